@@ -8,7 +8,6 @@ import sys
 from pathlib import Path
 import uuid
 
-import requests
 import streamlit as st
 import streamlit.components.v1 as components
 
@@ -102,7 +101,11 @@ from everskills.services.access import (  # noqa: E402
 )
 from everskills.services.passwords import hash_password_pbkdf2  # noqa: E402
 from everskills.services.gsheet_access import get_gsheet_api  # noqa: E402
-from everskills.services.mailer import send_email  # noqa: E402
+from everskills.services.mail_queue import enqueue_email, ensure_worker as ensure_mail_worker  # noqa: E402
+from everskills.services.program_pregen import ensure_worker as ensure_program_pregen_worker  # noqa: E402
+from everskills.services.reminders import enabled as reminders_enabled, ensure_worker as ensure_reminders_worker  # noqa: E402
+from everskills.services.settings import get_settings  # noqa: E402
+from everskills.services.webhook_client import post_json  # noqa: E402
 
 # -----------------------------------------------------------------------------
 # Seed demo users (DEV safe)
@@ -112,6 +115,17 @@ try:
 except Exception:
     pass
 
+# -----------------------------------------------------------------------------
+# Mail queue worker (drains jobs left by a previous process)
+# -----------------------------------------------------------------------------
+try:
+    ensure_mail_worker()
+    if reminders_enabled():
+        ensure_reminders_worker()
+    ensure_program_pregen_worker()
+except Exception:
+    pass
+
 # -----------------------------------------------------------------------------
 # Session bootstrap from URL token (back button / refresh safe)
 # -----------------------------------------------------------------------------
@@ -234,24 +248,15 @@ def _call_apps_script(action: str, payload: dict) -> dict:
       - URL: GSHEET_WEBAPP_URL / APPS_SCRIPT_URL / GSHEET_API_URL / WEBHOOK_URL
       - SECRET: GSHEET_SHARED_SECRET / SHARED_SECRET / EVS_SECRET
     """
-    url = (
-        st.secrets.get("GSHEET_WEBAPP_URL")
-        or st.secrets.get("APPS_SCRIPT_URL")
-        or st.secrets.get("GSHEET_API_URL")
-        or st.secrets.get("WEBHOOK_URL")
-    )
-    secret = (
-        st.secrets.get("GSHEET_SHARED_SECRET")
-        or st.secrets.get("SHARED_SECRET")
-        or st.secrets.get("EVS_SECRET")
-    )
+    cfg = get_settings().apps_script
+    url, secret = cfg.url, cfg.secret
 
     if not url or not secret:
         return {"ok": False, "error": "Missing secrets for Apps Script (URL or SECRET).", "data": None}
 
     body = {"secret": secret, "action": action, **payload}
     try:
-        r = requests.post(str(url), json=body, timeout=20)
+        r = post_json(str(url), body, timeout_s=20)
         j = r.json()
         return j if isinstance(j, dict) else {"ok": False, "error": "Non-JSON response", "data": None}
     except Exception as e:
@@ -520,8 +525,8 @@ with col_signup:
                 st.json(res.data)
                 st.stop()
 
-            admin_email = str(st.secrets.get("ACCESS_ADMIN_EMAIL") or "admin@everboarding.fr")
-            send_email(
+            admin_email = get_settings().access_admin_email or "admin@everboarding.fr"
+            enqueue_email(
                 to_email=admin_email,
                 subject="[EVERSKILLS] Nouvelle demande d’accès",
                 text_body=f"Nouvelle demande:\n{fn} {ln}\n{em}\nrequest_id={request_id}\n",
@@ -0,0 +1,781 @@
+# everskills/devtools/apps_script_standin.py
+"""
+Local stand-in for the Google Apps Script webhook (tests + benchmarks, offline).
+
+Implements the actions used by everskills/services/* and the pages on top of SQLite,
+with optional latency, error-rate and quota injection.
+
+Run:
+    python -m everskills.devtools.apps_script_standin --port 8765 --secret dev-secret \
+        --latency-ms 300 --jitter-ms 200 --error-rate 0.05 --quota 100 --quota-window-s 60
+
+Then point .streamlit/secrets.toml at it:
+    GSHEET_USERS_WEBAPP_URL = "http://127.0.0.1:8765/exec"
+    GSHEET_USERS_SHARED_SECRET = "dev-secret"
+    GSHEET_WEBAPP_URL = "http://127.0.0.1:8765/exec"
+    GSHEET_SHARED_SECRET = "dev-secret"
+
+In-process (tests / benchmarks):
+    srv = start_standin(latency_ms=50)
+    ... srv.url ...
+    srv.configure(error_rate=0.2)
+    srv.stop()
+
+Fault knobs can also be changed at runtime: POST /__control {"latency_ms": 0, ...}
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import secrets as pysecrets
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class FaultConfig:
+    latency_ms: int = 0
+    jitter_ms: int = 0
+    error_rate: float = 0.0  # share of calls answered with HTTP 500
+    quota: int = 0  # max calls per window (0 = unlimited), like the Apps Script quota
+    quota_window_s: int = 60
+
+
+def _now_s() -> int:
+    return int(time.time())
+
+
+def _now_iso() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def _norm_email(s: Any) -> str:
+    return str(s or "").strip().lower()
+
+
+def _truthy(v: Any) -> bool:
+    if isinstance(v, bool):
+        return v
+    return str(v or "").strip().lower() in {"true", "1", "yes", "y", "on"}
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    request_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_request_id ON users(request_id);
+
+CREATE TABLE IF NOT EXISTS journal (
+    id TEXT PRIMARY KEY,
+    author_email TEXT,
+    coach_email TEXT,
+    shared INTEGER,
+    created_at INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journal_author ON journal(author_email, created_at);
+CREATE INDEX IF NOT EXISTS journal_coach ON journal(coach_email, created_at);
+
+CREATE TABLE IF NOT EXISTS files (
+    file_id TEXT PRIMARY KEY,
+    file_name TEXT,
+    mime_type TEXT,
+    content BLOB
+);
+
+CREATE TABLE IF NOT EXISTS uploads (
+    upload_id TEXT PRIMARY KEY,
+    sha256 TEXT,
+    total_size INTEGER,
+    received INTEGER,
+    file_name TEXT,
+    mime_type TEXT,
+    file_id TEXT
+);
+CREATE INDEX IF NOT EXISTS uploads_sha ON uploads(sha256, total_size);
+
+CREATE TABLE IF NOT EXISTS upload_chunks (
+    upload_id TEXT,
+    offset INTEGER,
+    content BLOB,
+    PRIMARY KEY (upload_id, offset)
+);
+
+CREATE TABLE IF NOT EXISTS programs (
+    program_id TEXT PRIMARY KEY,
+    org_id TEXT,
+    learner_email TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS objectives (
+    objective_id TEXT PRIMARY KEY,
+    org_id TEXT,
+    program_id TEXT,
+    week_start TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS comments (
+    comment_id TEXT PRIMARY KEY,
+    org_id TEXT,
+    program_id TEXT,
+    week_start TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS password_resets (
+    email TEXT PRIMARY KEY,
+    token_hash TEXT,
+    expires_at INTEGER
+);
+"""
+
+
+class StandinBackend:
+    """
+    Action implementations. One SQLite connection guarded by a lock (the HTTP
+    server is threaded; throughput is not the point, realistic shapes are).
+    """
+
+    def __init__(self, db_path: str = ":memory:", secret: str = "dev-secret", base_url: str = "") -> None:
+        self.secret = secret
+        self.base_url = base_url
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self.actions: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+            "create_user": self.create_user,
+            "list_users": self.list_users,
+            "count_users": self.count_users,
+            "update_user": self.update_user,
+            "update_users": self.update_users,
+            "request_password_reset": self.request_password_reset,
+            "confirm_password_reset": self.confirm_password_reset,
+            "journal_create": self.journal_create,
+            "journal_list_learner": self.journal_list_learner,
+            "journal_list_coach": self.journal_list_coach,
+            "upload_voice_note": self.upload_voice_note,
+            "voice_upload_init": self.voice_upload_init,
+            "voice_upload_append": self.voice_upload_append,
+            "voice_upload_status": self.voice_upload_status,
+            "voice_upload_finalize": self.voice_upload_finalize,
+            "create_program": self.create_program,
+            "list_programs": self.list_programs,
+            "upsert_objective": self.upsert_objective,
+            "list_objectives": self.list_objectives,
+            "add_comment": self.add_comment,
+            "list_comments": self.list_comments,
+        }
+
+    # ----------------------------
+    # Dispatch
+    # ----------------------------
+    def handle(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if str(payload.get("secret") or "") != self.secret:
+            return {"ok": False, "error": "Unauthorized"}
+        action = str(payload.get("action") or "").strip()
+        fn = self.actions.get(action)
+        if fn is None:
+            return {"ok": False, "error": f"Unknown action: {action}"}
+        with self._lock:
+            try:
+                out = fn(payload)
+                self._db.commit()
+                return out
+            except Exception as e:
+                self._db.rollback()
+                return {"ok": False, "error": f"{action} failed: {e}"}
+
+    def _rows(self, sql: str, args: Tuple[Any, ...] = ()) -> List[Dict[str, Any]]:
+        return [json.loads(r[0]) for r in self._db.execute(sql, args).fetchall()]
+
+    # ----------------------------
+    # Users (onglet "New Users")
+    # ----------------------------
+    def _get_user(self, *, email: str = "", request_id: str = "") -> Optional[Dict[str, Any]]:
+        if request_id:
+            row = self._db.execute("SELECT data FROM users WHERE request_id = ?", (request_id,)).fetchone()
+            if row:
+                return json.loads(row[0])
+        if email:
+            row = self._db.execute("SELECT data FROM users WHERE email = ?", (_norm_email(email),)).fetchone()
+            if row:
+                return json.loads(row[0])
+        return None
+
+    def _put_user(self, user: Dict[str, Any]) -> None:
+        self._db.execute(
+            "INSERT INTO users(email, request_id, data) VALUES (?, ?, ?)"
+            " ON CONFLICT(email) DO UPDATE SET request_id = excluded.request_id, data = excluded.data",
+            (user["email"], str(user.get("request_id") or ""), json.dumps(user, ensure_ascii=False)),
+        )
+
+    def create_user(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        email = _norm_email(p.get("email"))
+        if not email or "@" not in email:
+            return {"ok": False, "error": "Invalid email"}
+        if self._get_user(email=email):
+            return {"ok": False, "error": "User already exists"}
+        user = {
+            "email": email,
+            "role": str(p.get("role") or "learner"),
+            "status": str(p.get("status") or "pending"),
+            "first_name": str(p.get("first_name") or ""),
+            "last_name": str(p.get("last_name") or ""),
+            "initial_password": str(p.get("initial_password") or ""),
+            "source": str(p.get("source") or ""),
+            "request_id": str(p.get("request_id") or ""),
+            "password_sent": "",
+            "sent_at": "",
+            "created_at": _now_iso(),
+        }
+        self._put_user(user)
+        return {"ok": True, "row": user}
+
+    @staticmethod
+    def _user_matches(user: Dict[str, Any], flt: Dict[str, Any]) -> bool:
+        """
+        filter = {field: value} (equality) or {field: {"ne": value}}, case-insensitive.
+        """
+        for k, cond in flt.items():
+            v = str(user.get(k) or "").strip().lower()
+            if isinstance(cond, dict):
+                if "ne" in cond and v == str(cond["ne"] or "").strip().lower():
+                    return False
+                if "eq" in cond and v != str(cond["eq"] or "").strip().lower():
+                    return False
+            elif v != str(cond or "").strip().lower():
+                return False
+        return True
+
+    def _filtered_users(self, p: Dict[str, Any], after_rowid: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        flt = p.get("filter") if isinstance(p.get("filter"), dict) else {}
+        for rowid, data in self._db.execute("SELECT rowid, data FROM users WHERE rowid > ? ORDER BY rowid", (after_rowid,)):
+            user = json.loads(data)
+            if self._user_matches(user, flt):
+                yield rowid, user
+
+    def list_users(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Without filter/cursor/limit: every row (legacy shape).
+        With them: one page + next_cursor ("" when done). The cursor is the sheet row id.
+        """
+        if not any(k in p for k in ("filter", "cursor", "limit")):
+            return {"ok": True, "rows": self._rows("SELECT data FROM users ORDER BY rowid")}
+
+        try:
+            after = int(str(p.get("cursor") or "0"))
+        except ValueError:
+            return {"ok": False, "error": "Invalid cursor"}
+        limit = max(int(p.get("limit") or 0), 0)
+
+        rows: List[Dict[str, Any]] = []
+        next_cursor = ""
+        last_rowid = after
+        for rowid, user in self._filtered_users(p, after):
+            if limit and len(rows) >= limit:
+                next_cursor = str(last_rowid)
+                break
+            rows.append(user)
+            last_rowid = rowid
+        return {"ok": True, "rows": rows, "next_cursor": next_cursor}
+
+    def count_users(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        return {"ok": True, "count": sum(1 for _ in self._filtered_users(p))}
+
+    def update_user(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        updates = p.get("updates") if isinstance(p.get("updates"), dict) else {}
+        user = self._get_user(email=str(p.get("email") or ""), request_id=str(p.get("request_id") or "").strip())
+        if not user:
+            return {"ok": False, "error": "User not found"}
+        user.update({k: v for k, v in updates.items() if k != "email"})
+        self._put_user(user)
+        return {"ok": True, "row": user}
+
+    def update_users(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Batch of update_user: {"items": [{request_id?, email?, updates}]} -> per-item results.
+        """
+        items = p.get("items") if isinstance(p.get("items"), list) else []
+        results = []
+        for it in items:
+            res = self.update_user(it if isinstance(it, dict) else {})
+            results.append({"ok": res.get("ok") is True, "error": str(res.get("error") or "")})
+        return {"ok": True, "results": results}
+
+    def request_password_reset(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        email = _norm_email(p.get("email"))
+        if not self._get_user(email=email):
+            return {"ok": True}  # same answer as the real script (no account enumeration)
+        token = pysecrets.token_urlsafe(24)
+        self._db.execute(
+            "INSERT OR REPLACE INTO password_resets(email, token_hash, expires_at) VALUES (?, ?, ?)",
+            (email, hashlib.sha256(token.encode("utf-8")).hexdigest(), _now_s() + 3600),
+        )
+        # The real script emails the link; the stand-in hands the token back for tests.
+        return {"ok": True, "debug_token": token}
+
+    def confirm_password_reset(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        email = _norm_email(p.get("email"))
+        token = str(p.get("token") or "")
+        row = self._db.execute("SELECT token_hash, expires_at FROM password_resets WHERE email = ?", (email,)).fetchone()
+        if not row or int(row[1]) < _now_s():
+            return {"ok": False, "error": "Invalid or expired token"}
+        if hashlib.sha256(token.encode("utf-8")).hexdigest() != row[0]:
+            return {"ok": False, "error": "Invalid or expired token"}
+        self._db.execute("DELETE FROM password_resets WHERE email = ?", (email,))
+        return {"ok": True}
+
+    # ----------------------------
+    # Journal
+    # ----------------------------
+    def journal_create(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        data = p.get("data") if isinstance(p.get("data"), dict) else {}
+        entry_id = str(data.get("id") or p.get("idempotency_key") or "").strip()
+        if not entry_id:
+            return {"ok": False, "error": "Missing entry id"}
+
+        # idempotent on entry id: a retried POST returns the stored row
+        row = self._db.execute("SELECT data FROM journal WHERE id = ?", (entry_id,)).fetchone()
+        if row:
+            return {"ok": True, "item": json.loads(row[0]), "duplicate": True}
+
+        item = {**data, "id": entry_id}
+        self._db.execute(
+            "INSERT INTO journal(id, author_email, coach_email, shared, created_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                entry_id,
+                _norm_email(item.get("author_email")),
+                _norm_email(item.get("coach_email")),
+                1 if _truthy(item.get("share_with_coach")) else 0,
+                int(item.get("created_at") or _now_s()),
+                json.dumps(item, ensure_ascii=False),
+            ),
+        )
+        return {"ok": True, "item": item}
+
+    def _journal_list(self, where: str, args: Tuple[Any, ...], p: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        With `after_seq` (incremental sync): rows appended after that sequence number
+        (the sheet row), oldest first, `limit` per page, `has_more` when a page is full.
+        Every item carries its `seq`. Without it: the newest `limit` rows with
+        created_at >= since, newest first (listing, older clients).
+        """
+        limit = max(1, min(int(p.get("limit") or 50), 1000))
+        if p.get("after_seq") is not None:
+            rows = self._db.execute(
+                f"SELECT rowid, data FROM journal WHERE {where} AND rowid > ? ORDER BY rowid ASC LIMIT ?",
+                (*args, int(p.get("after_seq") or 0), limit + 1),
+            ).fetchall()
+            items = [{**json.loads(r[1]), "seq": int(r[0])} for r in rows[:limit]]
+            return {"ok": True, "items": items, "has_more": len(rows) > limit}
+        since = int(p.get("since") or 0)
+        items = self._rows(
+            f"SELECT data FROM journal WHERE {where} AND created_at >= ? ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*args, since, limit),
+        )
+        return {"ok": True, "items": items}
+
+    def journal_list_learner(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        return self._journal_list("author_email = ?", (_norm_email(p.get("author_email")),), p)
+
+    def journal_list_coach(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        return self._journal_list("coach_email = ? AND shared = 1", (_norm_email(p.get("coach_email")),), p)
+
+    # ----------------------------
+    # Voice notes (Drive)
+    # ----------------------------
+    def _file_urls(self, file_id: str) -> Tuple[str, str]:
+        base = self.base_url.rstrip("/")
+        return f"{base}/files/{file_id}", f"{base}/files/{file_id}?download=1"
+
+    def upload_voice_note(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            content = base64.b64decode(str(p.get("data_b64") or ""), validate=True)
+        except Exception:
+            return {"ok": False, "error": "Invalid base64"}
+        if not content:
+            return {"ok": False, "error": "Empty file"}
+        return self._store_file(str(p.get("file_name") or ""), str(p.get("mime_type") or "application/octet-stream"), content)
+
+    def _store_file(self, file_name: str, mime: str, content: bytes) -> Dict[str, Any]:
+        file_id = uuid.uuid4().hex
+        self._db.execute(
+            "INSERT INTO files(file_id, file_name, mime_type, content) VALUES (?, ?, ?, ?)",
+            (file_id, file_name or file_id, mime, sqlite3.Binary(content)),
+        )
+        url, url_alt = self._file_urls(file_id)
+        return {"ok": True, "file_id": file_id, "audio_url": url, "audio_url_alt": url_alt, "mime_type": mime}
+
+    def _upload(self, upload_id: str) -> Optional[Tuple[str, int, int, str, str, str]]:
+        return self._db.execute(
+            "SELECT sha256, total_size, received, file_name, mime_type, file_id FROM uploads WHERE upload_id = ?",
+            (upload_id,),
+        ).fetchone()
+
+    def voice_upload_init(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        sha = str(p.get("sha256") or "").strip().lower()
+        size = int(p.get("total_size") or 0)
+        if not sha or size <= 0:
+            return {"ok": False, "error": "sha256 and total_size required"}
+        # same content already stored: hand back the existing file, nothing to send
+        done = self._db.execute(
+            "SELECT upload_id, file_id, mime_type FROM uploads WHERE sha256 = ? AND total_size = ? AND file_id != ''",
+            (sha, size),
+        ).fetchone()
+        if done:
+            url, url_alt = self._file_urls(done[1])
+            return {
+                "ok": True,
+                "upload_id": done[0],
+                "received": size,
+                "dedup": True,
+                "file_id": done[1],
+                "audio_url": url,
+                "audio_url_alt": url_alt,
+                "mime_type": done[2],
+            }
+        # same content, same size, not finalized yet: resume where it stopped
+        row = self._db.execute(
+            "SELECT upload_id, received FROM uploads WHERE sha256 = ? AND total_size = ? AND file_id = ''",
+            (sha, size),
+        ).fetchone()
+        if row:
+            return {"ok": True, "upload_id": row[0], "received": int(row[1])}
+        upload_id = uuid.uuid4().hex
+        self._db.execute(
+            "INSERT INTO uploads(upload_id, sha256, total_size, received, file_name, mime_type, file_id) VALUES (?, ?, ?, 0, ?, ?, '')",
+            (upload_id, sha, size, str(p.get("file_name") or ""), str(p.get("mime_type") or "application/octet-stream")),
+        )
+        return {"ok": True, "upload_id": upload_id, "received": 0}
+
+    def voice_upload_append(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        upload_id = str(p.get("upload_id") or "")
+        up = self._upload(upload_id)
+        if not up:
+            return {"ok": False, "error": "Unknown upload_id"}
+        try:
+            content = base64.b64decode(str(p.get("data_b64") or ""), validate=True)
+        except Exception:
+            return {"ok": False, "error": "Invalid base64"}
+        if hashlib.sha256(content).hexdigest() != str(p.get("chunk_sha256") or "").lower():
+            return {"ok": False, "error": "Chunk checksum mismatch"}
+        offset, received, total = int(p.get("offset") or 0), int(up[2]), int(up[1])
+        if offset + len(content) <= received:
+            return {"ok": True, "received": received}  # replayed chunk (lost ack)
+        if offset != received:
+            return {"ok": False, "error": f"Offset mismatch (expected {received})", "received": received}
+        if received + len(content) > total:
+            return {"ok": False, "error": "Chunk past total_size"}
+        self._db.execute(
+            "INSERT INTO upload_chunks(upload_id, offset, content) VALUES (?, ?, ?)",
+            (upload_id, offset, sqlite3.Binary(content)),
+        )
+        received += len(content)
+        self._db.execute("UPDATE uploads SET received = ? WHERE upload_id = ?", (received, upload_id))
+        return {"ok": True, "received": received}
+
+    def voice_upload_status(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        up = self._upload(str(p.get("upload_id") or ""))
+        if not up:
+            return {"ok": False, "error": "Unknown upload_id"}
+        return {"ok": True, "received": int(up[2]), "total_size": int(up[1]), "done": bool(up[5])}
+
+    def voice_upload_finalize(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        upload_id = str(p.get("upload_id") or "")
+        up = self._upload(upload_id)
+        if not up:
+            return {"ok": False, "error": "Unknown upload_id"}
+        sha, total, received, file_name, mime, file_id = up
+        if file_id:  # finalize replayed
+            url, url_alt = self._file_urls(file_id)
+            return {"ok": True, "file_id": file_id, "audio_url": url, "audio_url_alt": url_alt, "mime_type": mime}
+        if int(received) != int(total):
+            return {"ok": False, "error": f"Incomplete upload ({received}/{total})"}
+        chunks = self._db.execute(
+            "SELECT content FROM upload_chunks WHERE upload_id = ? ORDER BY offset", (upload_id,)
+        ).fetchall()
+        content = b"".join(bytes(c[0]) for c in chunks)
+        if hashlib.sha256(content).hexdigest() != sha or sha != str(p.get("sha256") or sha).lower():
+            return {"ok": False, "error": "File checksum mismatch"}
+        out = self._store_file(file_name, mime, content)
+        self._db.execute("UPDATE uploads SET file_id = ? WHERE upload_id = ?", (out["file_id"], upload_id))
+        self._db.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+        return out
+
+    def get_file(self, file_id: str) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            row = self._db.execute("SELECT content, mime_type FROM files WHERE file_id = ?", (file_id,)).fetchone()
+        return (bytes(row[0]), str(row[1])) if row else None
+
+    # ----------------------------
+    # Programs / objectives / comments
+    # ----------------------------
+    def create_program(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        program_id = str(p.get("program_id") or "").strip() or f"prog_{uuid.uuid4().hex[:12]}"
+        row = {k: p.get(k) for k in ("org_id", "learner_email", "title", "program_json", "status", "program_version")}
+        row.update({"program_id": program_id, "learner_email": _norm_email(row.get("learner_email")), "created_at": _now_iso()})
+        self._db.execute(
+            "INSERT OR REPLACE INTO programs(program_id, org_id, learner_email, data) VALUES (?, ?, ?, ?)",
+            (program_id, str(row.get("org_id") or ""), row["learner_email"], json.dumps(row, ensure_ascii=False)),
+        )
+        return {"ok": True, "row": row}
+
+    def list_programs(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        org_id = str(p.get("org_id") or "")
+        learner = _norm_email(p.get("learner_email"))
+        rows = self._rows(
+            "SELECT data FROM programs WHERE (? = '' OR org_id = ?) AND (? = '' OR learner_email = ?) ORDER BY rowid",
+            (org_id, org_id, learner, learner),
+        )
+        return {"ok": True, "rows": rows}
+
+    def upsert_objective(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        objective_id = str(p.get("objective_id") or "").strip() or f"obj_{uuid.uuid4().hex[:12]}"
+        row = {k: p.get(k) for k in ("org_id", "program_id", "week_start", "objective_text", "status")}
+        row.update({"objective_id": objective_id, "updated_at": _now_iso()})
+        self._db.execute(
+            "INSERT OR REPLACE INTO objectives(objective_id, org_id, program_id, week_start, data) VALUES (?, ?, ?, ?, ?)",
+            (
+                objective_id,
+                str(row.get("org_id") or ""),
+                str(row.get("program_id") or ""),
+                str(row.get("week_start") or ""),
+                json.dumps(row, ensure_ascii=False),
+            ),
+        )
+        return {"ok": True, "row": row}
+
+    def list_objectives(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        org_id, program_id, week = (str(p.get(k) or "") for k in ("org_id", "program_id", "week_start"))
+        rows = self._rows(
+            "SELECT data FROM objectives WHERE (? = '' OR org_id = ?) AND (? = '' OR program_id = ?)"
+            " AND (? = '' OR week_start = ?) ORDER BY week_start, rowid",
+            (org_id, org_id, program_id, program_id, week, week),
+        )
+        return {"ok": True, "rows": rows}
+
+    def add_comment(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        comment_id = str(p.get("comment_id") or p.get("idempotency_key") or "").strip() or uuid.uuid4().hex
+        row = self._db.execute("SELECT data FROM comments WHERE comment_id = ?", (comment_id,)).fetchone()
+        if row:
+            return {"ok": True, "row": json.loads(row[0]), "duplicate": True}
+        data = {k: p.get(k) for k in ("org_id", "program_id", "week_start", "author_role", "author_email", "message")}
+        data.update({"comment_id": comment_id, "created_at": _now_iso()})
+        self._db.execute(
+            "INSERT INTO comments(comment_id, org_id, program_id, week_start, created_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                comment_id,
+                str(data.get("org_id") or ""),
+                str(data.get("program_id") or ""),
+                str(data.get("week_start") or ""),
+                data["created_at"],
+                json.dumps(data, ensure_ascii=False),
+            ),
+        )
+        return {"ok": True, "row": data}
+
+    def list_comments(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        org_id, program_id, week = (str(p.get(k) or "") for k in ("org_id", "program_id", "week_start"))
+        rows = self._rows(
+            "SELECT data FROM comments WHERE (? = '' OR org_id = ?) AND (? = '' OR program_id = ?)"
+            " AND (? = '' OR week_start = ?) ORDER BY created_at, rowid",
+            (org_id, org_id, program_id, program_id, week, week),
+        )
+        return {"ok": True, "rows": rows}
+
+
+# ----------------------------
+# HTTP layer (fault injection lives here)
+# ----------------------------
+class _FaultGate:
+    def __init__(self, cfg: FaultConfig, seed: Optional[int] = None) -> None:
+        self.cfg = cfg
+        self._rng = random.Random(seed)
+        self._calls: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def check(self) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        Sleeps for the injected latency, then returns (http_status, body) if the call
+        must fail, else None.
+        """
+        cfg = self.cfg
+        with self._lock:
+            delay_ms = cfg.latency_ms + (self._rng.uniform(0, cfg.jitter_ms) if cfg.jitter_ms else 0)
+            fail = cfg.error_rate > 0 and self._rng.random() < cfg.error_rate
+
+            over_quota = False
+            if cfg.quota > 0:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] > cfg.quota_window_s:
+                    self._calls.popleft()
+                over_quota = len(self._calls) >= cfg.quota
+                if not over_quota:
+                    self._calls.append(now)
+
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+        if over_quota:
+            # Apps Script answers quota errors with a 200 + error payload
+            return 200, {"ok": False, "error": "Service invoked too many times in a short time (quota)"}
+        if fail:
+            return 500, {"ok": False, "error": "Injected server error"}
+        return None
+
+
+def _make_handler(backend: StandinBackend, gate: _FaultGate) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt: str, *args: Any) -> None:  # keep benchmarks quiet
+            return
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status: int, obj: Dict[str, Any]) -> None:
+            self._send(status, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+        def do_GET(self) -> None:  # noqa: N802
+            path = self.path.split("?", 1)[0]
+            if path.startswith("/files/"):
+                found = backend.get_file(path[len("/files/") :])
+                if not found:
+                    self._send_json(404, {"ok": False, "error": "Not found"})
+                    return
+                content, mime = found
+                self._send(200, content, mime)
+                return
+            if path == "/__health":
+                self._send_json(200, {"ok": True})
+                return
+            self._send_json(404, {"ok": False, "error": "Not found"})
+
+        def do_POST(self) -> None:  # noqa: N802
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                payload = json.loads(raw.decode("utf-8")) if raw else {}
+            except Exception:
+                self._send_json(400, {"ok": False, "error": "Invalid JSON"})
+                return
+
+            if self.path.split("?", 1)[0] == "/__control":
+                for k, v in (payload or {}).items():
+                    if hasattr(gate.cfg, k):
+                        setattr(gate.cfg, k, type(getattr(gate.cfg, k))(v))
+                self._send_json(200, {"ok": True, "config": asdict(gate.cfg)})
+                return
+
+            injected = gate.check()
+            if injected:
+                self._send_json(*injected)
+                return
+            self._send_json(200, backend.handle(payload if isinstance(payload, dict) else {}))
+
+    return Handler
+
+
+class StandinServer:
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        db_path: str = ":memory:",
+        secret: str = "dev-secret",
+        faults: Optional[FaultConfig] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.faults = faults or FaultConfig()
+        self.backend = StandinBackend(db_path=db_path, secret=secret)
+        self.gate = _FaultGate(self.faults, seed=seed)
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self.backend, self.gate))
+        self.httpd.daemon_threads = True
+        h, p = self.httpd.server_address[:2]
+        self.base_url = f"http://{h}:{p}"
+        self.backend.base_url = self.base_url
+        self.url = f"{self.base_url}/exec"
+        self.secret = secret
+        self._thread: Optional[threading.Thread] = None
+
+    def configure(self, **kwargs: Any) -> None:
+        for k, v in kwargs.items():
+            if not hasattr(self.faults, k):
+                raise AttributeError(f"Unknown fault knob: {k}")
+            setattr(self.faults, k, v)
+
+    def start(self) -> "StandinServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="apps-script-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_standin(**kwargs: Any) -> StandinServer:
+    """
+    Start a stand-in on a free port in a background thread.
+    Fault knobs (latency_ms, jitter_ms, error_rate, quota, quota_window_s) may be passed directly.
+    """
+    fault_keys = set(FaultConfig.__dataclass_fields__)
+    faults = FaultConfig(**{k: kwargs.pop(k) for k in list(kwargs) if k in fault_keys})
+    return StandinServer(faults=faults, **kwargs).start()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Local Apps Script stand-in (SQLite)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--db", default="data/apps_script_standin.sqlite3", help="SQLite path (':memory:' for ephemeral)")
+    ap.add_argument("--secret", default="dev-secret")
+    ap.add_argument("--latency-ms", type=int, default=0)
+    ap.add_argument("--jitter-ms", type=int, default=0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--quota", type=int, default=0)
+    ap.add_argument("--quota-window-s", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=None)
+    a = ap.parse_args(argv)
+
+    faults = FaultConfig(
+        latency_ms=a.latency_ms,
+        jitter_ms=a.jitter_ms,
+        error_rate=a.error_rate,
+        quota=a.quota,
+        quota_window_s=a.quota_window_s,
+    )
+    srv = StandinServer(host=a.host, port=a.port, db_path=a.db, secret=a.secret, faults=faults, seed=a.seed)
+    print(f"Apps Script stand-in listening on {srv.url} (secret={a.secret!r}, faults={asdict(faults)})")
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+# everskills/devtools/mail_bench.py
+"""
+Mail throughput benchmark against the local SMTP sink (no real relay).
+
+Drives the real sending paths (mailer.send_email, mailer.send_many,
+mail_send_once.send_once, mail_queue) at several sizes and reports messages/s and
+p95 latency, then checks idempotency with concurrent senders on shared event keys.
+
+Run:
+    python -m everskills.devtools.mail_bench --sizes 10,100,1000 --latency-ms 2 --threads 8
+    python -m everskills.devtools.mail_bench --sizes 100 --fail-rate 0.05 --json bench.json
+
+All state (outbox, mail_events, mail_queue) goes to a temporary directory: data/ is
+never touched.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from everskills.devtools.smtp_sink import SMTPSink, start_sink
+
+
+@dataclass
+class BenchRow:
+    scenario: str
+    n: int
+    ok: int
+    errors: int
+    seconds: float
+    msgs_per_s: float
+    p95_ms: float
+
+
+@dataclass
+class IdempotencyRow:
+    scenario: str
+    keys: int
+    threads: int
+    calls: int
+    delivered: int
+    duplicates: int
+    missing: int
+
+    @property
+    def correct(self) -> bool:
+        return self.duplicates == 0 and self.missing == 0
+
+
+def _p95(values: List[float]) -> float:
+    if not values:
+        return 0.0
+    v = sorted(values)
+    return v[min(len(v) - 1, int(round(0.95 * (len(v) - 1))))]
+
+
+# ----------------------------
+# Wiring: point the mail services at the sink and a scratch data dir
+# ----------------------------
+def _isolate(tmp: Path, sink: SMTPSink) -> None:
+    from everskills.services import mail_events, mail_queue, mailer
+
+    tmp.mkdir(parents=True, exist_ok=True)
+    mailer.DATA_DIR = tmp
+    mailer.OUTBOX_PATH = tmp / "emails_outbox.jsonl"
+    mailer.LEGACY_OUTBOX_PATH = tmp / "emails_outbox.json"
+    mail_events.DATA_DIR = tmp
+    mail_events.MAIL_CLAIMS_DB_PATH = tmp / "mail_events.sqlite3"
+    mail_events.MAIL_EVENTS_LOG_PATH = tmp / "mail_events.jsonl"
+    mail_events.MAIL_EVENTS_PATH = tmp / "mail_events.json"
+    mail_queue.DATA_DIR = tmp
+    mail_queue.QUEUE_DB_PATH = tmp / "mail_queue.sqlite3"
+
+    cfg = mailer.SMTPConfig(
+        host=sink.host,
+        port=sink.port,
+        user=sink.user,
+        password=sink.password,
+        email_from="bench@everskills.local",
+        starttls=sink.ssl_context is not None,
+        ca_file=sink.ca_file,
+    )
+    mailer.get_smtp_config = lambda: cfg  # type: ignore[assignment]
+    mailer.close_smtp_pools()
+
+
+def _timed(n: int, fn: Callable[[int], bool]) -> BenchRow:
+    lat: List[float] = []
+    ok = 0
+    t0 = time.perf_counter()
+    for i in range(n):
+        t = time.perf_counter()
+        try:
+            ok += 1 if fn(i) else 0
+        except Exception:
+            pass
+        lat.append((time.perf_counter() - t) * 1000.0)
+    secs = time.perf_counter() - t0
+    return BenchRow("", n, ok, n - ok, round(secs, 3), round(n / secs, 1) if secs else 0.0, round(_p95(lat), 1))
+
+
+# ----------------------------
+# Throughput scenarios
+# ----------------------------
+def bench_send_email(n: int, run_id: str, *, reuse: bool = True) -> BenchRow:
+    from everskills.services import mailer
+
+    mailer.close_smtp_pools()
+    if not reuse:
+        # one session per message = the pre-pool behaviour (EHLO/STARTTLS/LOGIN each time)
+        pool = mailer.get_smtp_pool(mailer.get_smtp_config())  # type: ignore[arg-type]
+        pool.max_messages = 1
+
+    def one(i: int) -> bool:
+        res = mailer.send_email(to_email=f"learner{i}@bench.local", subject=f"[{run_id}] email {i}", text_body="bench")
+        return bool(res.get("ok"))
+
+    row = _timed(n, one)
+    row.scenario = "send_email (pooled)" if reuse else "send_email (new session each)"
+    mailer.close_smtp_pools()
+    return row
+
+
+def bench_send_many(n: int, run_id: str, *, batch: int = 50) -> BenchRow:
+    from everskills.services import mailer
+
+    lat: List[float] = []
+    ok = 0
+    t0 = time.perf_counter()
+    for start in range(0, n, batch):
+        items = [
+            {"to_email": f"learner{i}@bench.local", "subject": f"[{run_id}] many {i}", "text_body": "bench"}
+            for i in range(start, min(start + batch, n))
+        ]
+        t = time.perf_counter()
+        res = mailer.send_many(items)
+        per_msg = (time.perf_counter() - t) * 1000.0 / max(len(items), 1)
+        lat.extend([per_msg] * len(items))
+        ok += sum(1 for r in res if r.get("ok"))
+    secs = time.perf_counter() - t0
+    return BenchRow(f"send_many (batch {batch})", n, ok, n - ok, round(secs, 3), round(n / secs, 1), round(_p95(lat), 1))
+
+
+def bench_send_once(n: int, run_id: str) -> BenchRow:
+    from everskills.services.mail_send_once import send_once
+
+    def one(i: int) -> bool:
+        return send_once(
+            event_key=f"BENCH:{run_id}:once:{i}",
+            event_type="BENCH",
+            request_id=run_id,
+            to_email=f"learner{i}@bench.local",
+            subject=f"[{run_id}] once {i}",
+            text_body="bench",
+        )
+
+    row = _timed(n, one)
+    row.scenario = "send_once"
+    return row
+
+
+def _drain_queue(ids: List[str], timeout_s: float) -> Dict[str, Dict[str, Any]]:
+    from everskills.services import mail_queue
+
+    deadline = time.time() + timeout_s
+    final = {mail_queue.SENT, mail_queue.FAILED, mail_queue.SKIPPED}
+    while True:
+        mail_queue.process_due()
+        states = {i: mail_queue.job_status(i) for i in set(ids)}
+        if all(s.get("state") in final for s in states.values()) or time.time() > deadline:
+            return states
+        time.sleep(0.05)
+
+
+def bench_queue(n: int, run_id: str, *, timeout_s: float = 600) -> BenchRow:
+    """
+    Enqueue n jobs (the UI side), then measure until the worker has sent all of them.
+    p95 = enqueue -> sent latency per job.
+    """
+    from everskills.services import mail_queue
+
+    t0 = time.perf_counter()
+    ids = [
+        mail_queue.enqueue_send_once(
+            event_key=f"BENCH:{run_id}:queue:{i}",
+            event_type="BENCH",
+            request_id=run_id,
+            to_email=f"learner{i}@bench.local",
+            subject=f"[{run_id}] queued {i}",
+            text_body="bench",
+        )
+        for i in range(n)
+    ]
+    enqueue_ms = (time.perf_counter() - t0) * 1000.0
+    _drain_queue(ids, timeout_s)
+    secs = time.perf_counter() - t0
+
+    jobs = {j["id"]: j for j in mail_queue.recent_jobs(limit=n * 2 + 10)}
+    lat = [
+        (float(j["updated_at"]) - float(j["created_at"])) * 1000.0
+        for i in ids
+        if (j := jobs.get(i)) and j.get("state") == mail_queue.SENT
+    ]
+    ok = len(lat)
+    row = BenchRow("mail_queue (enqueue→sent)", n, ok, n - ok, round(secs, 3), round(n / secs, 1), round(_p95(lat), 1))
+    print(f"    enqueue only: {enqueue_ms / max(n, 1):.2f} ms/job (what a button handler pays)")
+    return row
+
+
+# ----------------------------
+# Idempotency under concurrency
+# ----------------------------
+def _delivered_by_key(sink: SMTPSink, prefix: str) -> Counter:
+    return Counter(m.subject for m in sink.messages if m.subject.startswith(prefix))
+
+
+def bench_idempotency_send_once(sink: SMTPSink, keys: int, threads: int, run_id: str) -> IdempotencyRow:
+    from everskills.services.mail_send_once import send_once
+
+    prefix = f"[{run_id}] idem "
+    barrier = threading.Barrier(threads)
+
+    def worker(seed: int) -> None:
+        order = list(range(keys))
+        random.Random(seed).shuffle(order)
+        barrier.wait()
+        for k in order:
+            send_once(
+                event_key=f"BENCH:{run_id}:idem:{k}",
+                event_type="BENCH",
+                request_id=run_id,
+                to_email=f"learner{k}@bench.local",
+                subject=f"{prefix}{k}",
+                text_body="bench",
+            )
+
+    ts = [threading.Thread(target=worker, args=(s,)) for s in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+
+    got = _delivered_by_key(sink, prefix)
+    return IdempotencyRow(
+        "send_once (concurrent)",
+        keys,
+        threads,
+        keys * threads,
+        sum(got.values()),
+        sum(c - 1 for c in got.values() if c > 1),
+        keys - len(got),
+    )
+
+
+def bench_idempotency_queue(sink: SMTPSink, keys: int, threads: int, run_id: str) -> IdempotencyRow:
+    """
+    Several "UI" threads enqueue the same event keys while several workers drain.
+    """
+    from everskills.services import mail_queue
+
+    prefix = f"[{run_id}] qidem "
+    ids: List[str] = []
+    ids_lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def producer(seed: int) -> None:
+        order = list(range(keys))
+        random.Random(seed).shuffle(order)
+        barrier.wait()
+        for k in order:
+            jid = mail_queue.enqueue_send_once(
+                event_key=f"BENCH:{run_id}:qidem:{k}",
+                event_type="BENCH",
+                request_id=run_id,
+                to_email=f"learner{k}@bench.local",
+                subject=f"{prefix}{k}",
+                text_body="bench",
+            )
+            with ids_lock:
+                ids.append(jid)
+            if k % 7 == 0:
+                mail_queue.process_due()  # competing drainers
+
+    ts = [threading.Thread(target=producer, args=(s,)) for s in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    _drain_queue(ids, timeout_s=600)
+
+    got = _delivered_by_key(sink, prefix)
+    return IdempotencyRow(
+        "mail_queue (concurrent enqueue + drain)",
+        keys,
+        threads,
+        keys * threads,
+        sum(got.values()),
+        sum(c - 1 for c in got.values() if c > 1),
+        keys - len(got),
+    )
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+def run(
+    sizes: List[int],
+    *,
+    latency_ms: int = 2,
+    fail_rate: float = 0.0,
+    disconnect_rate: float = 0.0,
+    threads: int = 8,
+    no_reuse_max: int = 100,
+    seed: Optional[int] = 1,
+) -> Dict[str, Any]:
+    sink = start_sink(latency_ms=latency_ms, fail_rate=fail_rate, disconnect_rate=disconnect_rate, seed=seed)
+    tmp = tempfile.TemporaryDirectory(prefix="mail_bench_")
+    _isolate(Path(tmp.name), sink)
+
+    rows: List[BenchRow] = []
+    idem: List[IdempotencyRow] = []
+    try:
+        for n in sizes:
+            run_id = f"n{n}-{int(time.time() * 1000) % 100000}"
+            print(f"== {n} message(s)")
+            scenarios: List[Callable[[], BenchRow]] = [
+                lambda: bench_send_email(n, run_id),
+                lambda: bench_send_many(n, run_id),
+                lambda: bench_send_once(n, run_id),
+                lambda: bench_queue(n, run_id),
+            ]
+            if n <= no_reuse_max:
+                scenarios.insert(1, lambda: bench_send_email(n, run_id, reuse=False))
+            for sc in scenarios:
+                row = sc()
+                rows.append(row)
+                print(f"  {row.scenario:<34} {row.msgs_per_s:>9.1f} msg/s  p95 {row.p95_ms:>8.1f} ms  ok {row.ok}/{row.n}")
+
+            keys = max(1, n // 10)
+            for fn in (bench_idempotency_send_once, bench_idempotency_queue):
+                r = fn(sink, keys, threads, run_id)
+                idem.append(r)
+                verdict = "OK" if r.correct else "BROKEN"
+                print(
+                    f"  {r.scenario:<34} {r.keys} key(s) x {r.threads} thread(s): "
+                    f"delivered {r.delivered}, duplicates {r.duplicates}, missing {r.missing} -> {verdict}"
+                )
+    finally:
+        from everskills.services import mailer
+
+        mailer.close_smtp_pools()
+        sink.stop()
+        tmp.cleanup()
+
+    return {
+        "config": {
+            "sizes": sizes,
+            "latency_ms": latency_ms,
+            "fail_rate": fail_rate,
+            "disconnect_rate": disconnect_rate,
+            "threads": threads,
+        },
+        "throughput": [asdict(r) for r in rows],
+        "idempotency": [{**asdict(r), "correct": r.correct} for r in idem],
+        "sink": asdict(sink.stats),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Mail throughput + idempotency benchmark (local SMTP sink)")
+    ap.add_argument("--sizes", default="10,100,1000")
+    ap.add_argument("--latency-ms", type=int, default=2, help="sink latency per SMTP reply")
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--disconnect-rate", type=float, default=0.0)
+    ap.add_argument("--threads", type=int, default=8, help="concurrent senders for the idempotency check")
+    ap.add_argument("--no-reuse-max", type=int, default=100, help="skip the one-session-per-message baseline above this size")
+    ap.add_argument("--json", default="", help="write the report to this file")
+    a = ap.parse_args(argv)
+
+    report = run(
+        [int(x) for x in a.sizes.split(",") if x.strip()],
+        latency_ms=a.latency_ms,
+        fail_rate=a.fail_rate,
+        disconnect_rate=a.disconnect_rate,
+        threads=a.threads,
+        no_reuse_max=a.no_reuse_max,
+    )
+    if a.json:
+        Path(a.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"report written to {a.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+# everskills/devtools/openai_mock.py
+"""
+Local mock of the OpenAI endpoints used by everskills/services/* (tests + benchmarks, offline).
+
+    POST /v1/audio/transcriptions   multipart (file, model, language) -> {"text": ...}
+    POST /v1/chat/completions       JSON (or SSE with "stream": true) -> a short JSON
+                                    summary of the prompt, or a week-by-week program
+                                    when the prompt asks for one (JSON with a
+                                    json_schema response_format, else text)
+
+Transcription is deterministic for audio made by synth_speech(): every "word" is a
+burst whose amplitude encodes its index, so the mock "hears" mot0 mot1 ... in any
+slice of the recording, truncated words included. Processing time is simulated as
+latency_ms + ms_per_audio_s * duration (chat: + ms_per_token per streamed word), with
+a concurrency cap answered by 429.
+
+Run:
+    python -m everskills.devtools.openai_mock --port 8766 --latency-ms 100 \
+        --ms-per-audio-s 20 --ms-per-token 15 --max-concurrent 4
+
+Then point .streamlit/secrets.toml at it:
+    OPENAI_API_KEY = "mock"
+    OPENAI_BASE_URL = "http://127.0.0.1:8766/v1"
+(or LLM_MOCK = true: llm_gateway starts one in-process)
+
+In-process (tests / benchmarks):
+    srv = start_mock(ms_per_audio_s=20)
+    ... srv.base_url, srv.requests ...
+    srv.stop()
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import re
+import threading
+import time
+import wave
+from array import array
+from dataclasses import asdict, dataclass
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+RATE = 16000
+WORD_BASE = 1000  # amplitude of word 0
+WORD_STEP = 16  # amplitude step per word index (-> ~1900 distinct words in 16 bits)
+BLOCK = 80  # 5 ms at 16 kHz
+
+
+@dataclass
+class MockConfig:
+    latency_ms: int = 0  # fixed cost per request
+    ms_per_audio_s: int = 0  # transcription cost per second of audio
+    ms_per_token: int = 0  # chat: delay per word (streamed or not)
+    max_concurrent: int = 0  # 0 = unlimited; above it -> 429 + Retry-After
+    retry_after_s: float = 0.2
+    reject_response_format: bool = False  # chat: 400 on response_format (model without structured outputs)
+
+
+# ----------------------------
+# Synthetic speech
+# ----------------------------
+def synth_speech(
+    words: int,
+    *,
+    word_s: float = 0.32,
+    gap_s: float = 0.12,
+    sentence_every: int = 12,
+    pause_s: float = 0.7,
+    rate: int = RATE,
+) -> bytes:
+    """
+    WAV (mono, 16-bit) of `words` bursts separated by short gaps and sentence pauses.
+    """
+    samples = array("h")
+    gap = array("h", [0]) * int(gap_s * rate)
+    pause = array("h", [0]) * int(pause_s * rate)
+    n = int(word_s * rate)
+    for i in range(words):
+        amp = WORD_BASE + WORD_STEP * i
+        if amp > 32767:
+            raise ValueError("too many words for the amplitude code")
+        burst = array("h", [amp] * 8 + [-amp] * 8) * (n // 16)
+        samples.extend(burst)
+        samples.extend(pause if (i + 1) % sentence_every == 0 else gap)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+
+def expected_text(words: int) -> str:
+    return " ".join(f"mot{i}" for i in range(words))
+
+
+def hear(audio_bytes: bytes) -> Tuple[str, float]:
+    """
+    (text, duration_s) of a synth_speech() slice. Non-WAV input -> ("", 0).
+    """
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as w:
+            rate, channels = w.getframerate(), w.getnchannels()
+            samples = array("h")
+            samples.frombytes(w.readframes(w.getnframes()))
+    except (wave.Error, EOFError):
+        return "", 0.0
+    if channels > 1:
+        samples = samples[0::channels]
+    block = max(1, BLOCK * rate // RATE)
+    words: List[str] = []
+    peak = 0
+    for start in range(0, len(samples), block):
+        chunk = samples[start : start + block]
+        top = max(chunk)
+        if top > 0:
+            peak = max(peak, top)
+        elif peak:
+            words.append(f"mot{round((peak - WORD_BASE) / WORD_STEP)}")
+            peak = 0
+    if peak:
+        words.append(f"mot{round((peak - WORD_BASE) / WORD_STEP)}")
+    return " ".join(words), len(samples) / float(rate or 1)
+
+
+# ----------------------------
+# HTTP
+# ----------------------------
+def _multipart(content_type: str, body: bytes) -> Dict[str, Any]:
+    msg = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    out: Dict[str, Any] = {}
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if not name:
+            continue
+        payload = part.get_payload(decode=True) or b""
+        out[name] = payload if part.get_filename() else payload.decode("utf-8", "replace")
+    return out
+
+
+def _program(user: str) -> Dict[str, Any]:
+    m = re.search(r"Durée\s*:\s*(\d+)", user)
+    weeks = max(1, min(int(m.group(1)) if m else 3, 12))
+    m = re.search(r"Objectif de progression\s*:\s*(.+)", user)
+    objective = (m.group(1).strip() if m else "") or "progresser"
+    return {
+        "smart_objective": f"{objective} d'ici {weeks} semaines.",
+        "axes": ["préparer", "pratiquer", "ancrer"],
+        "weeks": [
+            {
+                "week": w,
+                "objective": f"étape {w} vers « {objective} »",
+                "actions": [f"pratiquer l'exercice {w}.1 en situation réelle", f"demander un retour après l'exercice {w}.2"],
+                "reminder": f"notion clé n°{w}",
+                "indicator": f"2 mises en pratique notées (semaine {w})",
+            }
+            for w in range(1, weeks + 1)
+        ],
+        "learner_message": "Tu as les cartes en main.\nAvance pas à pas.\nJe suis là si besoin.",
+    }
+
+
+def _program_text(p: Dict[str, Any]) -> str:
+    lines = [f"Objectif SMART : {p['smart_objective']}", ""]
+    for w in p["weeks"]:
+        lines += [
+            f"### Semaine {w['week']} : étape {w['week']}",
+            f"- Objectif de la semaine : {w['objective']}",
+            "- Actions terrain :",
+            *(f"  {i}. {a}" for i, a in enumerate(w["actions"], start=1)),
+            f"- Rappel : {w['reminder']}",
+            f"- Indicateur : {w['indicator']}",
+            "",
+        ]
+    lines += ["Message à l’apprenant", p["learner_message"]]
+    return "\n".join(lines)
+
+
+def _chat_text(body: Dict[str, Any]) -> str:
+    user = ""
+    for m in body.get("messages") or []:
+        if isinstance(m, dict) and m.get("role") == "user":
+            user = str(m.get("content") or "")
+    if "programme EVERSKILLS" in user:
+        if (body.get("response_format") or {}).get("type") == "json_schema":
+            return json.dumps(_program(user), ensure_ascii=False)
+        return _program_text(_program(user))
+    words = user.split()
+    return json.dumps(
+        {"summary": " ".join(words[:20]), "highlights": [" ".join(words[i : i + 5]) for i in range(0, min(15, len(words)), 5)]},
+        ensure_ascii=False,
+    )
+
+
+def _usage(body: Dict[str, Any], content: str) -> Dict[str, int]:
+    prompt = sum(len(str((m or {}).get("content") or "").split()) for m in body.get("messages") or [] if isinstance(m, dict))
+    completion = len(content.split())
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+def _chat_reply(body: Dict[str, Any], content: str) -> Dict[str, Any]:
+    return {
+        "id": "mock",
+        "object": "chat.completion",
+        "model": str(body.get("model") or ""),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": _usage(body, content),
+    }
+
+
+class MockServer:
+    def __init__(self, *, host: str = "127.0.0.1", port: int = 0, config: Optional[MockConfig] = None) -> None:
+        self.config = config or MockConfig()
+        self.requests: List[Dict[str, Any]] = []  # (path, duration_s, started, ended) per request
+        self._lock = threading.Lock()
+        self._active = 0
+        self.peak_concurrency = 0
+        self.cancelled = 0  # streams closed by the client before the end
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        h, p = self.httpd.server_address[:2]
+        self.base_url = f"http://{h}:{p}/v1"
+
+    def configure(self, **kwargs: Any) -> None:
+        for k, v in kwargs.items():
+            if not hasattr(self.config, k):
+                raise AttributeError(f"Unknown knob: {k}")
+            setattr(self.config, k, v)
+
+    def _enter(self) -> bool:
+        with self._lock:
+            if self.config.max_concurrent and self._active >= self.config.max_concurrent:
+                return False
+            self._active += 1
+            self.peak_concurrency = max(self.peak_concurrency, self._active)
+            return True
+
+    def _leave(self) -> None:
+        with self._lock:
+            self._active -= 1
+
+    def _make_handler(self) -> type:
+        srv = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt: str, *args: Any) -> None:  # quiet
+                return
+
+            def _send_json(self, status: int, obj: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+                body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream_chat(self, body: Dict[str, Any], content: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+
+                def event(obj: Any) -> None:
+                    data = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False)
+                    self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                base = {"id": "mock", "object": "chat.completion.chunk", "model": str(body.get("model") or "")}
+                try:
+                    for piece in re.findall(r"\S+\s*", content):
+                        time.sleep(srv.config.ms_per_token / 1000.0)
+                        event({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+                    event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        event({**base, "choices": [], "usage": _usage(body, content)})
+                    event("[DONE]")
+                except (BrokenPipeError, ConnectionResetError):
+                    # client cancelled the stream
+                    with srv._lock:
+                        srv.cancelled += 1
+
+            def do_POST(self) -> None:  # noqa: N802
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                path = self.path.split("?", 1)[0]
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    self._send_json(401, {"error": {"message": "Missing API key"}})
+                    return
+                if not srv._enter():
+                    self._send_json(
+                        429,
+                        {"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                        {"Retry-After": str(srv.config.retry_after_s)},
+                    )
+                    return
+                started = time.time()
+                try:
+                    if path.endswith("/audio/transcriptions"):
+                        form = _multipart(self.headers.get("Content-Type", ""), raw)
+                        text, duration = hear(form.get("file") or b"")
+                        time.sleep((srv.config.latency_ms + srv.config.ms_per_audio_s * duration) / 1000.0)
+                        reply: Dict[str, Any] = {"text": text}
+                    elif path.endswith("/chat/completions"):
+                        duration = 0.0
+                        try:
+                            body = json.loads(raw.decode("utf-8")) if raw else {}
+                        except ValueError:
+                            self._send_json(400, {"error": {"message": "Invalid JSON"}})
+                            return
+                        body = body if isinstance(body, dict) else {}
+                        if srv.config.reject_response_format and body.get("response_format"):
+                            self._send_json(
+                                400,
+                                {
+                                    "error": {
+                                        "message": "Invalid parameter: 'response_format' of type 'json_schema' "
+                                        "is not supported with this model.",
+                                        "type": "invalid_request_error",
+                                        "param": "response_format",
+                                    }
+                                },
+                            )
+                            return
+                        time.sleep(srv.config.latency_ms / 1000.0)
+                        content = _chat_text(body)
+                        if body.get("stream"):
+                            self._stream_chat(body, content)
+                            return
+                        time.sleep(srv.config.ms_per_token * len(content.split()) / 1000.0)
+                        reply = _chat_reply(body, content)
+                    else:
+                        self._send_json(404, {"error": {"message": "Not found"}})
+                        return
+                finally:
+                    srv._leave()
+                with srv._lock:
+                    srv.requests.append({"path": path, "duration_s": duration, "started": started, "ended": time.time()})
+                self._send_json(200, reply)
+
+        return Handler
+
+    def start(self) -> "MockServer":
+        threading.Thread(target=self.httpd.serve_forever, name="openai-mock", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_mock(**kwargs: Any) -> MockServer:
+    """
+    Start a mock on a free port in a background thread.
+    Knobs (latency_ms, ms_per_audio_s, ms_per_token, max_concurrent, retry_after_s,
+    reject_response_format) may be passed directly.
+    """
+    keys = set(MockConfig.__dataclass_fields__)
+    config = MockConfig(**{k: kwargs.pop(k) for k in list(kwargs) if k in keys})
+    return MockServer(config=config, **kwargs).start()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Local OpenAI mock (transcriptions + chat completions)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--latency-ms", type=int, default=0)
+    ap.add_argument("--ms-per-audio-s", type=int, default=0)
+    ap.add_argument("--ms-per-token", type=int, default=0)
+    ap.add_argument("--max-concurrent", type=int, default=0)
+    ap.add_argument("--reject-response-format", action="store_true", help="400 on response_format (text-only model)")
+    ap.add_argument("--write-sample", default="", help="write a synthetic recording (WAV) here and exit")
+    ap.add_argument("--sample-words", type=int, default=1200)
+    a = ap.parse_args(argv)
+
+    if a.write_sample:
+        with open(a.write_sample, "wb") as f:
+            f.write(synth_speech(a.sample_words))
+        print(f"Wrote {a.sample_words} words to {a.write_sample}")
+        return
+
+    config = MockConfig(
+        latency_ms=a.latency_ms,
+        ms_per_audio_s=a.ms_per_audio_s,
+        ms_per_token=a.ms_per_token,
+        max_concurrent=a.max_concurrent,
+        reject_response_format=a.reject_response_format,
+    )
+    srv = MockServer(host=a.host, port=a.port, config=config)
+    print(f"OpenAI mock listening on {srv.base_url} (config={asdict(config)})")
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
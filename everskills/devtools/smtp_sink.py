@@ -0,0 +1,387 @@
+# everskills/devtools/smtp_sink.py
+"""
+Local SMTP sink (tests + benchmarks, offline): accepts mail, keeps it in memory.
+
+Speaks enough ESMTP for smtplib / mailer.SMTPPool: EHLO/HELO, STARTTLS (self-signed
+certificate generated with the openssl CLI, or --cert/--key), AUTH PLAIN/LOGIN,
+MAIL/RCPT/DATA, RSET, NOOP, QUIT. Latency and failure injection per command.
+
+Run:
+    python -m everskills.devtools.smtp_sink --port 2525 --user dev --password dev \
+        --latency-ms 40 --fail-rate 0.05 --disconnect-rate 0.01
+
+Then point .streamlit/secrets.toml at it:
+    SMTP_HOST = "127.0.0.1"
+    SMTP_PORT = 2525
+    SMTP_USER = "dev"
+    SMTP_PASSWORD = "dev"
+    SMTP_STARTTLS = true
+    SMTP_CA_FILE = "<printed cert path>"
+
+In-process (tests / benchmarks):
+    sink = start_sink(latency_ms=20)
+    ... sink.port, sink.ca_file, sink.messages ...
+    sink.configure(fail_rate=0.2)
+    sink.stop()
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import random
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from email import message_from_bytes
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class SinkFaults:
+    latency_ms: int = 0  # added before every reply (so a handshake costs ~5x)
+    jitter_ms: int = 0
+    fail_rate: float = 0.0  # share of DATA answered 451 (temporary failure)
+    disconnect_rate: float = 0.0  # share of DATA where the server drops the connection
+    reject_pattern: str = ""  # RCPT containing this is refused with 550
+
+
+@dataclass
+class SinkMessage:
+    ts: float
+    mail_from: str
+    rcpt_to: List[str]
+    subject: str
+    data: bytes
+
+
+@dataclass
+class SinkStats:
+    connections: int = 0
+    tls: int = 0
+    auth_ok: int = 0
+    auth_failed: int = 0
+    accepted: int = 0
+    failed: int = 0
+    disconnected: int = 0
+    rejected_rcpt: int = 0
+    commands: Dict[str, int] = field(default_factory=dict)
+
+
+def make_self_signed_cert(directory: Path, host: str = "127.0.0.1") -> Tuple[str, str]:
+    """
+    (cert_path, key_path) for host, via the openssl CLI. Raises if openssl is missing.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    cert, key = directory / "smtp_sink.crt", directory / "smtp_sink.key"
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", str(key), "-out", str(cert), "-days", "7",
+            "-subj", f"/CN={host}",
+            "-addext", f"subjectAltName=IP:{host},DNS:localhost",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return str(cert), str(key)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_SinkTCPServer"
+
+    def _reply(self, line: str) -> None:
+        self.server.sink._delay()
+        self.wfile.write((line + "\r\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def _readline(self) -> Optional[str]:
+        raw = self.rfile.readline(65536)
+        if not raw:
+            return None
+        return raw.decode("utf-8", errors="replace").rstrip("\r\n")
+
+    def _ehlo_lines(self) -> List[str]:
+        caps = ["sink.local", "PIPELINING", "8BITMIME", "SIZE 26214400"]
+        if self.server.sink.ssl_context is not None and not self.tls:
+            caps.append("STARTTLS")
+        if self.server.sink.user:
+            caps.append("AUTH PLAIN LOGIN")
+        return [f"250-{c}" for c in caps[:-1]] + [f"250 {caps[-1]}"]
+
+    def _check_auth(self, user: str, password: str) -> bool:
+        sink = self.server.sink
+        ok = user == sink.user and password == sink.password
+        sink._count("auth_ok" if ok else "auth_failed")
+        return ok
+
+    def handle(self) -> None:
+        sink = self.server.sink
+        sink._count("connections")
+        self.tls = False
+        authed = not sink.user
+        mail_from = ""
+        rcpts: List[str] = []
+
+        self._reply("220 sink.local ESMTP everskills-sink")
+        while True:
+            line = self._readline()
+            if line is None:
+                return
+            verb, _, arg = line.partition(" ")
+            verb = verb.upper()
+            sink._count_cmd(verb)
+
+            if verb in ("EHLO", "HELO"):
+                for out in self._ehlo_lines() if verb == "EHLO" else ["250 sink.local"]:
+                    self._reply(out)
+            elif verb == "STARTTLS":
+                if sink.ssl_context is None or self.tls:
+                    self._reply("454 TLS not available")
+                    continue
+                self._reply("220 Ready to start TLS")
+                conn = sink.ssl_context.wrap_socket(self.connection, server_side=True)
+                self.connection = self.request = conn
+                self.rfile = conn.makefile("rb")
+                self.wfile = conn.makefile("wb")
+                self.tls = True
+                sink._count("tls")
+                authed, mail_from, rcpts = not sink.user, "", []
+            elif verb == "AUTH":
+                mech, _, initial = arg.partition(" ")
+                mech = mech.upper()
+                if mech == "PLAIN":
+                    if not initial:
+                        self._reply("334 ")
+                        initial = self._readline() or ""
+                    try:
+                        _, user, password = base64.b64decode(initial).decode("utf-8").split("\0", 2)
+                    except Exception:
+                        self._reply("501 Malformed AUTH PLAIN")
+                        continue
+                elif mech == "LOGIN":
+                    try:
+                        if initial:
+                            user = base64.b64decode(initial).decode("utf-8")
+                        else:
+                            self._reply("334 VXNlcm5hbWU6")
+                            user = base64.b64decode(self._readline() or "").decode("utf-8")
+                        self._reply("334 UGFzc3dvcmQ6")
+                        password = base64.b64decode(self._readline() or "").decode("utf-8")
+                    except Exception:
+                        self._reply("501 Malformed AUTH LOGIN")
+                        continue
+                else:
+                    self._reply("504 Unrecognized authentication type")
+                    continue
+                authed = self._check_auth(user, password)
+                self._reply("235 Authentication successful" if authed else "535 Authentication failed")
+            elif verb == "MAIL":
+                if not authed:
+                    self._reply("530 Authentication required")
+                    continue
+                mail_from, rcpts = arg.partition(":")[2].strip(" <>").split(">")[0], []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                rcpt = arg.partition(":")[2].strip(" <>").split(">")[0]
+                if sink.faults.reject_pattern and sink.faults.reject_pattern in rcpt:
+                    sink._count("rejected_rcpt")
+                    self._reply("550 Mailbox unavailable")
+                    continue
+                rcpts.append(rcpt)
+                self._reply("250 OK")
+            elif verb == "DATA":
+                if not rcpts:
+                    self._reply("503 Need RCPT first")
+                    continue
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                chunks: List[bytes] = []
+                while True:
+                    raw = self.rfile.readline(1 << 20)
+                    if not raw:
+                        return
+                    if raw in (b".\r\n", b".\n"):
+                        break
+                    chunks.append(raw[1:] if raw.startswith(b"..") else raw)
+                verdict = sink._data_verdict()
+                if verdict == "disconnect":
+                    return
+                if verdict == "fail":
+                    self._reply("451 Injected temporary failure")
+                else:
+                    sink._store(mail_from, rcpts, b"".join(chunks))
+                    self._reply("250 OK queued")
+                mail_from, rcpts = "", []
+            elif verb == "RSET":
+                mail_from, rcpts = "", []
+                self._reply("250 OK")
+            elif verb == "NOOP":
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _SinkTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    sink: "SMTPSink"
+
+
+class SMTPSink:
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        user: str = "dev",
+        password: str = "dev",
+        tls: bool = True,
+        cert_file: str = "",
+        key_file: str = "",
+        faults: Optional[SinkFaults] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.user = user
+        self.password = password
+        self.faults = faults or SinkFaults()
+        self.stats = SinkStats()
+        self.messages: List[SinkMessage] = []
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+        self.ca_file = ""
+        self.ssl_context: Optional[ssl.SSLContext] = None
+        if tls:
+            if not cert_file:
+                self._tmp = tempfile.TemporaryDirectory(prefix="smtp_sink_")
+                cert_file, key_file = make_self_signed_cert(Path(self._tmp.name), host)
+            self.ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            self.ssl_context.load_cert_chain(cert_file, key_file)
+            self.ca_file = cert_file  # self-signed: the cert is its own CA
+
+        self.server = _SinkTCPServer((host, port), _Handler)
+        self.server.sink = self
+        self.host, self.port = self.server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    # --- fault injection / bookkeeping (called from handler threads)
+    def _delay(self) -> None:
+        f = self.faults
+        if f.latency_ms or f.jitter_ms:
+            with self._lock:
+                extra = self._rng.uniform(0, f.jitter_ms) if f.jitter_ms else 0
+            time.sleep((f.latency_ms + extra) / 1000.0)
+
+    def _data_verdict(self) -> str:
+        with self._lock:
+            r = self._rng.random()
+        if r < self.faults.disconnect_rate:
+            self._count("disconnected")
+            return "disconnect"
+        if r < self.faults.disconnect_rate + self.faults.fail_rate:
+            self._count("failed")
+            return "fail"
+        return "ok"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self.stats, name, getattr(self.stats, name) + 1)
+
+    def _count_cmd(self, verb: str) -> None:
+        with self._lock:
+            self.stats.commands[verb] = self.stats.commands.get(verb, 0) + 1
+
+    def _store(self, mail_from: str, rcpts: List[str], data: bytes) -> None:
+        subject = str(message_from_bytes(data).get("Subject") or "")
+        with self._lock:
+            self.messages.append(SinkMessage(time.time(), mail_from, list(rcpts), subject, data))
+            self.stats.accepted += 1
+
+    # --- control
+    def configure(self, **kwargs: Any) -> None:
+        for k, v in kwargs.items():
+            if not hasattr(self.faults, k):
+                raise AttributeError(f"Unknown fault knob: {k}")
+            setattr(self.faults, k, v)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.messages.clear()
+            self.stats = SinkStats()
+
+    def start(self) -> "SMTPSink":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_sink(**kwargs: Any) -> SMTPSink:
+    """
+    Start a sink on a free port in a background thread.
+    Fault knobs (latency_ms, jitter_ms, fail_rate, disconnect_rate, reject_pattern) may be passed directly.
+    """
+    fault_keys = set(SinkFaults.__dataclass_fields__)
+    faults = SinkFaults(**{k: kwargs.pop(k) for k in list(kwargs) if k in fault_keys})
+    return SMTPSink(faults=faults, **kwargs).start()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="Local SMTP sink (STARTTLS/AUTH, fault injection)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=2525)
+    ap.add_argument("--user", default="dev")
+    ap.add_argument("--password", default="dev")
+    ap.add_argument("--no-tls", action="store_true")
+    ap.add_argument("--cert", default="")
+    ap.add_argument("--key", default="")
+    ap.add_argument("--latency-ms", type=int, default=0)
+    ap.add_argument("--jitter-ms", type=int, default=0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--disconnect-rate", type=float, default=0.0)
+    ap.add_argument("--reject-pattern", default="")
+    ap.add_argument("--seed", type=int, default=None)
+    a = ap.parse_args(argv)
+
+    faults = SinkFaults(
+        latency_ms=a.latency_ms,
+        jitter_ms=a.jitter_ms,
+        fail_rate=a.fail_rate,
+        disconnect_rate=a.disconnect_rate,
+        reject_pattern=a.reject_pattern,
+    )
+    sink = SMTPSink(
+        host=a.host,
+        port=a.port,
+        user=a.user,
+        password=a.password,
+        tls=not a.no_tls,
+        cert_file=a.cert,
+        key_file=a.key,
+        faults=faults,
+        seed=a.seed,
+    )
+    print(f"SMTP sink listening on {sink.host}:{sink.port} (user={a.user!r}, faults={asdict(faults)})")
+    if sink.ca_file:
+        print(f"STARTTLS certificate (set SMTP_CA_FILE to it): {sink.ca_file}")
+    try:
+        sink.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.server.server_close()
+        print(f"stats: {asdict(sink.stats)}")
+
+
+if __name__ == "__main__":
+    main()
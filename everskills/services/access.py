@@ -140,10 +140,12 @@ def _find_user_in_gsheet(email: str) -> Optional[Dict[str, Any]]:
         from everskills.services.gsheet_access import get_gsheet_api  # local import to avoid cycles
 
         api = get_gsheet_api()
-        res = api.list_users()
-        if not res.ok:
+        # login must not hang on a slow WebApp, but only fresh rows may authenticate:
+        # a stale snapshot could carry a revoked status (and has no password field)
+        res = api.list_users_swr(budget_s=3.0)
+        if not res.available or res.stale:
             return None
-        rows = res.data.get("rows", [])
+        rows = (res.data or {}).get("rows", [])
         em = _norm_email(email)
         for r in rows:
             if _norm_email(str(r.get("email") or "")) == em:
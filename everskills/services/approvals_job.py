@@ -0,0 +1,307 @@
+# everskills/services/approvals_job.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from everskills.services.passwords import generate_temp_password, hash_password_pbkdf2
+
+# Approvals as a resumable background job (pages/90_admin_approvals.py):
+# hash passwords in a bounded pool, write the sheet in batches, send mails over one
+# pooled SMTP session, and persist the state of every row after each stage.
+#
+# Temp passwords only ever live in memory: a row interrupted before its email is
+# restarted with a new password (the sheet hash is overwritten), never resent from disk.
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+JOBS_DIR = DATA_DIR / "approval_jobs"
+
+# Row states
+ROW_PENDING = "pending"
+ROW_SHEET_UPDATED = "sheet_updated"  # hash written, email not confirmed yet
+ROW_DONE = "done"
+ROW_ERROR = "error"
+
+# Job states
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+
+CHUNK_SIZE = 10
+HASH_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+_LOCK = threading.RLock()
+_THREADS: Dict[str, threading.Thread] = {}
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ----------------------------
+# Persistence
+# ----------------------------
+def _job_path(job_id: str) -> Path:
+    return JOBS_DIR / f"{job_id}.json"
+
+
+def load_job(job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        p = _job_path(job_id)
+        if not p.exists():
+            return None
+        data = json.loads(p.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else None
+    except Exception:
+        return None
+
+
+def _save_job(job: Dict[str, Any]) -> None:
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    job["updated_at"] = now_iso()
+    p = _job_path(job["id"])
+    tmp = p.with_suffix(".tmp")
+    tmp.write_text(json.dumps(job, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(p)
+
+
+def _set_rows(job_id: str, updates: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Apply per-row field updates (key = row key) and persist.
+    """
+    with _LOCK:
+        job = load_job(job_id) or {}
+        for row in job.get("rows", []):
+            upd = updates.get(row["key"])
+            if upd:
+                row.update(upd)
+                row["updated_at"] = now_iso()
+        _save_job(job)
+        return job
+
+
+def list_jobs() -> List[Dict[str, Any]]:
+    """
+    All job records, newest first.
+    """
+    if not JOBS_DIR.exists():
+        return []
+    jobs = [load_job(p.stem) for p in JOBS_DIR.glob("*.json")]
+    return sorted([j for j in jobs if j], key=lambda j: str(j.get("created_at") or ""), reverse=True)
+
+
+def latest_unfinished_job() -> Optional[Dict[str, Any]]:
+    for job in list_jobs():
+        if job.get("state") != JOB_DONE:
+            return job
+    return None
+
+
+def progress(job: Dict[str, Any]) -> Dict[str, int]:
+    counts = {ROW_PENDING: 0, ROW_SHEET_UPDATED: 0, ROW_DONE: 0, ROW_ERROR: 0}
+    for row in job.get("rows", []):
+        counts[row.get("state") or ROW_PENDING] = counts.get(row.get("state") or ROW_PENDING, 0) + 1
+    counts["total"] = len(job.get("rows", []))
+    return counts
+
+
+def is_running(job_id: str) -> bool:
+    t = _THREADS.get(job_id)
+    return t is not None and t.is_alive()
+
+
+# ----------------------------
+# Job creation
+# ----------------------------
+def _row_key(r: Dict[str, Any]) -> str:
+    rid = str(r.get("request_id") or "").strip()
+    return rid or str(r.get("email") or "").strip().lower()
+
+
+def _valid_email(email: str) -> bool:
+    return bool(email) and "@" in email
+
+
+def create_job(rows: List[Dict[str, Any]], *, env: str, created_by: str = "") -> Dict[str, Any]:
+    """
+    Persist a job for the approved rows (status=approved AND password_sent!=yes).
+    Rows without a usable email are recorded as errors and never activated.
+    """
+    job_rows = []
+    seen = set()
+    for r in rows:
+        key = _row_key(r)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        email = str(r.get("email") or "").strip().lower()
+        valid = _valid_email(email)
+        job_rows.append(
+            {
+                "key": key,
+                "request_id": str(r.get("request_id") or "").strip(),
+                "email": email,
+                "first_name": str(r.get("first_name") or "").strip(),
+                "last_name": str(r.get("last_name") or "").strip(),
+                "state": ROW_PENDING if valid else ROW_ERROR,
+                "error": "" if valid else "Invalid email in row",
+                "updated_at": now_iso(),
+            }
+        )
+
+    job = {
+        "id": f"appr_{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}",
+        "created_at": now_iso(),
+        "created_by": created_by,
+        "env": env,
+        "state": JOB_RUNNING,
+        "rows": job_rows,
+    }
+    with _LOCK:
+        _save_job(job)
+    return job
+
+
+# ----------------------------
+# Processing
+# ----------------------------
+def _hash_one(row: Dict[str, Any]) -> Tuple[str, str, str]:
+    temp_pwd = generate_temp_password()
+    return row["key"], temp_pwd, hash_password_pbkdf2(temp_pwd)
+
+
+def _mail_for(row: Dict[str, Any], temp_pwd: str, env: str) -> Dict[str, Any]:
+    first_name, last_name, email = row["first_name"], row["last_name"], row["email"]
+    return {
+        "to_email": email,
+        "subject": f"[EVERSKILLS] Accès validé ({env})",
+        "text_body": (
+            f"Bonjour {first_name} {last_name},\n\n"
+            "Ton accès à EVERSKILLS est validé.\n\n"
+            f"Identifiant : {email}\n"
+            f"Mot de passe temporaire : {temp_pwd}\n\n"
+            "À la première connexion, tu pourras changer ton mot de passe.\n\n"
+            "— EVERSKILLS\n"
+        ),
+        "meta": {"flow": "CR06", "request_id": row["request_id"], "env": env, "job": "approvals"},
+    }
+
+
+def _process_chunk(job_id: str, env: str, chunk: List[Dict[str, Any]], pool: ThreadPoolExecutor) -> None:
+    from everskills.services.gsheet_access import get_gsheet_api  # local import (reads secrets)
+    from everskills.services.mailer import send_many
+
+    # 0) never activate a row nobody can log in with (retry_errors brings them back here)
+    invalid = [row for row in chunk if not _valid_email(row["email"])]
+    if invalid:
+        _set_rows(job_id, {row["key"]: {"state": ROW_ERROR, "error": "Invalid email in row"} for row in invalid})
+        chunk = [row for row in chunk if _valid_email(row["email"])]
+        if not chunk:
+            return
+
+    # 1) temp passwords + PBKDF2 (hashlib releases the GIL: real parallelism)
+    hashed = list(pool.map(_hash_one, chunk))
+    pwd_by_key = {k: pwd for k, pwd, _ in hashed}
+
+    # 2) one sheet call for the whole chunk
+    api = get_gsheet_api()
+    results = api.update_users(
+        [
+            {
+                "request_id": row["request_id"],
+                "email": row["email"],
+                "updates": {
+                    "initial_password": h,
+                    "password_sent": "yes",
+                    "sent_at": now_iso(),
+                    "status": "active",
+                },
+            }
+            for row, (_, _, h) in zip(chunk, hashed)
+        ]
+    )
+    updated: List[Dict[str, Any]] = []
+    row_updates: Dict[str, Dict[str, Any]] = {}
+    for row, res in zip(chunk, results):
+        if res.ok:
+            updated.append(row)
+            row_updates[row["key"]] = {"state": ROW_SHEET_UPDATED, "error": ""}
+        else:
+            row_updates[row["key"]] = {"state": ROW_ERROR, "error": f"Sheet update failed: {res.error}"}
+    _set_rows(job_id, row_updates)
+
+    # 3) emails over one pooled SMTP session (never through the durable queue: they carry passwords)
+    if not updated:
+        return
+    mails = send_many([_mail_for(row, pwd_by_key[row["key"]], env) for row in updated])
+    row_updates = {}
+    for row, res in zip(updated, mails):
+        if res.get("ok"):
+            row_updates[row["key"]] = {"state": ROW_DONE, "error": "", "mail_mode": str(res.get("mode") or "")}
+        else:
+            row_updates[row["key"]] = {"state": ROW_ERROR, "error": f"Email send failed: {res.get('details')}"}
+    _set_rows(job_id, row_updates)
+
+
+def run_job(job_id: str, *, retry_errors: bool = False) -> Dict[str, Any]:
+    """
+    Process every unfinished row (blocking). Rows already DONE are never touched again;
+    rows left in SHEET_UPDATED by an interrupted run get a new password and email.
+    """
+    job = load_job(job_id)
+    if not job:
+        raise ValueError(f"Unknown approvals job: {job_id}")
+
+    todo_states = {ROW_PENDING, ROW_SHEET_UPDATED} | ({ROW_ERROR} if retry_errors else set())
+    todo = [r for r in job.get("rows", []) if r.get("state") in todo_states]
+    env = str(job.get("env") or "PROD")
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="approvals-hash") as pool:
+        for i in range(0, len(todo), CHUNK_SIZE):
+            chunk = todo[i : i + CHUNK_SIZE]
+            try:
+                _process_chunk(job_id, env, chunk, pool)
+            except Exception as e:
+                _set_rows(job_id, {r["key"]: {"state": ROW_ERROR, "error": str(e)} for r in chunk})
+
+    with _LOCK:
+        job = load_job(job_id) or job
+        job["state"] = JOB_DONE
+        job["finished_at"] = now_iso()
+        _save_job(job)
+    return job
+
+
+def start_job(job_id: str, *, retry_errors: bool = False) -> bool:
+    """
+    Run (or resume) a job in a background thread. False if it is already running here.
+    """
+    with _LOCK:
+        if is_running(job_id):
+            return False
+        job = load_job(job_id)
+        if job and job.get("state") == JOB_DONE and retry_errors:
+            job["state"] = JOB_RUNNING
+            _save_job(job)
+
+        def _run() -> None:
+            try:
+                run_job(job_id, retry_errors=retry_errors)
+            except Exception:
+                pass
+
+        t = threading.Thread(target=_run, name=f"approvals-{job_id}", daemon=True)
+        _THREADS[job_id] = t
+        t.start()
+        return True
@@ -0,0 +1,401 @@
+# everskills/services/audio_cache.py
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+import requests
+
+from everskills.services.settings import get_settings
+
+# Voice-note audio on local disk: streamed from Drive once, kept under a byte budget
+# (LRU by mtime), then played from the file. With AUDIO_SERVER_PORT and AUDIO_PUBLIC_URL
+# set, a small HTTP server answers Range requests so the browser streams/seeks instead
+# of getting the whole file on every rerun. Its URLs carry a signed expiry
+# (?exp=&sig=, HMAC of key + exp): a cache key alone does not give access.
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+CACHE_DIR = DATA_DIR / "audio_cache"
+
+MAX_FILE_BYTES = 64 * 1024 * 1024  # larger downloads are abandoned
+DOWNLOAD_CHUNK = 64 * 1024
+_AUDIO_TYPES = ("audio/", "video/", "application/octet-stream", "application/ogg", "binary/")
+FAILED_TTL_S = 300.0  # an unplayable URL (Drive HTML page) is not retried on every rerun
+URL_TTL_S = 3600  # signed playback URLs stay the same for a whole window (browser cache)
+
+
+@dataclass(frozen=True)
+class CachedAudio:
+    key: str
+    path: Path
+    mime: str
+    size: int
+
+
+def audio_key(url: str) -> str:
+    return hashlib.sha256(url.strip().encode("utf-8")).hexdigest()[:40]
+
+
+class AudioCache:
+    """
+    <key>.bin holds the bytes, <key>.json the metadata (url, mime, size).
+    Concurrent fetches of the same URL download it once.
+    """
+
+    def __init__(self, directory: Path, *, max_bytes: int) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._failed: Dict[str, float] = {}
+        self._index: Optional[Dict[str, Tuple[float, int]]] = None  # key -> (atime, size)
+        self.hits = 0
+        self.misses = 0
+
+    def _data_path(self, key: str) -> Path:
+        return self.directory / f"{key}.bin"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load_index(self) -> Dict[str, Tuple[float, int]]:
+        if self._index is None:
+            index: Dict[str, Tuple[float, int]] = {}
+            if self.directory.exists():
+                for p in self.directory.glob("*.bin"):
+                    try:
+                        st = p.stat()
+                        index[p.stem] = (st.st_mtime, st.st_size)
+                    except OSError:
+                        continue
+            self._index = index
+        return self._index
+
+    def get(self, key: str) -> Optional[CachedAudio]:
+        data = self._data_path(key)
+        try:
+            meta = json.loads(self._meta_path(key).read_text(encoding="utf-8"))
+            size = data.stat().st_size
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        try:
+            os.utime(data, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            self._load_index()[key] = (now, size)
+        return CachedAudio(key=key, path=data, mime=str(meta.get("mime") or ""), size=size)
+
+    def fetch(self, url: str, *, timeout_s: int = 25) -> Optional[CachedAudio]:
+        """
+        Cached file for url, downloading it (streamed to disk) on a miss.
+        None when the URL does not serve audio.
+        """
+        u = (url or "").strip()
+        if not u:
+            return None
+        key = audio_key(u)
+        with self._lock:
+            url_lock = self._url_locks.setdefault(key, threading.Lock())
+        with url_lock:
+            item = self.get(key)
+            if item:
+                with self._lock:
+                    self.hits += 1
+                return item
+            with self._lock:
+                self.misses += 1
+                if time.time() - self._failed.get(key, 0.0) < FAILED_TTL_S:
+                    return None
+            item = self._download(u, key, timeout_s=timeout_s)
+            if item is None:
+                with self._lock:
+                    now = time.time()
+                    self._failed = {k: t for k, t in self._failed.items() if now - t < FAILED_TTL_S}
+                    self._failed[key] = now
+            return item
+
+    def _download(self, url: str, key: str, *, timeout_s: int) -> Optional[CachedAudio]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.directory / f"{key}.{os.getpid()}.{threading.get_ident()}.part"
+        size = 0
+        try:
+            with requests.get(url, allow_redirects=True, timeout=timeout_s, stream=True) as r:
+                if r.status_code != 200:
+                    return None
+                ct = (r.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+                # Drive renvoie parfois du HTML (page de confirmation) => KO
+                if ct and not ct.startswith(_AUDIO_TYPES):
+                    return None
+                with tmp.open("wb") as f:
+                    for block in r.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                        if not block:
+                            continue
+                        if size == 0 and block[:15].lower().startswith(b"<!doctype html"):
+                            return None
+                        size += len(block)
+                        if size > MAX_FILE_BYTES:
+                            return None
+                        f.write(block)
+            if not size:
+                return None
+            tmp.replace(self._data_path(key))
+            meta_tmp = self._meta_path(key).with_suffix(".json.tmp")
+            meta_tmp.write_text(json.dumps({"url": url, "mime": ct, "size": size, "ts": time.time()}), encoding="utf-8")
+            meta_tmp.replace(self._meta_path(key))
+        except (OSError, requests.RequestException):
+            return None
+        finally:
+            tmp.unlink(missing_ok=True)
+
+        with self._lock:
+            index = self._load_index()
+            index[key] = (time.time(), size)
+            self._evict(index, keep=key)
+        return CachedAudio(key=key, path=self._data_path(key), mime=ct, size=size)
+
+    def _evict(self, index: Dict[str, Tuple[float, int]], *, keep: str) -> None:
+        total = sum(size for _, size in index.values())
+        for key, (_, size) in sorted(index.items(), key=lambda kv: kv[1][0]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            # a file being streamed stays readable (POSIX) until its handle closes
+            for p in (self._data_path(key), self._meta_path(key)):
+                try:
+                    p.unlink(missing_ok=True)
+                except OSError:
+                    pass
+            index.pop(key, None)
+            total -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            index = self._load_index()
+            return {
+                "entries": len(index),
+                "bytes": sum(size for _, size in index.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_CACHE: Optional[AudioCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_audio_cache() -> AudioCache:
+    """
+    Process-wide cache (re-created if CACHE_DIR is re-pointed or the budget changes).
+    """
+    global _CACHE
+    max_bytes = get_settings().audio_cache_max_mb * 1024 * 1024
+    with _CACHE_LOCK:
+        if _CACHE is None or _CACHE.directory != CACHE_DIR or _CACHE.max_bytes != max_bytes:
+            _CACHE = AudioCache(CACHE_DIR, max_bytes=max_bytes)
+        return _CACHE
+
+
+def fetch_audio(url: str) -> Optional[CachedAudio]:
+    return get_audio_cache().fetch(url)
+
+
+# ----------------------------
+# Range server
+# ----------------------------
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end inclusive) for a single "bytes=a-b" / "bytes=a-" / "bytes=-n" range.
+    None when absent or unsupported (-> full body); (-1, -1) when unsatisfiable.
+    """
+    m = _RANGE_RE.match((header or "").strip())
+    if not m:
+        return None
+    a, b = m.group(1), m.group(2)
+    if not a and not b:
+        return None
+    if not a:
+        n = int(b)
+        if n <= 0:
+            return (-1, -1)
+        return (max(0, size - n), size - 1)
+    start = int(a)
+    end = min(int(b), size - 1) if b else size - 1
+    if start >= size or end < start:
+        return (-1, -1)
+    return (start, end)
+
+
+_SECRET: Optional[bytes] = None
+_SECRET_FOR: Optional[Path] = None
+
+
+def _url_secret() -> bytes:
+    """
+    Signing key shared by every process serving the same cache dir (created once, 0600).
+    """
+    global _SECRET, _SECRET_FOR
+    path = CACHE_DIR / ".url_secret"
+    with _CACHE_LOCK:
+        if _SECRET is not None and _SECRET_FOR == path:
+            return _SECRET
+        try:
+            secret = path.read_bytes().strip()
+        except OSError:
+            secret = b""
+        if not secret:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            fd = os.open(str(tmp), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(secrets.token_hex(32).encode("ascii"))
+            try:
+                os.link(tmp, path)  # first writer wins, the others read its secret
+            except FileExistsError:
+                pass
+            finally:
+                tmp.unlink(missing_ok=True)
+            secret = path.read_bytes().strip()
+        _SECRET, _SECRET_FOR = secret, path
+        return secret
+
+
+def _sign(key: str, exp: int) -> str:
+    return hmac.new(_url_secret(), f"{key}:{exp}".encode("ascii"), hashlib.sha256).hexdigest()
+
+
+def signed_path(key: str, *, now: Optional[float] = None) -> str:
+    """
+    /audio/<key>?exp=&sig= valid for at least URL_TTL_S (exp rounded up to a window, so
+    reruns produce the same URL).
+    """
+    now = time.time() if now is None else now
+    exp = (int(now) // URL_TTL_S + 2) * URL_TTL_S
+    return f"/audio/{key}?exp={exp}&sig={_sign(key, exp)}"
+
+
+def verify_signature(key: str, exp: str, sig: str, *, now: Optional[float] = None) -> bool:
+    try:
+        exp_i = int(exp)
+    except (TypeError, ValueError):
+        return False
+    if exp_i < (time.time() if now is None else now):
+        return False
+    return hmac.compare_digest(_sign(key, exp_i), str(sig or ""))
+
+
+def _make_handler(cache_getter: Any) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt: str, *args: Any) -> None:  # quiet
+            return
+
+        def _serve(self, head: bool) -> None:
+            path, _, query = self.path.partition("?")
+            key = path[len("/audio/") :] if path.startswith("/audio/") else ""
+            if not re.fullmatch(r"[0-9a-f]{40}", key or ""):
+                self.send_error(404)
+                return
+            q = parse_qs(query)
+            if not verify_signature(key, (q.get("exp") or [""])[0], (q.get("sig") or [""])[0]):
+                self.send_error(403)
+                return
+            item = cache_getter().get(key)
+            if not item:
+                self.send_error(404)
+                return
+            rng = parse_range(self.headers.get("Range", ""), item.size)
+            if rng == (-1, -1):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{item.size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            start, end = rng or (0, item.size - 1)
+            self.send_response(206 if rng else 200)
+            self.send_header("Content-Type", item.mime or "application/octet-stream")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            if rng:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{item.size}")
+            self.send_header("Cache-Control", "private, max-age=3600")
+            self.end_headers()
+            if head:
+                return
+            try:
+                with item.path.open("rb") as f:
+                    f.seek(start)
+                    left = end - start + 1
+                    while left > 0:
+                        block = f.read(min(DOWNLOAD_CHUNK, left))
+                        if not block:
+                            break
+                        self.wfile.write(block)
+                        left -= len(block)
+            except (OSError, ConnectionError):
+                # evicted mid-stream or the player went away (seek): nothing to do
+                return
+
+        def do_GET(self) -> None:  # noqa: N802
+            self._serve(head=False)
+
+        def do_HEAD(self) -> None:  # noqa: N802
+            self._serve(head=True)
+
+    return Handler
+
+
+_SERVER: Optional[ThreadingHTTPServer] = None
+_SERVER_URL = ""
+
+
+def ensure_server() -> str:
+    """
+    Start the range server once per process (AUDIO_SERVER_PORT). It listens on all
+    interfaces only when AUDIO_PUBLIC_URL says how the browser reaches it, otherwise on
+    127.0.0.1. Returns AUDIO_PUBLIC_URL, or "" when there is no URL to hand out (the
+    caller plays the cached file instead).
+    """
+    global _SERVER, _SERVER_URL
+    s = get_settings()
+    if not s.audio_server_port:
+        return ""
+    host = "0.0.0.0" if s.audio_public_url else "127.0.0.1"
+    with _CACHE_LOCK:
+        if _SERVER is None:
+            try:
+                _SERVER = ThreadingHTTPServer((host, s.audio_server_port), _make_handler(get_audio_cache))
+            except OSError:
+                # another process (another Streamlit worker) already serves the same cache dir
+                _SERVER_URL = s.audio_public_url
+                return _SERVER_URL
+            _SERVER.daemon_threads = True
+            threading.Thread(target=_SERVER.serve_forever, name="audio-range-server", daemon=True).start()
+            _SERVER_URL = s.audio_public_url
+        return _SERVER_URL
+
+
+def playback_url(item: CachedAudio) -> str:
+    base = ensure_server()
+    return f"{base}{signed_path(item.key)}" if base else ""
@@ -0,0 +1,198 @@
+# everskills/services/audio_segments.py
+from __future__ import annotations
+
+import io
+import re
+import shutil
+import subprocess
+import wave
+from array import array
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+# Split long recordings into overlapping segments (cut in the quietest spot near each
+# window boundary) and stitch per-segment transcripts back without the overlap.
+# Pure stdlib: WAV is read directly; other containers (webm/ogg/m4a) are decoded with
+# the ffmpeg CLI when it is installed, otherwise the caller keeps the single request.
+
+DECODE_RATE = 16000  # ffmpeg output: 16 kHz mono s16le (what the transcription models use)
+FRAME_S = 0.05  # silence search resolution
+
+
+@dataclass(frozen=True)
+class Pcm:
+    samples: array  # signed 16-bit, mono
+    rate: int
+
+    @property
+    def duration_s(self) -> float:
+        return len(self.samples) / float(self.rate or 1)
+
+
+@dataclass(frozen=True)
+class Segment:
+    index: int
+    start: int  # sample offsets, overlap included
+    end: int
+
+    def seconds(self, rate: int) -> Tuple[float, float]:
+        return self.start / rate, self.end / rate
+
+
+# ----------------------------
+# Decode / encode
+# ----------------------------
+def _read_wav(audio_bytes: bytes) -> Optional[Pcm]:
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as w:
+            if w.getsampwidth() != 2 or w.getcomptype() != "NONE":
+                return None
+            channels, rate = w.getnchannels(), w.getframerate()
+            samples = array("h")
+            samples.frombytes(w.readframes(w.getnframes()))
+    except (wave.Error, EOFError):
+        return None
+    if channels > 1:
+        samples = samples[0::channels]  # first channel is enough to find pauses / transcribe
+    return Pcm(samples=samples, rate=rate)
+
+
+def _ffmpeg_decode(audio_bytes: bytes, timeout_s: int = 120) -> Optional[Pcm]:
+    exe = shutil.which("ffmpeg")
+    if not exe:
+        return None
+    try:
+        out = subprocess.run(
+            [exe, "-nostdin", "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(DECODE_RATE), "pipe:1"],
+            input=audio_bytes,
+            capture_output=True,
+            timeout=timeout_s,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    samples = array("h")
+    samples.frombytes(out[: len(out) - len(out) % 2])
+    return Pcm(samples=samples, rate=DECODE_RATE) if samples else None
+
+
+def decode_pcm(audio_bytes: bytes, mime_type: str = "") -> Optional[Pcm]:
+    """
+    Mono 16-bit PCM for the recording, or None when it cannot be decoded here.
+    """
+    if audio_bytes[:4] == b"RIFF" and audio_bytes[8:12] == b"WAVE":
+        return _read_wav(audio_bytes)
+    return _ffmpeg_decode(audio_bytes)
+
+
+def encode_wav(pcm: Pcm, start: int = 0, end: Optional[int] = None) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(pcm.rate)
+        w.writeframes(pcm.samples[start:end].tobytes())
+    return buf.getvalue()
+
+
+# ----------------------------
+# Segmenting
+# ----------------------------
+def _energy(samples: array, start: int, n: int) -> int:
+    chunk = samples[start : start + n]
+    return sum(x * x for x in chunk[::4])  # every 4th sample: plenty to rank frames
+
+
+def _quietest(pcm: Pcm, lo: int, hi: int) -> int:
+    """
+    Sample offset of the quietest FRAME_S frame in [lo, hi) (its middle).
+    """
+    n = max(1, int(pcm.rate * FRAME_S))
+    best, best_at = None, (lo + hi) // 2
+    for start in range(lo, max(lo + 1, hi - n + 1), n):
+        e = _energy(pcm.samples, start, n)
+        if best is None or e < best:
+            best, best_at = e, start + n // 2
+    return best_at
+
+
+def plan_segments(
+    pcm: Pcm,
+    *,
+    target_s: float = 60.0,
+    search_s: float = 6.0,
+    overlap_s: float = 1.5,
+) -> List[Segment]:
+    """
+    Cut roughly every target_s, moved to the quietest point within +/- search_s, then
+    widen each segment by overlap_s on both sides so no word is lost at a cut.
+    """
+    total = len(pcm.samples)
+    rate = pcm.rate
+    step, search, overlap = int(target_s * rate), int(search_s * rate), int(overlap_s * rate)
+    if total <= step + search:
+        return [Segment(index=0, start=0, end=total)]
+
+    cuts: List[int] = []
+    prev = 0
+    while total - prev > step + search:
+        aim = prev + step
+        cut = _quietest(pcm, max(prev + step // 2, aim - search), min(total, aim + search))
+        cuts.append(cut)
+        prev = cut
+
+    bounds = [0, *cuts, total]
+    return [
+        Segment(index=i, start=max(0, a - overlap), end=min(total, b + overlap))
+        for i, (a, b) in enumerate(zip(bounds, bounds[1:]))
+    ]
+
+
+# ----------------------------
+# Stitching
+# ----------------------------
+_NORM_RE = re.compile(r"[^\w']+", re.UNICODE)
+
+
+def _norm(word: str) -> str:
+    return _NORM_RE.sub("", word.lower())
+
+
+def _overlap_len(prev: Sequence[str], nxt: Sequence[str], max_words: int) -> int:
+    """
+    Longest k such that the last k words of prev are the first k of nxt (normalized).
+    From 4 words on, the two edge words may differ (they are cut by the overlap bounds:
+    "bonjo" / "bonjour") and one more mismatch is tolerated per 5 words.
+    """
+    a = [_norm(w) for w in prev[-max_words:]]
+    b = [_norm(w) for w in nxt[:max_words]]
+    for k in range(min(len(a), len(b)), 0, -1):
+        pairs = list(zip(a[-k:], b[:k]))
+        if k < 4:
+            if all(x == y for x, y in pairs):
+                return k
+            continue
+        if sum(1 for x, y in pairs[1:-1] if x != y) <= k // 5:
+            return k
+    return 0
+
+
+def stitch(texts: Sequence[str], *, max_overlap_words: int = 30) -> str:
+    """
+    Join per-segment transcripts in order, dropping the words repeated by the overlap.
+    On a match the overlap is taken from the next segment, except its first word (cut
+    by the segment start, so prev's copy is the complete one).
+    """
+    words: List[str] = []
+    for t in texts:
+        nxt = (t or "").split()
+        if not nxt:
+            continue
+        k = _overlap_len(words, nxt, max_overlap_words) if words else 0
+        if k >= 2:
+            # prev's last word was cut by the overlap end: keep nxt's copy
+            del words[-(k - 1) :]
+            words.extend(nxt[1:])
+        else:
+            words.extend(nxt[k:])
+    return " ".join(words)
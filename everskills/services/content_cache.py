@@ -0,0 +1,152 @@
+# everskills/services/content_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# Content-addressed, size-capped disk cache (one JSON file per key, LRU by mtime).
+# Used for results that are expensive and deterministic for a given input:
+# transcripts (audio sha256 + model + language), summaries (transcript hash +
+# prompt version), Drive uploads (file sha256).
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+CACHE_DIR = DATA_DIR / "content_cache"
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def sha256_hex(data: bytes | str) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(namespace: str, *parts: Any) -> str:
+    """
+    Stable key for (namespace, parts...). Parts are joined, then hashed.
+    """
+    raw = "\x1f".join([namespace, *(str(p) for p in parts)])
+    return f"{namespace}-{sha256_hex(raw)[:40]}"
+
+
+class ContentCache:
+    """
+    get / put JSON-able values. Hits refresh the entry's mtime; puts evict the least
+    recently used entries until the directory fits in max_bytes.
+    Safe across threads; across processes the worst case is a redundant recompute.
+    """
+
+    def __init__(self, directory: Path, *, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, Tuple[float, int]]] = None  # key -> (atime, size)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _load_index(self) -> Dict[str, Tuple[float, int]]:
+        if self._index is None:
+            index: Dict[str, Tuple[float, int]] = {}
+            if self.directory.exists():
+                for p in self.directory.glob("*.json"):
+                    try:
+                        st = p.stat()
+                        index[p.stem] = (st.st_mtime, st.st_size)
+                    except OSError:
+                        continue
+            self._index = index
+        return self._index
+
+    def get(self, key: str) -> Optional[Any]:
+        p = self._path(key)
+        try:
+            raw = p.read_bytes()
+            value = json.loads(raw.decode("utf-8"))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+                self._load_index().pop(key, None)
+            return None
+        now = time.time()
+        try:
+            os.utime(p, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            self._load_index()[key] = (now, len(raw))
+        return value
+
+    def peek(self, key: str) -> Optional[Any]:
+        """
+        Read without counting a hit / miss or refreshing the entry (read-modify-write).
+        """
+        try:
+            return json.loads(self._path(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        raw = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        if len(raw) > self.max_bytes:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        p = self._path(key)
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(raw)
+        tmp.replace(p)
+        with self._lock:
+            index = self._load_index()
+            index[key] = (time.time(), len(raw))
+            self._evict(index)
+
+    def _evict(self, index: Dict[str, Tuple[float, int]]) -> None:
+        total = sum(size for _, size in index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (_, size) in sorted(index.items(), key=lambda kv: kv[1][0]):
+            try:
+                self._path(key).unlink(missing_ok=True)
+            except OSError:
+                continue
+            index.pop(key, None)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            index = self._load_index()
+            return {
+                "entries": len(index),
+                "bytes": sum(size for _, size in index.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_CACHE: Optional[ContentCache] = None
+
+
+def get_cache() -> ContentCache:
+    """
+    Process-wide cache (re-created if CACHE_DIR is re-pointed, e.g. in benchmarks).
+    """
+    global _CACHE
+    if _CACHE is None or _CACHE.directory != CACHE_DIR:
+        _CACHE = ContentCache(CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES)
+    return _CACHE
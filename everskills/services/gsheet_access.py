@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import json
+import threading
+import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-import requests
-import streamlit as st
+from everskills.services.settings import get_settings
+from everskills.services.webhook_client import post_json
+from everskills.services.webhook_snapshots import SWRResult, invalidate_snapshots, swr_read
 
 
 @dataclass
@@ -15,22 +18,73 @@ class WebhookResult:
     error: str = ""
 
 
+# Users filter (list_users / count_users): {field: value} for equality or
+# {field: {"ne": value}}, compared trimmed and case-insensitive.
+UsersFilter = Dict[str, Any]
+
+COUNT_TTL_S = 60.0
+# Never written to data/webhook_snapshots: a stale copy must not be usable to log in.
+SNAPSHOT_SECRET_FIELDS = ("initial_password", "password_hash", "password")
+_COUNT_CACHE: Dict[str, Tuple[float, int]] = {}
+_COUNT_LOCK = threading.Lock()
+
+
+def user_matches(row: Dict[str, Any], flt: Optional[UsersFilter]) -> bool:
+    for k, cond in (flt or {}).items():
+        v = str(row.get(k) or "").strip().lower()
+        if isinstance(cond, dict):
+            if "ne" in cond and v == str(cond["ne"] or "").strip().lower():
+                return False
+            if "eq" in cond and v != str(cond["eq"] or "").strip().lower():
+                return False
+        elif v != str(cond or "").strip().lower():
+            return False
+    return True
+
+
+def _filter_key(flt: Optional[UsersFilter]) -> str:
+    return json.dumps(flt or {}, sort_keys=True, ensure_ascii=False)
+
+
+def _invalidate_counts() -> None:
+    with _COUNT_LOCK:
+        _COUNT_CACHE.clear()
+
+
+def _invalidate_users() -> None:
+    """
+    Any write to the users sheet: drop cached counts and list_users snapshots.
+    """
+    _invalidate_counts()
+    invalidate_snapshots("list_users")
+
+
+def _snapshot_rows(data: Any) -> Any:
+    if not isinstance(data, dict):
+        return data
+    rows = [
+        {k: v for k, v in r.items() if k not in SNAPSHOT_SECRET_FIELDS} if isinstance(r, dict) else r
+        for r in (data.get("rows") or [])
+    ]
+    return {**data, "rows": rows}
+
+
 class GSheetAccessAPI:
     def __init__(self) -> None:
-        self.url = st.secrets["GSHEET_USERS_WEBAPP_URL"]
-        self.secret = st.secrets["GSHEET_USERS_SHARED_SECRET"]
+        cfg = get_settings().users_webhook
+        if not cfg.url:
+            raise RuntimeError("Missing secret: GSHEET_USERS_WEBAPP_URL")
+        if not cfg.secret:
+            raise RuntimeError("Missing secret: GSHEET_USERS_SHARED_SECRET")
+        self.url = cfg.url
+        self.secret = cfg.secret
 
     def _post(self, payload: Dict[str, Any]) -> WebhookResult:
         payload = dict(payload)
         payload["secret"] = self.secret
 
         try:
-            r = requests.post(
-                self.url,
-                data=json.dumps(payload),
-                headers={"Content-Type": "application/json"},
-                timeout=25,
-            )
+            r = post_json(self.url, payload, timeout_s=25)
         except Exception as e:
             return WebhookResult(False, {"ok": False}, error=f"Webhook unreachable: {e}")
 
@@ -55,22 +109,100 @@ class GSheetAccessAPI:
         source: str = "streamlit",
         request_id: str = "",
     ) -> WebhookResult:
-        return self._post(
-            {
-                "action": "create_user",
-                "email": email.strip().lower(),
-                "role": role,
-                "status": status,
-                "first_name": first_name.strip(),
-                "last_name": last_name.strip(),
-                "initial_password": initial_password,  # should be empty at request time
-                "source": source,
-                "request_id": request_id,
-            }
-        )
-
-    def list_users(self) -> WebhookResult:
-        return self._post({"action": "list_users"})
+        try:
+            return self._post(
+                {
+                    "action": "create_user",
+                    "email": email.strip().lower(),
+                    "role": role,
+                    "status": status,
+                    "first_name": first_name.strip(),
+                    "last_name": last_name.strip(),
+                    "initial_password": initial_password,  # should be empty at request time
+                    "source": source,
+                    "request_id": request_id,
+                }
+            )
+        finally:
+            # after the write: a list_users refresh racing it must not keep the old rows
+            _invalidate_users()
+
+    def list_users(self, *, filter: Optional[UsersFilter] = None, cursor: str = "", limit: int = 0) -> WebhookResult:
+        """
+        Without arguments: every row (legacy). With filter / cursor / limit: one page,
+        data = {"rows": [...], "next_cursor": "" when done}. A WebApp that ignores
+        these params (no next_cursor in the answer) is filtered / paginated here.
+        """
+        if not filter and not cursor and not limit:
+            return self._post({"action": "list_users"})
+
+        payload: Dict[str, Any] = {"action": "list_users", "filter": filter or {}}
+        if cursor:
+            payload["cursor"] = cursor
+        if limit:
+            payload["limit"] = int(limit)
+        res = self._post(payload)
+        if not res.ok or "next_cursor" in res.data:
+            return res
+
+        # legacy WebApp: full list came back, the cursor is an offset in the filtered list
+        rows = [r for r in res.data.get("rows", []) if isinstance(r, dict) and user_matches(r, filter)]
+        start = int(cursor) if str(cursor).isdigit() else 0
+        end = start + int(limit) if limit else len(rows)
+        next_cursor = str(end) if end < len(rows) else ""
+        return WebhookResult(True, {**res.data, "rows": rows[start:end], "next_cursor": next_cursor, "client_side": True})
+
+    def list_users_swr(
+        self,
+        *,
+        filter: Optional[UsersFilter] = None,
+        cursor: str = "",
+        limit: int = 0,
+        budget_s: float = 4.0,
+    ) -> SWRResult:
+        """
+        list_users with a latency budget: falls back to the last-known-good rows
+        (SWRResult.stale=True) when the WebApp is slow or down. Snapshots are stored
+        without password fields, so stale rows never carry them.
+        """
+
+        def _fetch() -> Dict[str, Any]:
+            res = self.list_users(filter=filter, cursor=cursor, limit=limit)
+            if not res.ok:
+                raise RuntimeError(res.error)
+            return res.data
+
+        key = "list_users"
+        if filter or cursor or limit:
+            key += ":" + json.dumps([filter or {}, cursor, int(limit)], sort_keys=True, ensure_ascii=False)
+        return swr_read(key, _fetch, budget_s=budget_s, to_snapshot=_snapshot_rows)
+
+    def count_users(self, filter: Optional[UsersFilter] = None, *, max_age_s: float = COUNT_TTL_S) -> WebhookResult:
+        """
+        Number of rows matching filter (count_users action), cached per filter for
+        max_age_s and dropped on any write from this process.
+        Falls back to counting list_users rows when the WebApp has no count_users.
+        """
+        key = _filter_key(filter)
+        with _COUNT_LOCK:
+            hit = _COUNT_CACHE.get(key)
+        if hit and time.time() - hit[0] < max_age_s:
+            return WebhookResult(True, {"ok": True, "count": hit[1], "cached": True})
+
+        res = self._post({"action": "count_users", "filter": filter or {}})
+        if res.ok:
+            count = int(res.data.get("count") or 0)
+        elif "unknown action" in res.error.lower():
+            full = self._post({"action": "list_users"})
+            if not full.ok:
+                return full
+            count = sum(1 for r in full.data.get("rows", []) if isinstance(r, dict) and user_matches(r, filter))
+        else:
+            return res
+
+        with _COUNT_LOCK:
+            _COUNT_CACHE[key] = (time.time(), count)
+        return WebhookResult(True, {"ok": True, "count": count, "cached": False})
 
     def update_user(
         self,
@@ -85,7 +217,45 @@ class GSheetAccessAPI:
         else:
             payload["email"] = email.strip().lower()
 
-        return self._post(payload)
+        try:
+            return self._post(payload)
+        finally:
+            _invalidate_users()
+
+    def update_users(self, items: List[Dict[str, Any]]) -> List[WebhookResult]:
+        """
+        Batched update_user: one WebApp call for many rows ({request_id?, email?, updates}).
+        Falls back to one update_user per row when the WebApp has no `update_users` action.
+        Returns one result per item, in order.
+        """
+        norm: List[Dict[str, Any]] = []
+        for it in items:
+            rid = str(it.get("request_id") or "").strip()
+            one: Dict[str, Any] = {"updates": dict(it.get("updates") or {})}
+            if rid:
+                one["request_id"] = rid
+            else:
+                one["email"] = str(it.get("email") or "").strip().lower()
+            norm.append(one)
+        if not norm:
+            return []
+        try:
+            res = self._post({"action": "update_users", "items": norm})
+        finally:
+            _invalidate_users()
+        results = res.data.get("results") if res.ok else None
+        if isinstance(results, list) and len(results) == len(norm):
+            return [
+                WebhookResult(bool(r.get("ok")), r, error=str(r.get("error") or ""))
+                for r in (x if isinstance(x, dict) else {} for x in results)
+            ]
+        if not res.ok and "unknown action" not in res.error.lower():
+            return [res for _ in norm]
+
+        return [
+            self.update_user(request_id=str(it.get("request_id") or ""), email=str(it.get("email") or ""), updates=it["updates"])
+            for it in norm
+        ]
 
 
 def get_gsheet_api() -> GSheetAccessAPI:
@@ -1,11 +1,10 @@
 from __future__ import annotations
 
-import json
-import urllib.request
 from dataclasses import dataclass
 from typing import Any, Dict, Optional
 
-import streamlit as st
+from everskills.services.settings import get_settings
+from everskills.services.webhook_client import post_json
 
 
 @dataclass
@@ -16,8 +15,8 @@ class APIResult:
 
 
 def _secrets() -> tuple[str, str]:
-    url = str(st.secrets.get("GSHEET_USERS_WEBAPP_URL") or "").strip()
-    secret = str(st.secrets.get("GSHEET_USERS_SHARED_SECRET") or "").strip()
+    cfg = get_settings().users_webhook
+    url, secret = cfg.url, cfg.secret
     if not url:
         raise RuntimeError("Missing secret: GSHEET_USERS_WEBAPP_URL")
     if not secret:
@@ -25,21 +24,14 @@ def _secrets() -> tuple[str, str]:
     return url, secret
 
 
-def _post(payload: Dict[str, Any], timeout: int = 25) -> APIResult:
+def _post(payload: Dict[str, Any], timeout: int = 25, retries: int = 0) -> APIResult:
     url, secret = _secrets()
     payload = {**payload, "secret": secret}
 
-    req = urllib.request.Request(
-        url=url,
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            raw = resp.read().decode("utf-8")
-        data = json.loads(raw) if raw else {}
+        resp = post_json(url, payload, timeout_s=timeout, retries=retries)
+        resp.raise_for_status()
+        data = resp.json() or {}
         ok = bool(data.get("ok"))
         return APIResult(ok=ok, data=data, error="" if ok else str(data.get("error") or "Unknown error"))
     except Exception as e:
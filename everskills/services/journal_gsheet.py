@@ -6,8 +6,9 @@ import uuid
 from dataclasses import dataclass, asdict
 from typing import Any, Dict, List, Optional
 
-import requests
-import streamlit as st
+from everskills.services.journal_store import filter_since
+from everskills.services.settings import get_settings
+from everskills.services.webhook_client import post_json
 
 
 @dataclass
@@ -25,8 +26,8 @@ class JournalEntry:
 
 
 def _cfg() -> tuple[str, str]:
-    url = st.secrets.get("GSHEET_USERS_WEBAPP_URL", "").strip()
-    secret = st.secrets.get("GSHEET_USERS_SHARED_SECRET", "").strip()
+    cfg = get_settings().users_webhook
+    url, secret = cfg.url, cfg.secret
     if not url or not secret:
         raise RuntimeError("Missing GSHEET_USERS_WEBAPP_URL or GSHEET_USERS_SHARED_SECRET in secrets.")
     return url, secret
@@ -77,12 +78,12 @@ def build_entry(
     )
 
 
-def _post(payload: Dict[str, Any], timeout_s: int = 12) -> Dict[str, Any]:
+def _post(payload: Dict[str, Any], timeout_s: int = 12, retries: int = 0) -> Dict[str, Any]:
     url, secret = _cfg()
     payload = dict(payload)
     payload["secret"] = secret
 
-    r = requests.post(url, json=payload, timeout=timeout_s)
+    r = post_json(url, payload, timeout_s=timeout_s, retries=retries)
     r.raise_for_status()
 
     try:
@@ -100,13 +101,25 @@ def journal_create(entry: JournalEntry) -> JournalEntry:
     return entry
 
 
-def journal_list_learner(author_email: str, limit: int = 50) -> List[Dict[str, Any]]:
-    data = _post({"action": "journal_list_learner", "author_email": author_email.strip().lower(), "limit": int(limit)})
+def journal_list_learner(author_email: str, limit: int = 50, since: int = 0) -> List[Dict[str, Any]]:
+    """
+    since: epoch seconds; only items with created_at >= since are returned (0 = all).
+    """
+    payload: Dict[str, Any] = {"action": "journal_list_learner", "author_email": author_email.strip().lower(), "limit": int(limit)}
+    if since:
+        payload["since"] = int(since)
+    data = _post(payload)
     items = data.get("items", [])
-    return items if isinstance(items, list) else []
+    return filter_since(items, since) if isinstance(items, list) else []
 
 
-def journal_list_coach(coach_email: str, limit: int = 100) -> List[Dict[str, Any]]:
-    data = _post({"action": "journal_list_coach", "coach_email": coach_email.strip().lower(), "limit": int(limit)})
+def journal_list_coach(coach_email: str, limit: int = 100, since: int = 0) -> List[Dict[str, Any]]:
+    """
+    since: epoch seconds; only items with created_at >= since are returned (0 = all).
+    """
+    payload: Dict[str, Any] = {"action": "journal_list_coach", "coach_email": coach_email.strip().lower(), "limit": int(limit)}
+    if since:
+        payload["since"] = int(since)
+    data = _post(payload)
     items = data.get("items", [])
-    return items if isinstance(items, list) else []
+    return filter_since(items, since) if isinstance(items, list) else []
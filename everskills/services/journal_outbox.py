@@ -0,0 +1,288 @@
+# everskills/services/journal_outbox.py
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from everskills.services.journal_store import add_local_item, set_item_fields
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+OUTBOX_PATH = DATA_DIR / "journal_outbox.json"
+
+# Delivery states (also written on the local journal item as `_delivery`)
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_S = 2.0
+BACKOFF_MAX_S = 300.0
+SENT_RETENTION_S = 24 * 3600
+# Entries keep the author's created_at however late they are delivered: viewers fetch
+# them by server sequence (journal_store.sync_feed), not by date.
+
+_LOCK = threading.RLock()
+_WAKE = threading.Event()
+_WORKER: Optional[threading.Thread] = None
+
+
+# ----------------------------
+# Utils
+# ----------------------------
+def _read_jobs() -> List[Dict[str, Any]]:
+    try:
+        if not OUTBOX_PATH.exists():
+            return []
+        raw = OUTBOX_PATH.read_text(encoding="utf-8")
+        data = json.loads(raw) if raw.strip() else []
+        return [j for j in data if isinstance(j, dict)] if isinstance(data, list) else []
+    except Exception:
+        return []
+
+
+def _write_jobs(jobs: List[Dict[str, Any]]) -> None:
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = OUTBOX_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(jobs, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(OUTBOX_PATH)
+
+
+def _backoff_s(attempts: int) -> float:
+    return min(BACKOFF_BASE_S * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_S)
+
+
+def _enqueue(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Idempotent on job id: enqueueing the same id twice keeps the first job.
+    """
+    now = time.time()
+    job = {
+        "status": PENDING,
+        "attempts": 0,
+        "next_try_at": now,
+        "created_at": now,
+        "updated_at": now,
+        "last_error": "",
+        **job,
+    }
+    with _LOCK:
+        jobs = _read_jobs()
+        for j in jobs:
+            if j.get("id") == job["id"]:
+                return j
+        jobs.append(job)
+        _write_jobs(jobs)
+
+    ensure_worker()
+    _WAKE.set()
+    return job
+
+
+# ----------------------------
+# Delivery
+# ----------------------------
+def _deliver(job: Dict[str, Any]) -> None:
+    """
+    Raises on failure. The payload carries `idempotency_key` so a retry after a
+    lost response does not create a duplicate row on the Apps Script side; it is
+    sent unchanged on every attempt.
+    """
+    kind = str(job.get("kind") or "")
+    payload = dict(job.get("payload") or {})
+    payload["idempotency_key"] = job["id"]
+
+    if kind == "journal_create":
+        from everskills.services.journal_gsheet import _post  # local import to avoid cycles
+
+        _post(payload, retries=int(job.get("attempts") or 0))
+        return
+
+    if kind == "add_comment":
+        from everskills.services import gsheet_programs  # local import to avoid cycles
+
+        res = gsheet_programs._post(payload, retries=int(job.get("attempts") or 0))
+        if not res.ok:
+            raise RuntimeError(res.error or "add_comment failed")
+        return
+
+    raise RuntimeError(f"Unknown outbox job kind: {kind}")
+
+
+def _mark_local(job: Dict[str, Any], status: str, error: str = "") -> None:
+    store_key = str(job.get("store_key") or "")
+    if not store_key:
+        return
+    set_item_fields(store_key, job["id"], {"_delivery": status, "_delivery_error": error})
+
+
+def process_due(now: Optional[float] = None) -> int:
+    """
+    Deliver every due pending job once. Returns the number of jobs attempted.
+    Safe to call from a CLI or a test (the worker thread calls it in a loop).
+    """
+    now = time.time() if now is None else now
+    with _LOCK:
+        due = [j for j in _read_jobs() if j.get("status") == PENDING and float(j.get("next_try_at") or 0) <= now]
+
+    for job in due:
+        err = ""
+        try:
+            _deliver(job)
+        except Exception as e:
+            err = str(e) or e.__class__.__name__
+
+        with _LOCK:
+            jobs = _read_jobs()
+            for j in jobs:
+                if j.get("id") != job["id"]:
+                    continue
+                j["updated_at"] = time.time()
+                if not err:
+                    j["status"] = SENT
+                    j["last_error"] = ""
+                else:
+                    j["attempts"] = int(j.get("attempts") or 0) + 1
+                    j["last_error"] = err
+                    if j["attempts"] >= MAX_ATTEMPTS:
+                        j["status"] = FAILED
+                    else:
+                        j["next_try_at"] = time.time() + _backoff_s(j["attempts"])
+                status = j["status"]
+                break
+            else:
+                continue
+
+            # drop delivered jobs after a while (the journal itself is the record)
+            jobs = [
+                j
+                for j in jobs
+                if not (j.get("status") == SENT and time.time() - float(j.get("updated_at") or 0) > SENT_RETENTION_S)
+            ]
+            _write_jobs(jobs)
+
+        _mark_local(job, status, err)
+
+    return len(due)
+
+
+def _next_wakeup_s() -> float:
+    with _LOCK:
+        pending = [float(j.get("next_try_at") or 0) for j in _read_jobs() if j.get("status") == PENDING]
+    if not pending:
+        return 30.0
+    return max(0.2, min(pending) - time.time())
+
+
+def _worker_loop() -> None:
+    while True:
+        try:
+            process_due()
+        except Exception:
+            pass
+        _WAKE.wait(timeout=_next_wakeup_s())
+        _WAKE.clear()
+
+
+def ensure_worker() -> None:
+    """
+    Start the background delivery thread once per process.
+    """
+    global _WORKER
+    with _LOCK:
+        if _WORKER is not None and _WORKER.is_alive():
+            return
+        _WORKER = threading.Thread(target=_worker_loop, name="journal-outbox", daemon=True)
+        _WORKER.start()
+
+
+# ----------------------------
+# Public API
+# ----------------------------
+def enqueue_journal_create(entry: Any, *, store_key: str = "") -> Dict[str, Any]:
+    """
+    Write-behind journal_create: the entry is stored locally as pending (so the chat
+    renders it at once) and delivered to the webhook by the background worker.
+    """
+    data = asdict(entry) if not isinstance(entry, dict) else dict(entry)
+    if store_key:
+        add_local_item(store_key, {**data, "_delivery": PENDING, "_delivery_error": ""})
+
+    return _enqueue(
+        {
+            "id": str(data["id"]),
+            "kind": "journal_create",
+            "store_key": store_key,
+            "payload": {"action": "journal_create", "data": data},
+        }
+    )
+
+
+def enqueue_comment(
+    *,
+    org_id: str,
+    comment_id: str,
+    program_id: str,
+    author_role: str,
+    author_email: str,
+    message: str,
+    week_start: str = "",
+) -> Dict[str, Any]:
+    """
+    Write-behind version of gsheet_programs.add_comment (comment_id is the idempotency key).
+    """
+    return _enqueue(
+        {
+            "id": str(comment_id),
+            "kind": "add_comment",
+            "store_key": "",
+            "payload": {
+                "action": "add_comment",
+                "org_id": org_id,
+                "comment_id": comment_id,
+                "program_id": program_id,
+                "week_start": week_start,
+                "author_role": author_role,
+                "author_email": author_email,
+                "message": message,
+            },
+        }
+    )
+
+
+def delivery_state(job_id: str) -> Dict[str, Any]:
+    with _LOCK:
+        for j in _read_jobs():
+            if j.get("id") == job_id:
+                return {k: j.get(k) for k in ("id", "kind", "status", "attempts", "last_error", "next_try_at")}
+    return {}
+
+
+def retry_failed(job_id: str) -> bool:
+    """
+    Put a FAILED job back in the queue (manual retry from the UI).
+    """
+    with _LOCK:
+        jobs = _read_jobs()
+        for j in jobs:
+            if j.get("id") == job_id and j.get("status") == FAILED:
+                j["status"] = PENDING
+                j["attempts"] = 0
+                j["next_try_at"] = time.time()
+                _write_jobs(jobs)
+                break
+        else:
+            return False
+
+    _mark_local(j, PENDING)
+    ensure_worker()
+    _WAKE.set()
+    return True
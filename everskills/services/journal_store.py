@@ -0,0 +1,315 @@
+# everskills/services/journal_store.py
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# File is independent (no streamlit import) so it can be used from workers.
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+STORE_DIR = DATA_DIR / "journal_store"
+
+# One lock per process is enough: each thread file is small and writes are rare.
+_LOCK = threading.RLock()
+
+# Feed cursors. The WebApp numbers journal rows as they are appended (`seq`, the sheet
+# row): sync_feed asks for rows after the last seq seen, oldest first, page by page, so
+# a message delivered late (outbox retry, slow voice upload) or written on a device
+# with a wrong clock is still fetched, with the author's created_at.
+# WebApps without `after_seq` ignore it and answer the created_at `since` filter: that
+# cursor is re-read CURSOR_OVERLAP_S back (re-fetched items merge by id).
+CURSOR_OVERLAP_S = 15 * 60
+SYNC_MAX_PAGES = 20  # per feed and sync; the rest comes on the next sync
+
+
+# ----------------------------
+# Utils
+# ----------------------------
+def _norm_email(s: str) -> str:
+    return (s or "").strip().lower()
+
+
+def thread_store_key(coach_email: str, learner_email: str, viewer_email: str = "") -> str:
+    """
+    One store per (coach, learner) thread and per viewer: the learner feed contains
+    private notes the coach must never see, so a viewer only keeps what it fetched.
+    """
+    viewer = _norm_email(viewer_email) or _norm_email(learner_email)
+    return f"{_norm_email(coach_email)}::{_norm_email(learner_email)}::{viewer}"
+
+
+def _thread_path(key: str) -> Path:
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+    return STORE_DIR / f"{digest}.json"
+
+
+def _read_json(path: Path, default: Any) -> Any:
+    try:
+        if not path.exists():
+            return default
+        raw = path.read_text(encoding="utf-8")
+        if not raw.strip():
+            return default
+        return json.loads(raw)
+    except Exception:
+        return default
+
+
+def _write_json(path: Path, obj: Any) -> None:
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _created_at(item: Dict[str, Any]) -> int:
+    try:
+        return int(item.get("created_at") or 0)
+    except Exception:
+        return 0
+
+
+def _seq(item: Dict[str, Any]) -> int:
+    try:
+        return int(item.get("seq") or 0)
+    except Exception:
+        return 0
+
+
+def _sort_key(item: Dict[str, Any]) -> Tuple[int, str]:
+    return _created_at(item), str(item.get("id") or "")
+
+
+def _empty_thread(key: str) -> Dict[str, Any]:
+    return {
+        "key": key,
+        "cursors": {},  # feed name -> {"created_at": int, "id": str, "seq": int}
+        "items": [],
+    }
+
+
+def _load(key: str) -> Dict[str, Any]:
+    data = _read_json(_thread_path(key), None)
+    if not isinstance(data, dict):
+        return _empty_thread(key)
+    if not isinstance(data.get("cursors"), dict):
+        data["cursors"] = {}
+    if not isinstance(data.get("items"), list):
+        data["items"] = []
+    return data
+
+
+def _merge(existing: List[Dict[str, Any]], incoming: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Merge by id (incoming wins, but local-only keys such as `_delivery` are kept).
+    Returns (items sorted oldest -> newest, number of new ids).
+    """
+    by_id: Dict[str, Dict[str, Any]] = {}
+    for it in existing:
+        if isinstance(it, dict) and str(it.get("id") or "").strip():
+            by_id[str(it["id"]).strip()] = it
+
+    added = 0
+    for it in incoming:
+        if not isinstance(it, dict):
+            continue
+        iid = str(it.get("id") or "").strip()
+        if not iid:
+            continue
+        prev = by_id.get(iid)
+        if prev is None:
+            added += 1
+            by_id[iid] = dict(it)
+        else:
+            local = {k: v for k, v in prev.items() if k.startswith("_")}
+            by_id[iid] = {**prev, **it, **local}
+
+    return sorted(by_id.values(), key=_sort_key), added
+
+
+# ----------------------------
+# Public API
+# ----------------------------
+def _cursor(key: str, feed: str) -> Dict[str, Any]:
+    with _LOCK:
+        data = _load(key)
+    cur = data["cursors"].get(feed)
+    return cur if isinstance(cur, dict) else {}
+
+
+def feed_cursor(key: str, feed: str) -> int:
+    """
+    Max `created_at` seen for one webhook feed (e.g. "journal_list_coach"), minus
+    CURSOR_OVERLAP_S. Used as the `since` param by WebApps without `after_seq`: the
+    server returns items with created_at >= since.
+    """
+    try:
+        seen = int(_cursor(key, feed).get("created_at") or 0)
+    except Exception:
+        return 0
+    return max(1, seen - CURSOR_OVERLAP_S) if seen else 0
+
+
+def feed_seq(key: str, feed: str) -> int:
+    """
+    Last server sequence number seen for one feed (0 = none): the `after_seq` param.
+    """
+    return _seq(_cursor(key, feed))
+
+
+def feed_params(key: str, feed: str) -> Dict[str, int]:
+    """
+    Cursor params of the next request of one feed: after_seq always (0 on the first
+    sync), since as well for WebApps that ignore after_seq.
+    """
+    params = {"after_seq": feed_seq(key, feed)}
+    since = feed_cursor(key, feed)
+    if since:
+        params["since"] = since
+    return params
+
+
+def merge_feed(
+    key: str,
+    feed: str,
+    items: List[Dict[str, Any]],
+    *,
+    keep: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> int:
+    """
+    Merge newly fetched items of one feed into the thread store and advance its cursor.
+    The cursor moves on every fetched item (even the ones `keep` rejects) so the next
+    call only asks for what is newer. Returns the number of new messages stored.
+    """
+    items = [it for it in (items or []) if isinstance(it, dict)]
+
+    with _LOCK:
+        data = _load(key)
+
+        if items:
+            last = max(items, key=_sort_key)
+            prev = data["cursors"].get(feed) if isinstance(data["cursors"].get(feed), dict) else {}
+            cur = dict(prev)
+            if _created_at(last) >= int(prev.get("created_at") or 0):
+                cur.update({"created_at": _created_at(last), "id": str(last.get("id") or "")})
+            cur["seq"] = max(_seq(prev), max(_seq(it) for it in items))
+            data["cursors"][feed] = cur
+
+        kept = [it for it in items if keep is None or keep(it)]
+        data["items"], added = _merge(data["items"], kept)
+
+        if items:
+            _write_json(_thread_path(key), data)
+    return added
+
+
+def sync_feed(
+    key: str,
+    feed: str,
+    fetch: Callable[[Dict[str, int]], Dict[str, Any]],
+    *,
+    keep: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> int:
+    """
+    Fetch and merge everything one feed has after its cursor. fetch(params) posts the
+    feed request with the cursor params (feed_params) and returns the JSON answer;
+    pages are requested while the server reports `has_more` (at most SYNC_MAX_PAGES).
+    Returns the number of new messages stored.
+    """
+    added = 0
+    for _ in range(SYNC_MAX_PAGES):
+        params = feed_params(key, feed)
+        answer = fetch(params)
+        items = [it for it in answer.get("items") or [] if isinstance(it, dict)]
+        added += merge_feed(key, feed, filter_since(items, params.get("since", 0)), keep=keep)
+        if not answer.get("has_more") or not items:
+            break
+    return added
+
+
+def mark_synced(key: str) -> None:
+    """
+    Record a complete, successful sync of every feed of this thread.
+    """
+    with _LOCK:
+        data = _load(key)
+        data["synced_at"] = time.time()
+        _write_json(_thread_path(key), data)
+
+
+def synced_at(key: str) -> float:
+    """
+    Epoch seconds of the last complete sync (0 if never synced).
+    """
+    with _LOCK:
+        data = _load(key)
+    try:
+        return float(data.get("synced_at") or 0)
+    except Exception:
+        return 0.0
+
+
+def add_local_item(key: str, item: Dict[str, Any]) -> None:
+    """
+    Store a message we just created, so it renders without waiting for the next sync.
+    Does not touch cursors: the server copy will be merged (same id) on the next sync.
+    """
+    with _LOCK:
+        data = _load(key)
+        data["items"], _ = _merge(data["items"], [item])
+        _write_json(_thread_path(key), data)
+
+
+def set_item_fields(key: str, item_id: str, fields: Dict[str, Any]) -> bool:
+    """
+    Patch one stored message in place (e.g. local delivery state). Returns False if absent.
+    """
+    with _LOCK:
+        data = _load(key)
+        for it in data["items"]:
+            if isinstance(it, dict) and str(it.get("id") or "") == item_id:
+                it.update(fields)
+                if "created_at" in fields:
+                    data["items"].sort(key=_sort_key)
+                _write_json(_thread_path(key), data)
+                return True
+    return False
+
+
+def thread_items(key: str) -> List[Dict[str, Any]]:
+    """
+    All stored messages of the thread, oldest -> newest.
+    """
+    with _LOCK:
+        data = _load(key)
+    return list(data["items"])
+
+
+def filter_since(items: List[Dict[str, Any]], since: int) -> List[Dict[str, Any]]:
+    """
+    Local stand-in for the webhook `since` param: older Apps Script deployments
+    ignore it and return the full list, so callers filter again client-side.
+    Items carrying a `seq` were selected by after_seq, not by date: kept as is.
+    """
+    if not since:
+        return list(items or [])
+    return [it for it in (items or []) if isinstance(it, dict) and (_seq(it) or _created_at(it) >= int(since))]
+
+
+def reset_thread(key: str) -> None:
+    """
+    DEV helper: forget local history (next sync re-downloads everything).
+    """
+    with _LOCK:
+        p = _thread_path(key)
+        if p.exists():
+            p.unlink()
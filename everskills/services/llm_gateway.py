@@ -0,0 +1,529 @@
+# everskills/services/llm_gateway.py
+from __future__ import annotations
+
+import atexit
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from everskills.services.rotating_jsonl import RotatingJSONL
+from everskills.services.settings import get_settings
+from everskills.services.webhook_metrics import Histogram, caller_page
+
+# Single entry point for OpenAI calls (chat, streamed chat, transcription):
+# - one pooled HTTP session per process (keep-alive, no client rebuilt per click)
+# - a token bucket per model (LLM_RPM, overridable per model with LLM_RATE_LIMITS)
+# - retries on 429 / 5xx / network errors, honouring Retry-After; connect + read timeouts
+# - one sample per call (latency, first token, tokens, retries), aggregated in memory
+#   and appended to data/llm_metrics.jsonl (rotated) for the admin metrics page
+# LLM_MOCK=true starts everskills.devtools.openai_mock in-process and talks to it.
+# File is independent (no streamlit import): also used by background workers.
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+METRICS_PATH = DATA_DIR / "llm_metrics.jsonl"
+
+FLUSH_INTERVAL_S = 30.0
+FLUSH_MAX_BUFFER = 20
+
+# Rotation of the metrics log and the longest history the admin page ever reads.
+METRICS_MAX_BYTES = 5 * 1024 * 1024
+METRICS_MAX_AGE_S = 24 * 3600.0
+METRICS_KEEP_SEGMENTS = 30
+MAX_READ_WINDOW_S = 30 * 24 * 3600.0
+
+CONNECT_TIMEOUT_S = 10.0
+MAX_RETRIES = 3
+MAX_BACKOFF_S = 20.0
+RATE_WAIT_MAX_S = 120.0  # give up (LLMError) rather than queue behind the limiter forever
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    def __init__(self, message: str, *, status: int = 0) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class ChatResult:
+    text: str
+    finish_reason: str = ""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: float = 0.0
+
+
+@dataclass
+class LLMSample:
+    ts: float
+    kind: str  # chat | chat_stream | transcribe
+    model: str
+    page: str
+    ok: bool
+    status: int
+    latency_ms: float
+    first_token_ms: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    audio_s: float = 0.0
+    retries: int = 0
+    error: str = ""
+
+
+# ----------------------------
+# Rate limiting
+# ----------------------------
+class TokenBucket:
+    """
+    rate_per_s tokens refilled continuously, up to capacity (the allowed burst).
+    """
+
+    def __init__(self, rate_per_s: float, capacity: float) -> None:
+        self.rate_per_s = float(rate_per_s)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._at) * self.rate_per_s)
+        self._at = now
+
+    def acquire(self, cost: float = 1.0, *, timeout_s: Optional[float] = None) -> bool:
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= cost:
+                    self._tokens -= cost
+                    return True
+                wait = (cost - self._tokens) / self.rate_per_s
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(min(wait, 1.0))
+
+
+_LOCK = threading.Lock()
+_BUCKETS: Dict[Tuple[str, int], TokenBucket] = {}
+
+
+def _bucket(model: str) -> TokenBucket:
+    s = get_settings()
+    rpm = int(s.llm_rate_limits.get(model) or s.llm_rpm)
+    with _LOCK:
+        b = _BUCKETS.get((model, rpm))
+        if b is None:
+            # burst of ~10 s worth of requests (segmented transcription starts several at once)
+            b = _BUCKETS[(model, rpm)] = TokenBucket(rpm / 60.0, max(1.0, rpm / 6.0))
+        return b
+
+
+# ----------------------------
+# Transport
+# ----------------------------
+_SESSION: Optional[requests.Session] = None
+_MOCK: Any = None
+
+
+def _session() -> requests.Session:
+    global _SESSION
+    with _LOCK:
+        if _SESSION is None:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            _SESSION = sess
+        return _SESSION
+
+
+def _endpoint() -> Tuple[str, str]:
+    """
+    (base_url, api_key); the in-process mock when LLM_MOCK is on.
+    """
+    global _MOCK
+    s = get_settings()
+    if s.llm_mock:
+        with _LOCK:
+            if _MOCK is None:
+                from everskills.devtools.openai_mock import start_mock
+
+                _MOCK = start_mock()
+            return _MOCK.base_url, s.openai_api_key or "mock"
+    return s.openai_base_url, s.openai_api_key
+
+
+def configured() -> bool:
+    return bool(_endpoint()[1])
+
+
+def default_model() -> str:
+    return get_settings().openai_model
+
+
+def _retry_delay(r: Optional[requests.Response], attempt: int) -> float:
+    delay = 0.0
+    if r is not None:
+        try:
+            delay = float(r.headers.get("Retry-After") or 0)
+        except ValueError:
+            delay = 0.0
+    return min(max(delay, 0.5 * (2**attempt)), MAX_BACKOFF_S)
+
+
+def _error_text(r: requests.Response) -> str:
+    try:
+        j = r.json()
+        msg = ((j or {}).get("error") or {}).get("message") if isinstance(j, dict) else ""
+    except ValueError:
+        msg = ""
+    return f"HTTP {r.status_code}: {msg or r.reason or 'error'}"
+
+
+def _post(
+    path: str,
+    *,
+    model: str,
+    timeout_s: float,
+    json_body: Optional[Dict[str, Any]] = None,
+    files: Optional[Dict[str, Any]] = None,
+    data: Optional[Dict[str, Any]] = None,
+    stream: bool = False,
+) -> Tuple[requests.Response, int]:
+    """
+    POST with rate limiting and retries. Returns (2xx response, retries used).
+    """
+    base, api_key = _endpoint()
+    if not api_key:
+        raise LLMError("Missing OPENAI_API_KEY in secrets")
+    url = f"{base}{path}"
+    headers = {"Authorization": f"Bearer {api_key}"}
+    last = ""
+    status = 0
+    for attempt in range(MAX_RETRIES + 1):
+        if not _bucket(model).acquire(timeout_s=RATE_WAIT_MAX_S):
+            raise LLMError(f"Rate limit: no slot for {model} within {RATE_WAIT_MAX_S:.0f} s", status=429)
+        r: Optional[requests.Response] = None
+        try:
+            r = _session().post(
+                url,
+                headers=headers,
+                json=json_body,
+                files=files,
+                data=data,
+                timeout=(CONNECT_TIMEOUT_S, timeout_s),
+                stream=stream,
+            )
+        except requests.RequestException as e:
+            last, status = str(e), 0
+        else:
+            if r.status_code < 300:
+                return r, attempt
+            last, status = _error_text(r), r.status_code
+            r.close()
+            if status not in RETRY_STATUSES:
+                break
+        if attempt < MAX_RETRIES:
+            time.sleep(_retry_delay(r, attempt))
+    raise LLMError(last or "LLM call failed", status=status)
+
+
+# ----------------------------
+# Calls
+# ----------------------------
+def chat(
+    messages: List[Dict[str, Any]],
+    *,
+    model: str = "",
+    temperature: float = 0.2,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    timeout_s: float = 60.0,
+) -> ChatResult:
+    model = model or default_model()
+    body: Dict[str, Any] = {"model": model, "temperature": temperature, "messages": messages}
+    if max_tokens:
+        body["max_tokens"] = max_tokens
+    if response_format:
+        body["response_format"] = response_format
+    t0 = time.monotonic()
+    sample = LLMSample(ts=time.time(), kind="chat", model=model, page=caller_page(), ok=False, status=0, latency_ms=0.0)
+    try:
+        r, sample.retries = _post("/chat/completions", model=model, timeout_s=timeout_s, json_body=body)
+        j = r.json()
+        choice = (j.get("choices") or [{}])[0]
+        usage = j.get("usage") or {}
+        res = ChatResult(
+            text=str((choice.get("message") or {}).get("content") or ""),
+            finish_reason=str(choice.get("finish_reason") or ""),
+            prompt_tokens=int(usage.get("prompt_tokens") or 0),
+            completion_tokens=int(usage.get("completion_tokens") or 0),
+        )
+        sample.ok, sample.status = True, r.status_code
+        sample.prompt_tokens, sample.completion_tokens = res.prompt_tokens, res.completion_tokens
+    except LLMError as e:
+        sample.status, sample.error = e.status, str(e)
+        raise
+    except ValueError as e:
+        sample.error = f"Invalid JSON: {e}"
+        raise LLMError(sample.error) from e
+    finally:
+        sample.latency_ms = (time.monotonic() - t0) * 1000.0
+        sample.first_token_ms = sample.latency_ms
+        record(sample)
+    res.latency_ms = sample.latency_ms
+    return res
+
+
+def chat_stream(
+    messages: List[Dict[str, Any]],
+    *,
+    model: str = "",
+    temperature: float = 0.2,
+    max_tokens: Optional[int] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    timeout_s: float = 60.0,
+) -> Iterator[str]:
+    """
+    Yields content deltas as they arrive (server-sent events). Closing the generator
+    early (cancel) closes the HTTP response; the call is then recorded as "cancelled".
+    """
+    model = model or default_model()
+    body: Dict[str, Any] = {
+        "model": model,
+        "temperature": temperature,
+        "messages": messages,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+    if max_tokens:
+        body["max_tokens"] = max_tokens
+    if response_format:
+        body["response_format"] = response_format
+    t0 = time.monotonic()
+    sample = LLMSample(ts=time.time(), kind="chat_stream", model=model, page=caller_page(), ok=False, status=0, latency_ms=0.0)
+    r: Optional[requests.Response] = None
+    done = False
+    try:
+        r, sample.retries = _post("/chat/completions", model=model, timeout_s=timeout_s, json_body=body, stream=True)
+        sample.status = r.status_code
+        r.encoding = "utf-8"  # SSE is UTF-8; requests would assume latin-1 without a charset
+        for line in r.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+            try:
+                chunk = json.loads(payload)
+            except ValueError:
+                continue
+            usage = chunk.get("usage") or {}
+            if usage:
+                sample.prompt_tokens = int(usage.get("prompt_tokens") or 0)
+                sample.completion_tokens = int(usage.get("completion_tokens") or 0)
+            for choice in chunk.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    if not sample.first_token_ms:
+                        sample.first_token_ms = (time.monotonic() - t0) * 1000.0
+                    yield delta
+        done = True
+        sample.ok = True
+    except LLMError as e:
+        sample.status, sample.error = e.status, str(e)
+        raise
+    except requests.RequestException as e:
+        sample.error = str(e)
+        raise LLMError(str(e)) from e
+    finally:
+        if r is not None:
+            r.close()
+        if not done and not sample.error:
+            sample.error = "cancelled"
+        sample.latency_ms = (time.monotonic() - t0) * 1000.0
+        record(sample)
+
+
+def transcribe(
+    audio_bytes: bytes,
+    *,
+    file_name: str,
+    mime_type: str,
+    model: str,
+    language: str = "fr",
+    timeout_s: float = 90.0,
+    audio_s: float = 0.0,
+) -> str:
+    t0 = time.monotonic()
+    sample = LLMSample(
+        ts=time.time(), kind="transcribe", model=model, page=caller_page(), ok=False, status=0, latency_ms=0.0, audio_s=audio_s
+    )
+    try:
+        r, sample.retries = _post(
+            "/audio/transcriptions",
+            model=model,
+            timeout_s=timeout_s,
+            files={"file": (file_name, audio_bytes, mime_type or "application/octet-stream")},
+            data={"model": model, "language": language, "response_format": "json"},
+        )
+        txt = r.json().get("text")
+        if not isinstance(txt, str):
+            raise LLMError("Transcription returned no text", status=r.status_code)
+        sample.ok, sample.status = True, r.status_code
+        return txt.strip()
+    except LLMError as e:
+        sample.status, sample.error = e.status, str(e)
+        raise
+    except ValueError as e:
+        sample.error = f"Invalid JSON: {e}"
+        raise LLMError(sample.error) from e
+    finally:
+        sample.latency_ms = (time.monotonic() - t0) * 1000.0
+        sample.first_token_ms = sample.latency_ms
+        record(sample)
+
+
+# ----------------------------
+# Metrics
+# ----------------------------
+@dataclass
+class ModelStats:
+    calls: int = 0
+    errors: int = 0
+    cancelled: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    audio_s: float = 0.0
+    latency: Histogram = field(default_factory=Histogram)
+    first_token: Histogram = field(default_factory=Histogram)
+
+    def add(self, s: LLMSample) -> None:
+        self.calls += 1
+        if s.error == "cancelled":
+            self.cancelled += 1
+        elif not s.ok:
+            self.errors += 1
+        self.retries += int(s.retries or 0)
+        self.prompt_tokens += int(s.prompt_tokens or 0)
+        self.completion_tokens += int(s.completion_tokens or 0)
+        self.audio_s += float(s.audio_s or 0)
+        self.latency.add(float(s.latency_ms or 0))
+        if s.first_token_ms:
+            self.first_token.add(float(s.first_token_ms))
+
+    def summary(self, model: str) -> Dict[str, Any]:
+        n = max(self.calls, 1)
+        price = get_settings().llm_prices.get(model)
+        cost = None
+        if price:
+            cost = round((self.prompt_tokens * price[0] + self.completion_tokens * price[1]) / 1e6, 4)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_pct": round(100.0 * self.errors / n, 1),
+            "cancelled": self.cancelled,
+            "retries": self.retries,
+            "p50_ms": round(self.latency.percentile(50)),
+            "p95_ms": round(self.latency.percentile(95)),
+            "p95_first_token_ms": round(self.first_token.percentile(95)),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "audio_min": round(self.audio_s / 60.0, 1),
+            "cost_usd": cost,
+        }
+
+
+_STATS: Dict[Tuple[str, str], ModelStats] = {}
+_BUFFER: List[LLMSample] = []
+_LAST_FLUSH = time.time()
+_LOG: Optional[RotatingJSONL] = None
+
+
+def _metrics_log() -> RotatingJSONL:
+    global _LOG
+    if _LOG is None or _LOG.path != METRICS_PATH:
+        _LOG = RotatingJSONL(
+            METRICS_PATH,
+            max_bytes=METRICS_MAX_BYTES,
+            max_age_s=METRICS_MAX_AGE_S,
+            keep_segments=METRICS_KEEP_SEGMENTS,
+        )
+    return _LOG
+
+
+def record(sample: LLMSample) -> None:
+    global _LAST_FLUSH
+    key = (sample.kind, sample.model or "?")
+    with _LOCK:
+        _STATS.setdefault(key, ModelStats()).add(sample)
+        _BUFFER.append(sample)
+        due = len(_BUFFER) >= FLUSH_MAX_BUFFER or time.time() - _LAST_FLUSH >= FLUSH_INTERVAL_S
+    if due:
+        flush()
+
+
+def flush() -> None:
+    """
+    Append buffered samples to data/llm_metrics.jsonl (rotated, one JSON per line).
+    """
+    global _LAST_FLUSH
+    with _LOCK:
+        batch = list(_BUFFER)
+        _BUFFER.clear()
+        _LAST_FLUSH = time.time()
+    if not batch:
+        return
+    try:
+        _metrics_log().append_many(asdict(s) for s in batch)
+    except Exception:
+        # metrics must never break a call
+        pass
+
+
+atexit.register(flush)
+
+
+def live_summary() -> List[Dict[str, Any]]:
+    """
+    Per (kind, model) summary for this process since start.
+    """
+    with _LOCK:
+        items = [(k, v) for k, v in _STATS.items()]
+    return [{"kind": k, "model": m, **v.summary(m)} for (k, m), v in sorted(items)]
+
+
+def iter_samples(since_ts: float = 0.0) -> Iterator[LLMSample]:
+    """
+    Stream samples from the metrics log, oldest first; never further back than
+    MAX_READ_WINDOW_S.
+    """
+    since_ts = max(float(since_ts or 0), time.time() - MAX_READ_WINDOW_S)
+    fields = set(LLMSample.__dataclass_fields__)
+    for d in _metrics_log().iter_records(since_ts=since_ts):
+        try:
+            if float(d.get("ts") or 0) < since_ts:
+                continue
+            yield LLMSample(**{k: v for k, v in d.items() if k in fields})
+        except Exception:
+            continue
+
+
+def persisted_summary(since_ts: float = 0.0) -> List[Dict[str, Any]]:
+    stats: Dict[Tuple[str, str], ModelStats] = {}
+    for s in iter_samples(since_ts):
+        stats.setdefault((s.kind, s.model or "?"), ModelStats()).add(s)
+    return [{"kind": k, "model": m, **v.summary(m)} for (k, m), v in sorted(stats.items())]
@@ -0,0 +1,67 @@
+# everskills/services/mail_digest.py
+from __future__ import annotations
+
+from typing import Any, Dict, List, Tuple
+
+from everskills.services.settings import get_settings
+
+# Digest mode: notifications of the same family for the same recipient are held by
+# the mail queue for a window, then sent as one email (see mail_queue.process_due).
+
+# Default window per event family (seconds). 0 / missing = sent on its own, at once.
+DEFAULT_DIGEST_WINDOWS_S: Dict[str, int] = {
+    "COACH_ASSIGNED": 10 * 60,
+    "COACH_UPDATE": 15 * 60,
+}
+
+FAMILY_LABELS: Dict[str, str] = {
+    "COACH_ASSIGNED": "Nouvelles demandes assignées",
+    "COACH_UPDATE": "Retours de ton coach",
+}
+
+_SEPARATOR = "\n" + "—" * 24 + "\n\n"
+
+
+def digest_window_s(event_type: str) -> int:
+    """
+    Window for one event family. Override in secrets:
+      [MAIL_DIGEST_WINDOWS]
+      COACH_UPDATE = 600   # 0 disables the digest for this family
+    """
+    family = (event_type or "").strip().upper()
+    windows = {**DEFAULT_DIGEST_WINDOWS_S, **get_settings().mail_digest_windows}
+    return max(int(windows.get(family, 0) or 0), 0)
+
+
+def digest_key(event_type: str, to_email: str) -> str:
+    return f"{(event_type or '').strip().upper()}:{(to_email or '').strip().lower()}"
+
+
+def render_digest(event_type: str, items: List[Dict[str, Any]]) -> Tuple[str, str, str]:
+    """
+    One email for several notifications (oldest first). Returns (subject, text, html).
+    Each item carries the original subject / text_body / html_body.
+    """
+    family = (event_type or "").strip().upper()
+    label = FAMILY_LABELS.get(family, "Notifications")
+    n = len(items)
+
+    subject = f"[EVERSKILLS] {label} ({n})"
+    intro = f"{n} notification(s) regroupée(s) :\n\n"
+    text = intro + _SEPARATOR.join(
+        f"{it.get('subject') or ''}\n\n{(it.get('text_body') or '').strip()}\n" for it in items
+    )
+
+    if not any(it.get("html_body") for it in items):
+        return subject, text, ""
+
+    def _html_part(it: Dict[str, Any]) -> str:
+        body = it.get("html_body") or "<pre>" + _escape(it.get("text_body") or "") + "</pre>"
+        return f"<h3>{_escape(it.get('subject') or '')}</h3>{body}"
+
+    html = f"<p>{_escape(intro.strip())}</p>" + "<hr/>".join(_html_part(it) for it in items)
+    return subject, text, html
+
+
+def _escape(s: str) -> str:
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
@@ -2,17 +2,51 @@
 from __future__ import annotations
 
 import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, Optional
 from datetime import datetime, timezone
 
+from everskills.services.rotating_jsonl import RotatingJSONL
+
 # File is independent (no streamlit import) to avoid side effects.
 
 THIS_FILE = Path(__file__).resolve()
 PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
 DATA_DIR = PROJECT_ROOT / "data"
+# Idempotency index: one row per event_key (unique), checked and claimed atomically.
+MAIL_CLAIMS_DB_PATH = DATA_DIR / "mail_events.sqlite3"
+# Append-only history of every attempt (SENT / FAILED / SKIPPED).
+MAIL_EVENTS_LOG_PATH = DATA_DIR / "mail_events.jsonl"
+# Before the index: one JSON array rewritten per event (imported once, then read-only).
 MAIL_EVENTS_PATH = DATA_DIR / "mail_events.json"
 
+# Claim states
+CLAIMED = "CLAIMED"
+SENT = "SENT"
+FAILED = "FAILED"
+
+# A claim not resolved within this delay belongs to a dead sender and can be taken over.
+CLAIM_LEASE_S = 600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mail_claims (
+    event_key TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    owner TEXT NOT NULL DEFAULT '',
+    claimed_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_INIT_LOCK = threading.Lock()
+_READY_FOR: Optional[Path] = None
+_LOG: Optional[RotatingJSONL] = None
+
 
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -34,11 +68,62 @@ def _read_json(path: Path, default: Any) -> Any:
         return default
 
 
-def _write_json(path: Path, obj: Any) -> None:
-    _ensure_data_dir()
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+def _import_legacy(conn: sqlite3.Connection) -> None:
+    """
+    Seed the index with the SENT keys of the legacy mail_events.json (once).
+    """
+    rows = _read_json(MAIL_EVENTS_PATH, [])
+    if not isinstance(rows, list):
+        return
+    now = time.time()
+    keys = {
+        str(r.get("event_key") or "").strip()
+        for r in rows
+        if isinstance(r, dict) and str(r.get("status") or "").strip() == SENT
+    }
+    conn.executemany(
+        "INSERT OR IGNORE INTO mail_claims (event_key, state, owner, claimed_at, updated_at) VALUES (?, ?, 'legacy', ?, ?)",
+        [(k, SENT, now, now) for k in keys if k],
+    )
 
 
+@contextmanager
+def _db() -> Iterator[sqlite3.Connection]:
+    global _READY_FOR
+    _ensure_data_dir()
+    conn = sqlite3.connect(str(MAIL_CLAIMS_DB_PATH), timeout=30, isolation_level=None)
+    try:
+        if _READY_FOR != MAIL_CLAIMS_DB_PATH:
+            with _INIT_LOCK:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("BEGIN IMMEDIATE")
+                fresh = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='mail_claims'"
+                ).fetchone() is None
+                conn.execute(_SCHEMA)
+                if fresh:
+                    _import_legacy(conn)
+                conn.execute("COMMIT")
+                _READY_FOR = MAIL_CLAIMS_DB_PATH
+        yield conn
+    finally:
+        conn.close()
+
+
+def _event_log() -> RotatingJSONL:
+    global _LOG
+    if _LOG is None or _LOG.path != MAIL_EVENTS_LOG_PATH:
+        _LOG = RotatingJSONL(MAIL_EVENTS_LOG_PATH)
+    return _LOG
+
+
+def _owner() -> str:
+    return f"{os.getpid()}:{threading.get_ident()}"
+
+
+# ----------------------------
+# Idempotency (O(1), safe across processes)
+# ----------------------------
 def was_sent(event_key: str) -> bool:
     """
     Idempotency check: True if we already have an event with same key and status SENT.
@@ -46,19 +131,68 @@ def was_sent(event_key: str) -> bool:
     key = (event_key or "").strip()
     if not key:
         return False
+    with _db() as conn:
+        row = conn.execute("SELECT state FROM mail_claims WHERE event_key = ?", (key,)).fetchone()
+    return bool(row) and row[0] == SENT
 
-    rows = _read_json(MAIL_EVENTS_PATH, [])
-    if not isinstance(rows, list):
-        return False
 
-    for r in rows:
-        if not isinstance(r, dict):
-            continue
-        if str(r.get("event_key") or "").strip() == key and str(r.get("status") or "").strip() == "SENT":
-            return True
-    return False
+def claim(event_key: str, *, lease_s: float = CLAIM_LEASE_S) -> bool:
+    """
+    Atomic check-and-claim before sending. True means the caller owns the send and
+    must call mark_sent() or release(); False means it was SENT (or is being sent).
+    A FAILED key, or a CLAIMED one whose lease expired, can be claimed again.
+    """
+    key = (event_key or "").strip()
+    if not key:
+        return True
+    now = time.time()
+    with _db() as conn:
+        cur = conn.execute(
+            """
+            INSERT INTO mail_claims (event_key, state, owner, claimed_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(event_key) DO UPDATE
+               SET state = excluded.state, owner = excluded.owner,
+                   claimed_at = excluded.claimed_at, updated_at = excluded.updated_at
+             WHERE mail_claims.state = ?
+                OR (mail_claims.state = ? AND mail_claims.claimed_at < ?)
+            """,
+            (key, CLAIMED, _owner(), now, now, FAILED, CLAIMED, now - lease_s),
+        )
+    return cur.rowcount == 1
+
+
+def _set_state(event_key: str, state: str) -> None:
+    key = (event_key or "").strip()
+    if not key:
+        return
+    now = time.time()
+    with _db() as conn:
+        conn.execute(
+            """
+            INSERT INTO mail_claims (event_key, state, owner, claimed_at, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(event_key) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+             WHERE mail_claims.state != ?
+            """,
+            (key, state, _owner(), now, now, SENT),
+        )
+
 
+def mark_sent(event_key: str) -> None:
+    _set_state(event_key, SENT)
+
+
+def release(event_key: str) -> None:
+    """
+    Give a claim back after a failed send (a later call may retry).
+    """
+    _set_state(event_key, FAILED)
 
+
+# ----------------------------
+# Event log
+# ----------------------------
 def log_event(
     *,
     event_key: str,
@@ -73,6 +207,7 @@ def log_event(
 ) -> None:
     """
     Append one event row. IMPORTANT: we log the `to_email` we received, no rewrite.
+    SENT / FAILED rows also resolve the idempotency claim of event_key.
     """
     row: Dict[str, Any] = {
         "ts": now_iso(),
@@ -87,8 +222,20 @@ def log_event(
         "error": error,
     }
 
-    rows = _read_json(MAIL_EVENTS_PATH, [])
-    if not isinstance(rows, list):
-        rows = []
-    rows.append(row)
-    _write_json(MAIL_EVENTS_PATH, rows)
+    if row["status"] == SENT:
+        mark_sent(row["event_key"])
+    elif row["status"] == FAILED:
+        release(row["event_key"])
+
+    _event_log().append(row)
+
+
+def iter_events() -> Iterator[Dict[str, Any]]:
+    """
+    Stream the whole history, oldest first (legacy JSON array, then the JSONL log).
+    """
+    legacy = _read_json(MAIL_EVENTS_PATH, [])
+    for r in legacy if isinstance(legacy, list) else []:
+        if isinstance(r, dict):
+            yield r
+    yield from _event_log().iter_records()
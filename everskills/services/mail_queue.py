@@ -0,0 +1,473 @@
+# everskills/services/mail_queue.py
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from everskills.services.mail_digest import digest_key, digest_window_s, render_digest
+
+# Durable mail queue: Streamlit handlers enqueue and return at once, a background
+# worker (thread in the app process, or `python -m everskills.services.mail_queue`)
+# sends through the pooled mailer with retries/backoff.
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+QUEUE_DB_PATH = DATA_DIR / "mail_queue.sqlite3"
+
+# Job states
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+SKIPPED = "skipped"  # send_once job whose event_key was already SENT
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 900.0
+BATCH_SIZE = 20
+# A job stuck in SENDING longer than this belongs to a dead worker: requeue it.
+SENDING_LEASE_S = 300.0
+
+_LOCK = threading.RLock()
+_WAKE = threading.Event()
+_WORKER: Optional[threading.Thread] = None
+_READY_FOR: Optional[Path] = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mail_jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_try_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    event_key TEXT NOT NULL DEFAULT '',
+    event_type TEXT NOT NULL DEFAULT '',
+    request_id TEXT NOT NULL DEFAULT '',
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    text_body TEXT NOT NULL,
+    html_body TEXT NOT NULL DEFAULT '',
+    meta_json TEXT NOT NULL DEFAULT '{}',
+    mail_mode TEXT NOT NULL DEFAULT '',
+    last_error TEXT NOT NULL DEFAULT '',
+    digest_key TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS mail_jobs_due ON mail_jobs (state, next_try_at);
+CREATE INDEX IF NOT EXISTS mail_jobs_event_key ON mail_jobs (event_key);
+"""
+
+
+# ----------------------------
+# Utils
+# ----------------------------
+@contextmanager
+def _db() -> Iterator[sqlite3.Connection]:
+    global _READY_FOR
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(QUEUE_DB_PATH), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if _READY_FOR != QUEUE_DB_PATH:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            cols = {r["name"] for r in conn.execute("PRAGMA table_info(mail_jobs)").fetchall()}
+            if "digest_key" not in cols:  # queue created before digest mode
+                conn.execute("ALTER TABLE mail_jobs ADD COLUMN digest_key TEXT NOT NULL DEFAULT ''")
+            conn.execute("CREATE INDEX IF NOT EXISTS mail_jobs_digest ON mail_jobs (digest_key, state)")
+            _READY_FOR = QUEUE_DB_PATH
+        yield conn
+    finally:
+        conn.close()
+
+
+def _backoff_s(attempts: int) -> float:
+    return min(BACKOFF_BASE_S * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_S)
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = dict(row)
+    try:
+        job["meta"] = json.loads(job.pop("meta_json") or "{}")
+    except Exception:
+        job["meta"] = {}
+    return job
+
+
+def _enqueue(
+    *,
+    to_email: str,
+    subject: str,
+    text_body: str,
+    html_body: Optional[str],
+    meta: Optional[Dict[str, Any]],
+    event_key: str = "",
+    event_type: str = "",
+    request_id: str = "",
+    digest: bool = False,
+) -> str:
+    """
+    Insert a job and wake the worker. A send_once job whose event_key is already
+    queued (pending/sending) is not queued twice: the existing job id is returned.
+    With digest=True the job joins the pending digest of its (family, recipient)
+    and is sent with it when the window opened by the first one closes.
+    """
+    now = time.time()
+    event_key = (event_key or "").strip()
+    window_s = digest_window_s(event_type) if digest else 0
+    dkey = digest_key(event_type, to_email) if window_s else ""
+
+    with _LOCK, _db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if event_key:
+                row = conn.execute(
+                    "SELECT id FROM mail_jobs WHERE event_key = ? AND state IN (?, ?) LIMIT 1",
+                    (event_key, PENDING, SENDING),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return str(row["id"])
+
+            next_try_at = now
+            if dkey:
+                row = conn.execute(
+                    "SELECT MIN(next_try_at) AS t FROM mail_jobs WHERE digest_key = ? AND state = ? AND attempts = 0",
+                    (dkey, PENDING),
+                ).fetchone()
+                next_try_at = float(row["t"]) if row is not None and row["t"] is not None else now + window_s
+
+            job_id = f"mail_{uuid.uuid4().hex[:16]}"
+            conn.execute(
+                """
+                INSERT INTO mail_jobs (id, state, created_at, updated_at, next_try_at, event_key, event_type,
+                                       request_id, to_email, subject, text_body, html_body, meta_json, digest_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    job_id,
+                    PENDING,
+                    now,
+                    now,
+                    next_try_at,
+                    event_key,
+                    (event_type or "").strip(),
+                    (request_id or "").strip(),
+                    (to_email or "").strip(),
+                    subject or "",
+                    text_body or "",
+                    html_body or "",
+                    json.dumps(meta or {}, ensure_ascii=False),
+                    dkey,
+                ),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    ensure_worker()
+    _WAKE.set()
+    return job_id
+
+
+# ----------------------------
+# Delivery
+# ----------------------------
+def _claim_due(now: float, limit: int) -> List[Dict[str, Any]]:
+    """
+    Atomically move due jobs to SENDING (safe with several worker processes).
+    """
+    with _db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE mail_jobs SET state = ?, updated_at = ? WHERE state = ? AND updated_at < ?",
+                (PENDING, now, SENDING, now - SENDING_LEASE_S),
+            )
+            rows = conn.execute(
+                "SELECT * FROM mail_jobs WHERE state = ? AND next_try_at <= ? ORDER BY next_try_at LIMIT ?",
+                (PENDING, now, limit),
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE mail_jobs SET state = ?, updated_at = ? WHERE id = ?",
+                    [(SENDING, now, r["id"]) for r in rows],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return [_row_to_job(r) for r in rows]
+
+
+def _finish(job: Dict[str, Any], state: str, *, mode: str = "", error: str = "") -> str:
+    now = time.time()
+    attempts = int(job.get("attempts") or 0)
+    next_try_at = now
+    if state == FAILED:
+        attempts += 1
+        if attempts < MAX_ATTEMPTS:
+            state = PENDING
+            next_try_at = now + _backoff_s(attempts)
+
+    with _db() as conn:
+        conn.execute(
+            """
+            UPDATE mail_jobs
+               SET state = ?, attempts = ?, next_try_at = ?, updated_at = ?, mail_mode = ?, last_error = ?
+             WHERE id = ?
+            """,
+            (state, attempts, next_try_at, now, mode, (error or "")[:500], job["id"]),
+        )
+    return state
+
+
+def _log_mail_event(job: Dict[str, Any], status: str, *, mode: str = "", ok: Optional[bool] = None, error: str = "") -> None:
+    if not job.get("event_key"):
+        return
+    from everskills.services.mail_events import log_event  # local import to avoid cycles
+
+    log_event(
+        event_key=job["event_key"],
+        event_type=job.get("event_type") or "",
+        request_id=job.get("request_id") or "",
+        to_email=job.get("to_email") or "",
+        subject=job.get("subject") or "",
+        status=status,
+        mail_mode=mode,
+        mail_ok=ok,
+        error=error or None,
+    )
+
+
+def process_due(now: Optional[float] = None) -> int:
+    """
+    Send every due job once (one pooled SMTP session per batch).
+    Returns the number of jobs attempted. Safe to call from a CLI or a test.
+    """
+    from everskills.services.mail_events import claim  # local import to avoid cycles
+    from everskills.services.mailer import send_many
+
+    now = time.time() if now is None else now
+    total = 0
+    while True:
+        jobs = _claim_due(now, BATCH_SIZE)
+        if not jobs:
+            return total
+        total += len(jobs)
+
+        claimed: List[Dict[str, Any]] = []
+        for job in jobs:
+            if job.get("event_key") and not claim(job["event_key"]):
+                _finish(job, SKIPPED, error="already_sent")
+                _log_mail_event(job, "SKIPPED", error="already_sent")
+            else:
+                claimed.append(job)
+
+        # one message per job, or per digest group (every job of the group shares its result)
+        groups: List[List[Dict[str, Any]]] = []
+        by_digest: Dict[str, List[Dict[str, Any]]] = {}
+        for job in claimed:
+            dkey = job.get("digest_key") or ""
+            if not dkey:
+                groups.append([job])
+            elif dkey in by_digest:
+                by_digest[dkey].append(job)
+            else:
+                by_digest[dkey] = [job]
+                groups.append(by_digest[dkey])
+
+        messages: List[Dict[str, Any]] = []
+        for group in groups:
+            first = group[0]
+            if len(group) == 1:
+                subject, text_body, html_body = first["subject"], first["text_body"], first.get("html_body") or None
+                meta = first.get("meta") or {}
+            else:
+                group.sort(key=lambda j: float(j.get("created_at") or 0))
+                subject, text_body, html_body = render_digest(first.get("event_type") or "", group)
+                meta = {"digest": first.get("digest_key"), "event_keys": [j.get("event_key") for j in group]}
+            messages.append(
+                {
+                    "to_email": first["to_email"],
+                    "subject": subject,
+                    "text_body": text_body,
+                    "html_body": html_body or None,
+                    "meta": meta,
+                }
+            )
+
+        try:
+            results = send_many(messages)
+        except Exception as e:
+            results = [{"ok": False, "mode": "", "details": str(e)} for _ in messages]
+
+        for group, res in zip(groups, results):
+            ok = bool(res.get("ok"))
+            mode = str(res.get("mode", "")) + ("+digest" if len(group) > 1 else "")
+            details = "" if ok else str(res.get("details", ""))
+            for job in group:
+                _finish(job, SENT if ok else FAILED, mode=mode, error=details)
+                _log_mail_event(job, "SENT" if ok else "FAILED", mode=mode, ok=ok, error=details)
+
+
+def _next_wakeup_s() -> float:
+    try:
+        with _db() as conn:
+            row = conn.execute("SELECT MIN(next_try_at) AS t FROM mail_jobs WHERE state = ?", (PENDING,)).fetchone()
+    except Exception:
+        return 30.0
+    if row is None or row["t"] is None:
+        return 30.0
+    return max(0.2, min(float(row["t"]) - time.time(), 30.0))
+
+
+def _worker_loop() -> None:
+    while True:
+        try:
+            process_due()
+        except Exception:
+            pass
+        _WAKE.wait(timeout=_next_wakeup_s())
+        _WAKE.clear()
+
+
+def ensure_worker() -> None:
+    """
+    Start the background sender thread once per process.
+    """
+    global _WORKER
+    with _LOCK:
+        if _WORKER is not None and _WORKER.is_alive():
+            return
+        _WORKER = threading.Thread(target=_worker_loop, name="mail-queue", daemon=True)
+        _WORKER.start()
+
+
+# ----------------------------
+# Public API
+# ----------------------------
+def enqueue_email(
+    *,
+    to_email: str,
+    subject: str,
+    text_body: str,
+    html_body: Optional[str] = None,
+    meta: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Non-blocking send_email: returns the job id at once.
+    """
+    return _enqueue(to_email=to_email, subject=subject, text_body=text_body, html_body=html_body, meta=meta)
+
+
+def enqueue_send_once(
+    *,
+    event_key: str,
+    event_type: str,
+    request_id: str,
+    to_email: str,
+    subject: str,
+    text_body: str,
+    html_body: Optional[str] = None,
+    meta: Optional[Dict[str, Any]] = None,
+    digest: bool = False,
+) -> str:
+    """
+    Non-blocking send_once: the idempotency claim (mail_events) is taken at send time,
+    and the event is logged SENT / FAILED / SKIPPED by the worker.
+    digest=True: may be merged with other notifications of the same family for the
+    same recipient (mail_digest windows); every event_key is still logged SENT.
+    """
+    return _enqueue(
+        to_email=to_email,
+        subject=subject,
+        text_body=text_body,
+        html_body=html_body,
+        meta=meta,
+        event_key=event_key,
+        event_type=event_type,
+        request_id=request_id,
+        digest=digest,
+    )
+
+
+def job_status(job_id: str) -> Dict[str, Any]:
+    """
+    {id, state, attempts, last_error, next_try_at, mail_mode} or {} if unknown.
+    """
+    with _db() as conn:
+        row = conn.execute(
+            "SELECT id, state, attempts, last_error, next_try_at, mail_mode, to_email, subject FROM mail_jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+    return dict(row) if row is not None else {}
+
+
+def queue_stats() -> Dict[str, int]:
+    with _db() as conn:
+        rows = conn.execute("SELECT state, COUNT(*) AS n FROM mail_jobs GROUP BY state").fetchall()
+    return {str(r["state"]): int(r["n"]) for r in rows}
+
+
+def recent_jobs(limit: int = 50, *, state: str = "") -> List[Dict[str, Any]]:
+    sql = "SELECT * FROM mail_jobs"
+    args: List[Any] = []
+    if state:
+        sql += " WHERE state = ?"
+        args.append(state)
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    args.append(int(limit))
+    with _db() as conn:
+        rows = conn.execute(sql, args).fetchall()
+    return [_row_to_job(r) for r in rows]
+
+
+def retry_job(job_id: str) -> bool:
+    """
+    Put a FAILED job back in the queue (manual retry from the UI).
+    """
+    now = time.time()
+    with _db() as conn:
+        cur = conn.execute(
+            "UPDATE mail_jobs SET state = ?, attempts = 0, next_try_at = ?, updated_at = ? WHERE id = ? AND state = ?",
+            (PENDING, now, now, job_id, FAILED),
+        )
+    if cur.rowcount != 1:
+        return False
+    ensure_worker()
+    _WAKE.set()
+    return True
+
+
+# ----------------------------
+# CLI: dedicated worker process
+# ----------------------------
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="EVERSKILLS mail queue worker")
+    ap.add_argument("--once", action="store_true", help="drain due jobs once and exit")
+    args = ap.parse_args(argv)
+
+    if args.once:
+        print(f"{process_due()} job(s) processed")
+        return
+
+    while True:
+        process_due()
+        time.sleep(_next_wakeup_s())
+
+
+if __name__ == "__main__":
+    main()
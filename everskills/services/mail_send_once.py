@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, Optional
 
-from everskills.services.mail_events import log_event, was_sent
+from everskills.services.mail_events import claim, log_event
 from everskills.services.mailer import send_email
 
 
@@ -17,7 +17,8 @@ def send_once(
     html_body: Optional[str] = None,
     meta: Optional[Dict[str, Any]] = None,
 ) -> bool:
-    if was_sent(event_key):
+    # atomic check-and-claim: two concurrent calls (or processes) cannot both send
+    if not claim(event_key):
         log_event(
             event_key=event_key,
             event_type=event_type,
@@ -1,16 +1,21 @@
 # everskills/services/mailer.py
 from __future__ import annotations
 
+import atexit
 import json
 import smtplib
 import ssl
+import threading
+import time
+from contextlib import ExitStack, contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from email.message import EmailMessage
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-import streamlit as st
+from everskills.services.rotating_jsonl import RotatingJSONL
+from everskills.services.settings import get_settings
 
 
 # ----------------------------
@@ -19,71 +24,61 @@ import streamlit as st
 THIS_FILE = Path(__file__).resolve()
 PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
 DATA_DIR = PROJECT_ROOT / "data"
-OUTBOX_PATH = DATA_DIR / "emails_outbox.json"
+OUTBOX_PATH = DATA_DIR / "emails_outbox.jsonl"
+# Before rotation: one pretty-printed JSON array, rewritten per email (read-only now).
+LEGACY_OUTBOX_PATH = DATA_DIR / "emails_outbox.json"
+
+OUTBOX_MAX_BYTES = 5 * 1024 * 1024
+OUTBOX_MAX_AGE_S = 7 * 24 * 3600.0
 
 
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def _ensure_data_dir() -> None:
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
+_OUTBOX: Optional[RotatingJSONL] = None
+
+
+def get_outbox() -> RotatingJSONL:
+    global _OUTBOX
+    if _OUTBOX is None or _OUTBOX.path != OUTBOX_PATH:
+        _OUTBOX = RotatingJSONL(
+            OUTBOX_PATH,
+            max_bytes=OUTBOX_MAX_BYTES,
+            max_age_s=OUTBOX_MAX_AGE_S,
+            gzip_rotated=get_settings().email_outbox_gzip,
+        )
+    return _OUTBOX
 
 
 def _append_outbox(item: Dict[str, Any]) -> None:
-    _ensure_data_dir()
-    existing = []
-    if OUTBOX_PATH.exists():
-        try:
-            raw = OUTBOX_PATH.read_text(encoding="utf-8")
-            existing = json.loads(raw) if raw.strip() else []
-        except Exception:
-            existing = []
-    if not isinstance(existing, list):
-        existing = []
-    existing.append(item)
-    OUTBOX_PATH.write_text(json.dumps(existing, ensure_ascii=False, indent=2), encoding="utf-8")
+    try:
+        get_outbox().append(item)
+    except Exception:
+        # the outbox is a trace, never a reason to fail a send
+        pass
 
 
-def _get_secret_str(*keys: str, default: str = "") -> str:
+def iter_outbox(*, since_ts: float = 0.0) -> Iterator[Dict[str, Any]]:
     """
-    Returns the first non-empty secret among keys.
+    Stream every outbox item, oldest first (legacy JSON array, then JSONL segments).
     """
-    for k in keys:
-        v = st.secrets.get(k)
-        if v is None:
-            continue
-        s = str(v).strip()
-        if s:
-            return s
-    return default
-
-
-def _get_secret_int(*keys: str, default: int) -> int:
-    for k in keys:
-        v = st.secrets.get(k)
-        if v is None:
-            continue
+    if LEGACY_OUTBOX_PATH.exists() and not since_ts:
         try:
-            return int(v)
+            legacy = json.loads(LEGACY_OUTBOX_PATH.read_text(encoding="utf-8") or "[]")
         except Exception:
-            continue
-    return default
-
-
-def _get_secret_bool(*keys: str, default: bool) -> bool:
-    for k in keys:
-        v = st.secrets.get(k)
-        if v is None:
-            continue
-        if isinstance(v, bool):
-            return v
-        s = str(v).strip().lower()
-        if s in {"true", "1", "yes", "y", "on"}:
-            return True
-        if s in {"false", "0", "no", "n", "off"}:
-            return False
-    return default
+            legacy = []
+        for it in legacy if isinstance(legacy, list) else []:
+            if isinstance(it, dict):
+                yield it
+    yield from get_outbox().iter_records(since_ts=since_ts)
+
+
+def outbox_tail(n: int = 100) -> List[Dict[str, Any]]:
+    """
+    Last n outbox items, newest first.
+    """
+    return get_outbox().tail(n)
 
 
 @dataclass
@@ -94,11 +89,12 @@ class SMTPConfig:
     password: str
     email_from: str
     starttls: bool
+    ca_file: str = ""  # extra CA bundle for STARTTLS (private relay / local sink)
 
 
 def get_smtp_config() -> Optional[SMTPConfig]:
     """
-    Reads SMTP config from Streamlit secrets.
+    SMTP config from the process settings (everskills/services/settings.py).
 
     Backward compatible keys (old + new):
 
@@ -122,28 +118,20 @@ def get_smtp_config() -> Optional[SMTPConfig]:
 
     TLS:
       - SMTP_STARTTLS (new, optional) default True for port 587
+      - SMTP_CA_FILE (optional) CA bundle trusted for STARTTLS
     """
-    host = _get_secret_str("SMTP_HOST")
-    port = _get_secret_int("SMTP_PORT", default=587)
-    user = _get_secret_str("SMTP_USER")
-
-    password = _get_secret_str("SMTP_PASS", "SMTP_PASSWORD")
-    email_from = _get_secret_str("EMAIL_FROM", "SMTP_FROM_EMAIL", default=user)
-
-    # Default behavior: STARTTLS True on 587, else False unless explicitly set
-    default_starttls = True if port == 587 else False
-    starttls = _get_secret_bool("SMTP_STARTTLS", default=default_starttls)
-
-    if not host or not user or not password:
+    s = get_settings()
+    if not s.smtp_configured:
         return None
 
     return SMTPConfig(
-        host=host,
-        port=port,
-        user=user,
-        password=password,
-        email_from=email_from,
-        starttls=starttls,
+        host=s.smtp_host,
+        port=s.smtp_port,
+        user=s.smtp_user,
+        password=s.smtp_password,
+        email_from=s.email_from,
+        starttls=s.smtp_starttls,
+        ca_file=s.smtp_ca_file,
     )
 
 
@@ -151,47 +139,214 @@ def smtp_is_configured() -> bool:
     return get_smtp_config() is not None
 
 
-def send_email(
-    *,
-    to_email: str,
-    subject: str,
-    text_body: str,
-    html_body: Optional[str] = None,
-    meta: Optional[Dict[str, Any]] = None,
-) -> Dict[str, Any]:
+# ----------------------------
+# SMTP connection pool
+# ----------------------------
+POOL_MAX_CONNECTIONS = 2
+POOL_IDLE_TIMEOUT_S = 60.0  # servers drop idle sessions after ~1-5 min
+POOL_NOOP_AFTER_S = 5.0  # health-check a session idle for longer than this
+POOL_MAX_MESSAGES = 100  # per session, then reconnect (provider limits)
+SMTP_TIMEOUT_S = 30
+
+# Refusals of one message: the session stays usable (RSET), no retry.
+_MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class SMTPUnavailable(OSError):
+    """
+    No session could be opened (connect / STARTTLS / LOGIN failed): the rest of a
+    batch would fail the same way, after the same timeout.
     """
-    Sends an email via SMTP if configured, otherwise writes into data/emails_outbox.json.
 
-    Returns a dict:
-      {"ok": True/False, "mode": "smtp"|"outbox"|"none", "details": "..."}
+
+@dataclass
+class _PooledSession:
+    server: smtplib.SMTP
+    created_at: float
+    last_used: float
+    sent: int = 0
+
+
+class SMTPPool:
+    """
+    Small pool of authenticated SMTP sessions (EHLO/STARTTLS/LOGIN done once per session).
+    - idle sessions expire after idle_timeout_s
+    - sessions idle for a few seconds are checked with NOOP before reuse
+    - a session is recycled after max_messages
+    - a broken session is dropped and the message retried once on a fresh one
     """
-    to_email = (to_email or "").strip()
-    if not to_email:
-        return {"ok": False, "mode": "none", "details": "Missing to_email"}
 
-    meta = meta or {}
-    cfg = get_smtp_config()
+    def __init__(
+        self,
+        cfg: SMTPConfig,
+        *,
+        max_connections: int = POOL_MAX_CONNECTIONS,
+        idle_timeout_s: float = POOL_IDLE_TIMEOUT_S,
+        max_messages: int = POOL_MAX_MESSAGES,
+        timeout_s: float = SMTP_TIMEOUT_S,
+    ) -> None:
+        self.cfg = cfg
+        self.idle_timeout_s = idle_timeout_s
+        self.max_messages = max_messages
+        self.timeout_s = timeout_s
+        self._idle: List[_PooledSession] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, max_connections))
+
+    # --- sessions
+    def _connect(self) -> _PooledSession:
+        server = smtplib.SMTP(self.cfg.host, self.cfg.port, timeout=self.timeout_s)
+        try:
+            server.ehlo()
+            if self.cfg.starttls:
+                server.starttls(context=ssl.create_default_context(cafile=self.cfg.ca_file or None))
+                server.ehlo()
+            server.login(self.cfg.user, self.cfg.password)
+        except Exception:
+            _quit_quietly(server)
+            raise
+        now = time.monotonic()
+        return _PooledSession(server=server, created_at=now, last_used=now)
+
+    def _healthy(self, sess: _PooledSession) -> bool:
+        now = time.monotonic()
+        if now - sess.last_used > self.idle_timeout_s or sess.sent >= self.max_messages:
+            return False
+        if now - sess.last_used <= POOL_NOOP_AFTER_S:
+            return True
+        try:
+            code, _ = sess.server.noop()
+            return code == 250
+        except Exception:
+            return False
 
-    # Always log intent (useful for end-to-end debugging)
-    outbox_item = {
-        "ts": now_iso(),
-        "to": to_email,
-        "subject": subject,
-        "text_body": text_body,
-        "html_body": html_body or "",
-        "meta": meta,
-    }
+    def _checkout(self) -> _PooledSession:
+        while True:
+            with self._lock:
+                sess = self._idle.pop() if self._idle else None
+            if sess is None:
+                return self._connect()
+            if self._healthy(sess):
+                return sess
+            _quit_quietly(sess.server)
+
+    def _checkin(self, sess: _PooledSession) -> None:
+        sess.last_used = time.monotonic()
+        if sess.sent >= self.max_messages:
+            _quit_quietly(sess.server)
+            return
+        with self._lock:
+            self._idle.append(sess)
+
+    @contextmanager
+    def session(self) -> Iterator["_SessionHandle"]:
+        """
+        Borrow one session for a batch (blocks while all slots are busy).
+        """
+        self._slots.acquire()
+        handle = _SessionHandle(self)
+        try:
+            yield handle
+        finally:
+            handle.release()
+            self._slots.release()
+
+    def send(self, msg: EmailMessage) -> None:
+        with self.session() as h:
+            h.send(msg)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sess in idle:
+            _quit_quietly(sess.server)
+
+
+class _SessionHandle:
+    """
+    One borrowed session; transparently reconnects when the server drops it.
+    """
+
+    def __init__(self, pool: SMTPPool) -> None:
+        self.pool = pool
+        self.sess: Optional[_PooledSession] = None
+
+    def send(self, msg: EmailMessage) -> None:
+        for attempt in range(2):
+            if self.sess is None or self.sess.sent >= self.pool.max_messages:
+                self.release()
+                try:
+                    self.sess = self.pool._checkout()
+                except Exception as e:
+                    raise SMTPUnavailable(str(e) or type(e).__name__) from e
+            try:
+                self.sess.server.send_message(msg)
+                self.sess.sent += 1
+                self.sess.last_used = time.monotonic()
+                return
+            except _MESSAGE_ERRORS:
+                try:
+                    self.sess.server.rset()
+                except Exception:
+                    _quit_quietly(self.sess.server)
+                    self.sess = None
+                raise
+            except OSError:
+                # disconnect / timeout / protocol error (SMTPException is an OSError):
+                # drop the session and retry once on a fresh one
+                _quit_quietly(self.sess.server)
+                self.sess = None
+                if attempt:
+                    raise
+
+    def release(self) -> None:
+        if self.sess is not None:
+            self.pool._checkin(self.sess)
+            self.sess = None
+
+
+def _quit_quietly(server: smtplib.SMTP) -> None:
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+_POOLS: Dict[Tuple[str, int, str, str, bool, str], SMTPPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_smtp_pool(cfg: SMTPConfig) -> SMTPPool:
+    """
+    Process-wide pool per SMTP config (a secrets change gets a new pool).
+    """
+    key = (cfg.host, cfg.port, cfg.user, cfg.password, cfg.starttls, cfg.ca_file)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = SMTPPool(cfg)
+            _POOLS[key] = pool
+        return pool
 
-    # If no SMTP config -> outbox
-    if not cfg:
-        _append_outbox({**outbox_item, "mode": "outbox", "sent": False})
-        return {
-            "ok": True,
-            "mode": "outbox",
-            "details": f"SMTP not configured. Saved to {OUTBOX_PATH}",
-        }
 
-    # Build message
+def close_smtp_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_smtp_pools)
+
+
+# ----------------------------
+# Sending
+# ----------------------------
+def _build_message(cfg: SMTPConfig, to_email: str, subject: str, text_body: str, html_body: Optional[str]) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = cfg.email_from
     msg["To"] = to_email
@@ -203,24 +358,107 @@ def send_email(
     # Optional HTML part
     if html_body and html_body.strip():
         msg.add_alternative(html_body, subtype="html")
+    return msg
 
-    # Send
-    context = ssl.create_default_context()
-    try:
-        with smtplib.SMTP(cfg.host, cfg.port, timeout=30) as server:
-            server.ehlo()
 
-            if cfg.starttls:
-                server.starttls(context=context)
-                server.ehlo()
+def _outbox_item(to_email: str, subject: str, text_body: str, html_body: Optional[str], meta: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ts": now_iso(),
+        "to": to_email,
+        "subject": subject,
+        "text_body": text_body,
+        "html_body": html_body or "",
+        "meta": meta,
+    }
 
-            server.login(cfg.user, cfg.password)
-            server.send_message(msg)
 
-        _append_outbox({**outbox_item, "mode": "smtp", "sent": True})
-        return {"ok": True, "mode": "smtp", "details": "Email sent via SMTP"}
+def send_email(
+    *,
+    to_email: str,
+    subject: str,
+    text_body: str,
+    html_body: Optional[str] = None,
+    meta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Sends an email via SMTP if configured, otherwise writes into data/emails_outbox.jsonl.
+    SMTP sessions are pooled (see SMTPPool).
 
-    except Exception as e:
-        # Fallback: keep trace in outbox
-        _append_outbox({**outbox_item, "mode": "smtp", "sent": False, "error": str(e)})
-        return {"ok": False, "mode": "smtp", "details": f"SMTP error: {e}"}  # noqa: TRY003
+    Returns a dict:
+      {"ok": True/False, "mode": "smtp"|"outbox"|"none", "details": "..."}
+    """
+    return send_many(
+        [
+            {
+                "to_email": to_email,
+                "subject": subject,
+                "text_body": text_body,
+                "html_body": html_body,
+                "meta": meta,
+            }
+        ]
+    )[0]
+
+
+def send_many(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Sends several emails over one pooled SMTP session (no handshake per message).
+    Each item takes the send_email kwargs (to_email, subject, text_body, html_body, meta).
+    Returns one send_email-style result per item, in order.
+    Once the SMTP server cannot be reached, the remaining items are only logged to
+    the outbox (sent=False) instead of each waiting for its own connect timeout.
+    """
+    cfg = get_smtp_config()
+    results: List[Dict[str, Any]] = []
+    handle: Optional[_SessionHandle] = None
+    unavailable = ""
+    pool = get_smtp_pool(cfg) if cfg else None
+
+    with ExitStack() as stack:
+        for m in messages:
+            to_email = str(m.get("to_email") or "").strip()
+            subject = str(m.get("subject") or "")
+            text_body = str(m.get("text_body") or "")
+            html_body = m.get("html_body")
+            meta = m.get("meta") or {}
+
+            if not to_email:
+                results.append({"ok": False, "mode": "none", "details": "Missing to_email"})
+                continue
+
+            # Always log intent (useful for end-to-end debugging)
+            outbox_item = _outbox_item(to_email, subject, text_body, html_body, meta)
+
+            # If no SMTP config -> outbox
+            if not cfg or pool is None:
+                _append_outbox({**outbox_item, "mode": "outbox", "sent": False})
+                results.append(
+                    {
+                        "ok": True,
+                        "mode": "outbox",
+                        "details": f"SMTP not configured. Saved to {OUTBOX_PATH}",
+                    }
+                )
+                continue
+
+            if unavailable:
+                _append_outbox({**outbox_item, "mode": "smtp", "sent": False, "error": unavailable})
+                results.append({"ok": False, "mode": "smtp", "details": f"SMTP unavailable: {unavailable}"})
+                continue
+
+            try:
+                if handle is None:
+                    handle = stack.enter_context(pool.session())
+                handle.send(_build_message(cfg, to_email, subject, text_body, html_body))
+                _append_outbox({**outbox_item, "mode": "smtp", "sent": True})
+                results.append({"ok": True, "mode": "smtp", "details": "Email sent via SMTP"})
+            except SMTPUnavailable as e:
+                unavailable = str(e)
+                _append_outbox({**outbox_item, "mode": "smtp", "sent": False, "error": unavailable})
+                results.append({"ok": False, "mode": "smtp", "details": f"SMTP unavailable: {unavailable}"})
+            except Exception as e:
+                # Fallback: keep trace in outbox
+                _append_outbox({**outbox_item, "mode": "smtp", "sent": False, "error": str(e)})
+                results.append({"ok": False, "mode": "smtp", "details": f"SMTP error: {e}"})
+
+    return results
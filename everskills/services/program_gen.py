@@ -0,0 +1,583 @@
+# everskills/services/program_gen.py
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from everskills.services import content_cache, llm_gateway
+from everskills.services.content_cache import ContentCache, make_key
+from everskills.services.settings import get_settings
+
+# Program generation (Coach Space "Générer"): prompt, streamed LLM call, and a cache
+# of generated programs keyed by everything that determines the output:
+# (objective, context, weeks, model, prompt version). Each key keeps up to
+# PROGRAM_VARIANTS drafts so coaches can flip between them without a new call.
+# Structured mode (PROGRAM_STRUCTURED, on by default): the model answers a JSON
+# program (PROGRAM_SCHEMA), validated once; program_text is rendered from it and the
+# weekly_plan is filled from its weeks. The regex parsing of free text stays for
+# hand-edited programs (and for PROGRAM_STRUCTURED=false). A model that rejects
+# response_format (HTTP 400) is retried once with the text prompt and stays in text
+# mode for the life of the process (_TEXT_ONLY), so one unsupported model does not
+# break "Générer" nor the background drafts.
+# File is independent (no streamlit import): also used by background workers
+# (program_pregen).
+
+# Bump when the prompt (or system prompt) changes: cached programs are keyed on it.
+PROMPT_VERSION = "v1"
+STRUCTURED_PROMPT_VERSION = "s1"
+SYSTEM_PROMPT = "Tu es un coach RH exigeant, pragmatique et bienveillant."
+MAX_TOKENS = 900
+STRUCTURED_MAX_TOKENS = 1400  # JSON keys / quotes cost tokens, and a cut JSON is lost entirely
+TEMPERATURE = 0.4
+MAX_ACTIONS = 3
+
+PROGRAM_VARIANTS = 5
+PROGRAM_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+# strict structured outputs: every property required, no extra keys (counts are checked
+# by validate_program: minItems / maxItems are not enforced by every model)
+PROGRAM_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": ["smart_objective", "axes", "weeks", "learner_message"],
+    "properties": {
+        "smart_objective": {"type": "string"},
+        "axes": {"type": "array", "items": {"type": "string"}},
+        "weeks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["week", "objective", "actions", "reminder", "indicator"],
+                "properties": {
+                    "week": {"type": "integer"},
+                    "objective": {"type": "string"},
+                    "actions": {"type": "array", "items": {"type": "string"}},
+                    "reminder": {"type": "string"},
+                    "indicator": {"type": "string"},
+                },
+            },
+        },
+        "learner_message": {"type": "string"},
+    },
+}
+
+
+class ProgramFormatError(ValueError):
+    """The structured answer is not a usable program (bad JSON, missing weeks...)."""
+
+
+_TEXT_ONLY: Set[str] = set()  # models that answered 400 to response_format
+_TEXT_ONLY_LOCK = threading.Lock()
+
+
+def structured_mode(model: str = "") -> bool:
+    if not get_settings().program_structured:
+        return False
+    with _TEXT_ONLY_LOCK:
+        return (model or llm_gateway.default_model()) not in _TEXT_ONLY
+
+
+def prompt_version(model: str = "") -> str:
+    return STRUCTURED_PROMPT_VERSION if structured_mode(model) else PROMPT_VERSION
+
+
+def _unsupported_structured(e: Exception) -> bool:
+    msg = str(e).lower()
+    return (
+        isinstance(e, llm_gateway.LLMError)
+        and getattr(e, "status", 0) == 400
+        and ("response_format" in msg or "json_schema" in msg)
+    )
+
+
+def _text_only(model: str) -> None:
+    with _TEXT_ONLY_LOCK:
+        _TEXT_ONLY.add(model)
+
+
+def build_program_prompt(objective: str, context: str, weeks: int, *, structured: bool = False) -> str:
+    answer = (
+        f"Réponds uniquement en JSON (schéma everskills_program) : exactement {weeks} semaines numérotées de 1 à {weeks}, "
+        f"2–{MAX_ACTIONS} actions par semaine, learner_message sur 3 lignes."
+        if structured
+        else "Réponds en texte clair (pas de JSON)."
+    )
+    return f"""
+Tu es un coach RH. Tu dois produire un programme EVERSKILLS simple, concret et actionnable.
+
+Objectif de progression : {objective}
+Contexte : {context}
+Durée : {weeks} semaines
+
+Contraintes :
+- Format court, lisible, en français.
+- 1 objectif SMART.
+- 3 axes maximum.
+- Un rythme hebdomadaire.
+- Pour chaque semaine :
+  - 1 objectif de semaine
+  - 2–3 actions terrain (très concrètes)
+  - 1 rappel de connaissance
+  - 1 indicateur
+- Termine par : "Message à l’apprenant" (3 lignes, ton coach).
+
+{answer}
+""".strip()
+
+
+def _request(objective: str, context: str, weeks: int, structured: bool) -> Dict[str, Any]:
+    out: Dict[str, Any] = {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_program_prompt(objective, context, weeks, structured=structured)},
+        ],
+        "temperature": TEMPERATURE,
+        "max_tokens": STRUCTURED_MAX_TOKENS if structured else MAX_TOKENS,
+    }
+    if structured:
+        out["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {"name": "everskills_program", "strict": True, "schema": PROGRAM_SCHEMA},
+        }
+    return out
+
+
+def generate_program(
+    objective: str, context: str, weeks: int, *, model: str = "", timeout_s: float = 120.0
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Whole program in one (non-streamed) call: for background workers, nobody watches the tokens.
+    Returns (program_text, program); program is None in free-text mode.
+    """
+    model = model or llm_gateway.default_model()
+    structured = structured_mode(model)
+    try:
+        res = llm_gateway.chat(model=model, timeout_s=timeout_s, **_request(objective, context, weeks, structured))
+    except llm_gateway.LLMError as e:
+        if not (structured and _unsupported_structured(e)):
+            raise
+        _text_only(model)
+        structured = False
+        res = llm_gateway.chat(model=model, timeout_s=timeout_s, **_request(objective, context, weeks, structured))
+    if not structured:
+        return res.text.strip(), None
+    return _finish_structured(res.text, weeks)
+
+
+def _finish_structured(raw: str, weeks: int) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    (program_text, program) of a complete structured answer. An answer that does not
+    validate (a week missing, JSON cut by max_tokens...) is kept as text, program None:
+    the weekly_plan then comes from the regex parsing, like a hand-edited program.
+    """
+    try:
+        program = parse_program_json(raw, weeks)
+    except ProgramFormatError:
+        return (render_partial_program(raw) or (raw or "").strip()), None
+    return render_program_text(program), program
+
+
+@dataclass
+class StreamedProgram:
+    """
+    One step of stream_program. `text` is rendered on first access only: rendering the
+    partial JSON re-reads the whole buffer, so callers read it when they draw, not on
+    every delta.
+    """
+
+    raw: str  # answer so far (JSON in structured mode)
+    structured: bool
+    done: bool = False
+    program: Optional[Dict[str, Any]] = None  # last item, structured mode, when it validates
+    _text: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = render_partial_program(self.raw) if self.structured else self.raw
+        return self._text
+
+
+def stream_program(objective: str, context: str, weeks: int, *, model: str = "") -> Iterator[StreamedProgram]:
+    """
+    Yields a StreamedProgram per chunk; in structured mode its text is rendered from the
+    partial JSON. The last item has done=True and carries the validated program (None
+    in free-text mode, or when the answer does not validate: its text is kept, see
+    _finish_structured). Closing the generator (cancel) closes the HTTP stream, so the
+    rest of the completion is not generated for nothing.
+    """
+    model = model or llm_gateway.default_model()
+    structured = structured_mode(model)
+    stream = llm_gateway.chat_stream(model=model, **_request(objective, context, weeks, structured))
+    raw = ""
+    try:
+        try:
+            first = next(stream, "")  # the request is sent here: a 400 comes before any delta
+        except llm_gateway.LLMError as e:
+            if not (structured and _unsupported_structured(e)):
+                raise
+            _text_only(model)
+            structured = False
+            stream = llm_gateway.chat_stream(model=model, **_request(objective, context, weeks, structured))
+            first = next(stream, "")
+        if first:
+            raw = first
+            yield StreamedProgram(raw=raw, structured=structured)
+        for delta in stream:
+            raw += delta
+            yield StreamedProgram(raw=raw, structured=structured)
+    finally:
+        stream.close()
+    if structured:
+        text, program = _finish_structured(raw, weeks)
+        yield StreamedProgram(raw=raw, structured=True, done=True, program=program, _text=text)
+    else:
+        yield StreamedProgram(raw=raw, structured=False, done=True, _text=raw.strip())
+
+
+# ----------------------------
+# Structured program (JSON)
+# ----------------------------
+def _text(v: Any) -> str:
+    return " ".join(str(v or "").split())
+
+
+def validate_program(obj: Any, weeks: int) -> Dict[str, Any]:
+    """
+    Normalized program, or ProgramFormatError. Weeks are matched by number (position when
+    missing), extra weeks are dropped, every week 1..weeks needs an objective and an action.
+    """
+    if not isinstance(obj, dict):
+        raise ProgramFormatError("programme JSON : objet attendu")
+    raw_weeks = obj.get("weeks")
+    if not isinstance(raw_weeks, list):
+        raise ProgramFormatError("programme JSON : 'weeks' manquant")
+
+    by_week: Dict[int, Dict[str, Any]] = {}
+    for i, w in enumerate(raw_weeks):
+        if not isinstance(w, dict):
+            continue
+        try:
+            n = int(w.get("week") or i + 1)
+        except (TypeError, ValueError):
+            n = i + 1
+        if not 1 <= n <= weeks or n in by_week:
+            continue
+        actions = [_text(a) for a in w.get("actions") or [] if _text(a)] if isinstance(w.get("actions"), list) else []
+        by_week[n] = {
+            "week": n,
+            "objective": _text(w.get("objective")),
+            "actions": actions[:MAX_ACTIONS],
+            "reminder": _text(w.get("reminder")),
+            "indicator": _text(w.get("indicator")),
+        }
+
+    missing = [n for n in range(1, weeks + 1) if n not in by_week or not by_week[n]["objective"] or not by_week[n]["actions"]]
+    if missing:
+        raise ProgramFormatError(f"programme JSON : semaine(s) incomplète(s) {missing}")
+
+    axes = obj.get("axes") if isinstance(obj.get("axes"), list) else []
+    return {
+        "smart_objective": _text(obj.get("smart_objective")),
+        "axes": [_text(a) for a in axes if _text(a)][:3],
+        "weeks": [by_week[n] for n in range(1, weeks + 1)],
+        "learner_message": str(obj.get("learner_message") or "").strip(),
+    }
+
+
+def parse_program_json(raw: str, weeks: int) -> Dict[str, Any]:
+    s = (raw or "").strip()
+    if s.startswith("```"):
+        # some models wrap the JSON in a fence despite response_format
+        s = re.sub(r"^```(?:json)?\s*|\s*```$", "", s)
+    try:
+        obj = json.loads(s)
+    except ValueError as e:
+        raise ProgramFormatError(f"programme JSON illisible ({e})") from e
+    return validate_program(obj, weeks)
+
+
+def render_program_text(program: Dict[str, Any]) -> str:
+    """
+    The program as coach-editable text. Its week sections use the layout the regex
+    fallback reads ("Semaine N : objectif", numbered actions), so light edits still sync.
+    Tolerates partial programs (streaming).
+    """
+    lines: List[str] = []
+    if program.get("smart_objective"):
+        lines.append(f"Objectif SMART : {program['smart_objective']}")
+    axes = [a for a in program.get("axes") or [] if isinstance(a, str) and a.strip()]
+    if axes:
+        lines.append("Axes : " + " ; ".join(axes))
+    for w in program.get("weeks") or []:
+        if not isinstance(w, dict):
+            continue
+        lines += ["", f"Semaine {w.get('week', '?')} : {w.get('objective') or ''}".rstrip()]
+        actions = [a for a in w.get("actions") or [] if isinstance(a, str)]
+        if actions:
+            lines.append("Actions terrain :")
+            lines += [f"{i}. {a}" for i, a in enumerate(actions, start=1)]
+        if w.get("reminder"):
+            lines.append(f"Rappel : {w['reminder']}")
+        if w.get("indicator"):
+            lines.append(f"Indicateur : {w['indicator']}")
+    if program.get("learner_message"):
+        lines += ["", "Message à l’apprenant", str(program["learner_message"]).strip()]
+    return "\n".join(lines).strip()
+
+
+def complete_partial_json(raw: str) -> Any:
+    """
+    Best-effort value of a JSON prefix (a stream cut anywhere): open strings and
+    brackets are closed; a dangling key / comma is dropped. None when nothing parses.
+    """
+    stack: List[str] = []
+    cuts: List[Tuple[int, str]] = []  # (position of a top-level-of-its-container comma, closers there)
+    in_str = esc = False
+    for i, ch in enumerate(raw):
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+        elif ch == ",":
+            cuts.append((i, "".join(reversed(stack))))
+
+    closers = "".join(reversed(stack))
+    head = raw[:-1] if in_str and esc else raw
+    candidates = [head + ('"' if in_str else "") + closers]
+    if in_str:
+        candidates.append(head + '": null' + closers)  # the open string was a key
+    candidates += [raw[:i] + c for i, c in reversed(cuts[-3:])]
+    for cand in candidates:
+        try:
+            return json.loads(cand)
+        except ValueError:
+            continue
+    return None
+
+
+def render_partial_program(raw: str) -> str:
+    obj = complete_partial_json(raw)
+    return render_program_text(obj) if isinstance(obj, dict) else ""
+
+
+def program_weeks(program: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    [{"week", "objective", "actions", "indicator"}] of a validated program.
+    """
+    return [
+        {"week": w["week"], "objective": w["objective"], "actions": list(w["actions"]), "indicator": w.get("indicator", "")}
+        for w in program.get("weeks") or []
+    ]
+
+
+# ----------------------------
+# Free text -> weeks (fallback: hand-edited programs)
+# ----------------------------
+def program_hash(text: str) -> str:
+    return hashlib.md5((text or "").encode("utf-8")).hexdigest()
+
+
+def clean_md_line(line: str) -> str:
+    s = (line or "").strip()
+    s = re.sub(r"^\s*(?:[#>\-\*\u2022]+\s*)+", "", s)
+    s = s.strip()
+    s = re.sub(r"^\*{1,3}\s*(.*?)\s*\*{1,3}$", r"\1", s)
+    s = re.sub(r"^_{1,3}\s*(.*?)\s*_{1,3}$", r"\1", s)
+    return s.strip()
+
+
+def extract_week_sections(program_text: str) -> Dict[int, List[str]]:
+    text = (program_text or "").strip()
+    if not text:
+        return {}
+    lines = text.splitlines()
+    header_re = re.compile(r"(?i)^\s*semaine\s*(\d{1,2})\s*[:\-\.\u2013\u2014]\s*(.*)\s*$")
+    # closing block of the prompt's layout: not part of the last week
+    end_re = re.compile(r"(?i)^\s*message\s+(?:à|a)\s+l[’']apprenant\b")
+
+    sections: Dict[int, List[str]] = {}
+    current_week: Optional[int] = None
+
+    for raw in lines:
+        line = clean_md_line(raw)
+        if not line:
+            continue
+
+        if end_re.match(line):
+            current_week = None
+            continue
+
+        m = header_re.match(line)
+        if m:
+            wk = int(m.group(1))
+            if 1 <= wk <= 52:
+                current_week = wk
+                sections.setdefault(wk, [])
+                remainder = (m.group(2) or "").strip()
+                if remainder:
+                    sections[wk].append(remainder)
+            else:
+                current_week = None
+            continue
+
+        if current_week is not None:
+            sections[current_week].append(line)
+
+    return sections
+
+
+def pick_objective_and_actions(lines: List[str]) -> Tuple[str, List[str]]:
+    clean = [clean_md_line(ln) for ln in (lines or [])]
+    clean = [ln for ln in clean if ln.strip()]
+    if not clean:
+        return "", []
+
+    obj = ""
+    actions: List[str] = []
+
+    obj_re = re.compile(r"(?i)^\s*objectif(?:\s+de\s+la\s+semaine)?\s*:\s*(.*)$")
+    action_line_re = re.compile(r"^\s*(?:[-•]\s+|\d+\.\s+|\d+\)\s+)(.+)$")
+
+    for ln in clean[:15]:
+        m = obj_re.match(ln)
+        if m:
+            cand = (m.group(1) or "").strip()
+            if cand:
+                obj = cand
+                break
+    if not obj:
+        obj = clean[0].strip()
+
+    in_actions_block = False
+    for ln in clean:
+        if re.match(r"(?i)^\s*actions?\b\s*:?\s*$", ln) or re.match(r"(?i)^\s*actions?\s+terrain\s*:?\s*$", ln):
+            in_actions_block = True
+            continue
+
+        m = action_line_re.match(ln)
+        if m:
+            t = (m.group(1) or "").strip()
+            if t:
+                actions.append(t)
+        elif in_actions_block:
+            if len(ln) > 5 and not re.match(r"(?i)^(objectif|rappel|indicateur)\b", ln):
+                actions.append(ln.strip())
+
+        if len(actions) >= 3:
+            break
+
+    actions = [a for a in actions if a]
+    return obj.strip(), actions[:3]
+
+
+def pick_indicator(lines: List[str]) -> str:
+    for ln in lines or []:
+        m = re.match(r"(?i)^\s*indicateur\s*:\s*(.+)$", clean_md_line(ln))
+        if m:
+            return m.group(1).strip()
+    return ""
+
+
+def parse_program_weeks(program_text: str) -> List[Dict[str, Any]]:
+    """
+    [{"week", "objective", "actions", "indicator"}] for every "Semaine N" section, in week order.
+    """
+    out: List[Dict[str, Any]] = []
+    for wk, lines in sorted(extract_week_sections(program_text).items()):
+        obj, acts = pick_objective_and_actions(lines)
+        out.append({"week": wk, "objective": obj, "actions": acts, "indicator": pick_indicator(lines)})
+    return out
+
+
+# ----------------------------
+# Cache (N variants per input)
+# ----------------------------
+_WS_RE = re.compile(r"\s+")
+_LOCK = threading.Lock()
+_VARIANTS_LOCK = threading.Lock()  # read-modify-write of one key's variant list
+_CACHE: Optional[ContentCache] = None
+
+
+def _cache() -> ContentCache:
+    """
+    Own directory / budget under the content cache, so transcripts never evict programs.
+    """
+    global _CACHE
+    directory = content_cache.CACHE_DIR / "programs"
+    with _LOCK:
+        if _CACHE is None or _CACHE.directory != directory:
+            _CACHE = ContentCache(directory, max_bytes=PROGRAM_CACHE_MAX_BYTES)
+        return _CACHE
+
+
+def program_key(objective: str, context: str, weeks: int, model: str = "") -> str:
+    def norm(s: str) -> str:
+        return _WS_RE.sub(" ", (s or "").strip())
+
+    model = model or llm_gateway.default_model()
+    return make_key("program", norm(objective), norm(context), int(weeks), model, prompt_version(model))
+
+
+def _variants(entry: Any) -> List[Dict[str, Any]]:
+    variants = entry.get("variants") if isinstance(entry, dict) else None
+    return [v for v in variants or [] if isinstance(v, dict) and str(v.get("text") or "").strip()]
+
+
+def list_variants(key: str) -> List[Dict[str, Any]]:
+    """
+    Variants for key, oldest first: [{"text", "created_at", "model", "program"?}] (no hit / miss counted).
+    """
+    return _variants(_cache().peek(key))
+
+
+def cached_program(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Latest variant for key, counted as a cache hit (an LLM call saved) or miss.
+    """
+    variants = _variants(_cache().get(key))
+    return variants[-1] if variants else None
+
+
+def add_variant(key: str, text: str, *, model: str = "", program: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Store a freshly generated program (its structured form too, if any); the oldest
+    variants go beyond PROGRAM_VARIANTS. Returns the updated list (oldest first).
+    An identical text is not stored twice.
+    """
+    text = (text or "").strip()
+    if not text:
+        return _variants(_cache().peek(key))
+    cache = _cache()
+    with _VARIANTS_LOCK:
+        variants = [v for v in _variants(cache.peek(key)) if v.get("text") != text]
+        variant: Dict[str, Any] = {"text": text, "created_at": time.time(), "model": model or llm_gateway.default_model()}
+        if program:
+            variant["program"] = program
+        variants.append(variant)
+        variants = variants[-PROGRAM_VARIANTS:]
+        cache.put(key, {"variants": variants, "prompt_version": prompt_version(model)})
+    return variants
+
+
+def program_cache_stats() -> Dict[str, int]:
+    """
+    ContentCache stats; hits are LLM calls saved by serving a cached program.
+    """
+    return _cache().stats()
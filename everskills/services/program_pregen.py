@@ -0,0 +1,338 @@
+# everskills/services/program_pregen.py
+from __future__ import annotations
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from everskills.services import llm_gateway, program_gen, storage
+from everskills.services.settings import get_settings
+
+# Draft programs generated before a coach opens Coach Space. Every open request
+# (submitted / assigned, or in_progress while its campaign has no program yet) gets a
+# program from the Coach Space prompt, parsed into weeks:
+#   {key, text, program, hash, weeks: [{week, objective, actions, indicator}], model,
+#    prompt_version, generated_at}   (program: the structured form, None in free-text mode)
+# Drafts live in their own file (DRAFTS_PATH, by request id), never in requests.json /
+# campaigns.json: pages save whole lists loaded at render start, so a worker write
+# there would be lost (or would undo a page write). Coach Space reads get_draft() and
+# copies it to the campaign as `program_draft_auto` when the coach saves.
+# The text also goes to the program cache, so "Générer" is a cache hit. A draft is
+# tied to its inputs (program_gen.program_key): editing objective / context / weeks
+# makes it stale and it is generated again.
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+STATE_PATH = DATA_DIR / "program_pregen.json"  # {request_id: {key, attempts, next_try_at, ...}}
+DRAFTS_PATH = DATA_DIR / "program_drafts.json"  # {request_id: draft}
+
+OPEN_STATUSES = ("submitted", "assigned", "in_progress")
+MAX_ATTEMPTS = 3  # then the request waits for its inputs to change (or a coach click)
+BACKOFF_BASE_S = 30.0
+BACKOFF_MAX_S = 900.0
+LEASE_S = 300.0  # a generation running longer than this belongs to a dead process
+POLL_S = 60.0  # request writes wake the worker (storage.save_requests); this is the fallback
+
+_LOCK = threading.RLock()
+_WAKE = threading.Event()
+_WORKER: Optional[threading.Thread] = None
+_POOL: Optional[ThreadPoolExecutor] = None
+_IN_FLIGHT: Set[str] = set()
+
+
+# ----------------------------
+# State
+# ----------------------------
+def _read_map(path: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {str(k): v for k, v in data.items() if isinstance(v, dict)} if isinstance(data, dict) else {}
+
+
+def _write_map(path: Path, obj: Dict[str, Dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _read_state() -> Dict[str, Dict[str, Any]]:
+    return _read_map(STATE_PATH)
+
+
+def _write_state(state: Dict[str, Dict[str, Any]]) -> None:
+    _write_map(STATE_PATH, state)
+
+
+def _backoff_s(attempts: int) -> float:
+    return min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** max(0, attempts - 1)))
+
+
+def _set_state(request_id: str, entry: Optional[Dict[str, Any]]) -> None:
+    with _LOCK:
+        state = _read_state()
+        if entry is None:
+            state.pop(request_id, None)
+        else:
+            state[request_id] = entry
+        _write_state(state)
+
+
+def enabled() -> bool:
+    return get_settings().program_pregen and llm_gateway.configured()
+
+
+# ----------------------------
+# Scan
+# ----------------------------
+def _weeks(v: Any) -> int:
+    try:
+        return int(v or 3)
+    except (TypeError, ValueError):
+        return 3
+
+
+def _fresh(draft: Any, key: str) -> bool:
+    return isinstance(draft, dict) and draft.get("key") == key and bool(str(draft.get("text") or "").strip())
+
+
+def _targets() -> List[Dict[str, Any]]:
+    """
+    Open requests without an up-to-date draft. Drafts nobody can use any more (request
+    closed, or the coach has a program) are dropped here.
+    """
+    model = llm_gateway.default_model()
+    camps = {str(c.get("request_id") or ""): c for c in storage.load_campaigns() if c.get("request_id")}
+    with _LOCK:
+        drafts = _read_map(DRAFTS_PATH)
+    alive: Set[str] = set()
+    out: List[Dict[str, Any]] = []
+    for r in storage.load_requests():
+        rid = str(r.get("id") or "").strip()
+        if not rid or str(r.get("status") or "") not in OPEN_STATUSES:
+            continue
+        camp = camps.get(rid)
+        if camp and (str(camp.get("program_text") or "").strip() or camp.get("weekly_plan_origin") == "action_plan"):
+            continue  # the coach already has a program (or works from the action plan)
+        src = camp or r
+        objective = str(src.get("objective") or "").strip()
+        if not objective:
+            continue
+        context = str(src.get("context") or "").strip()
+        weeks = _weeks(src.get("weeks"))
+        key = program_gen.program_key(objective, context, weeks, model)
+        alive.add(rid)
+
+        if _fresh(drafts.get(rid), key) or (camp and _fresh(camp.get("program_draft_auto"), key)):
+            continue
+        out.append(
+            {
+                "id": rid,
+                "campaign_id": str(camp.get("id") or "") if camp else "",
+                "key": key,
+                "objective": objective,
+                "context": context,
+                "weeks": weeks,
+                "model": model,
+            }
+        )
+
+    if set(drafts) - alive:
+        with _LOCK:
+            drafts = _read_map(DRAFTS_PATH)
+            _write_map(DRAFTS_PATH, {rid: d for rid, d in drafts.items() if rid in alive})
+    return out
+
+
+def _claim_due(now: float, limit: int) -> List[Dict[str, Any]]:
+    """
+    Lease due targets (lease_until) so another process does not generate the same draft.
+    """
+    if limit <= 0 or not enabled():
+        return []
+    targets = _targets()
+    with _LOCK:
+        state = _read_state()
+        open_ids = {t["id"] for t in targets}
+        # requests closed / drafted meanwhile: forget their retry state
+        state = {rid: e for rid, e in state.items() if rid in open_ids}
+        picked: List[Dict[str, Any]] = []
+        for t in targets:
+            if len(picked) >= limit:
+                break
+            if t["id"] in _IN_FLIGHT:
+                continue
+            e = state.get(t["id"])
+            if e and e.get("key") == t["key"]:
+                if e.get("failed") or float(e.get("next_try_at") or 0) > now or float(e.get("lease_until") or 0) > now:
+                    continue
+            elif e:
+                e = None  # inputs changed: start over
+            state[t["id"]] = {**(e or {}), "key": t["key"], "lease_until": now + LEASE_S}
+            picked.append(t)
+        _write_state(state)
+        _IN_FLIGHT.update(t["id"] for t in picked)
+    return picked
+
+
+# ----------------------------
+# Generation
+# ----------------------------
+def _draft(target: Dict[str, Any]) -> Dict[str, Any]:
+    key, model = target["key"], target["model"]
+    variants = program_gen.list_variants(key)
+    if variants:
+        # a coach (or another process) generated these inputs already
+        text = str(variants[-1].get("text") or "")
+        program = variants[-1].get("program")
+        model = str(variants[-1].get("model") or model)
+    else:
+        text, program = program_gen.generate_program(target["objective"], target["context"], target["weeks"], model=model)
+        if not text:
+            raise llm_gateway.LLMError("réponse vide")
+        # the model may have fallen back to text mode (response_format rejected): new key
+        key = program_gen.program_key(target["objective"], target["context"], target["weeks"], model)
+        program_gen.add_variant(key, text, model=model, program=program)
+    return {
+        "key": key,
+        "text": text,
+        "program": program,
+        "hash": program_gen.program_hash(text),
+        "weeks": program_gen.program_weeks(program) if program else program_gen.parse_program_weeks(text),
+        "model": model,
+        "prompt_version": program_gen.prompt_version(model),
+        "generated_at": storage.now_iso(),
+    }
+
+
+def _store(target: Dict[str, Any], draft: Dict[str, Any]) -> None:
+    with _LOCK:
+        drafts = _read_map(DRAFTS_PATH)
+        drafts[target["id"]] = draft
+        _write_map(DRAFTS_PATH, drafts)
+
+
+def _run(target: Dict[str, Any]) -> None:
+    rid = target["id"]
+    try:
+        try:
+            draft = _draft(target)
+        except Exception as e:
+            with _LOCK:
+                entry = _read_state().get(rid) or {}
+            attempts = int(entry.get("attempts") or 0) + 1
+            _set_state(
+                rid,
+                {
+                    "key": target["key"],
+                    "attempts": attempts,
+                    "failed": attempts >= MAX_ATTEMPTS,
+                    "last_error": str(e) or e.__class__.__name__,
+                    "next_try_at": time.time() + _backoff_s(attempts),
+                    "lease_until": 0,
+                },
+            )
+            return
+        _store(target, draft)
+        _set_state(rid, None)
+    finally:
+        with _LOCK:
+            _IN_FLIGHT.discard(rid)
+        _WAKE.set()
+
+
+# ----------------------------
+# Dispatcher
+# ----------------------------
+def _max_workers() -> int:
+    return get_settings().program_pregen_concurrency
+
+
+def process_due(now: Optional[float] = None) -> int:
+    """
+    Generate every due draft (bounded by PROGRAM_PREGEN_CONCURRENCY) and wait for them.
+    Returns the number of generations run. For CLIs / tests; the app uses the worker thread.
+    """
+    n = 0
+    workers = _max_workers()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="program-pregen") as pool:
+        for target in _claim_due(time.time() if now is None else now, workers * 4):
+            pool.submit(_run, target)
+            n += 1
+    return n
+
+
+def _next_wakeup_s() -> float:
+    with _LOCK:
+        due = [
+            float(e.get("next_try_at") or 0)
+            for e in _read_state().values()
+            if not e.get("failed") and float(e.get("next_try_at") or 0) > 0
+        ]
+    if not due:
+        return POLL_S
+    return max(0.2, min(min(due) - time.time(), POLL_S))
+
+
+def _worker_loop() -> None:
+    global _POOL
+    workers = _max_workers()
+    _POOL = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="program-pregen")
+    while True:
+        try:
+            for target in _claim_due(time.time(), workers - len(_IN_FLIGHT)):
+                _POOL.submit(_run, target)
+        except Exception:
+            pass
+        _WAKE.wait(timeout=_next_wakeup_s())
+        _WAKE.clear()
+
+
+def ensure_worker() -> None:
+    """
+    Start the dispatcher thread (and its bounded generation pool) once per process.
+    """
+    global _WORKER
+    with _LOCK:
+        if _WORKER is not None and _WORKER.is_alive():
+            return
+        _WORKER = threading.Thread(target=_worker_loop, name="program-pregen", daemon=True)
+        _WORKER.start()
+
+
+# ----------------------------
+# Public API
+# ----------------------------
+def get_draft(request_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Latest background draft of one request (check its `key` against the current inputs).
+    """
+    with _LOCK:
+        return _read_map(DRAFTS_PATH).get(str(request_id or "").strip())
+
+
+def notify() -> None:
+    """
+    Requests changed (storage.save_requests): rescan now instead of at the next poll.
+    """
+    _WAKE.set()
+
+
+def pregen_stats() -> Dict[str, int]:
+    with _LOCK:
+        state = _read_state()
+        in_flight = len(_IN_FLIGHT)
+    return {
+        "in_flight": in_flight,
+        "retrying": sum(1 for e in state.values() if int(e.get("attempts") or 0) and not e.get("failed")),
+        "failed": sum(1 for e in state.values() if e.get("failed")),
+    }
@@ -0,0 +1,437 @@
+# everskills/services/reminders.py
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from everskills.services.settings import get_settings
+
+# Weekly follow-up reminders (one per weekly_plan part of an active campaign).
+# Only what the learner can resolve is indexed: a part is done once the learner saved
+# its follow-up in Learner Space (learner_updated_at) or the coach closed it.
+# storage.save_campaigns() keeps a due-date index up to date (only campaigns whose
+# weekly plan changed are re-indexed); the scheduler claims due items in due order and
+# enqueues one send_once email per item, so the work scales with due items, not
+# with the number of campaigns. Off unless REMINDERS is set (app.py).
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+REMINDERS_DB_PATH = DATA_DIR / "reminders.sqlite3"
+
+# Item states
+PENDING = "pending"
+CLAIMED = "claimed"  # popped by a scheduler, send_once job not created yet
+ENQUEUED = "enqueued"
+EXPIRED = "expired"  # popped too late to be useful (e.g. first indexing of old campaigns)
+
+EVENT_TYPE = "CHECKPOINT_REMINDER"
+# Only campaigns the learner has started get reminders (activated_at = week 0).
+INDEXED_STATUSES = {"active"}
+EXPIRE_AFTER_S = 7 * 24 * 3600.0
+BATCH_SIZE = 50
+# An item stuck in CLAIMED longer than this belongs to a dead scheduler: pop it again.
+CLAIM_LEASE_S = 300.0
+IDLE_WAKEUP_S = 600.0
+
+_LOCK = threading.RLock()
+_WAKE = threading.Event()
+_WORKER: Optional[threading.Thread] = None
+_READY_FOR: Optional[Path] = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminder_items (
+    item_key TEXT PRIMARY KEY,
+    campaign_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    week INTEGER NOT NULL DEFAULT 0,
+    due_at REAL NOT NULL,
+    state TEXT NOT NULL,
+    to_email TEXT NOT NULL,
+    payload_json TEXT NOT NULL DEFAULT '{}',
+    job_id TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reminder_items_due ON reminder_items (state, due_at);
+CREATE INDEX IF NOT EXISTS reminder_items_campaign ON reminder_items (campaign_id);
+CREATE TABLE IF NOT EXISTS reminder_campaigns (
+    campaign_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+);
+"""
+
+
+# ----------------------------
+# Utils
+# ----------------------------
+@contextmanager
+def _db() -> Iterator[sqlite3.Connection]:
+    global _READY_FOR
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(REMINDERS_DB_PATH), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if _READY_FOR != REMINDERS_DB_PATH:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _READY_FOR = REMINDERS_DB_PATH
+        yield conn
+    finally:
+        conn.close()
+
+
+def _parse_ts(v: Any) -> Optional[float]:
+    """
+    ISO datetime or YYYY-MM-DD (09:00 UTC) -> epoch seconds.
+    """
+    s = str(v or "").strip()
+    if not s:
+        return None
+    try:
+        if len(s) == 10:
+            d = datetime.strptime(s, "%Y-%m-%d").replace(hour=9, tzinfo=timezone.utc)
+            return d.timestamp()
+        d = datetime.fromisoformat(s.replace("Z", "+00:00"))
+        if d.tzinfo is None:
+            d = d.replace(tzinfo=timezone.utc)
+        return d.timestamp()
+    except ValueError:
+        return None
+
+
+def _fingerprint(c: Dict[str, Any]) -> str:
+    relevant = {
+        k: c.get(k)
+        for k in ("status", "activated_at", "learner_email", "coach_email", "objective", "weekly_plan")
+    }
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _part_done(w: Dict[str, Any]) -> bool:
+    return bool(
+        str(w.get("learner_updated_at") or "").strip()
+        or str(w.get("learner_comment") or "").strip()
+        or str(w.get("closed_at") or "").strip()
+    )
+
+
+def due_items(c: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Weekly parts of one campaign still waiting for the learner's follow-up, with their
+    due time (part n = activation + n weeks).
+    """
+    if str(c.get("status") or "") not in INDEXED_STATUSES:
+        return []
+    start = _parse_ts(c.get("activated_at"))
+    to_email = str(c.get("learner_email") or "").strip().lower()
+    cid = str(c.get("id") or "").strip()
+    wp = c.get("weekly_plan") if isinstance(c.get("weekly_plan"), list) else []
+    if start is None or not to_email or not cid:
+        return []
+
+    week_s = 7 * 24 * 3600.0
+    items: List[Dict[str, Any]] = []
+    for i, w in enumerate(wp):
+        if not isinstance(w, dict) or _part_done(w):
+            continue
+        try:
+            week = int(w.get("week") or i + 1)
+        except (TypeError, ValueError):
+            week = i + 1
+        kind = "touchpoint"
+        due_at = start + week * week_s
+        due_day = datetime.fromtimestamp(due_at, timezone.utc).strftime("%Y-%m-%d")
+        items.append(
+            {
+                # the due day is part of the key: a re-activated campaign gets new reminders
+                "item_key": f"{cid}:{kind}:{week}:{due_day}",
+                "campaign_id": cid,
+                "kind": kind,
+                "week": week,
+                "due_at": due_at,
+                "to_email": to_email,
+                "payload": {
+                    "coach_email": str(c.get("coach_email") or "").strip().lower(),
+                    "objective": str(c.get("objective") or "").strip(),
+                    "request_id": str(c.get("request_id") or "").strip(),
+                    "due_day": due_day,
+                },
+            }
+        )
+    return items
+
+
+# ----------------------------
+# Index maintenance (called by storage.save_campaigns)
+# ----------------------------
+def _replace_campaign(conn: sqlite3.Connection, cid: str, items: List[Dict[str, Any]], now: float) -> None:
+    # items already enqueued / expired stay as history; open ones are rebuilt
+    conn.execute("DELETE FROM reminder_items WHERE campaign_id = ? AND state = ?", (cid, PENDING))
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO reminder_items
+            (item_key, campaign_id, kind, week, due_at, state, to_email, payload_json, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                it["item_key"],
+                cid,
+                it["kind"],
+                it["week"],
+                it["due_at"],
+                PENDING,
+                it["to_email"],
+                json.dumps(it["payload"], ensure_ascii=False),
+                now,
+            )
+            for it in items
+        ],
+    )
+
+
+def reindex_campaigns(campaigns: List[Dict[str, Any]]) -> int:
+    """
+    Sync the index with the full campaign list just written. Only campaigns whose
+    reminder-relevant fields changed are re-indexed. Returns that number.
+    """
+    by_id = {str(c.get("id") or ""): c for c in campaigns if isinstance(c, dict) and c.get("id")}
+    now = time.time()
+    changed = 0
+    with _LOCK, _db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            known = {r["campaign_id"]: r["fingerprint"] for r in conn.execute("SELECT * FROM reminder_campaigns")}
+            for cid in set(known) - set(by_id):
+                conn.execute("DELETE FROM reminder_items WHERE campaign_id = ? AND state = ?", (cid, PENDING))
+                conn.execute("DELETE FROM reminder_campaigns WHERE campaign_id = ?", (cid,))
+            for cid, c in by_id.items():
+                fp = _fingerprint(c)
+                if known.get(cid) == fp:
+                    continue
+                _replace_campaign(conn, cid, due_items(c), now)
+                conn.execute(
+                    "INSERT INTO reminder_campaigns (campaign_id, fingerprint) VALUES (?, ?) "
+                    "ON CONFLICT(campaign_id) DO UPDATE SET fingerprint = excluded.fingerprint",
+                    (cid, fp),
+                )
+                changed += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    if changed:
+        _WAKE.set()
+    return changed
+
+
+def rebuild_index() -> int:
+    """
+    Full re-index from storage (first deploy / repair).
+    """
+    from everskills.services.storage import load_campaigns  # local import to avoid cycles
+
+    with _db() as conn:
+        conn.execute("DELETE FROM reminder_campaigns")
+    return reindex_campaigns(load_campaigns())
+
+
+# ----------------------------
+# Scheduler
+# ----------------------------
+_KIND_LABELS = {
+    "touchpoint": "ton suivi de la partie {week}",
+}
+
+
+def _render(item: Dict[str, Any]) -> Dict[str, str]:
+    payload = item.get("payload") or {}
+    what = _KIND_LABELS.get(item["kind"], "un point d’étape").format(week=item.get("week"))
+    objective = payload.get("objective") or ""
+    text = (
+        "Bonjour,\n\n"
+        f"Petit rappel : {what} est attendu le {payload.get('due_day')}.\n"
+        + (f"Objectif : {objective}\n" if objective else "")
+        + "\nRenseigne-le dans ton Learner Space (bouton « Enregistrer mon suivi »).\n\n— EVERSKILLS\n"
+    )
+    return {"subject": f"[EVERSKILLS] Rappel — {what}", "text_body": text}
+
+
+def _pop_due(now: float, limit: int) -> List[Dict[str, Any]]:
+    """
+    Atomically claim the earliest due items (safe with several scheduler processes).
+    They become ENQUEUED only once their send_once job exists (see process_due).
+    """
+    with _db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE reminder_items SET state = ?, updated_at = ? WHERE state = ? AND updated_at < ?",
+                (PENDING, now, CLAIMED, now - CLAIM_LEASE_S),
+            )
+            rows = conn.execute(
+                "SELECT * FROM reminder_items WHERE state = ? AND due_at <= ? ORDER BY due_at LIMIT ?",
+                (PENDING, now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE reminder_items SET state = ?, updated_at = ? WHERE item_key = ?",
+                [(EXPIRED if now - float(r["due_at"]) > EXPIRE_AFTER_S else CLAIMED, now, r["item_key"]) for r in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    items = []
+    for r in rows:
+        it = dict(r)
+        it["payload"] = json.loads(it.pop("payload_json") or "{}")
+        items.append(it)
+    return items
+
+
+def _release(keys: List[str], now: float) -> None:
+    """
+    Give claimed items back to the index (their send_once job could not be created).
+    """
+    with _db() as conn:
+        conn.executemany(
+            "UPDATE reminder_items SET state = ?, updated_at = ? WHERE item_key = ? AND state = ?",
+            [(PENDING, now, key, CLAIMED) for key in keys],
+        )
+
+
+def process_due(now: Optional[float] = None) -> int:
+    """
+    Enqueue reminder emails for every due item. Returns the number enqueued.
+    The send_once event key is the item key, so a reminder is never sent twice
+    even if an item is popped again (restored backup, concurrent schedulers, a
+    scheduler that died between the enqueue and the ENQUEUED mark).
+    """
+    from everskills.services.mail_queue import enqueue_send_once  # local import to avoid cycles
+
+    now = time.time() if now is None else now
+    sent = 0
+    while True:
+        items = _pop_due(now, BATCH_SIZE)
+        todo = [it for it in items if now - float(it["due_at"]) <= EXPIRE_AFTER_S]
+        for i, it in enumerate(todo):
+            msg = _render(it)
+            try:
+                job_id = enqueue_send_once(
+                    event_key=f"{EVENT_TYPE}:{it['item_key']}",
+                    event_type=EVENT_TYPE,
+                    request_id=str(it["payload"].get("request_id") or ""),
+                    to_email=it["to_email"],
+                    subject=msg["subject"],
+                    text_body=msg["text_body"],
+                    meta={"flow": "reminders", "campaign_id": it["campaign_id"], "kind": it["kind"], "week": it["week"]},
+                )
+            except Exception:
+                _release([x["item_key"] for x in todo[i:]], now)
+                raise
+            with _db() as conn:
+                conn.execute(
+                    "UPDATE reminder_items SET state = ?, job_id = ?, updated_at = ? WHERE item_key = ?",
+                    (ENQUEUED, job_id, now, it["item_key"]),
+                )
+            sent += 1
+        if len(items) < BATCH_SIZE:
+            return sent
+
+
+def _next_wakeup_s() -> float:
+    try:
+        with _db() as conn:
+            row = conn.execute("SELECT MIN(due_at) AS t FROM reminder_items WHERE state = ?", (PENDING,)).fetchone()
+    except Exception:
+        return IDLE_WAKEUP_S
+    if row is None or row["t"] is None:
+        return IDLE_WAKEUP_S
+    return max(1.0, min(float(row["t"]) - time.time(), IDLE_WAKEUP_S))
+
+
+def _worker_loop() -> None:
+    try:
+        # catch up with campaigns saved while no scheduler ran (fingerprints: cheap)
+        from everskills.services.storage import load_campaigns  # local import to avoid cycles
+
+        reindex_campaigns(load_campaigns())
+    except Exception:
+        pass
+    while True:
+        try:
+            process_due()
+        except Exception:
+            pass
+        _WAKE.wait(timeout=_next_wakeup_s())
+        _WAKE.clear()
+
+
+def enabled() -> bool:
+    return get_settings().reminders
+
+
+def ensure_worker() -> None:
+    """
+    Start the scheduler thread once per process (callers check enabled()).
+    """
+    global _WORKER
+    with _LOCK:
+        if _WORKER is not None and _WORKER.is_alive():
+            return
+        _WORKER = threading.Thread(target=_worker_loop, name="reminders", daemon=True)
+        _WORKER.start()
+
+
+def index_stats() -> Dict[str, Any]:
+    with _db() as conn:
+        rows = conn.execute("SELECT state, COUNT(*) AS n FROM reminder_items GROUP BY state").fetchall()
+        nxt = conn.execute("SELECT MIN(due_at) AS t FROM reminder_items WHERE state = ?", (PENDING,)).fetchone()
+    stats: Dict[str, Any] = {str(r["state"]): int(r["n"]) for r in rows}
+    stats["next_due_at"] = float(nxt["t"]) if nxt and nxt["t"] is not None else None
+    return stats
+
+
+def upcoming(limit: int = 50) -> List[Dict[str, Any]]:
+    with _db() as conn:
+        rows = conn.execute(
+            "SELECT item_key, campaign_id, kind, week, due_at, to_email FROM reminder_items "
+            "WHERE state = ? ORDER BY due_at LIMIT ?",
+            (PENDING, int(limit)),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+# ----------------------------
+# CLI: dedicated scheduler process
+# ----------------------------
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description="EVERSKILLS weekly follow-up reminder scheduler")
+    ap.add_argument("--once", action="store_true", help="enqueue due reminders once and exit")
+    ap.add_argument("--rebuild", action="store_true", help="re-index every campaign first")
+    args = ap.parse_args(argv)
+
+    if args.rebuild:
+        print(f"{rebuild_index()} campaign(s) indexed")
+    if args.once:
+        print(f"{process_due()} reminder(s) enqueued")
+        return
+
+    while True:
+        process_due()
+        time.sleep(_next_wakeup_s())
+
+
+if __name__ == "__main__":
+    main()
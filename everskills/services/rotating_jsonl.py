@@ -0,0 +1,196 @@
+# everskills/services/rotating_jsonl.py
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# File is independent (no streamlit import): used by the mailer and by workers.
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_MAX_AGE_S = 7 * 24 * 3600.0
+DEFAULT_KEEP_SEGMENTS = 50
+
+
+class RotatingJSONL:
+    """
+    Append-only JSON-lines log with size / age based rotation.
+
+    - active segment: <name>.jsonl (one JSON object per line, never rewritten)
+    - rotated segments: <name>.<UTC stamp>.jsonl[.gz], oldest ones pruned past keep_segments
+    - readers stream every segment in order without loading the whole log
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_s: float = DEFAULT_MAX_AGE_S,
+        gzip_rotated: bool = True,
+        keep_segments: int = DEFAULT_KEEP_SEGMENTS,
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = int(max_bytes)
+        self.max_age_s = float(max_age_s)
+        self.gzip_rotated = gzip_rotated
+        self.keep_segments = int(keep_segments)
+        self._lock = threading.Lock()
+        self._opened_at: Optional[float] = None  # ts of the first record of the active segment
+
+    # --- writing
+    def append(self, obj: Dict[str, Any]) -> None:
+        self.append_many([obj])
+
+    def append_many(self, objs: Iterable[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(o, ensure_ascii=False) + "\n" for o in objs)
+        if not data:
+            return
+        with self._lock:
+            self._maybe_rotate()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # one write() on an O_APPEND file: lines from several processes do not interleave
+            fd = os.open(str(self.path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data.encode("utf-8"))
+            finally:
+                os.close(fd)
+            if self._opened_at is None:
+                self._opened_at = time.time()
+
+    def _active_opened_at(self) -> Optional[float]:
+        if self._opened_at is not None:
+            return self._opened_at
+        try:
+            with self.path.open("r", encoding="utf-8") as fh:
+                first = json.loads(fh.readline() or "{}")
+            self._opened_at = _to_epoch(first.get("ts")) or self.path.stat().st_mtime
+        except Exception:
+            self._opened_at = None
+        return self._opened_at
+
+    def _maybe_rotate(self) -> None:
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            self._opened_at = None
+            return
+        if size == 0:
+            return
+        opened = self._active_opened_at()
+        too_old = opened is not None and time.time() - opened >= self.max_age_s
+        if size < self.max_bytes and not too_old:
+            return
+        self.rotate()
+
+    def rotate(self) -> Optional[Path]:
+        """
+        Close the active segment (rename + optional gzip). Returns the rotated path.
+        """
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        rotated = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        try:
+            os.replace(self.path, rotated)
+        except FileNotFoundError:
+            # another process rotated first
+            return None
+        self._opened_at = None
+
+        if self.gzip_rotated:
+            gz = rotated.with_name(rotated.name + ".gz")
+            with rotated.open("rb") as src, gzip.open(gz, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            rotated.unlink()
+            rotated = gz
+
+        self._prune()
+        return rotated
+
+    def _prune(self) -> None:
+        rotated = self.rotated_segments()
+        for p in rotated[: max(len(rotated) - self.keep_segments, 0)]:
+            try:
+                p.unlink()
+            except Exception:
+                pass
+
+    # --- reading
+    def rotated_segments(self) -> List[Path]:
+        """
+        Rotated segments, oldest first (the UTC stamp sorts lexicographically).
+        """
+        if not self.path.parent.exists():
+            return []
+        prefix = f"{self.path.stem}."
+        out = [
+            p
+            for p in self.path.parent.iterdir()
+            if p.name.startswith(prefix)
+            and p != self.path
+            and (p.name.endswith(self.path.suffix) or p.name.endswith(self.path.suffix + ".gz"))
+        ]
+        return sorted(out, key=lambda p: p.name)
+
+    def segments(self) -> List[Path]:
+        segs = self.rotated_segments()
+        if self.path.exists():
+            segs.append(self.path)
+        return segs
+
+    def iter_records(self, *, since_ts: float = 0.0) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every record, oldest first (skips malformed lines).
+        Segments fully older than since_ts are skipped by their mtime.
+        """
+        for seg in self.segments():
+            try:
+                if since_ts and seg.stat().st_mtime < since_ts:
+                    continue
+            except FileNotFoundError:
+                continue
+            yield from _iter_segment(seg)
+
+    def tail(self, n: int = 100) -> List[Dict[str, Any]]:
+        """
+        Last n records, newest first (reads segments from the newest backwards).
+        """
+        out: List[Dict[str, Any]] = []
+        for seg in reversed(self.segments()):
+            rows = list(_iter_segment(seg))
+            out.extend(reversed(rows))
+            if len(out) >= n:
+                break
+        return out[:n]
+
+
+def _iter_segment(path: Path) -> Iterator[Dict[str, Any]]:
+    opener = gzip.open if path.name.endswith(".gz") else open
+    try:
+        with opener(path, "rt", encoding="utf-8") as fh:  # type: ignore[operator]
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                except Exception:
+                    continue
+                if isinstance(obj, dict):
+                    yield obj
+    except (FileNotFoundError, OSError, EOFError):
+        return
+
+
+def _to_epoch(ts: Any) -> Optional[float]:
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    try:
+        return datetime.fromisoformat(str(ts)).timestamp()
+    except Exception:
+        return None
@@ -0,0 +1,325 @@
+# everskills/services/settings.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+# Typed settings, resolved once per process from (lowest to highest priority):
+#   1) ~/.streamlit/secrets.toml, then <project>/.streamlit/secrets.toml (or EVS_SECRETS_FILE)
+#   2) st.secrets, when Streamlit is importable and has secrets
+#   3) environment variables with the same names
+# Services read get_settings() instead of st.secrets, so they also run in
+# background workers and CLIs. reload_settings() re-reads every source.
+
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+
+# Alias chains, first non-empty wins (old names kept for existing secrets files)
+USERS_WEBAPP_URL_KEYS = ("GSHEET_USERS_WEBAPP_URL",)
+USERS_SECRET_KEYS = ("GSHEET_USERS_SHARED_SECRET",)
+APPS_SCRIPT_URL_KEYS = ("GSHEET_WEBAPP_URL", "APPS_SCRIPT_URL", "GSHEET_API_URL", "WEBHOOK_URL")
+APPS_SCRIPT_SECRET_KEYS = ("GSHEET_SHARED_SECRET", "SHARED_SECRET", "EVS_SECRET")
+
+# every key read below; env vars override these (and any key found in a secrets file)
+KNOWN_KEYS = (
+    ("SMTP_HOST", "SMTP_PORT", "SMTP_USER", "SMTP_PASS", "SMTP_PASSWORD", "EMAIL_FROM", "SMTP_FROM_EMAIL")
+    + ("SMTP_STARTTLS", "SMTP_CA_FILE", "EMAIL_OUTBOX_GZIP", "MAIL_DIGEST_WINDOWS")
+    + USERS_WEBAPP_URL_KEYS + USERS_SECRET_KEYS + APPS_SCRIPT_URL_KEYS + APPS_SCRIPT_SECRET_KEYS
+    + ("OPENAI_API_KEY", "OPENAI_MODEL", "OPENAI_BASE_URL", "APP_ENV", "ACCESS_ADMIN_EMAIL", "ADMIN_EMAIL")
+    + ("AUDIO_CACHE_MAX_MB", "AUDIO_SERVER_PORT", "AUDIO_PUBLIC_URL")
+    + ("LLM_MOCK", "LLM_RPM", "LLM_RATE_LIMITS", "LLM_PRICES")
+    + ("PROGRAM_STRUCTURED", "PROGRAM_PREGEN", "PROGRAM_PREGEN_CONCURRENCY")
+    + ("REMINDERS",)
+)
+
+_TRUE = {"true", "1", "yes", "y", "on"}
+_FALSE = {"false", "0", "no", "n", "off"}
+
+
+@dataclass(frozen=True)
+class WebhookSettings:
+    url: str = ""
+    secret: str = ""
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url and self.secret)
+
+
+@dataclass(frozen=True)
+class Settings:
+    # SMTP (see mailer.get_smtp_config)
+    smtp_host: str = ""
+    smtp_port: int = 587
+    smtp_user: str = ""
+    smtp_password: str = ""
+    email_from: str = ""
+    smtp_starttls: bool = True
+    smtp_ca_file: str = ""
+    email_outbox_gzip: bool = True
+    mail_digest_windows: Dict[str, int] = field(default_factory=dict)
+
+    # Apps Script webhooks: users sheet (GSHEET_USERS_*) and the generic one (GSHEET_*)
+    users_webhook: WebhookSettings = WebhookSettings()
+    apps_script: WebhookSettings = WebhookSettings()
+
+    # OpenAI
+    openai_api_key: str = ""
+    openai_model: str = "gpt-4o-mini"
+    # point at a local mock (everskills.devtools.openai_mock) for offline runs
+    openai_base_url: str = "https://api.openai.com/v1"
+    # llm_gateway: requests per minute (default, then per model) and USD per 1M tokens
+    # ({model: [input, output]}) for the cost estimate; LLM_MOCK runs the local mock
+    llm_rpm: int = 60
+    llm_rate_limits: Dict[str, int] = field(default_factory=dict)
+    llm_prices: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    llm_mock: bool = False
+    # program_gen: JSON (schema) programs, rendered to text; false = free text parsed by regex
+    program_structured: bool = True
+    # program_pregen: draft programs generated in the background for open requests
+    program_pregen: bool = True
+    program_pregen_concurrency: int = 2
+    # reminders: weekly follow-up emails to learners (scheduler thread); opt-in
+    reminders: bool = False
+
+    # voice notes: disk cache budget + optional range server the browser streams from
+    audio_cache_max_mb: int = 256
+    audio_server_port: int = 0  # 0 = no server, st.audio gets the cached file
+    audio_public_url: str = ""  # base URL the browser uses (reverse proxy); unset = server on 127.0.0.1 only, files played directly
+
+    app_env: str = "PROD"
+    access_admin_email: str = ""
+    admin_email: str = ""
+
+    # every raw value, for keys without a typed field
+    raw: Mapping[str, Any] = field(default_factory=dict)
+    # validation problems (bad types / URLs); the offending value falls back to its default
+    warnings: Tuple[str, ...] = ()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        v = self.raw.get(key)
+        return default if v is None else v
+
+    @property
+    def smtp_configured(self) -> bool:
+        return bool(self.smtp_host and self.smtp_user and self.smtp_password)
+
+
+# ----------------------------
+# Sources
+# ----------------------------
+def _secrets_files() -> List[Path]:
+    custom = os.environ.get("EVS_SECRETS_FILE", "").strip()
+    if custom:
+        return [Path(custom)]
+    return [Path.home() / ".streamlit" / "secrets.toml", PROJECT_ROOT / ".streamlit" / "secrets.toml"]
+
+
+def _read_toml(path: Path) -> Dict[str, Any]:
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        try:
+            import toml as tomllib  # type: ignore
+        except ImportError:
+            return {}
+    try:
+        if not path.exists():
+            return {}
+        data = tomllib.loads(path.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _plain(v: Any) -> Any:
+    # st.secrets tables are AttrDict-like mappings
+    if isinstance(v, Mapping):
+        return {str(k): _plain(x) for k, x in v.items()}
+    return v
+
+
+def _streamlit_secrets() -> Dict[str, Any]:
+    try:
+        import streamlit as st
+
+        return {str(k): _plain(st.secrets[k]) for k in st.secrets}
+    except Exception:
+        # not installed, or no secrets file outside `streamlit run`
+        return {}
+
+
+def _raw_source() -> Dict[str, Any]:
+    raw: Dict[str, Any] = {}
+    for p in _secrets_files():
+        raw.update(_read_toml(p))
+    raw.update(_streamlit_secrets())
+    for k in set(raw) | set(KNOWN_KEYS):
+        if k in os.environ:
+            raw[k] = os.environ[k]
+    return raw
+
+
+# ----------------------------
+# Parsing
+# ----------------------------
+class _Parser:
+    def __init__(self, raw: Mapping[str, Any]) -> None:
+        self.raw = raw
+        self.warnings: List[str] = []
+
+    def text(self, *keys: str, default: str = "") -> str:
+        for k in keys:
+            v = self.raw.get(k)
+            if v is None or isinstance(v, Mapping):
+                continue
+            s = str(v).strip()
+            if s:
+                return s
+        return default
+
+    def integer(self, *keys: str, default: int, lo: Optional[int] = None, hi: Optional[int] = None) -> int:
+        for k in keys:
+            v = self.raw.get(k)
+            if v is None or str(v).strip() == "":
+                continue
+            try:
+                n = int(v)
+            except (TypeError, ValueError):
+                self.warnings.append(f"{k}: not an integer ({v!r})")
+                continue
+            if (lo is not None and n < lo) or (hi is not None and n > hi):
+                self.warnings.append(f"{k}: out of range ({n})")
+                continue
+            return n
+        return default
+
+    def flag(self, *keys: str, default: bool) -> bool:
+        for k in keys:
+            v = self.raw.get(k)
+            if v is None:
+                continue
+            if isinstance(v, bool):
+                return v
+            s = str(v).strip().lower()
+            if s in _TRUE:
+                return True
+            if s in _FALSE:
+                return False
+            self.warnings.append(f"{k}: not a boolean ({v!r})")
+        return default
+
+    def url(self, *keys: str) -> str:
+        for k in keys:
+            s = self.text(k)
+            if not s:
+                continue
+            if s.startswith(("http://", "https://")):
+                return s
+            self.warnings.append(f"{k}: not an http(s) URL")
+        return ""
+
+    def table(self, key: str) -> Dict[str, Any]:
+        v = self.raw.get(key)
+        if isinstance(v, str) and v.strip():
+            # env vars carry tables as JSON
+            try:
+                v = json.loads(v)
+            except ValueError:
+                self.warnings.append(f"{key}: not a table / JSON object")
+                return {}
+        return dict(v) if isinstance(v, Mapping) else {}
+
+
+def build_settings(raw: Mapping[str, Any]) -> Settings:
+    p = _Parser(raw)
+
+    port = p.integer("SMTP_PORT", default=587, lo=1, hi=65535)
+    user = p.text("SMTP_USER")
+
+    windows: Dict[str, int] = {}
+    for k, v in p.table("MAIL_DIGEST_WINDOWS").items():
+        try:
+            windows[str(k).upper()] = max(int(v), 0)
+        except (TypeError, ValueError):
+            p.warnings.append(f"MAIL_DIGEST_WINDOWS.{k}: not an integer ({v!r})")
+
+    rate_limits: Dict[str, int] = {}
+    for k, v in p.table("LLM_RATE_LIMITS").items():
+        try:
+            rate_limits[str(k)] = max(1, int(v))
+        except (TypeError, ValueError):
+            p.warnings.append(f"LLM_RATE_LIMITS.{k}: not an integer ({v!r})")
+    prices: Dict[str, Tuple[float, float]] = {}
+    for k, v in p.table("LLM_PRICES").items():
+        try:
+            prices[str(k)] = (float(v[0]), float(v[1]))
+        except (TypeError, ValueError, IndexError, KeyError):
+            p.warnings.append(f"LLM_PRICES.{k}: expected [input, output] per 1M tokens ({v!r})")
+
+    return Settings(
+        smtp_host=p.text("SMTP_HOST"),
+        smtp_port=port,
+        smtp_user=user,
+        smtp_password=p.text("SMTP_PASS", "SMTP_PASSWORD"),
+        email_from=p.text("EMAIL_FROM", "SMTP_FROM_EMAIL", default=user),
+        # STARTTLS on by default on 587 only
+        smtp_starttls=p.flag("SMTP_STARTTLS", default=port == 587),
+        smtp_ca_file=p.text("SMTP_CA_FILE"),
+        email_outbox_gzip=p.flag("EMAIL_OUTBOX_GZIP", default=True),
+        mail_digest_windows=windows,
+        users_webhook=WebhookSettings(url=p.url(*USERS_WEBAPP_URL_KEYS), secret=p.text(*USERS_SECRET_KEYS)),
+        apps_script=WebhookSettings(url=p.url(*APPS_SCRIPT_URL_KEYS), secret=p.text(*APPS_SCRIPT_SECRET_KEYS)),
+        openai_api_key=p.text("OPENAI_API_KEY"),
+        openai_model=p.text("OPENAI_MODEL", default="gpt-4o-mini"),
+        openai_base_url=(p.url("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/"),
+        llm_rpm=p.integer("LLM_RPM", default=60, lo=1),
+        llm_rate_limits=rate_limits,
+        llm_prices=prices,
+        llm_mock=p.flag("LLM_MOCK", default=False),
+        program_structured=p.flag("PROGRAM_STRUCTURED", default=True),
+        program_pregen=p.flag("PROGRAM_PREGEN", default=True),
+        program_pregen_concurrency=p.integer("PROGRAM_PREGEN_CONCURRENCY", default=2, lo=1, hi=8),
+        reminders=p.flag("REMINDERS", default=False),
+        audio_cache_max_mb=p.integer("AUDIO_CACHE_MAX_MB", default=256, lo=1),
+        audio_server_port=p.integer("AUDIO_SERVER_PORT", default=0, lo=0, hi=65535),
+        audio_public_url=p.url("AUDIO_PUBLIC_URL").rstrip("/"),
+        app_env=p.text("APP_ENV", default="PROD"),
+        access_admin_email=p.text("ACCESS_ADMIN_EMAIL"),
+        admin_email=p.text("ADMIN_EMAIL"),
+        raw=dict(raw),
+        warnings=tuple(p.warnings),
+    )
+
+
+# ----------------------------
+# Process-wide cache
+# ----------------------------
+_LOCK = threading.Lock()
+_SETTINGS: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    global _SETTINGS
+    s = _SETTINGS
+    if s is None:
+        with _LOCK:
+            if _SETTINGS is None:
+                _SETTINGS = build_settings(_raw_source())
+            s = _SETTINGS
+    return s
+
+
+def reload_settings() -> Settings:
+    """
+    Re-read every source (after editing secrets.toml / env). SMTP pools are keyed
+    by config, so new SMTP settings get fresh connections on the next send.
+    """
+    global _SETTINGS
+    with _LOCK:
+        _SETTINGS = build_settings(_raw_source())
+        return _SETTINGS
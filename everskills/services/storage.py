@@ -6,6 +6,7 @@ import os
 from pathlib import Path
 from datetime import datetime, timezone
 import secrets
+import threading
 from typing import Any, Dict, List, Optional
 
 
@@ -23,6 +24,9 @@ CAMPAIGNS_PATH = DATA_DIR / "campaigns.json"
 PACKAGE_DIR = THIS_FILE.parents[1]  # .../everskills
 UPLOAD_DIR = PACKAGE_DIR / "temp_uploads"
 
+# read-modify-write helpers below may run from pages and from background threads
+_LOCK = threading.RLock()
+
 
 # ----------------------------
 # Utils
@@ -49,8 +53,11 @@ def _read_json(path: Path, default: Any) -> Any:
 
 
 def _write_json(path: Path, obj: Any) -> None:
+    # atomic: a concurrent reader never sees a truncated file (and never writes [] back)
     ensure_dirs()
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(path)
 
 
 def _new_id(prefix: str) -> str:
@@ -300,17 +307,18 @@ def _migrate_legacy_if_needed() -> None:
     Reads raw json files, normalizes, writes back.
     MUST NOT call load_requests/load_campaigns (to avoid recursion).
     """
-    ensure_dirs()
+    with _LOCK:
+        ensure_dirs()
 
-    # requests
-    raw_req = _read_json(REQUESTS_PATH, [])
-    norm_req = normalize_requests_ids(raw_req)
-    _write_json(REQUESTS_PATH, norm_req)
+        # requests
+        raw_req = _read_json(REQUESTS_PATH, [])
+        norm_req = normalize_requests_ids(raw_req)
+        _write_json(REQUESTS_PATH, norm_req)
 
-    # campaigns
-    raw_camp = _read_json(CAMPAIGNS_PATH, [])
-    norm_camp = _normalize_campaigns(raw_camp)
-    _write_json(CAMPAIGNS_PATH, norm_camp)
+        # campaigns
+        raw_camp = _read_json(CAMPAIGNS_PATH, [])
+        norm_camp = _normalize_campaigns(raw_camp)
+        _write_json(CAMPAIGNS_PATH, norm_camp)
 
 
 # ----------------------------
@@ -321,8 +329,19 @@ def load_requests() -> List[Dict[str, Any]]:
     return normalize_requests_ids(_read_json(REQUESTS_PATH, []))
 
 
+def _notify_program_pregen() -> None:
+    try:
+        from everskills.services.program_pregen import notify  # local import to avoid cycles
+
+        notify()
+    except Exception:
+        # background drafts are a convenience: never fail a request write for them
+        pass
+
+
 def save_requests(requests: List[Dict[str, Any]]) -> None:
     _write_json(REQUESTS_PATH, normalize_requests_ids(requests))
+    _notify_program_pregen()
 
 
 def save_request(req: Dict[str, Any]) -> Dict[str, Any]:
@@ -331,41 +350,43 @@ def save_request(req: Dict[str, Any]) -> Dict[str, Any]:
     Ensures non-empty id.
     Returns normalized request.
     """
-    requests = load_requests()
+    with _LOCK:
+        requests = load_requests()
 
-    rid = (req.get("id") or "").strip()
-    if not rid:
-        rid = _new_id("req")
-        req["id"] = rid
+        rid = (req.get("id") or "").strip()
+        if not rid:
+            rid = _new_id("req")
+            req["id"] = rid
 
-    req_norm = normalize_requests_ids([req])[0]
+        req_norm = normalize_requests_ids([req])[0]
 
-    replaced = False
-    for i, r in enumerate(requests):
-        if r.get("id") == rid:
-            requests[i] = {**r, **req_norm, "updated_at": now_iso()}
-            replaced = True
-            break
+        replaced = False
+        for i, r in enumerate(requests):
+            if r.get("id") == rid:
+                requests[i] = {**r, **req_norm, "updated_at": now_iso()}
+                replaced = True
+                break
 
-    if not replaced:
-        requests.append(req_norm)
+        if not replaced:
+            requests.append(req_norm)
 
-    save_requests(requests)
-    return req_norm
+        save_requests(requests)
+        return req_norm
 
 
 def update_request(request_id: str, patch: Dict[str, Any]) -> None:
-    requests = load_requests()
-    changed = False
+    with _LOCK:
+        requests = load_requests()
+        changed = False
 
-    for i, r in enumerate(requests):
-        if r.get("id") == request_id:
-            requests[i] = {**r, **patch, "updated_at": patch.get("updated_at") or now_iso()}
-            changed = True
-            break
+        for i, r in enumerate(requests):
+            if r.get("id") == request_id:
+                requests[i] = {**r, **patch, "updated_at": patch.get("updated_at") or now_iso()}
+                changed = True
+                break
 
-    if changed:
-        save_requests(requests)
+        if changed:
+            save_requests(requests)
 
 
 def load_campaigns() -> List[Dict[str, Any]]:
@@ -373,32 +394,45 @@ def load_campaigns() -> List[Dict[str, Any]]:
     return _normalize_campaigns(_read_json(CAMPAIGNS_PATH, []))
 
 
+def _reindex_reminders(campaigns: List[Dict[str, Any]]) -> None:
+    try:
+        from everskills.services.reminders import reindex_campaigns  # local import to avoid cycles
+
+        reindex_campaigns(campaigns)
+    except Exception:
+        # the reminder index is derived data: never fail a campaign write for it
+        pass
+
+
 def save_campaigns(campaigns: List[Dict[str, Any]]) -> None:
-    _write_json(CAMPAIGNS_PATH, _normalize_campaigns(campaigns))
+    campaigns = _normalize_campaigns(campaigns)
+    _write_json(CAMPAIGNS_PATH, campaigns)
+    _reindex_reminders(campaigns)
 
 
 def upsert_campaign(camp: Dict[str, Any]) -> Dict[str, Any]:
-    campaigns = load_campaigns()
+    with _LOCK:
+        campaigns = load_campaigns()
 
-    cid = str(camp.get("id") or "").strip()
-    if not cid:
-        cid = _new_id("camp")
-        camp["id"] = cid
+        cid = str(camp.get("id") or "").strip()
+        if not cid:
+            cid = _new_id("camp")
+            camp["id"] = cid
 
-    camp_norm = _normalize_campaign(camp)
+        camp_norm = _normalize_campaign(camp)
 
-    replaced = False
-    for i, c in enumerate(campaigns):
-        if c.get("id") == cid:
-            campaigns[i] = {**c, **camp_norm, "updated_at": now_iso()}
-            replaced = True
-            break
+        replaced = False
+        for i, c in enumerate(campaigns):
+            if c.get("id") == cid:
+                campaigns[i] = {**c, **camp_norm, "updated_at": now_iso()}
+                replaced = True
+                break
 
-    if not replaced:
-        campaigns.append(camp_norm)
+        if not replaced:
+            campaigns.append(camp_norm)
 
-    save_campaigns(campaigns)
-    return camp_norm
+        save_campaigns(campaigns)
+        return camp_norm
 
 
 # Alias (some pages may expect save_campaign)
@@ -407,17 +441,18 @@ def save_campaign(camp: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def update_campaign(campaign_id: str, patch: Dict[str, Any]) -> None:
-    campaigns = load_campaigns()
-    changed = False
+    with _LOCK:
+        campaigns = load_campaigns()
+        changed = False
 
-    for i, c in enumerate(campaigns):
-        if c.get("id") == campaign_id:
-            campaigns[i] = {**c, **patch, "updated_at": patch.get("updated_at") or now_iso()}
-            changed = True
-            break
+        for i, c in enumerate(campaigns):
+            if c.get("id") == campaign_id:
+                campaigns[i] = {**c, **patch, "updated_at": patch.get("updated_at") or now_iso()}
+                changed = True
+                break
 
-    if changed:
-        save_campaigns(campaigns)
+        if changed:
+            save_campaigns(campaigns)
 
 
 # ----------------------------
@@ -472,3 +507,4 @@ def reset_runtime_data() -> None:
     ensure_dirs()
     _write_json(REQUESTS_PATH, [])
     _write_json(CAMPAIGNS_PATH, [])
+    _reindex_reminders([])
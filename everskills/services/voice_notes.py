@@ -2,12 +2,24 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
 
-import requests
-import streamlit as st
+from everskills.services.audio_segments import Pcm, Segment, decode_pcm, encode_wav, plan_segments, stitch
+from everskills.services import llm_gateway
+from everskills.services.content_cache import get_cache, make_key, sha256_hex
+from everskills.services.settings import get_settings
+from everskills.services.webhook_client import post_json
+
+
+TRANSCRIBE_MODEL = "gpt-4o-mini-transcribe"
+SUMMARY_MODEL = "gpt-4o-mini"
+# Bump when the summary prompt changes: cached summaries are keyed on it.
+SUMMARY_PROMPT_VERSION = "v1"
 
 
 @dataclass
@@ -21,20 +33,8 @@ class DriveUploadResult:
 
 
 def _webhook_url_and_secret() -> Tuple[str, str]:
-    url = (
-        st.secrets.get("GSHEET_WEBAPP_URL")
-        or st.secrets.get("APPS_SCRIPT_URL")
-        or st.secrets.get("GSHEET_API_URL")
-        or st.secrets.get("WEBHOOK_URL")
-        or ""
-    )
-    secret = (
-        st.secrets.get("GSHEET_SHARED_SECRET")
-        or st.secrets.get("SHARED_SECRET")
-        or st.secrets.get("EVS_SECRET")
-        or ""
-    )
-    return str(url).strip(), str(secret).strip()
+    cfg = get_settings().apps_script
+    return cfg.url, cfg.secret
 
 
 def upload_voice_note_to_drive(
@@ -43,8 +43,12 @@ def upload_voice_note_to_drive(
     mime_type: str,
     audio_bytes: bytes,
     timeout_s: int = 60,
+    meta: Optional[Dict[str, Any]] = None,
+    url: str = "",
+    secret: str = "",
 ) -> DriveUploadResult:
-    url, secret = _webhook_url_and_secret()
+    if not url or not secret:
+        url, secret = _webhook_url_and_secret()
     if not url or not secret:
         return DriveUploadResult(
             ok=False,
@@ -62,10 +66,11 @@ def upload_voice_note_to_drive(
         "file_name": file_name,
         "mime_type": mime_type,
         "data_b64": b64,
+        "meta": meta or {},
     }
 
     try:
-        r = requests.post(url, json=payload, timeout=timeout_s)
+        r = post_json(url, payload, timeout_s=timeout_s)
         j = r.json() if r.content else {}
         if not isinstance(j, dict) or not j.get("ok"):
             return DriveUploadResult(
@@ -96,8 +101,236 @@ def upload_voice_note_to_drive(
         )
 
 
-def _openai_key() -> str:
-    return str(st.secrets.get("OPENAI_API_KEY") or "").strip()
+# ----------------------------
+# Chunked upload (voice_upload_init / _append / _finalize)
+# ----------------------------
+# Each chunk is a small JSON POST (base64, checksummed). The server keys an upload by
+# the whole-file sha256, so calling again after a failure resumes at the last
+# acknowledged offset instead of restarting from zero.
+UPLOAD_CHUNK_BYTES = 512 * 1024
+UPLOAD_CHUNK_RETRIES = 3
+UPLOAD_CHUNK_TIMEOUT_S = 30
+
+
+class _UploadError(RuntimeError):
+    pass
+
+
+def _failed_upload(mime_type: str, error: str) -> DriveUploadResult:
+    return DriveUploadResult(ok=False, audio_url="", audio_url_alt="", file_id="", mime_type=mime_type or "", error=error)
+
+
+def _file_digest(fileobj: BinaryIO, chunk_bytes: int) -> Tuple[str, int]:
+    """
+    sha256 + size of a seekable file object, reading it chunk by chunk.
+    """
+    h = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while True:
+        block = fileobj.read(chunk_bytes)
+        if not block:
+            break
+        h.update(block)
+        size += len(block)
+    fileobj.seek(0)
+    return h.hexdigest(), size
+
+
+def _upload_call(url: str, secret: str, payload: Dict[str, Any], *, retries: int = 0) -> Dict[str, Any]:
+    last = ""
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(min(0.5 * (2 ** (attempt - 1)), 4.0))
+        try:
+            r = post_json(url, {**payload, "secret": secret}, timeout_s=UPLOAD_CHUNK_TIMEOUT_S)
+            j = r.json() if r.content else {}
+        except Exception as e:
+            last = str(e)
+            continue
+        if isinstance(j, dict) and j.get("ok"):
+            return j
+        last = str((j or {}).get("error") or "Upload failed") if isinstance(j, dict) else "Invalid JSON response"
+        if "checksum" not in last.lower():
+            # only network errors and corrupted chunks are worth sending again
+            break
+    raise _UploadError(last)
+
+
+def upload_voice_note_chunked(
+    fileobj: BinaryIO,
+    *,
+    file_name: str,
+    mime_type: str,
+    meta: Optional[Dict[str, Any]] = None,
+    url: str = "",
+    secret: str = "",
+    chunk_bytes: int = UPLOAD_CHUNK_BYTES,
+) -> DriveUploadResult:
+    """
+    Stream a recording to Drive in checksummed chunks (fileobj: seekable binary file,
+    e.g. a Streamlit UploadedFile). Only one chunk is held in memory at a time.
+    Falls back to the single-request upload when the WebApp has no chunked actions.
+    """
+    if not url or not secret:
+        url, secret = _webhook_url_and_secret()
+    if not url or not secret:
+        return _failed_upload(mime_type, "Missing webhook secrets (URL/SECRET).")
+
+    try:
+        sha, size = _file_digest(fileobj, chunk_bytes)
+        if not size:
+            return _failed_upload(mime_type, "Empty file")
+
+        # same bytes already on Drive (re-submitted note, retried job): reuse the file
+        drive_key = make_key("drive", sha, size)
+        cached = get_cache().get(drive_key)
+        if isinstance(cached, dict) and cached.get("file_id"):
+            return DriveUploadResult(
+                ok=True,
+                audio_url=str(cached.get("audio_url") or ""),
+                audio_url_alt=str(cached.get("audio_url_alt") or ""),
+                file_id=str(cached.get("file_id") or ""),
+                mime_type=str(cached.get("mime_type") or mime_type or ""),
+                error="",
+            )
+
+        try:
+            init = _upload_call(
+                url,
+                secret,
+                {
+                    "action": "voice_upload_init",
+                    "file_name": file_name,
+                    "mime_type": mime_type,
+                    "total_size": size,
+                    "sha256": sha,
+                    "chunk_size": chunk_bytes,
+                    "meta": meta or {},
+                },
+                retries=UPLOAD_CHUNK_RETRIES,
+            )
+        except _UploadError as e:
+            if "unknown action" not in str(e).lower():
+                raise
+            fileobj.seek(0)
+            return upload_voice_note_to_drive(
+                file_name=file_name,
+                mime_type=mime_type,
+                audio_bytes=fileobj.read(),
+                timeout_s=90,
+                meta=meta,
+                url=url,
+                secret=secret,
+            )
+
+        upload_id = str(init.get("upload_id") or "")
+        offset = int(init.get("received") or 0)  # > 0 when resuming
+        if init.get("file_id"):
+            offset = size  # server-side dedupe: this content is already finalized
+        while offset < size:
+            fileobj.seek(offset)
+            block = fileobj.read(chunk_bytes)
+            try:
+                ack = _upload_call(
+                    url,
+                    secret,
+                    {
+                        "action": "voice_upload_append",
+                        "upload_id": upload_id,
+                        "offset": offset,
+                        "data_b64": base64.b64encode(block).decode("ascii"),
+                        "chunk_sha256": hashlib.sha256(block).hexdigest(),
+                    },
+                    retries=UPLOAD_CHUNK_RETRIES,
+                )
+            except _UploadError:
+                # lost ack / offset mismatch: ask the server where it stands, then go on
+                status = _upload_call(url, secret, {"action": "voice_upload_status", "upload_id": upload_id})
+                if int(status.get("received") or 0) <= offset:
+                    raise
+                ack = status
+            offset = int(ack.get("received") or offset + len(block))
+
+        if init.get("file_id"):
+            done = init
+        else:
+            done = _upload_call(
+                url,
+                secret,
+                {"action": "voice_upload_finalize", "upload_id": upload_id, "sha256": sha},
+                retries=UPLOAD_CHUNK_RETRIES,
+            )
+        res = DriveUploadResult(
+            ok=True,
+            audio_url=str(done.get("audio_url") or ""),
+            audio_url_alt=str(done.get("audio_url_alt") or ""),
+            file_id=str(done.get("file_id") or ""),
+            mime_type=str(done.get("mime_type") or mime_type or ""),
+            error="",
+        )
+        if res.file_id:
+            get_cache().put(
+                drive_key,
+                {
+                    "audio_url": res.audio_url,
+                    "audio_url_alt": res.audio_url_alt,
+                    "file_id": res.file_id,
+                    "mime_type": res.mime_type,
+                },
+            )
+        return res
+    except Exception as e:
+        return _failed_upload(mime_type, str(e))
+
+
+# ----------------------------
+# Transcription (long recordings: overlapping segments, transcribed in parallel)
+# ----------------------------
+SEGMENT_TARGET_S = 60.0  # segment length; recordings under ~1.1x this go in one request
+SEGMENT_OVERLAP_S = 1.5
+TRANSCRIBE_MAX_CONCURRENCY = 4  # rate limit, retries and metrics: llm_gateway
+
+
+def _transcribe_request(
+    *,
+    audio_bytes: bytes,
+    file_name: str,
+    mime_type: str,
+    language: str,
+    timeout_s: float,
+    audio_s: float = 0.0,
+) -> str:
+    return llm_gateway.transcribe(
+        audio_bytes,
+        file_name=file_name,
+        mime_type=mime_type,
+        model=TRANSCRIBE_MODEL,
+        language=language,
+        timeout_s=timeout_s,
+        audio_s=audio_s,
+    )
+
+
+def _transcribe_segments(*, pcm: Pcm, language: str, file_name: str) -> str:
+    segments = plan_segments(pcm, target_s=SEGMENT_TARGET_S, overlap_s=SEGMENT_OVERLAP_S)
+    stem = file_name.rsplit(".", 1)[0] or "voice"
+
+    def one(seg: Segment) -> str:
+        start_s, end_s = seg.seconds(pcm.rate)
+        return _transcribe_request(
+            audio_bytes=encode_wav(pcm, seg.start, seg.end),
+            file_name=f"{stem}-{seg.index:03d}.wav",
+            mime_type="audio/wav",
+            language=language,
+            timeout_s=30 + 2 * (end_s - start_s),
+            audio_s=end_s - start_s,
+        )
+
+    workers = max(1, min(TRANSCRIBE_MAX_CONCURRENCY, len(segments)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcribe") as pool:
+        texts = list(pool.map(one, segments))  # map keeps segment order; first error propagates
+    return stitch(texts)
 
 
 def transcribe_audio_openai(
@@ -111,30 +344,36 @@ def transcribe_audio_openai(
     """
     Uses OpenAI Audio Transcriptions endpoint.
     Model: gpt-4o-mini-transcribe (as requested)
+    Cached by audio sha256 + model + language: the same recording is billed once.
+    Long recordings (when decodable: WAV, or anything with ffmpeg installed) are split
+    into overlapping segments transcribed concurrently, so wall-clock time follows the
+    segment length rather than the recording length.
     """
-    api_key = _openai_key()
-    if not api_key:
-        raise RuntimeError("Missing OPENAI_API_KEY in st.secrets")
-
-    url = "https://api.openai.com/v1/audio/transcriptions"
-    headers = {"Authorization": f"Bearer {api_key}"}
+    cache = get_cache()
+    key = make_key("transcript", sha256_hex(audio_bytes), TRANSCRIBE_MODEL, language)
+    hit = cache.get(key)
+    if isinstance(hit, str) and hit.strip():
+        return hit
 
-    files = {
-        "file": (file_name, audio_bytes, mime_type or "application/octet-stream"),
-    }
-    data = {
-        "model": "gpt-4o-mini-transcribe",
-        "language": language,
-        "response_format": "json",
-    }
+    if not llm_gateway.configured():
+        raise RuntimeError("Missing OPENAI_API_KEY in secrets")
 
-    r = requests.post(url, headers=headers, files=files, data=data, timeout=timeout_s)
-    r.raise_for_status()
-    j = r.json()
-    txt = j.get("text")
-    if not isinstance(txt, str) or not txt.strip():
+    pcm = decode_pcm(audio_bytes, mime_type)
+    if pcm is not None and pcm.duration_s > SEGMENT_TARGET_S * 1.1:
+        txt = _transcribe_segments(pcm=pcm, language=language, file_name=file_name)
+    else:
+        txt = _transcribe_request(
+            audio_bytes=audio_bytes,
+            file_name=file_name,
+            mime_type=mime_type,
+            language=language,
+            timeout_s=timeout_s,
+            audio_s=pcm.duration_s if pcm is not None else 0.0,
+        )
+    if not txt:
         raise RuntimeError("Transcription returned empty text")
-    return txt.strip()
+    cache.put(key, txt)
+    return txt
 
 
 def summarize_transcript_openai(
@@ -144,13 +383,16 @@ def summarize_transcript_openai(
 ) -> Tuple[str, List[str]]:
     """
     Chat summary with gpt-4o-mini -> returns (summary, bullets)
+    Cached by transcript hash + model + SUMMARY_PROMPT_VERSION.
     """
-    api_key = _openai_key()
-    if not api_key:
-        raise RuntimeError("Missing OPENAI_API_KEY in st.secrets")
+    cache = get_cache()
+    key = make_key("summary", sha256_hex(transcript), SUMMARY_MODEL, SUMMARY_PROMPT_VERSION)
+    hit = cache.get(key)
+    if isinstance(hit, dict) and str(hit.get("summary") or "").strip():
+        return str(hit["summary"]), [str(x) for x in (hit.get("highlights") or [])]
 
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    if not llm_gateway.configured():
+        raise RuntimeError("Missing OPENAI_API_KEY in secrets")
 
     sys = (
         "Tu es un assistant de synthèse. "
@@ -167,20 +409,15 @@ def summarize_transcript_openai(
         "- highlights: 3 à 6 puces max\n"
     )
 
-    body = {
-        "model": "gpt-4o-mini",
-        "temperature": 0.2,
-        "messages": [
+    content = llm_gateway.chat(
+        [
             {"role": "system", "content": sys},
             {"role": "user", "content": user},
         ],
-    }
-
-    r = requests.post(url, headers=headers, data=json.dumps(body), timeout=timeout_s)
-    r.raise_for_status()
-    j = r.json()
-    content = (((j.get("choices") or [{}])[0]).get("message") or {}).get("content") or ""
-    content = str(content)
+        model=SUMMARY_MODEL,
+        temperature=0.2,
+        timeout_s=timeout_s,
+    ).text
 
     # Robust JSON extraction (no hard fail)
     summary = ""
@@ -200,6 +437,9 @@ def summarize_transcript_openai(
 
     if not summary:
         summary = "Résumé indisponible."
+    else:
+        # placeholder results are not cached, so a later call gets another chance
+        cache.put(key, {"summary": summary, "highlights": highlights})
     if not highlights:
         highlights = []
 
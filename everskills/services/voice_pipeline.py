@@ -0,0 +1,452 @@
+# everskills/services/voice_pipeline.py
+from __future__ import annotations
+
+import json
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Set, Tuple
+
+from everskills.services.journal_store import add_local_item, set_item_fields
+from everskills.services.settings import get_settings
+
+# Voice notes as a background pipeline (pages/20_canal_chat.py):
+#   upload    -> chunked upload of the spooled recording, then journal_create (outbox)
+#   transcribe-> OpenAI transcription
+#   summarize -> summary + highlights
+#   attach    -> a `voice_summary` journal entry (parent_id = the voice note), via the outbox
+# The chat renders the note at once from the local store; every stage result is
+# persisted on the job, so a retry or a restart resumes at the failed stage.
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+JOBS_PATH = DATA_DIR / "voice_jobs.json"
+SPOOL_DIR = DATA_DIR / "voice_spool"
+
+# Stages (job["stage"]); DONE / FAILED are terminal
+UPLOAD = "upload"
+TRANSCRIBE = "transcribe"
+SUMMARIZE = "summarize"
+ATTACH = "attach"
+DONE = "done"
+FAILED = "failed"
+NEXT_STAGE = {UPLOAD: TRANSCRIBE, TRANSCRIBE: SUMMARIZE, SUMMARIZE: ATTACH, ATTACH: DONE}
+
+MAX_WORKERS = 2  # concurrent stages (OpenAI calls are long and rate limited)
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 300.0
+LEASE_S = 300.0  # a stage running longer than this belongs to a dead process
+DONE_RETENTION_S = 24 * 3600
+FAILED_RETENTION_S = 7 * 24 * 3600  # long enough for a manual retry, then job + spool go
+
+_LOCK = threading.RLock()
+_WAKE = threading.Event()
+_WORKER: Optional[threading.Thread] = None
+_POOL: Optional[ThreadPoolExecutor] = None
+_IN_FLIGHT: Set[str] = set()
+
+
+class _Skip(Exception):
+    """The remaining stages cannot run here (e.g. no OpenAI key): finish without them."""
+
+
+# ----------------------------
+# Utils
+# ----------------------------
+def _read_jobs() -> List[Dict[str, Any]]:
+    try:
+        if not JOBS_PATH.exists():
+            return []
+        raw = JOBS_PATH.read_text(encoding="utf-8")
+        data = json.loads(raw) if raw.strip() else []
+        return [j for j in data if isinstance(j, dict)] if isinstance(data, list) else []
+    except Exception:
+        return []
+
+
+def _write_jobs(jobs: List[Dict[str, Any]]) -> None:
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = JOBS_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps(jobs, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(JOBS_PATH)
+
+
+def _backoff_s(attempts: int) -> float:
+    return min(BACKOFF_BASE_S * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_S)
+
+
+def _update_job(job_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    with _LOCK:
+        jobs = _read_jobs()
+        for j in jobs:
+            if j.get("id") == job_id:
+                j.update(fields)
+                j["updated_at"] = time.time()
+                _write_jobs(jobs)
+                return j
+    return {}
+
+
+def _webhook() -> Tuple[str, str]:
+    # same resolution as the canal chat: users WebApp first, then the generic one
+    s = get_settings()
+    return s.users_webhook.url or s.apps_script.url, s.users_webhook.secret or s.apps_script.secret
+
+
+def _voice_body(job: Dict[str, Any]) -> str:
+    msg = {
+        "v": 1,
+        "type": "voice",
+        "mood": job.get("mood") or "",
+        "text": job.get("text") or "",
+        "audio": job.get("audio") or {"pending": True},
+    }
+    return "EVSMSG:" + json.dumps(msg, ensure_ascii=False)
+
+
+def _mark_local(job: Dict[str, Any], fields: Dict[str, Any]) -> None:
+    if job.get("store_key"):
+        set_item_fields(job["store_key"], job["entry"]["id"], fields)
+
+
+# ----------------------------
+# Stages
+# ----------------------------
+def _stage_upload(job: Dict[str, Any]) -> Dict[str, Any]:
+    from everskills.services.journal_outbox import enqueue_journal_create  # local import to avoid cycles
+    from everskills.services.voice_notes import upload_voice_note_chunked
+
+    url, secret = _webhook()
+    with open(job["spool_path"], "rb") as f:
+        res = upload_voice_note_chunked(
+            f,
+            file_name=job["file_name"],
+            mime_type=job["mime_type"],
+            meta=job.get("meta") or {},
+            url=url,
+            secret=secret,
+        )
+    if not res.ok:
+        raise RuntimeError(f"Upload audio KO: {res.error}")
+    if not res.audio_url and not res.audio_url_alt:
+        raise RuntimeError("Upload audio KO: audio_url manquant.")
+
+    audio = {"url": res.audio_url, "url_alt": res.audio_url_alt, "mime": res.mime_type or job["mime_type"], "file_id": res.file_id}
+    # created_at stays the recording time: viewers fetch late rows by server sequence
+    entry = {**job["entry"], "body": _voice_body({**job, "audio": audio})}
+    enqueue_journal_create(entry, store_key=job.get("store_key") or "")
+    _mark_local(job, {"body": entry["body"]})
+    return {"audio": audio}
+
+
+def _stage_transcribe(job: Dict[str, Any]) -> Dict[str, Any]:
+    from everskills.services.llm_gateway import configured
+    from everskills.services.voice_notes import transcribe_audio_openai
+
+    if not configured():
+        raise _Skip("OPENAI_API_KEY absente : pas de transcription.")
+    audio_bytes = Path(job["spool_path"]).read_bytes()
+    return {
+        "transcript": transcribe_audio_openai(
+            audio_bytes=audio_bytes,
+            file_name=job["file_name"],
+            mime_type=job["mime_type"],
+        )
+    }
+
+
+def _stage_summarize(job: Dict[str, Any]) -> Dict[str, Any]:
+    from everskills.services.voice_notes import summarize_transcript_openai
+
+    summary, highlights = summarize_transcript_openai(transcript=job.get("transcript") or "")
+    return {"summary": summary, "highlights": highlights}
+
+
+def _stage_attach(job: Dict[str, Any]) -> Dict[str, Any]:
+    from everskills.services.journal_outbox import enqueue_journal_create  # local import to avoid cycles
+
+    parent = job["entry"]
+    body = "EVSMSG:" + json.dumps(
+        {
+            "v": 1,
+            "type": "voice_summary",
+            "parent_id": parent["id"],
+            "summary": job.get("summary") or "",
+            "highlights": job.get("highlights") or [],
+            "transcript": job.get("transcript") or "",
+        },
+        ensure_ascii=False,
+    )
+    # stable id: re-running the stage never posts a second summary
+    child = {**parent, "id": f"{parent['id']}-summary", "created_at": int(time.time()), "body": body, "tags": ["chat", "canal", "voice_summary"]}
+    enqueue_journal_create(child, store_key=job.get("store_key") or "")
+    return {}
+
+
+_STAGES = {UPLOAD: _stage_upload, TRANSCRIBE: _stage_transcribe, SUMMARIZE: _stage_summarize, ATTACH: _stage_attach}
+
+
+def _finish(job: Dict[str, Any], stage: str, error: str = "") -> None:
+    fields: Dict[str, Any] = {"_voice_stage": stage, "_voice_error": error}
+    if stage == DONE:
+        try:
+            Path(job["spool_path"]).unlink(missing_ok=True)
+        except Exception:
+            pass
+    if job.get("failed_stage") == UPLOAD or stage == UPLOAD:
+        # the note itself was never posted: show it as failed / pending like any message
+        from everskills.services.journal_outbox import FAILED as OUTBOX_FAILED, PENDING  # local import to avoid cycles
+
+        fields.update({"_delivery": OUTBOX_FAILED if stage == FAILED else PENDING, "_delivery_error": error})
+    _mark_local(job, fields)
+
+
+def _run_stage(job_id: str) -> None:
+    try:
+        with _LOCK:
+            job = next((j for j in _read_jobs() if j.get("id") == job_id), None)
+        if not job or job.get("stage") not in _STAGES:
+            return
+        stage = job["stage"]
+        try:
+            out = _STAGES[stage](job)
+        except _Skip as e:
+            job = _update_job(job_id, {"stage": DONE, "last_error": str(e), "lease_until": 0})
+            _finish(job, DONE, str(e))
+            return
+        except Exception as e:
+            attempts = int(job.get("attempts") or 0) + 1
+            err = str(e) or e.__class__.__name__
+            terminal = attempts >= MAX_ATTEMPTS
+            job = _update_job(
+                job_id,
+                {
+                    "attempts": 0 if terminal else attempts,
+                    "stage": FAILED if terminal else stage,
+                    "failed_stage": stage,
+                    "last_error": err,
+                    "next_try_at": time.time() + _backoff_s(attempts),
+                    "lease_until": 0,
+                },
+            )
+            if terminal:
+                _finish(job, FAILED, err)
+            return
+
+        nxt = NEXT_STAGE[stage]
+        job = _update_job(
+            job_id,
+            {**out, "stage": nxt, "failed_stage": "", "attempts": 0, "last_error": "", "next_try_at": time.time(), "lease_until": 0},
+        )
+        _finish(job, nxt)
+    finally:
+        with _LOCK:
+            _IN_FLIGHT.discard(job_id)
+        _WAKE.set()
+
+
+# ----------------------------
+# Dispatcher
+# ----------------------------
+def _expired(j: Dict[str, Any], now: float) -> bool:
+    age = now - float(j.get("updated_at") or 0)
+    return (j.get("stage") == DONE and age > DONE_RETENTION_S) or (j.get("stage") == FAILED and age > FAILED_RETENTION_S)
+
+
+def _prune_spool(jobs: List[Dict[str, Any]], now: float) -> None:
+    """
+    Spool files of dropped FAILED jobs, and orphans left by a crash before the job was saved.
+    """
+    keep = {str(j.get("spool_path") or "") for j in jobs}
+    try:
+        paths = list(SPOOL_DIR.iterdir()) if SPOOL_DIR.exists() else []
+    except Exception:
+        return
+    for p in paths:
+        try:
+            if str(p) not in keep and now - p.stat().st_mtime > FAILED_RETENTION_S:
+                p.unlink()
+        except Exception:
+            continue
+
+
+def _claim_due(now: float, limit: int) -> List[str]:
+    """
+    Lease due jobs (lease_until) so another process does not run the same stage.
+    """
+    if limit <= 0:
+        return []
+    with _LOCK:
+        jobs = _read_jobs()
+        picked: List[str] = []
+        for j in jobs:
+            if len(picked) >= limit:
+                break
+            if j.get("stage") not in _STAGES or j.get("id") in _IN_FLIGHT:
+                continue
+            if float(j.get("next_try_at") or 0) > now or float(j.get("lease_until") or 0) > now:
+                continue
+            j["lease_until"] = now + LEASE_S
+            picked.append(j["id"])
+        # drop finished / abandoned jobs after a while (the journal is the record)
+        expired = [j for j in jobs if _expired(j, now)]
+        if expired:
+            jobs = [j for j in jobs if not _expired(j, now)]
+            for j in expired:
+                try:
+                    if j.get("spool_path"):
+                        Path(j["spool_path"]).unlink(missing_ok=True)
+                except Exception:
+                    pass
+            _prune_spool(jobs, now)
+        _write_jobs(jobs)
+        _IN_FLIGHT.update(picked)
+    return picked
+
+
+def process_due(now: Optional[float] = None) -> int:
+    """
+    Run the current stage of every due job (bounded by MAX_WORKERS) and wait for them.
+    Returns the number of stages run. For CLIs / tests; the app uses the worker thread.
+    """
+    n = 0
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="voice-stage") as pool:
+        for job_id in _claim_due(time.time() if now is None else now, MAX_WORKERS * 4):
+            pool.submit(_run_stage, job_id)
+            n += 1
+    return n
+
+
+def _next_wakeup_s() -> float:
+    with _LOCK:
+        due = [float(j.get("next_try_at") or 0) for j in _read_jobs() if j.get("stage") in _STAGES]
+    if not due:
+        return 30.0
+    return max(0.2, min(min(due) - time.time(), 30.0))
+
+
+def _worker_loop() -> None:
+    global _POOL
+    _POOL = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="voice-stage")
+    while True:
+        try:
+            for job_id in _claim_due(time.time(), MAX_WORKERS - len(_IN_FLIGHT)):
+                _POOL.submit(_run_stage, job_id)
+        except Exception:
+            pass
+        _WAKE.wait(timeout=_next_wakeup_s())
+        _WAKE.clear()
+
+
+def ensure_worker() -> None:
+    """
+    Start the dispatcher thread (and its bounded stage pool) once per process.
+    """
+    global _WORKER
+    with _LOCK:
+        if _WORKER is not None and _WORKER.is_alive():
+            return
+        _WORKER = threading.Thread(target=_worker_loop, name="voice-pipeline", daemon=True)
+        _WORKER.start()
+
+
+# ----------------------------
+# Public API
+# ----------------------------
+def submit_voice_note(
+    fileobj: BinaryIO,
+    *,
+    entry: Any,
+    file_name: str,
+    mime_type: str,
+    store_key: str = "",
+    mood: str = "",
+    text: str = "",
+    meta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Spool the recording to disk (streamed copy), show the note at once in the local
+    thread store and queue the pipeline. `entry` is the JournalEntry of the note;
+    its body is filled in once the audio is uploaded.
+    """
+    data = asdict(entry) if not isinstance(entry, dict) else dict(entry)
+    job_id = f"voice_{uuid.uuid4().hex[:12]}"
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    spool_path = SPOOL_DIR / f"{job_id}{Path(file_name).suffix or '.bin'}"
+    fileobj.seek(0)
+    with open(spool_path, "wb") as out:
+        shutil.copyfileobj(fileobj, out, length=256 * 1024)
+
+    now = time.time()
+    job = {
+        "id": job_id,
+        "stage": UPLOAD,
+        "attempts": 0,
+        "next_try_at": now,
+        "lease_until": 0,
+        "created_at": now,
+        "updated_at": now,
+        "last_error": "",
+        "store_key": store_key,
+        "entry": data,
+        "file_name": file_name,
+        "mime_type": mime_type,
+        "spool_path": str(spool_path),
+        "mood": mood,
+        "text": text,
+        "meta": meta or {},
+    }
+    if store_key:
+        from everskills.services.journal_outbox import PENDING  # local import to avoid cycles
+
+        add_local_item(
+            store_key,
+            {**data, "body": _voice_body(job), "_delivery": PENDING, "_delivery_error": "", "_voice_job": job_id, "_voice_stage": UPLOAD},
+        )
+    with _LOCK:
+        jobs = _read_jobs()
+        jobs.append(job)
+        _write_jobs(jobs)
+
+    ensure_worker()
+    _WAKE.set()
+    return job
+
+
+def load_job(job_id: str) -> Dict[str, Any]:
+    with _LOCK:
+        return next((dict(j) for j in _read_jobs() if j.get("id") == job_id), {})
+
+
+def retry_job(job_id: str) -> bool:
+    """
+    Resume a FAILED job at the stage that failed (manual retry from the chat).
+    """
+    with _LOCK:
+        job = load_job(job_id)
+        if job.get("stage") != FAILED:
+            return False
+        if job.get("failed_stage") in (UPLOAD, TRANSCRIBE) and not Path(job["spool_path"]).exists():
+            return False
+        job = _update_job(job_id, {"stage": job.get("failed_stage") or UPLOAD, "attempts": 0, "next_try_at": time.time()})
+    _finish(job, job["stage"])
+    ensure_worker()
+    _WAKE.set()
+    return True
+
+
+def pipeline_stats() -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    with _LOCK:
+        for j in _read_jobs():
+            out[str(j.get("stage"))] = out.get(str(j.get("stage")), 0) + 1
+    return out
@@ -0,0 +1,207 @@
+# everskills/services/webhook_client.py
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from everskills.services.webhook_metrics import WebhookSample, caller_page, record
+
+# File is independent (no streamlit import): callers resolve URL/secret themselves.
+# Goes through `requests` on purpose: HTTP(S)_PROXY / NO_PROXY and the certifi CA
+# bundle (or REQUESTS_CA_BUNDLE) apply exactly as they did before instrumentation.
+# Connect time (TCP + TLS) is measured in urllib3's connection classes, mounted
+# through the session adapter; a reused keep-alive connection costs 0.
+
+_LOCAL = threading.local()
+
+
+def _add_connect_ms(t0: float) -> None:
+    _LOCAL.connect_ms = getattr(_LOCAL, "connect_ms", 0.0) + (time.perf_counter() - t0) * 1000.0
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self) -> None:
+        t0 = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _add_connect_ms(t0)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self) -> None:
+        t0 = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _add_connect_ms(t0)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+_TIMED_POOLS = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+class _TimingAdapter(HTTPAdapter):
+    """
+    requests' adapter with the timed connection pools (direct and HTTP(S) proxy).
+    """
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _TIMED_POOLS
+
+    def proxy_manager_for(self, proxy: str, **proxy_kwargs: Any) -> Any:
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if not proxy.lower().startswith("socks"):  # SOCKS pools open their own sockets
+            manager.pool_classes_by_scheme = _TIMED_POOLS
+        return manager
+
+
+def _session() -> requests.Session:
+    """
+    One keep-alive session per thread (requests.Session is not thread-safe).
+    """
+    s = getattr(_LOCAL, "session", None)
+    if s is None:
+        s = requests.Session()
+        adapter = _TimingAdapter()
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        _LOCAL.session = s
+    return s
+
+
+@dataclass
+class WebhookResponse:
+    status: int
+    content: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+    connect_ms: float = 0.0
+    first_byte_ms: float = 0.0
+    total_ms: float = 0.0
+    _json: Any = None
+    _json_done: bool = False
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        """
+        Parsed JSON body (raises ValueError on non-JSON, like requests).
+        """
+        if not self._json_done:
+            self._json = json.loads(self.text) if self.content else None
+            self._json_done = True
+        return self._json
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status} from webhook")
+
+
+def _is_ok(resp: WebhookResponse) -> bool:
+    if resp.status >= 400:
+        return False
+    try:
+        j = resp.json()
+    except Exception:
+        return False
+    return not (isinstance(j, dict) and j.get("ok") is not True)
+
+
+def post_json(
+    url: str,
+    payload: Dict[str, Any],
+    *,
+    timeout_s: float = 25,
+    action: str = "",
+    retries: int = 0,
+    page: str = "",
+) -> WebhookResponse:
+    """
+    POST a JSON payload to the Apps Script webhook and record per-action timings
+    (connect / first byte / total, request + response bytes, ok/error, retry count).
+
+    Redirects are followed by requests (Apps Script answers POST with a 302 to
+    googleusercontent, fetched with GET). The body is streamed so the first-byte time
+    is taken when the final headers arrive; connect_ms adds up the connections opened
+    on the way (0 when both hops reuse keep-alive connections). Raises on network errors.
+    """
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    action = action or str(payload.get("action") or "")
+    page = page or caller_page()
+
+    t0 = time.perf_counter()
+    resp: Optional[WebhookResponse] = None
+    error = ""
+    _LOCAL.connect_ms = 0.0
+
+    try:
+        r = _session().post(
+            url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            timeout=timeout_s,
+            stream=True,
+        )
+        first_byte_ms = (time.perf_counter() - t0) * 1000.0
+        try:
+            content = r.content
+        finally:
+            r.close()
+
+        resp = WebhookResponse(
+            status=r.status_code,
+            content=content,
+            headers={k.lower(): v for k, v in r.headers.items()},
+            connect_ms=_LOCAL.connect_ms,
+            first_byte_ms=first_byte_ms,
+            total_ms=(time.perf_counter() - t0) * 1000.0,
+        )
+        if resp.status >= 400:
+            error = f"HTTP {resp.status}"
+        elif not _is_ok(resp):
+            try:
+                j = resp.json()
+                error = str((j or {}).get("error") or "ok!=true") if isinstance(j, dict) else "Non-dict JSON"
+            except Exception:
+                error = "Non-JSON response"
+        return resp
+
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+        raise
+
+    finally:
+        record(
+            WebhookSample(
+                ts=time.time(),
+                action=action,
+                page=page,
+                ok=not error,
+                status=resp.status if resp else 0,
+                connect_ms=round(_LOCAL.connect_ms, 1),
+                first_byte_ms=round(resp.first_byte_ms, 1) if resp else 0.0,
+                total_ms=round((time.perf_counter() - t0) * 1000.0, 1),
+                request_bytes=len(body),
+                response_bytes=len(resp.content) if resp else 0,
+                retries=int(retries or 0),
+                error=error[:300],
+            )
+        )
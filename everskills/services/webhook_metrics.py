@@ -0,0 +1,276 @@
+# everskills/services/webhook_metrics.py
+from __future__ import annotations
+
+import atexit
+import bisect
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from everskills.services.rotating_jsonl import RotatingJSONL
+
+# File is independent (no streamlit import): also used by background workers.
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+METRICS_PATH = DATA_DIR / "webhook_metrics.jsonl"
+
+FLUSH_INTERVAL_S = 30.0
+FLUSH_MAX_BUFFER = 50
+
+# Rotation of the metrics log (older segments gzipped, then pruned) and the longest
+# history the admin page ever reads ("Tout" included).
+METRICS_MAX_BYTES = 5 * 1024 * 1024
+METRICS_MAX_AGE_S = 24 * 3600.0
+METRICS_KEEP_SEGMENTS = 30
+MAX_READ_WINDOW_S = 30 * 24 * 3600.0
+
+# Upper bounds (ms) of the latency buckets; the last bucket is open-ended.
+BUCKETS_MS: List[float] = [
+    10, 25, 50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000,
+    5000, 8000, 12000, 20000, 30000, 45000, 60000, 90000,
+]
+
+
+@dataclass
+class WebhookSample:
+    ts: float
+    action: str
+    page: str
+    ok: bool
+    status: int
+    connect_ms: float
+    first_byte_ms: float
+    total_ms: float
+    request_bytes: int
+    response_bytes: int
+    retries: int = 0
+    error: str = ""
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram (cheap to update, mergeable, percentile estimates
+    interpolated inside the bucket).
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, v: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, v)] += 1
+        self.n += 1
+        self.total += v
+        self.max = max(self.max, v)
+
+    def percentile(self, q: float) -> float:
+        if self.n == 0:
+            return 0.0
+        rank = q / 100.0 * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c == 0:
+                continue
+            if seen + c >= rank:
+                lo = BUCKETS_MS[i - 1] if i > 0 else 0.0
+                hi = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+                frac = (rank - seen) / c
+                return min(lo + (hi - lo) * frac, self.max)
+            seen += c
+        return self.max
+
+
+@dataclass
+class ActionStats:
+    calls: int = 0
+    errors: int = 0
+    retries: int = 0
+    new_connections: int = 0  # calls that opened a connection (no keep-alive reuse)
+    request_bytes: int = 0
+    response_bytes: int = 0
+    total: Histogram = field(default_factory=Histogram)
+    first_byte: Histogram = field(default_factory=Histogram)
+    connect: Histogram = field(default_factory=Histogram)
+
+    def add(self, s: WebhookSample) -> None:
+        self.calls += 1
+        self.errors += 0 if s.ok else 1
+        self.retries += int(s.retries or 0)
+        self.request_bytes += int(s.request_bytes or 0)
+        self.response_bytes += int(s.response_bytes or 0)
+        self.total.add(float(s.total_ms or 0))
+        self.first_byte.add(float(s.first_byte_ms or 0))
+        self.connect.add(float(s.connect_ms or 0))
+        self.new_connections += 1 if float(s.connect_ms or 0) > 0 else 0
+
+    def summary(self) -> Dict[str, Any]:
+        n = max(self.calls, 1)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_pct": round(100.0 * self.errors / n, 1),
+            "retries": self.retries,
+            "p50_ms": round(self.total.percentile(50)),
+            "p95_ms": round(self.total.percentile(95)),
+            "p99_ms": round(self.total.percentile(99)),
+            "max_ms": round(self.total.max),
+            "p95_first_byte_ms": round(self.first_byte.percentile(95)),
+            "p95_connect_ms": round(self.connect.percentile(95)),
+            "new_conn_pct": round(100.0 * self.new_connections / n, 1),
+            "avg_req_bytes": round(self.request_bytes / n),
+            "avg_resp_bytes": round(self.response_bytes / n),
+        }
+
+
+# ----------------------------
+# In-memory aggregation (per process)
+# ----------------------------
+_LOCK = threading.Lock()
+_STATS: Dict[Tuple[str, str], ActionStats] = {}
+_BUFFER: List[WebhookSample] = []
+_LAST_FLUSH = time.time()
+_PAGE_OVERRIDE = threading.local()
+_LOG: Optional[RotatingJSONL] = None
+
+
+def _metrics_log() -> RotatingJSONL:
+    global _LOG
+    if _LOG is None or _LOG.path != METRICS_PATH:
+        _LOG = RotatingJSONL(
+            METRICS_PATH,
+            max_bytes=METRICS_MAX_BYTES,
+            max_age_s=METRICS_MAX_AGE_S,
+            keep_segments=METRICS_KEEP_SEGMENTS,
+        )
+    return _LOG
+
+
+@contextmanager
+def page_context(page: str) -> Iterator[None]:
+    """
+    Attribute calls made from a worker thread to the page that scheduled them.
+    """
+    prev = getattr(_PAGE_OVERRIDE, "page", "")
+    _PAGE_OVERRIDE.page = page
+    try:
+        yield
+    finally:
+        _PAGE_OVERRIDE.page = prev
+
+
+def caller_page() -> str:
+    """
+    Name of the Streamlit page (pages/*.py or app.py) on the call stack, else "background".
+    """
+    override = getattr(_PAGE_OVERRIDE, "page", "")
+    if override:
+        return override
+    f = sys._getframe(1)
+    while f is not None:
+        fn = f.f_code.co_filename.replace("\\", "/")
+        if "/pages/" in fn or fn.endswith("/app.py"):
+            return fn.rsplit("/", 1)[-1]
+        f = f.f_back
+    return "background"
+
+
+def record(sample: WebhookSample) -> None:
+    global _LAST_FLUSH
+    key = (sample.action or "?", sample.page or "?")
+    with _LOCK:
+        _STATS.setdefault(key, ActionStats()).add(sample)
+        _BUFFER.append(sample)
+        due = len(_BUFFER) >= FLUSH_MAX_BUFFER or time.time() - _LAST_FLUSH >= FLUSH_INTERVAL_S
+    if due:
+        flush()
+
+
+def flush() -> None:
+    """
+    Append buffered samples to data/webhook_metrics.jsonl (rotated, one JSON per line).
+    """
+    global _LAST_FLUSH
+    with _LOCK:
+        batch = list(_BUFFER)
+        _BUFFER.clear()
+        _LAST_FLUSH = time.time()
+    if not batch:
+        return
+    try:
+        _metrics_log().append_many(asdict(s) for s in batch)
+    except Exception:
+        # metrics must never break a request
+        pass
+
+
+atexit.register(flush)
+
+
+def live_summary() -> List[Dict[str, Any]]:
+    """
+    Per (action, page) summary for this process since start.
+    """
+    with _LOCK:
+        items = [(k, v.summary()) for k, v in _STATS.items()]
+    return [{"action": a, "page": p, **s} for (a, p), s in sorted(items)]
+
+
+# ----------------------------
+# Persisted metrics (admin page)
+# ----------------------------
+def iter_samples(since_ts: float = 0.0) -> Iterator[WebhookSample]:
+    """
+    Stream samples from the metrics log, oldest first (skips malformed lines).
+    Never reads further back than MAX_READ_WINDOW_S.
+    """
+    since_ts = max(float(since_ts or 0), time.time() - MAX_READ_WINDOW_S)
+    fields = set(WebhookSample.__dataclass_fields__)
+    for d in _metrics_log().iter_records(since_ts=since_ts):
+        try:
+            if float(d.get("ts") or 0) < since_ts:
+                continue
+            yield WebhookSample(**{k: v for k, v in d.items() if k in fields})
+        except Exception:
+            continue
+
+
+def persisted_summary(since_ts: float = 0.0, *, by_page: bool = True) -> List[Dict[str, Any]]:
+    stats: Dict[Tuple[str, str], ActionStats] = {}
+    for s in iter_samples(since_ts):
+        key = (s.action or "?", (s.page or "?") if by_page else "*")
+        stats.setdefault(key, ActionStats()).add(s)
+    return [{"action": a, "page": p, **v.summary()} for (a, p), v in sorted(stats.items())]
+
+
+def recent_errors(limit: int = 50, since_ts: float = 0.0) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for s in iter_samples(since_ts):
+        if not s.ok:
+            out.append(asdict(s))
+            if len(out) > limit:
+                out.pop(0)
+    return list(reversed(out))
+
+
+def reset(*, delete_file: bool = False) -> None:
+    """
+    DEV helper: clear in-memory stats (and optionally every metrics segment).
+    """
+    with _LOCK:
+        _STATS.clear()
+        _BUFFER.clear()
+    if delete_file:
+        for seg in _metrics_log().segments():
+            seg.unlink(missing_ok=True)
+
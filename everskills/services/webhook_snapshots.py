@@ -0,0 +1,258 @@
+# everskills/services/webhook_snapshots.py
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from everskills.services.webhook_metrics import caller_page, page_context
+
+# File is independent (no streamlit import); the banner lives in everskills/ui/banners.py.
+
+# ----------------------------
+# Paths
+# ----------------------------
+THIS_FILE = Path(__file__).resolve()
+PROJECT_ROOT = THIS_FILE.parents[2]  # .../EVERSKILLS
+DATA_DIR = PROJECT_ROOT / "data"
+SNAPSHOT_DIR = DATA_DIR / "webhook_snapshots"
+
+DEFAULT_BUDGET_S = 4.0
+# Within this delay of the last failure, probe the backend in the background instead of
+# making pages wait; past it, the next caller waits (up to its budget) for a real call.
+DEGRADED_PROBE_S = 30.0
+
+_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="webhook-swr")
+_LOCK = threading.Lock()
+_INFLIGHT: Dict[str, Future] = {}
+_INVALIDATED: Dict[str, float] = {}  # key prefix -> last invalidation (epoch s)
+_DEGRADED_SINCE: Optional[float] = None  # start of the outage (banner)
+_LAST_FAILURE_AT: Optional[float] = None  # last failed call or probe
+_LAST_ERROR = ""
+
+
+@dataclass
+class BudgetResult:
+    done: bool  # finished within the budget
+    value: Any = None
+    error: str = ""
+
+
+@dataclass
+class SWRResult:
+    data: Any
+    stale: bool = False
+    stale_since: Optional[float] = None  # epoch seconds of the snapshot served
+    error: str = ""  # why the snapshot was served (timeout / backend error)
+
+    @property
+    def available(self) -> bool:
+        return self.data is not None
+
+
+# ----------------------------
+# Backend health (one Apps Script behind every action)
+# ----------------------------
+def mark_ok() -> None:
+    global _DEGRADED_SINCE, _LAST_FAILURE_AT, _LAST_ERROR
+    with _LOCK:
+        _DEGRADED_SINCE = None
+        _LAST_FAILURE_AT = None
+        _LAST_ERROR = ""
+
+
+def mark_degraded(error: str) -> None:
+    global _DEGRADED_SINCE, _LAST_FAILURE_AT, _LAST_ERROR
+    with _LOCK:
+        now = time.time()
+        if _DEGRADED_SINCE is None:
+            _DEGRADED_SINCE = now
+        _LAST_FAILURE_AT = now
+        _LAST_ERROR = error
+
+
+def degraded_since() -> Optional[float]:
+    return _DEGRADED_SINCE
+
+
+def last_error() -> str:
+    return _LAST_ERROR
+
+
+# ----------------------------
+# Single-flight + latency budget
+# ----------------------------
+def _submit(key: str, fn: Callable[[], Any], on_done: Optional[Callable[[Future], None]] = None) -> Future:
+    """
+    At most one in-flight call per key; late callers join the running one.
+    """
+    with _LOCK:
+        fut = _INFLIGHT.get(key)
+        if fut is not None and not fut.done():
+            return fut
+
+        page = caller_page()
+
+        def _run() -> Any:
+            with page_context(page):
+                return fn()
+
+        fut = _POOL.submit(_run)
+        fut.submitted_at = time.time()  # type: ignore[attr-defined]
+        _INFLIGHT[key] = fut
+
+    def _cleanup(f: Future) -> None:
+        with _LOCK:
+            if _INFLIGHT.get(key) is f:
+                _INFLIGHT.pop(key, None)
+        err = f.exception()
+        if err is None:
+            mark_ok()
+        else:
+            mark_degraded(str(err) or err.__class__.__name__)
+
+    fut.add_done_callback(_cleanup)
+    if on_done is not None:
+        fut.add_done_callback(on_done)
+    return fut
+
+
+def _recently_degraded() -> bool:
+    last = _LAST_FAILURE_AT
+    return last is not None and time.time() - last < DEGRADED_PROBE_S
+
+
+def run_with_budget(
+    key: str,
+    fn: Callable[[], Any],
+    *,
+    budget_s: float = DEFAULT_BUDGET_S,
+    fallback_available: bool = True,
+) -> BudgetResult:
+    """
+    Run fn in the background pool and wait at most budget_s.
+    If it does not finish in time it keeps running (the next caller joins it).
+    When the caller has a local copy to show and the backend is known to be down,
+    do not wait at all; without a local copy, wait for the real call.
+    """
+    fut = _submit(key, fn)
+    if not fallback_available:
+        wait_s: Optional[float] = None
+    elif _recently_degraded():
+        wait_s = 0.0
+    else:
+        wait_s = max(budget_s, 0.0)
+    try:
+        return BudgetResult(done=True, value=fut.result(timeout=wait_s))
+    except FutureTimeout:
+        mark_degraded(f"latency budget exceeded ({budget_s:.1f}s)")
+        return BudgetResult(done=False, error=f"Délai dépassé ({budget_s:.0f}s)")
+    except Exception as e:
+        return BudgetResult(done=True, error=str(e) or e.__class__.__name__)
+
+
+# ----------------------------
+# Last-known-good snapshots
+# ----------------------------
+def _snapshot_path(key: str) -> Path:
+    return SNAPSHOT_DIR / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:24]}.json"
+
+
+def load_snapshot(key: str) -> Optional[Dict[str, Any]]:
+    p = _snapshot_path(key)
+    try:
+        if not p.exists():
+            return None
+        d = json.loads(p.read_text(encoding="utf-8"))
+        return d if isinstance(d, dict) and "data" in d else None
+    except Exception:
+        return None
+
+
+def save_snapshot(key: str, data: Any) -> None:
+    try:
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        p = _snapshot_path(key)
+        tmp = p.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"key": key, "saved_at": time.time(), "data": data}, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(p)
+    except Exception:
+        pass
+
+
+def invalidate_snapshots(prefix: str) -> int:
+    """
+    Delete the snapshots whose key starts with prefix (after a write to that resource).
+    Returns the number of files removed. A fetch already in flight will not write
+    its (possibly older) result back.
+    """
+    n = 0
+    with _LOCK:
+        _INVALIDATED[prefix] = time.time()
+        try:
+            paths = list(SNAPSHOT_DIR.glob("*.json"))
+        except Exception:
+            return 0
+        for p in paths:
+            try:
+                d = json.loads(p.read_text(encoding="utf-8"))
+                if isinstance(d, dict) and str(d.get("key") or "").startswith(prefix):
+                    p.unlink()
+                    n += 1
+            except Exception:
+                continue
+    return n
+
+
+def swr_read(
+    key: str,
+    fetch: Callable[[], Any],
+    *,
+    budget_s: float = DEFAULT_BUDGET_S,
+    to_snapshot: Optional[Callable[[Any], Any]] = None,
+) -> SWRResult:
+    """
+    Stale-while-revalidate read of one webhook resource.
+    - fetch() must return JSON-serialisable data and raise on failure.
+    - to_snapshot(data) is what gets written to disk (e.g. without secrets); the
+      caller still gets the full fresh data.
+    - Healthy backend: wait up to budget_s for fresh data (and refresh the snapshot).
+    - Slow / failing backend: serve the last-known-good snapshot at once and let the
+      refresh finish in the background.
+    - No snapshot yet: nothing better to show, so wait for the real call.
+    """
+    snap = load_snapshot(key)
+
+    def _store(f: Future) -> None:
+        if f.exception() is None:
+            started = float(getattr(f, "submitted_at", 0.0))
+            data = f.result()
+            with _LOCK:
+                if any(key.startswith(p) and t >= started for p, t in _INVALIDATED.items()):
+                    return
+                save_snapshot(key, to_snapshot(data) if to_snapshot else data)
+
+    # Known outage: do not make the page wait, just revalidate in the background.
+    if snap is not None and _recently_degraded():
+        _submit(key, fetch, on_done=_store)
+        return SWRResult(data=snap["data"], stale=True, stale_since=float(snap.get("saved_at") or 0), error=last_error())
+
+    fut = _submit(key, fetch, on_done=_store)
+    wait_s = max(budget_s, 0.0) if snap is not None else None
+    try:
+        return SWRResult(data=fut.result(timeout=wait_s))
+    except FutureTimeout:
+        mark_degraded(f"latency budget exceeded ({budget_s:.1f}s)")
+        err = f"Délai dépassé ({budget_s:.0f}s)"
+    except Exception as e:
+        err = str(e) or e.__class__.__name__
+
+    if snap is None:
+        return SWRResult(data=None, stale=False, error=err)
+    return SWRResult(data=snap["data"], stale=True, stale_since=float(snap.get("saved_at") or 0), error=err)
@@ -0,0 +1,27 @@
+# everskills/ui/banners.py
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+import streamlit as st
+
+
+def _fmt_ts(ts: Optional[float]) -> str:
+    if not ts:
+        return "?"
+    try:
+        return datetime.fromtimestamp(float(ts)).strftime("%d/%m %H:%M")
+    except Exception:
+        return "?"
+
+
+def stale_banner(stale_since: Optional[float], error: str = "", *, what: str = "Données") -> None:
+    """
+    Degraded-mode banner: the page shows a last-known-good copy while the
+    Google Sheet WebApp is slow or unavailable.
+    """
+    msg = f"⚠️ {what} non à jour (dernière synchro : {_fmt_ts(stale_since)}). Le Google Sheet ne répond pas, nouvel essai en arrière-plan."
+    if error:
+        msg += f"\n\nDétail : {error}"
+    st.warning(msg)
@@ -10,8 +10,8 @@ from everskills.services.access import require_login
 from everskills.services.storage import load_requests, save_requests, update_request, now_iso
 from everskills.services.guard import require_role
 
-# CR11: email events (idempotent)
-from everskills.services.mail_send_once import send_once
+# CR11: email events (idempotent), sent by the mail queue worker
+from everskills.services.mail_queue import enqueue_send_once
 
 st.set_page_config(page_title="Admin RH — EVERSKILLS", layout="wide")
 
@@ -175,7 +175,7 @@ with tabs[0]:
 
                     # Email #0,5 (idempotent)
                     if send_mail:
-                        send_once(
+                        enqueue_send_once(
                             event_key=f"COACH_ASSIGNED:{rid}",
                             event_type="COACH_ASSIGNED",
                             request_id=rid,
@@ -194,6 +194,7 @@ with tabs[0]:
                                 "learner_email": learner_email,
                                 "assigned_by": actor_email,
                             },
+                            digest=True,
                         )
 
                     st.success("Coach assigné ✅")
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import hashlib
-import re
+import time
 from typing import Any, Dict, List, Optional, Tuple
 
 import streamlit as st
@@ -12,9 +12,22 @@ import streamlit as st
 # -----------------------------------------------------------------------------
 st.set_page_config(page_title="Coach Space — EVERSKILLS", layout="wide")
 
+from everskills.services import llm_gateway
 from everskills.services.access import require_login, find_user
 from everskills.services.guard import require_role
-from everskills.services.mail_send_once import send_once
+from everskills.services.mail_queue import enqueue_send_once
+from everskills.services.program_gen import (
+    PROGRAM_VARIANTS,
+    add_variant,
+    cached_program,
+    list_variants,
+    parse_program_weeks,
+    program_key,
+    program_weeks,
+    render_program_text,
+    stream_program,
+)
+from everskills.services.program_pregen import ensure_worker as ensure_program_pregen_worker, get_draft
 from everskills.services.storage import (
     load_campaigns,
     load_requests,
@@ -41,6 +54,9 @@ if user.get("role") not in ("coach", "admin", "super_admin"):
 
 coach_email = (user.get("email") or "").strip().lower()
 
+# background program drafts for open requests (program_draft_auto)
+ensure_program_pregen_worker()
+
 # -----------------------------------------------------------------------------
 # Helpers (generic)
 # -----------------------------------------------------------------------------
@@ -328,6 +344,7 @@ def _ensure_weekly_plan(camp: Dict[str, Any]) -> Dict[str, Any]:
             {
                 "week": w,
                 "objective_week": str(existing.get("objective_week") or "").strip(),
+                "indicator": str(existing.get("indicator") or "").strip(),
                 "actions": norm_actions,
                 "learner_comment": str(existing.get("learner_comment") or "").strip(),
                 "coach_comment": str(existing.get("coach_comment") or "").strip(),
@@ -353,93 +370,6 @@ def _hash_text(s: str) -> str:
     return hashlib.md5((s or "").encode("utf-8")).hexdigest()
 
 
-def _clean_md_line(line: str) -> str:
-    s = (line or "").strip()
-    s = re.sub(r"^\s*(?:[#>\-\*\u2022]+\s*)+", "", s)
-    s = s.strip()
-    s = re.sub(r"^\*{1,3}\s*(.*?)\s*\*{1,3}$", r"\1", s)
-    s = re.sub(r"^_{1,3}\s*(.*?)\s*_{1,3}$", r"\1", s)
-    return s.strip()
-
-
-def _extract_week_sections(program_text: str) -> Dict[int, List[str]]:
-    text = (program_text or "").strip()
-    if not text:
-        return {}
-    lines = text.splitlines()
-    header_re = re.compile(r"(?i)^\s*semaine\s*(\d{1,2})\s*[:\-\.\u2013\u2014]\s*(.*)\s*$")
-
-    sections: Dict[int, List[str]] = {}
-    current_week: Optional[int] = None
-
-    for raw in lines:
-        line = _clean_md_line(raw)
-        if not line:
-            continue
-
-        m = header_re.match(line)
-        if m:
-            wk = int(m.group(1))
-            if 1 <= wk <= 52:
-                current_week = wk
-                sections.setdefault(wk, [])
-                remainder = (m.group(2) or "").strip()
-                if remainder:
-                    sections[wk].append(remainder)
-            else:
-                current_week = None
-            continue
-
-        if current_week is not None:
-            sections[current_week].append(line)
-
-    return sections
-
-
-def _pick_objective_and_actions(lines: List[str]) -> Tuple[str, List[str]]:
-    clean = [_clean_md_line(ln) for ln in (lines or [])]
-    clean = [ln for ln in clean if ln.strip()]
-    if not clean:
-        return "", []
-
-    obj = ""
-    actions: List[str] = []
-
-    obj_re = re.compile(r"(?i)^\s*objectif(?:\s+de\s+la\s+semaine)?\s*:\s*(.*)$")
-    action_line_re = re.compile(r"^\s*(?:[-•]\s+|\d+\.\s+|\d+\)\s+)(.+)$")
-
-    for ln in clean[:15]:
-        m = obj_re.match(ln)
-        if m:
-            cand = (m.group(1) or "").strip()
-            if cand:
-                obj = cand
-                break
-    if not obj:
-        obj = clean[0].strip()
-
-    in_actions_block = False
-    for ln in clean:
-        if re.match(r"(?i)^\s*actions?\b\s*:?\s*$", ln) or re.match(r"(?i)^\s*actions?\s+terrain\s*:?\s*$", ln):
-            in_actions_block = True
-            continue
-
-        m = action_line_re.match(ln)
-        if m:
-            t = (m.group(1) or "").strip()
-            if t:
-                actions.append(t)
-        elif in_actions_block:
-            if len(ln) > 5 and not re.match(r"(?i)^(objectif|rappel|indicateur)\b", ln):
-                actions.append(ln.strip())
-
-        if len(actions) >= 3:
-            break
-
-    actions = [a for a in actions if a]
-    return obj.strip(), actions[:3]
-
-
 def _week_needs_fill(w: Dict[str, Any]) -> bool:
     obj = str(w.get("objective_week") or "").strip()
     actions = w.get("actions") or []
@@ -449,6 +379,30 @@ def _week_needs_fill(w: Dict[str, Any]) -> bool:
     return (not obj) or (not has_action)
 
 
+def _program_weeks_for(camp: Dict[str, Any], prog_hash: str, program_text: str) -> List[Dict[str, Any]]:
+    """
+    Weeks of program_text: from its structured program while the text is still the
+    rendering of it (or the pre-generated draft), else parsed from the text (hand-edited).
+    """
+    struct = camp.get("program_struct")
+    if isinstance(struct, dict) and _hash_text(render_program_text(struct)) == prog_hash:
+        return program_weeks(struct)
+    draft = camp.get("program_draft_auto")
+    if isinstance(draft, dict) and draft.get("hash") == prog_hash and isinstance(draft.get("weeks"), list):
+        return [w for w in draft["weeks"] if isinstance(w, dict) and int(w.get("week") or 0) > 0]
+    return parse_program_weeks(program_text)
+
+
+def _structured_for(text: str) -> Optional[Dict[str, Any]]:
+    """
+    The structured program behind the draft, if the text still is its rendering.
+    """
+    struct = st.session_state.get("program_draft_struct")
+    if isinstance(struct, dict) and render_program_text(struct).strip() == (text or "").strip():
+        return struct
+    return None
+
+
 def _sync_weekly_plan_from_program(camp: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
     program_text = str(camp.get("program_text") or "").strip()
     if not program_text:
@@ -466,8 +420,8 @@ def _sync_weekly_plan_from_program(camp: Dict[str, Any]) -> Tuple[Dict[str, Any]
     if already == prog_hash and not needs_retry:
         return camp, False
 
-    sections = _extract_week_sections(program_text)
-    if not sections:
+    parsed = {w["week"]: w for w in _program_weeks_for(camp, prog_hash, program_text)}
+    if not parsed:
         if not needs_retry:
             camp["weekly_init_program_hash"] = prog_hash
             return camp, True
@@ -480,14 +434,16 @@ def _sync_weekly_plan_from_program(camp: Dict[str, Any]) -> Tuple[Dict[str, Any]
         if not isinstance(item, dict):
             continue
         week_n = int(item.get("week") or 0) or 0
-        if week_n <= 0:
+        if week_n <= 0 or week_n not in parsed:
             continue
 
-        lines = sections.get(week_n)
-        if not lines:
-            continue
-
-        obj, acts = _pick_objective_and_actions(lines)
+        pw = parsed[week_n]
+        obj = str(pw.get("objective") or "")
+        acts = [str(a) for a in pw.get("actions") or []]
+        indicator = str(pw.get("indicator") or "").strip()
+        if not str(item.get("indicator") or "").strip() and indicator:
+            item["indicator"] = indicator
+            changed = True
 
         if not str(item.get("objective_week") or "").strip() and obj.strip():
             item["objective_week"] = obj.strip()
@@ -515,44 +471,61 @@ def _sync_weekly_plan_from_program(camp: Dict[str, Any]) -> Tuple[Dict[str, Any]
 # -----------------------------------------------------------------------------
 # OpenAI (program gen)
 # -----------------------------------------------------------------------------
-def _get_openai_client():
-    try:
-        from openai import OpenAI  # type: ignore
-    except Exception:
-        return None
-
-    api_key = (st.secrets.get("OPENAI_API_KEY") or "").strip()
-    if not api_key:
-        return None
+STREAM_REFRESH_S = 0.05  # placeholder refresh while tokens arrive (fewer websocket messages)
 
-    try:
-        return OpenAI(api_key=api_key)
-    except Exception:
-        return None
 
+def _cancel_program_generation() -> None:
+    st.session_state["program_gen_cancelled"] = True
 
-def _build_program_prompt(objective: str, context: str, weeks: int) -> str:
-    return f"""
-Tu es un coach RH. Tu dois produire un programme EVERSKILLS simple, concret et actionnable.
 
-Objectif de progression : {objective}
-Contexte : {context}
-Durée : {weeks} semaines
+def _generate_program_streamed(
+    objective: str, context: str, weeks: int, model: str
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Stream a new program into a placeholder; returns the completed text ("" on error) and
+    its structured form (None in free-text mode).
+    Cancel reruns the script, which closes the stream: nothing is returned then.
+    """
+    st.button("⏹️ Annuler la génération", on_click=_cancel_program_generation, use_container_width=True)
+    status = st.empty()
+    live = st.empty()
+    status.caption("⏳ Génération en cours…")
+    t0 = time.monotonic()
+    ttft = 0.0
+    shown_at = 0.0
+    text = ""
+    program: Optional[Dict[str, Any]] = None
+    try:
+        for part in stream_program(objective, context, weeks, model=model):
+            now = time.monotonic()
+            if not ttft:
+                ttft = now - t0
+                status.caption(f"✍️ Premier token en {ttft:.1f} s…")
+            if part.done:
+                text, program = part.text, part.program
+            elif now - shown_at >= STREAM_REFRESH_S:
+                # part.text renders the partial JSON: only when the placeholder is redrawn
+                live.markdown(part.text + " ▌")
+                shown_at = now
+    except Exception as e:
+        live.empty()
+        status.empty()
+        st.error(f"Erreur IA: {e}")
+        return "", None
+    live.empty()
+    text = text.strip()
+    if not text:
+        status.empty()
+        st.error("Erreur IA: réponse vide.")
+        return "", None
+    status.caption(f"Premier token {ttft:.1f} s · total {time.monotonic() - t0:.1f} s")
+    return text, program
 
-Contraintes :
-- Format court, lisible, en français.
-- 1 objectif SMART.
-- 3 axes maximum.
-- Un rythme hebdomadaire.
-- Pour chaque semaine :
-  - 1 objectif de semaine
-  - 2–3 actions terrain (très concrètes)
-  - 1 rappel de connaissance
-  - 1 indicateur
-- Termine par : "Message à l’apprenant" (3 lignes, ton coach).
 
-Réponds en texte clair (pas de JSON).
-""".strip()
+def _variant_label(i: int, v: Dict[str, Any]) -> str:
+    ts = float(v.get("created_at") or 0)
+    when = time.strftime("%d/%m %H:%M", time.localtime(ts)) if ts else "?"
+    return f"Variante {i + 1} · {when}"
 
 
 def _first_name_from_access(email: str) -> str:
@@ -632,6 +605,7 @@ st.session_state.setdefault("coach_view", "Demandes")
 st.session_state.setdefault("selected_req_id", "")
 st.session_state.setdefault("selected_camp_id", "")
 st.session_state.setdefault("program_draft", "")
+st.session_state.setdefault("program_draft_struct", None)
 st.session_state.setdefault("_draft_cid", "")
 
 # -----------------------------------------------------------------------------
@@ -739,6 +713,9 @@ with col_mid:
                 "created_at": now_iso(),
                 "updated_at": now_iso(),
             }
+            draft = get_draft(str(selected_req.get("id") or ""))
+            if draft:
+                camp["program_draft_auto"] = draft
 
             camp = _ensure_weekly_plan(camp)
             camp = _ensure_action_plan_struct(camp)
@@ -779,7 +756,7 @@ with col_mid:
                 _save_campaign_in_list(campaigns, selected_camp)
 
                 camp_id2 = str(selected_camp.get("id") or "").strip()
-                send_once(
+                enqueue_send_once(
                     event_key=f"CAMPAIGN_CLOSED:{camp_id2}",
                     event_type="CAMPAIGN_CLOSED",
                     request_id=camp_id2,
@@ -797,7 +774,7 @@ with col_mid:
                     meta={"camp_id": camp_id2, "learner_email": learner_email4, "coach_email": coach_email},
                 )
 
-                st.success("Clôturé ✅ (email envoyé)")
+                st.success("Clôturé ✅ (email en cours d’envoi)")
                 st.rerun()
     # -------------------------------------------------------------------------
     # CR16 — PLAN D’ACTION PROPOSÉ PAR LE LEARNER
@@ -954,17 +931,48 @@ with col_mid:
     else:
         existing_text = (selected_camp.get("program_text") or "").strip()
         camp_id = str(selected_camp.get("id") or "").strip()
+        weekly_origin = str(selected_camp.get("weekly_plan_origin") or "").strip()
+
+        objective = str(selected_camp.get("objective") or "").strip()
+        context = str(selected_camp.get("context") or "").strip()
+        try:
+            weeks = int(selected_camp.get("weeks") or 3)
+        except Exception:
+            weeks = 3
+        model = llm_gateway.default_model()
+        pkey = program_key(objective, context, weeks, model)
+
+        # background draft (program_pregen), only while the inputs it was made for still hold
+        auto_draft = selected_camp.get("program_draft_auto")
+        if not isinstance(auto_draft, dict) or auto_draft.get("key") != pkey:
+            fresh_draft = get_draft(str(selected_camp.get("request_id") or ""))
+            if fresh_draft:
+                auto_draft = fresh_draft
+                selected_camp["program_draft_auto"] = auto_draft  # saved with the program (pre-parsed weeks)
+        auto_text = ""
+        if not existing_text and weekly_origin != "action_plan" and isinstance(auto_draft, dict):
+            if auto_draft.get("key") == pkey:
+                auto_text = str(auto_draft.get("text") or "").strip()
 
         if st.session_state.get("_draft_cid") != camp_id:
             st.session_state["_draft_cid"] = camp_id
-            st.session_state["program_draft"] = existing_text
-
-        weekly_origin = str(selected_camp.get("weekly_plan_origin") or "").strip()
+            st.session_state["program_draft"] = existing_text or auto_text
+            # structured program behind the draft (kept while the text is its rendering)
+            struct = selected_camp.get("program_struct") if existing_text else None
+            if not existing_text and auto_text:
+                struct = auto_draft.get("program")
+            st.session_state["program_draft_struct"] = struct
 
         # CR16: si weekly_plan vient du plan d’action, on retire les boutons IA
         if weekly_origin == "action_plan":
             st.info("Programme IA désactivé : weekly_plan vient du plan d’action officialisé.")
         else:
+            if auto_text and st.session_state.get("program_draft") == auto_text:
+                st.caption(
+                    f"🤖 Brouillon pré-généré le {str(auto_draft.get('generated_at') or '')[:16].replace('T', ' ')}"
+                    " — relis-le, puis 💾 Enregistrer."
+                )
+
             b1, b2, b3 = st.columns([1, 1, 1.4])
             with b1:
                 do_gen = st.button("⚡ Générer (IA)", use_container_width=True)
@@ -975,40 +983,53 @@ with col_mid:
 
             if do_load:
                 st.session_state["program_draft"] = (selected_camp.get("program_text") or "").strip()
+                st.session_state["program_draft_struct"] = selected_camp.get("program_struct")
                 selected_camp, _ = _sync_weekly_plan_from_program(selected_camp)
                 _save_campaign_in_list(campaigns, selected_camp)
                 st.success("Rechargé ✅")
                 st.rerun()
 
+            if st.session_state.pop("program_gen_cancelled", False):
+                st.info("Génération annulée ✋ (brouillon inchangé)")
+
             if do_gen or do_regen:
-                client = _get_openai_client()
-                model = (st.secrets.get("OPENAI_MODEL") or "gpt-4o-mini").strip()
-                if not client:
-                    st.error("OPENAI_API_KEY manquante (ou SDK openai absent).")
+                # Générer: last cached program for these inputs if any (no LLM call);
+                # Regénérer: always a new variant. Tokens are rendered as they arrive; the
+                # draft (hence the weekly_plan sync on save / publish) only ever receives a
+                # completed text.
+                hit = cached_program(pkey) if do_gen else None
+                if hit:
+                    st.session_state["program_draft"] = str(hit.get("text") or "")
+                    st.session_state["program_draft_struct"] = hit.get("program")
+                    st.success("Programme généré ✅ (cache — 🔁 Regénérer pour une nouvelle variante)")
+                elif not llm_gateway.configured():
+                    st.error("OPENAI_API_KEY manquante.")
                 else:
-                    objective = str(selected_camp.get("objective") or "").strip()
-                    context = str(selected_camp.get("context") or "").strip()
-                    try:
-                        weeks = int(selected_camp.get("weeks") or 3)
-                    except Exception:
-                        weeks = 3
-
-                    prompt = _build_program_prompt(objective, context, weeks)
-                    try:
-                        resp = client.chat.completions.create(
-                            model=model,
-                            messages=[
-                                {"role": "system", "content": "Tu es un coach RH exigeant, pragmatique et bienveillant."},
-                                {"role": "user", "content": prompt},
-                            ],
-                            temperature=0.4,
-                            max_tokens=900,
-                        )
-                        text = (resp.choices[0].message.content or "").strip()
+                    text, program = _generate_program_streamed(objective, context, weeks, model)
+                    if text:
+                        # the model may have been switched to text mode (response_format rejected)
+                        pkey = program_key(objective, context, weeks, model)
+                        add_variant(pkey, text, model=model, program=program)
                         st.session_state["program_draft"] = text
+                        st.session_state["program_draft_struct"] = program
                         st.success("Programme généré ✅")
-                    except Exception as e:
-                        st.error(f"Erreur IA: {e}")
+
+            variants = list_variants(pkey)
+            if len(variants) > 1:
+                v1, v2 = st.columns([2, 1])
+                with v1:
+                    pick = st.selectbox(
+                        f"Variantes générées ({len(variants)}/{PROGRAM_VARIANTS})",
+                        options=list(range(len(variants)))[::-1],
+                        format_func=lambda i: _variant_label(i, variants[i]),
+                        key=f"program_variant_{camp_id}",
+                    )
+                with v2:
+                    st.write("")
+                    if st.button("↪️ Utiliser cette variante", use_container_width=True):
+                        st.session_state["program_draft"] = str(variants[pick].get("text") or "")
+                        st.session_state["program_draft_struct"] = variants[pick].get("program")
+                        st.rerun()
 
         program_text = st.text_area(
             "Programme (modifiable)",
@@ -1020,6 +1041,7 @@ with col_mid:
         with c1:
             if st.button("💾 Enregistrer le programme", use_container_width=True):
                 selected_camp["program_text"] = program_text
+                selected_camp["program_struct"] = _structured_for(program_text)
                 selected_camp, changed = _sync_weekly_plan_from_program(selected_camp)
 
                 selected_camp["updated_at"] = now_iso()
@@ -1033,6 +1055,7 @@ with col_mid:
         with c2:
             if st.button("📤 Publier (program_ready)", use_container_width=True):
                 selected_camp["program_text"] = program_text
+                selected_camp["program_struct"] = _structured_for(program_text)
                 selected_camp["status"] = "program_ready"
 
                 selected_camp, _ = _sync_weekly_plan_from_program(selected_camp)
@@ -1047,7 +1070,7 @@ with col_mid:
                 learner_to = _norm_email(str(selected_camp.get("learner_email") or ""))
                 prog_hash = _hash_text(program_text)
                 event_key = f"PROGRAM_PUBLISHED:{camp_id}:{prog_hash}"
-                send_once(
+                enqueue_send_once(
                     event_key=event_key,
                     event_type="PROGRAM_PUBLISHED",
                     request_id=camp_id,
@@ -1102,6 +1125,8 @@ with col_mid:
                         value=str(w.get("objective_week") or ""),
                         key=obj_key,
                     )
+                    if str(w.get("indicator") or "").strip():
+                        st.caption(f"📏 Indicateur : {w['indicator']}")
 
                     # ACTIONS (coach add/edit/remove)
                     actions = w.get("actions") or []
@@ -1322,7 +1347,7 @@ with col_mid:
                         coach_from = _norm_email(str(selected_camp.get("coach_email") or coach_email))
                         cid3 = str(selected_camp.get("id") or "").strip()
 
-                        send_once(
+                        enqueue_send_once(
                             event_key=f"COACH_UPDATE:{cid3}:{week_n}:{now}",
                             event_type="COACH_UPDATE",
                             request_id=cid3,
@@ -1340,6 +1365,7 @@ with col_mid:
                                 "learner_email": learner_to,
                                 "coach_email": coach_from,
                             },
+                            digest=True,
                         )
 
                         st.success("OK ✅")
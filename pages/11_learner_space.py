@@ -15,6 +15,7 @@ st.set_page_config(page_title="Learner Space — EVERSKILLS", layout="wide")
 from everskills.services.access import require_login  # noqa: E402
 from everskills.services.guard import require_role  # noqa: E402
 from everskills.services.mail_send_once import send_once  # noqa: E402
+from everskills.services.settings import get_settings  # noqa: E402
 from everskills.services.storage import (  # noqa: E402
     load_requests,
     save_requests,
@@ -53,13 +54,8 @@ def _norm_email(s: str) -> str:
 
 
 def _admin_rh_email() -> str:
-    v = str(st.secrets.get("ADMIN_EMAIL") or "").strip()
-    if v:
-        return v
-    v = str(st.secrets.get("ACCESS_ADMIN_EMAIL") or "").strip()
-    if v:
-        return v
-    return "contact@everboarding.fr"
+    s = get_settings()
+    return s.admin_email or s.access_admin_email or "contact@everboarding.fr"
 
 
 def _parse_iso_dt(s: str) -> Optional[datetime]:
@@ -183,6 +179,7 @@ def _ensure_weekly_plan(camp: Dict[str, Any]) -> Dict[str, Any]:
             {
                 "week": w,
                 "objective_week": str(existing.get("objective_week") or "").strip(),
+                "indicator": str(existing.get("indicator") or "").strip(),
                 "actions": norm_actions,
                 "learner_comment": str(existing.get("learner_comment") or "").strip(),
                 "coach_comment": str(existing.get("coach_comment") or "").strip(),
@@ -687,6 +684,8 @@ with t2:
                     st.write(obj_part)
                 else:
                     st.warning("Objectif non défini.")
+                if str(w.get("indicator") or "").strip():
+                    st.caption(f"📏 Indicateur : {w['indicator']}")
 
                 st.divider()
                 st.markdown("**Actions (coach → toi)**")
@@ -776,6 +775,7 @@ with t2:
                     w["actions"] = actions
                     w["learner_comment"] = comment
                     w["updated_at"] = now
+                    w["learner_updated_at"] = now  # resolves the part's reminder
                     camp["updated_at"] = now
 
                     campaigns = _upsert_campaign(campaigns, camp)
@@ -3,16 +3,40 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Tuple
 from datetime import datetime, timezone
-import base64
 import json
-import requests
 
 import streamlit as st
 
 from everskills.services.access import require_login
+from everskills.services.audio_cache import fetch_audio, playback_url
 from everskills.services.guard import require_role
+from everskills.services.settings import get_settings
+from everskills.services.voice_pipeline import (
+    DONE as VOICE_DONE,
+    FAILED as VOICE_FAILED,
+    ensure_worker as ensure_voice_worker,
+    retry_job as retry_voice_job,
+    submit_voice_note,
+)
+from everskills.services.webhook_client import post_json
 from everskills.services.storage import load_campaigns
-from everskills.services.journal_gsheet import build_entry, journal_create
+from everskills.services.journal_gsheet import build_entry
+from everskills.services.journal_outbox import (
+    FAILED,
+    PENDING,
+    enqueue_journal_create,
+    ensure_worker,
+    retry_failed,
+)
+from everskills.services.journal_store import (
+    mark_synced,
+    sync_feed,
+    synced_at,
+    thread_items,
+    thread_store_key,
+)
+from everskills.services.webhook_snapshots import run_with_budget
+from everskills.ui.banners import stale_banner
 
 # ---------------------------------------------------------------------
 # Page config (MUST be first Streamlit call)
@@ -44,6 +68,9 @@ if not me_email or "@" not in me_email:
 CANAL_PROMPT = "Canal Chat"
 CANAL_PROMPT_KEY = CANAL_PROMPT.lower().strip()
 
+# Max wait for the journal sync before rendering the local store (degraded mode).
+SYNC_BUDGET_S = 4.0
+
 MOODS = ["🟢 En confiance", "🔵 Flow", "🟡 Neutre", "🟠 Tendu", "🔴 Fatigué"]
 
 
@@ -80,28 +107,25 @@ def _fmt_ts(x: Any) -> str:
     return str(x or "").strip()
 
 
+def _delivery_suffix(it: Dict[str, Any]) -> str:
+    state = str(it.get("_delivery") or "").strip()
+    if state == PENDING:
+        return " · ⏳ envoi…"
+    if state == FAILED:
+        return " · ⚠️ non envoyé"
+    if state:
+        return " · ✓"
+    return ""
+
+
 def _thread_key_for_learner(email: str) -> str:
     return f"{_norm_email(email)}::{CANAL_PROMPT_KEY}"
 
 
 def _apps_script_url_and_secret() -> Tuple[str, str]:
     # compatible avec tes secrets actuels
-    url = (
-        st.secrets.get("GSHEET_USERS_WEBAPP_URL")
-        or st.secrets.get("GSHEET_WEBAPP_URL")
-        or st.secrets.get("APPS_SCRIPT_URL")
-        or st.secrets.get("GSHEET_API_URL")
-        or st.secrets.get("WEBHOOK_URL")
-        or ""
-    )
-    secret = (
-        st.secrets.get("GSHEET_USERS_SHARED_SECRET")
-        or st.secrets.get("GSHEET_SHARED_SECRET")
-        or st.secrets.get("SHARED_SECRET")
-        or st.secrets.get("EVS_SECRET")
-        or ""
-    )
-    return str(url).strip(), str(secret).strip()
+    s = get_settings()
+    return s.users_webhook.url or s.apps_script.url, s.users_webhook.secret or s.apps_script.secret
 
 
 def _post_webhook(payload: Dict[str, Any], timeout_s: int = 45) -> Dict[str, Any]:
@@ -109,7 +133,7 @@ def _post_webhook(payload: Dict[str, Any], timeout_s: int = 45) -> Dict[str, Any
     if not url:
         return {"ok": False, "error": "Missing Apps Script URL"}
     try:
-        r = requests.post(url, json=payload, timeout=timeout_s)
+        r = post_json(url, payload, timeout_s=timeout_s)
         try:
             j = r.json()
         except Exception:
@@ -117,7 +141,7 @@ def _post_webhook(payload: Dict[str, Any], timeout_s: int = 45) -> Dict[str, Any
             return {
                 "ok": False,
                 "error": "Non-JSON response from webhook",
-                "status": r.status_code,
+                "status": r.status,
                 "snippet": snippet,
             }
         return j if isinstance(j, dict) else {"ok": False, "error": "Non-dict JSON response"}
@@ -125,38 +149,66 @@ def _post_webhook(payload: Dict[str, Any], timeout_s: int = 45) -> Dict[str, Any
         return {"ok": False, "error": str(e)}
 
 
+def _sync_thread_store(
+    store_key: str,
+    feeds: List[Tuple[str, Dict[str, Any]]],
+    keep: Any,
+    url: str,
+) -> None:
+    """
+    Incremental sync of the local thread store (only items after each feed cursor,
+    paged). Runs in the background pool (no Streamlit calls here); raises if a feed
+    fails so the thread is not marked as synced.
+    """
+    for action, payload in feeds:
+
+        def fetch(params: Dict[str, int], action: str = action, payload: Dict[str, Any] = payload) -> Dict[str, Any]:
+            r = post_json(url, {**payload, **params}, timeout_s=45)
+            j = r.json()
+            if not isinstance(j, dict) or not j.get("ok"):
+                raise RuntimeError(str((j or {}).get("error") or f"{action} failed") if isinstance(j, dict) else "Non-dict JSON response")
+            return j
+
+        sync_feed(store_key, action, fetch, keep=keep)
+    mark_synced(store_key)
+
+
 def _journal_list_for_me(learner_email: str, coach_email: str) -> List[Dict[str, Any]]:
     """
-    Récupère les items visibles pour l'utilisateur courant.
+    Items visibles pour l'utilisateur courant, servis depuis le store local.
     - Coach: journal_list_coach(coach_email=coach)
-    - Learner: merge journal_list_learner(author_email=learner) + journal_list_coach(coach_email=coach)
+    - Learner: journal_list_learner(author_email=learner) + journal_list_coach(coach_email=coach)
       (permet le flux coach->learner)
+    La synchro a un budget de latence : si le Google Sheet est lent ou en panne,
+    on affiche le store local (bannière) et la synchro continue en arrière-plan.
     """
+    store_key = thread_store_key(coach_email, learner_email, me_email)
     url, secret = _apps_script_url_and_secret()
     if not url or not secret:
-        return []
+        return thread_items(store_key)
 
-    # Coach view
+    feeds: List[Tuple[str, Dict[str, Any]]] = []
     if me_role == "coach" and coach_email and "@" in coach_email:
-        payload = {"secret": secret, "action": "journal_list_coach", "coach_email": coach_email, "limit": 300}
-        j = _post_webhook(payload)
-        return list(j.get("items") or []) if j.get("ok") else []
-
-    # Learner view = merge
-    items: List[Dict[str, Any]] = []
+        feeds.append(("journal_list_coach", {"secret": secret, "action": "journal_list_coach", "coach_email": coach_email, "limit": 300}))
+    else:
+        feeds.append(("journal_list_learner", {"secret": secret, "action": "journal_list_learner", "author_email": learner_email, "limit": 200}))
+        if coach_email and "@" in coach_email:
+            feeds.append(("journal_list_coach", {"secret": secret, "action": "journal_list_coach", "coach_email": coach_email, "limit": 300}))
 
-    p1 = {"secret": secret, "action": "journal_list_learner", "author_email": learner_email, "limit": 200}
-    j1 = _post_webhook(p1)
-    if j1.get("ok"):
-        items.extend(list(j1.get("items") or []))
+    thread_key_ = _thread_key_for_learner(learner_email)
 
-    if coach_email and "@" in coach_email:
-        p2 = {"secret": secret, "action": "journal_list_coach", "coach_email": coach_email, "limit": 300}
-        j2 = _post_webhook(p2)
-        if j2.get("ok"):
-            items.extend(list(j2.get("items") or []))
+    def _keep(it: Dict[str, Any]) -> bool:
+        return bool(_filter_items_for_thread([it], thread_key_, learner_email, coach_email))
 
-    return items
+    res = run_with_budget(
+        f"journal_sync:{store_key}",
+        lambda: _sync_thread_store(store_key, feeds, _keep, url),
+        budget_s=SYNC_BUDGET_S,
+        fallback_available=synced_at(store_key) > 0,
+    )
+    if not res.done or res.error:
+        stale_banner(synced_at(store_key) or None, res.error, what="Messages")
+    return thread_items(store_key)
 
 
 def _filter_items_for_thread(
@@ -226,7 +278,13 @@ def _parse_canonical_body(body: str) -> Dict[str, Any]:
                     "url_alt": str(audio.get("url_alt") or "").strip(),
                     "mime": str(audio.get("mime") or "").strip(),
                     "file_id": str(audio.get("file_id") or "").strip(),
+                    "pending": bool(audio.get("pending")),
                 }
+                if out["type"] == "voice_summary":
+                    out["parent_id"] = str(j.get("parent_id") or "")
+                    out["summary"] = str(j.get("summary") or "")
+                    out["highlights"] = [str(x) for x in (j.get("highlights") or []) if str(x).strip()]
+                    out["transcript"] = str(j.get("transcript") or "")
                 return out
         except Exception:
             out["text"] = body
@@ -296,22 +354,7 @@ def _bubble_text(text: str, mood: str, ts: str, is_me: bool) -> None:
     )
 
 
-@st.cache_data(show_spinner=False, ttl=3600)
-def _fetch_audio_bytes(url: str) -> Tuple[bytes, str]:
-    u = (url or "").strip()
-    if not u:
-        return b"", ""
-    r = requests.get(u, allow_redirects=True, timeout=25)
-    ct = (r.headers.get("Content-Type") or "").lower()
-
-    # Drive renvoie parfois du HTML => KO
-    if "text/html" in ct or (r.content and r.content[:15].lower().startswith(b"<!doctype html")):
-        return b"", ct
-
-    return r.content or b"", ct
-
-
-def _bubble_voice(audio_url: str, audio_url_alt: str, mime: str, ts: str, is_me: bool) -> None:
+def _bubble_voice(audio_url: str, audio_url_alt: str, mime: str, ts: str, is_me: bool, pending: bool = False) -> None:
     # ✅ pas de vignette / pas d’humeur sur les vocaux
     align = "flex-end" if is_me else "flex-start"
     bg = "#111827" if is_me else "#F3F4F6"
@@ -342,16 +385,22 @@ def _bubble_voice(audio_url: str, audio_url_alt: str, mime: str, ts: str, is_me:
     )
 
     src = (audio_url or "").strip() or (audio_url_alt or "").strip()
+    if not src and pending:
+        st.caption("⏳ Envoi de l’audio…")
+        return
     if not src:
         st.error("Audio introuvable (url vide).")
         return
 
-    data, ct = _fetch_audio_bytes(src)
-    if data:
+    # disk cache (byte budget) + range server when configured: the browser streams the
+    # file instead of receiving the whole blob on every rerun
+    item = fetch_audio(src)
+    if item:
+        target = playback_url(item) or str(item.path)
         try:
-            st.audio(data, format=(mime or ct or None))
+            st.audio(target, format=(mime or item.mime or "audio/wav"))
         except Exception:
-            st.audio(data)
+            st.audio(target)
     else:
         st.warning("Audio non lisible en live (Drive). Utilise le fallback ci-dessous.")
 
@@ -359,20 +408,14 @@ def _bubble_voice(audio_url: str, audio_url_alt: str, mime: str, ts: str, is_me:
         st.link_button("Ouvrir le lien audio (fallback)", audio_url_alt)
 
 
-def _upload_voice_note(file_name: str, mime: str, b64: str, meta: Dict[str, Any]) -> Dict[str, Any]:
-    url, secret = _apps_script_url_and_secret()
-    if not url or not secret:
-        return {"ok": False, "error": "Missing Apps Script URL/SECRET"}
-
-    payload = {
-        "secret": secret,
-        "action": "upload_voice_note",
-        "file_name": file_name,
-        "mime_type": mime,
-        "data_b64": b64,
-        "meta": meta or {},
-    }
-    return _post_webhook(payload, timeout_s=90)
+def _voice_summary_block(summary: Dict[str, Any]) -> None:
+    with st.expander("📝 Résumé & transcription", expanded=False):
+        st.markdown(summary.get("summary") or "Résumé indisponible.")
+        for h in summary.get("highlights") or []:
+            st.markdown(f"- {h}")
+        if summary.get("transcript"):
+            st.caption("Transcription")
+            st.write(summary["transcript"])
 
 
 def _build_structured_text(ok_txt: str, ko_txt: str, learn_txt: str) -> str:
@@ -507,6 +550,10 @@ else:
 
 thread_key = _thread_key_for_learner(learner_email)
 
+# deliver jobs left pending by a previous run
+ensure_worker()
+ensure_voice_worker()
+
 # ---------------------------------------------------------------------
 # Composer (sticky, visible tout le temps)
 # ---------------------------------------------------------------------
@@ -572,51 +619,11 @@ if send:
         st.stop()
 
     try:
-        audio_payload: Dict[str, Any] = {}
-        if has_audio:
-            raw = audio.getvalue()  # bytes
-            if not raw:
-                st.error("Audio vide (0 byte). Refaire l’enregistrement.")
-                st.stop()
-
-            mime = getattr(audio, "type", "") or "audio/webm"
-            fname = getattr(audio, "name", "") or f"voice_{camp_id}_{int(datetime.now().timestamp())}.webm"
-            b64 = base64.b64encode(raw).decode("utf-8")
-
-            up = _upload_voice_note(
-                file_name=fname,
-                mime=mime,
-                b64=b64,
-                meta={
-                    "camp_id": camp_id,
-                    "thread_key": thread_key,
-                    "author_email": me_email,
-                    "learner_email": learner_email,
-                    "coach_email": coach_email,
-                },
-            )
-            if not up.get("ok"):
-                st.error(f"Upload audio KO: {up.get('error')}")
-                st.stop()
-
-            audio_payload = {
-                "url": str(up.get("audio_url") or "").strip(),
-                "url_alt": str(up.get("audio_url_alt") or "").strip(),
-                "mime": str(up.get("mime_type") or mime).strip(),
-                "file_id": str(up.get("file_id") or "").strip(),
-            }
+        if has_audio and not getattr(audio, "size", 0):
+            st.error("Audio vide (0 byte). Refaire l’enregistrement.")
+            st.stop()
 
-            if not audio_payload["url"] and not audio_payload["url_alt"]:
-                st.error("Upload audio KO: audio_url manquant.")
-                st.stop()
-
-        msg_obj = {
-            "v": 1,
-            "type": "voice" if has_audio else "text",
-            "mood": mood or "",
-            "text": txt_struct,
-            "audio": audio_payload if has_audio else {},
-        }
+        msg_obj = {"v": 1, "type": "text", "mood": mood or "", "text": txt_struct, "audio": {}}
         body = "EVSMSG:" + json.dumps(msg_obj, ensure_ascii=False)
 
         entry = build_entry(
@@ -630,7 +637,28 @@ if send:
         )
         entry.thread_key = thread_key
 
-        journal_create(entry)
+        store_key = thread_store_key(coach_email, learner_email, me_email)
+        if has_audio:
+            # rendered at once; upload, transcription and summary run in the voice pipeline
+            submit_voice_note(
+                audio,
+                entry=entry,
+                file_name=getattr(audio, "name", "") or f"voice_{camp_id}_{int(datetime.now().timestamp())}.webm",
+                mime_type=getattr(audio, "type", "") or "audio/webm",
+                store_key=store_key,
+                mood=mood or "",
+                text=txt_struct,
+                meta={
+                    "camp_id": camp_id,
+                    "thread_key": thread_key,
+                    "author_email": me_email,
+                    "learner_email": learner_email,
+                    "coach_email": coach_email,
+                },
+            )
+        else:
+            # write-behind: rendered at once as "pending", delivered by the outbox worker
+            enqueue_journal_create(entry, store_key=store_key)
         st.rerun()
 
     except Exception as e:
@@ -649,19 +677,28 @@ items = _filter_items_for_thread(
     coach_email_=coach_email or "",
 )
 
+# voice summaries are shown under their voice note, not as messages
+summaries: Dict[str, Dict[str, Any]] = {}
+for it in items:
+    parsed_it = _parse_canonical_body(str(it.get("body") or ""))
+    if parsed_it.get("type") == "voice_summary" and parsed_it.get("parent_id"):
+        summaries[parsed_it["parent_id"]] = parsed_it
+
 if not items:
     st.info("Aucun message dans ce canal pour l’instant.")
 else:
     for it in items:
         body = str(it.get("body") or "").strip()
         author = _norm_email(str(it.get("author_email") or ""))
-        ts = _fmt_ts(it.get("created_at"))
+        ts = _fmt_ts(it.get("created_at")) + _delivery_suffix(it)
         if not body:
             continue
 
         parsed = _parse_canonical_body(body)
         is_me = (author == me_email)
 
+        if parsed.get("type") == "voice_summary":
+            continue
         if parsed.get("type") == "voice":
             audio_d = parsed.get("audio") if isinstance(parsed.get("audio"), dict) else {}
             _bubble_voice(
@@ -670,7 +707,22 @@ else:
                 mime=str(audio_d.get("mime") or ""),
                 ts=ts,
                 is_me=is_me,
+                pending=bool(audio_d.get("pending")),
             )
+            iid = str(it.get("id") or "")
+            stage = str(it.get("_voice_stage") or "")
+            if iid in summaries:
+                _voice_summary_block(summaries[iid])
+            elif stage == VOICE_FAILED and is_me:
+                st.caption(f"Traitement de la note vocale en échec : {it.get('_voice_error') or 'erreur inconnue'}")
+                if st.button("🔁 Relancer le traitement", key=f"retry_voice_{iid}"):
+                    retry_voice_job(str(it.get("_voice_job") or ""))
+                    st.rerun()
+                continue
+            elif stage == VOICE_DONE and it.get("_voice_error"):
+                st.caption(str(it.get("_voice_error")))
+            elif stage:
+                st.caption("⏳ Transcription et résumé en cours…")
         else:
             _bubble_text(
                 text=str(parsed.get("text") or body),
@@ -679,3 +731,21 @@ else:
                 is_me=is_me,
             )
 
+        if str(it.get("_delivery") or "") == FAILED and is_me:
+            iid = str(it.get("id") or "")
+            st.caption(f"Échec d’envoi : {it.get('_delivery_error') or 'erreur inconnue'}")
+            if st.button("🔁 Réessayer l’envoi", key=f"retry_{iid}"):
+                retry_failed(iid)
+                st.rerun()
+
+# Pending messages: poll until the outbox worker has delivered them
+if any(
+    str(it.get("_delivery") or "") == PENDING or str(it.get("_voice_stage") or "") not in ("", VOICE_DONE, VOICE_FAILED)
+    for it in items
+):
+    try:
+        from streamlit_autorefresh import st_autorefresh  # type: ignore
+
+        st_autorefresh(interval=3000, key=f"canal_outbox_refresh_{camp_id}")
+    except Exception:
+        st.caption("Messages en cours d’envoi — rafraîchis la page pour voir leur statut.")
@@ -1,23 +1,133 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
-
 import streamlit as st
 
+from everskills.services.approvals_job import (
+    JOB_DONE,
+    ROW_DONE,
+    ROW_ERROR,
+    create_job,
+    is_running,
+    latest_unfinished_job,
+    list_jobs,
+    load_job,
+    progress,
+    start_job,
+)
 from everskills.services.gsheet_access import get_gsheet_api
-from everskills.services.passwords import generate_temp_password, hash_password_pbkdf2
-from everskills.services.mailer import send_email
 
 from everskills.services.guard import require_role
+from everskills.services.settings import get_settings
+from everskills.ui.banners import stale_banner
 
 
 st.set_page_config(page_title="EVERSKILLS - Admin approvals", page_icon="✅", layout="wide")
 
 require_role({"admin","super_admin"})
 
+# status=approved AND password_sent != yes (filtered by the WebApp when it supports it)
+ACTIONABLE_FILTER = {"status": "approved", "password_sent": {"ne": "yes"}}
+ACTIONABLE_PAGE = 200
+HISTORY_PAGE = 50
+
+
+def _autorefresh(key: str) -> None:
+    try:
+        from streamlit_autorefresh import st_autorefresh  # type: ignore
+
+        st_autorefresh(interval=2000, key=key)
+    except Exception:
+        st.caption("Traitement en cours — rafraîchis la page pour suivre la progression.")
+
+
+def _job_panel(job: dict) -> None:
+    """
+    Live progress of one approvals job (persisted per-row state).
+    """
+    job = load_job(job["id"]) or job
+    prog = progress(job)
+    total = max(prog["total"], 1)
+    finished = prog[ROW_DONE] + prog[ROW_ERROR]
+    running = is_running(job["id"])
+
+    st.subheader(f"Traitement {job['id']}")
+    st.progress(finished / total, text=f"{finished}/{prog['total']} ligne(s) — {prog[ROW_DONE]} email(s) envoyé(s), {prog[ROW_ERROR]} erreur(s)")
+
+    errors = [r for r in job.get("rows", []) if r.get("state") == ROW_ERROR]
+    if errors:
+        with st.expander(f"{len(errors)} erreur(s)", expanded=not running):
+            st.dataframe(
+                [{k: r.get(k) for k in ("email", "request_id", "error", "updated_at")} for r in errors],
+                use_container_width=True,
+                hide_index=True,
+            )
+
+    if running:
+        _autorefresh(f"approvals_job_{job['id']}")
+        return
+
+    if job.get("state") != JOB_DONE:
+        st.warning("Traitement interrompu (rechargement / redémarrage). Les lignes déjà envoyées ne seront pas renvoyées.")
+        if st.button("▶️ Reprendre le traitement", type="primary"):
+            start_job(job["id"])
+            st.rerun()
+        return
 
-def now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+    st.success(f"Traitement terminé : {prog[ROW_DONE]} email(s) envoyés.")
+    if errors and st.button("🔁 Relancer les lignes en erreur"):
+        start_job(job["id"], retry_errors=True)
+        st.rerun()
+
+
+def _load_actionable(api):
+    """
+    Every actionable row, page by page. Returns (rows, stale_res or None, error).
+    """
+    rows, stale, cursor = [], None, ""
+    while True:
+        res = api.list_users_swr(filter=ACTIONABLE_FILTER, cursor=cursor, limit=ACTIONABLE_PAGE)
+        if not res.available:
+            return rows, stale, res.error
+        if res.stale and stale is None:
+            stale = res
+        data = res.data or {}
+        rows.extend(data.get("rows", []))
+        cursor = str(data.get("next_cursor") or "")
+        if not cursor:
+            return rows, stale, ""
+
+
+def _history_section(api) -> None:
+    """
+    All requests, one page at a time (cursor stack kept in session_state).
+    """
+    stack = st.session_state.setdefault("approvals_history_cursors", [""])
+
+    counts = [api.count_users(), api.count_users(ACTIONABLE_FILTER)]
+    total, actionable = (c.data.get("count") if c.ok else "?" for c in counts)
+
+    st.subheader("Demandes (historique)")
+    st.caption(f"{total} demande(s) au total — {actionable} approuvée(s) sans email envoyé.")
+
+    res = api.list_users_swr(cursor=stack[-1], limit=HISTORY_PAGE)
+    if not res.available:
+        st.error(f"Impossible de lire l'historique : {res.error}")
+        return
+    data = res.data or {}
+    st.dataframe(data.get("rows", []), use_container_width=True)
+
+    c1, c2, c3 = st.columns([1, 1, 4])
+    with c1:
+        if len(stack) > 1 and st.button("⬅️ Page précédente"):
+            stack.pop()
+            st.rerun()
+    with c2:
+        next_cursor = str(data.get("next_cursor") or "")
+        if next_cursor and st.button("Page suivante ➡️"):
+            stack.append(next_cursor)
+            st.rerun()
+    with c3:
+        st.caption(f"Page {len(stack)} ({HISTORY_PAGE} lignes par page)")
 
 
 def main() -> None:
@@ -29,6 +139,12 @@ def main() -> None:
         "2) Ici : clique 'Traiter les approvals' → email envoyé au learner + hash MDP écrit + flags mis à jour.\n"
     )
 
+    # A job in progress (or interrupted) takes precedence over a new run
+    current = latest_unfinished_job()
+    if current:
+        _job_panel(current)
+        return
+
     api = get_gsheet_api()
 
     colA, colB = st.columns([1, 3])
@@ -37,32 +153,36 @@ def main() -> None:
     with colB:
         st.caption("Critère : status=approved ET password_sent != yes")
 
-    res = api.list_users()
-    if not res.ok:
-        st.error(f"Impossible de lire le G-Sheet : {res.error}")
-        st.json(res.data)
-        return
+    last = (list_jobs() or [None])[0]
+    if last:
+        _job_panel(last)
 
-    rows = res.data.get("rows", [])
-    if not rows:
-        st.warning("Aucune ligne.")
+    rows, stale, error = _load_actionable(api)
+    if error:
+        st.error(f"Impossible de lire le G-Sheet : {error}")
         return
+    if stale is not None:
+        stale_banner(stale.stale_since, stale.error, what="Liste des demandes")
 
     def norm(x) -> str:
         return str(x or "").strip()
 
-    st.subheader("Demandes (vue brute)")
-    st.dataframe(rows, use_container_width=True)
+    # rows finished by the last job may still look "approved" in a cached list
+    done_keys = {r["key"] for r in (last or {}).get("rows", []) if r.get("state") == ROW_DONE}
 
     to_process = []
     for r in rows:
-        status = norm(r.get("status")).lower()
-        sent = norm(r.get("password_sent")).lower()
-        if status == "approved" and sent != "yes":
+        key = norm(r.get("request_id")) or norm(r.get("email")).lower()
+        if key not in done_keys:
             to_process.append(r)
 
     st.subheader("À traiter")
     st.write(f"{len(to_process)} ligne(s)")
+    if to_process:
+        st.dataframe(to_process, use_container_width=True)
+
+    with st.expander("Historique des demandes", expanded=not to_process):
+        _history_section(api)
 
     if not to_process:
         st.success("Rien à faire.")
@@ -71,75 +191,19 @@ def main() -> None:
     if not process:
         st.stop()
 
-    processed = 0
-    errors = []
-
-    env = st.secrets.get("APP_ENV", "PROD")
-
-    for r in to_process:
-        email = norm(r.get("email")).lower()
-        first_name = norm(r.get("first_name"))
-        last_name = norm(r.get("last_name"))
-        request_id = norm(r.get("request_id"))
-
-        if not email or "@" not in email:
-            errors.append({"email": email, "error": "Invalid email in row", "request_id": request_id})
-            continue
-
-        # 1) Generate temp password + hash
-        temp_pwd = generate_temp_password()
-        pwd_hash = hash_password_pbkdf2(temp_pwd)
-
-        # 2) Update sheet: write hash + flags + activate
-        upd = api.update_user(
-            request_id=request_id,
-            email=email,
-            updates={
-                "initial_password": pwd_hash,
-                "password_sent": "yes",
-                "sent_at": now_iso(),
-                "status": "active",
-            },
-        )
-        if not upd.ok:
-            errors.append(
-                {
-                    "email": email,
-                    "error": f"Sheet update failed: {upd.error}",
-                    "details": upd.data,
-                    "request_id": request_id,
-                }
-            )
-            continue
-
-        # 3) Send email to learner (transactionnel)
-        subject = f"[EVERSKILLS] Accès validé ({env})"
-        body = (
-            f"Bonjour {first_name} {last_name},\n\n"
-            "Ton accès à EVERSKILLS est validé.\n\n"
-            f"Identifiant : {email}\n"
-            f"Mot de passe temporaire : {temp_pwd}\n\n"
-            "À la première connexion, tu pourras changer ton mot de passe.\n\n"
-            "— EVERSKILLS\n"
-        )
-
-        mail_res = send_email(
-            to_email=email,
-            subject=subject,
-            text_body=body,
-            meta={"flow": "CR06", "request_id": request_id, "env": env},
-        )
-
-        if not mail_res.get("ok"):
-            errors.append({"email": email, "error": "Email send failed", "details": mail_res, "request_id": request_id})
-            continue
-
-        processed += 1
-
-    st.success(f"Traitement terminé : {processed} email(s) envoyés.")
-    if errors:
-        st.error(f"{len(errors)} erreur(s)")
-        st.json(errors)
+    if stale is not None:
+        # password_sent flags may have changed since the snapshot: never process on stale rows
+        st.error("Traitement impossible tant que le Google Sheet ne répond pas (liste non à jour).")
+        st.stop()
+
+    me = st.session_state.get("user") or {}
+    job = create_job(
+        to_process,
+        env=get_settings().app_env,
+        created_by=str(me.get("email") or ""),
+    )
+    start_job(job["id"])
+    st.rerun()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+# pages/91_admin_metrics.py
+from __future__ import annotations
+
+import time
+
+import streamlit as st
+
+from everskills.services.access import require_login
+from everskills.services.audio_cache import get_audio_cache
+from everskills.services.guard import require_role
+from everskills.services import llm_gateway
+from everskills.services.content_cache import get_cache
+from everskills.services.mail_queue import FAILED, queue_stats, recent_jobs, retry_job
+from everskills.services.mailer import get_outbox, outbox_tail
+from everskills.services.program_gen import PROGRAM_VARIANTS, program_cache_stats
+from everskills.services.program_pregen import enabled as program_pregen_enabled, pregen_stats
+from everskills.services.reminders import enabled as reminders_enabled, index_stats, upcoming
+from everskills.services.settings import get_settings, reload_settings
+from everskills.services.webhook_metrics import (
+    METRICS_PATH,
+    flush,
+    live_summary,
+    persisted_summary,
+    recent_errors,
+)
+
+st.set_page_config(page_title="EVERSKILLS - Admin metrics", page_icon="📈", layout="wide")
+
+require_role({"admin", "super_admin"})
+
+user = st.session_state.get("user")
+ok, msg = require_login(user)
+if not ok:
+    st.error(msg)
+    st.stop()
+
+
+WINDOWS = {
+    "1 heure": 3600,
+    "24 heures": 24 * 3600,
+    "7 jours": 7 * 24 * 3600,
+    "Tout": 0,
+}
+
+COLUMNS = [
+    "action",
+    "page",
+    "calls",
+    "errors",
+    "error_pct",
+    "retries",
+    "p50_ms",
+    "p95_ms",
+    "p99_ms",
+    "max_ms",
+    "p95_connect_ms",
+    "new_conn_pct",
+    "p95_first_byte_ms",
+    "avg_req_bytes",
+    "avg_resp_bytes",
+]
+
+
+def _table(rows: list) -> None:
+    if not rows:
+        st.info("Aucune mesure.")
+        return
+    st.dataframe([{k: r.get(k) for k in COLUMNS} for r in rows], use_container_width=True, hide_index=True)
+
+
+def main() -> None:
+    st.title("📈 Admin — Webhook Apps Script")
+    st.caption("Latence par action (connexion / premier octet / total), tailles et erreurs.")
+
+    # make the current process' buffered samples visible in the persisted view
+    flush()
+
+    colA, colB = st.columns([1, 1])
+    with colA:
+        window = st.selectbox("Fenêtre", options=list(WINDOWS.keys()), index=1)
+    with colB:
+        by_page = st.toggle("Détail par page", value=False)
+
+    secs = WINDOWS[window]
+    since_ts = time.time() - secs if secs else 0.0
+
+    st.subheader("Historique (fichier)")
+    st.caption(f"Source : {METRICS_PATH}")
+    _table(persisted_summary(since_ts, by_page=by_page))
+
+    st.subheader("Processus courant (mémoire)")
+    _table(live_summary())
+
+    with st.expander("Dernières erreurs", expanded=False):
+        errs = recent_errors(limit=50, since_ts=since_ts)
+        if not errs:
+            st.success("Aucune erreur.")
+        else:
+            st.dataframe(errs, use_container_width=True, hide_index=True)
+
+
+def mail_queue_section() -> None:
+    st.subheader("📬 File d’envoi des emails")
+    stats = queue_stats()
+    cols = st.columns(5)
+    for col, state in zip(cols, ["pending", "sending", "sent", "failed", "skipped"]):
+        col.metric(state, stats.get(state, 0))
+
+    with st.expander("Outbox (50 derniers emails)", expanded=False):
+        st.caption(f"Segments : {len(get_outbox().segments())} — {get_outbox().path}")
+        rows = [
+            {k: it.get(k) for k in ("ts", "to", "subject", "mode", "sent", "error")}
+            for it in outbox_tail(50)
+        ]
+        if rows:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+        else:
+            st.info("Outbox vide.")
+
+    failed = recent_jobs(limit=20, state=FAILED)
+    if not failed:
+        return
+    st.caption("Échecs définitifs (après toutes les tentatives)")
+    for j in failed:
+        c1, c2 = st.columns([5, 1])
+        with c1:
+            st.write(f"`{j['id']}` → {j['to_email']} — {j['subject']}")
+            st.caption(j.get("last_error") or "")
+        with c2:
+            if st.button("🔁 Relancer", key=f"retry_{j['id']}"):
+                retry_job(j["id"])
+                st.rerun()
+
+
+def reminders_section() -> None:
+    st.subheader("⏰ Rappels de suivi hebdo")
+    if not reminders_enabled():
+        st.caption("Envoi désactivé (REMINDERS=false) : l’index est tenu à jour, aucun email ne part.")
+    stats = index_stats()
+    cols = st.columns(3)
+    for col, state in zip(cols, ["pending", "enqueued", "expired"]):
+        col.metric(state, stats.get(state, 0))
+    nxt = stats.get("next_due_at")
+    if nxt:
+        st.caption(f"Prochain rappel : {time.strftime('%Y-%m-%d %H:%M', time.localtime(nxt))}")
+    with st.expander("Prochains rappels (50)", expanded=False):
+        rows = [{**r, "due_at": time.strftime("%Y-%m-%d %H:%M", time.localtime(r["due_at"]))} for r in upcoming(50)]
+        if rows:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+        else:
+            st.info("Aucun rappel prévu.")
+
+
+def llm_section() -> None:
+    st.subheader("🤖 Appels LLM (OpenAI)")
+    st.caption("Latence, premier token, tokens et coût estimé (LLM_PRICES) par type d’appel et modèle.")
+    llm_gateway.flush()
+    window = st.selectbox("Fenêtre LLM", options=list(WINDOWS.keys()), index=1)
+    secs = WINDOWS[window]
+    rows = llm_gateway.persisted_summary(time.time() - secs if secs else 0.0)
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    else:
+        st.info("Aucun appel LLM.")
+
+
+def content_cache_section() -> None:
+    st.subheader("🗄️ Cache transcriptions / résumés")
+    stats = get_cache().stats()
+    cols = st.columns(4)
+    cols[0].metric("Entrées", stats["entries"])
+    cols[1].metric("Taille (Mo)", f"{stats['bytes'] / 1e6:.1f} / {stats['max_bytes'] / 1e6:.0f}")
+    cols[2].metric("Hits", stats["hits"])
+    cols[3].metric("Misses", stats["misses"])
+
+    st.subheader("🧠 Cache programmes (Coach Space)")
+    st.caption(f"Clé : objectif + contexte + semaines + modèle + version du prompt ; {PROGRAM_VARIANTS} variantes max par clé.")
+    stats = program_cache_stats()
+    cols = st.columns(4)
+    cols[0].metric("Clés", stats["entries"])
+    cols[1].metric("Taille (Mo)", f"{stats['bytes'] / 1e6:.2f} / {stats['max_bytes'] / 1e6:.0f}")
+    cols[2].metric("Appels LLM évités", stats["hits"])
+    cols[3].metric("Misses", stats["misses"])
+    pre = pregen_stats()
+    st.caption(
+        f"Brouillons pré-générés (PROGRAM_PREGEN) : {'actif' if program_pregen_enabled() else 'inactif'} — "
+        f"{pre['in_flight']} en cours, {pre['retrying']} en reprise, {pre['failed']} en échec."
+    )
+
+    st.subheader("🎧 Cache audio (notes vocales)")
+    stats = get_audio_cache().stats()
+    cols = st.columns(4)
+    cols[0].metric("Fichiers", stats["entries"])
+    cols[1].metric("Taille (Mo)", f"{stats['bytes'] / 1e6:.1f} / {stats['max_bytes'] / 1e6:.0f}")
+    cols[2].metric("Hits", stats["hits"])
+    cols[3].metric("Misses", stats["misses"])
+
+
+def settings_section() -> None:
+    st.subheader("⚙️ Configuration")
+    s = get_settings()
+    cols = st.columns(3)
+    cols[0].metric("SMTP", "configuré" if s.smtp_configured else "absent")
+    cols[1].metric("Webhook users", "configuré" if s.users_webhook.configured else "absent")
+    cols[2].metric("Webhook Apps Script", "configuré" if s.apps_script.configured else "absent")
+    for w in s.warnings:
+        st.warning(f"Secret ignoré — {w}")
+    if st.button("🔄 Recharger la configuration"):
+        reload_settings()
+        st.rerun()
+
+
+main()
+mail_queue_section()
+reminders_section()
+llm_section()
+content_cache_section()
+settings_section()
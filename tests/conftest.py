@@ -0,0 +1,116 @@
+# tests/conftest.py
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from everskills.devtools.apps_script_standin import StandinServer, start_standin  # noqa: E402
+from everskills.devtools.openai_mock import MockServer, start_mock  # noqa: E402
+from everskills.devtools.smtp_sink import SMTPSink, start_sink  # noqa: E402
+from everskills.services import (  # noqa: E402
+    content_cache,
+    journal_store,
+    llm_gateway,
+    mail_events,
+    mail_queue,
+    mailer,
+    reminders,
+    settings,
+    webhook_metrics,
+    webhook_snapshots,
+)
+
+# Every test runs offline against the in-process stand-ins (everskills/devtools), with
+# its own data directory: nothing is read from secrets.toml nor written under data/.
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    monkeypatch.setenv("EVS_SECRETS_FILE", str(tmp_path / "secrets.toml"))
+    for k in settings.KNOWN_KEYS:
+        monkeypatch.delenv(k, raising=False)
+    monkeypatch.setattr(content_cache, "CACHE_DIR", tmp_path / "content_cache")
+    monkeypatch.setattr(journal_store, "STORE_DIR", tmp_path / "journal_store")
+    monkeypatch.setattr(llm_gateway, "METRICS_PATH", tmp_path / "llm_metrics.jsonl")
+    monkeypatch.setattr(mailer, "OUTBOX_PATH", tmp_path / "emails_outbox.jsonl")
+    monkeypatch.setattr(mailer, "LEGACY_OUTBOX_PATH", tmp_path / "emails_outbox.json")
+    monkeypatch.setattr(mail_events, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(mail_events, "MAIL_CLAIMS_DB_PATH", tmp_path / "mail_events.sqlite3")
+    monkeypatch.setattr(mail_events, "MAIL_EVENTS_LOG_PATH", tmp_path / "mail_events.jsonl")
+    monkeypatch.setattr(mail_events, "MAIL_EVENTS_PATH", tmp_path / "mail_events.json")
+    monkeypatch.setattr(mail_queue, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(mail_queue, "QUEUE_DB_PATH", tmp_path / "mail_queue.sqlite3")
+    monkeypatch.setattr(mail_queue, "ensure_worker", lambda: None)  # the tests drive process_due
+    monkeypatch.setattr(reminders, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(reminders, "REMINDERS_DB_PATH", tmp_path / "reminders.sqlite3")
+    monkeypatch.setattr(webhook_metrics, "METRICS_PATH", tmp_path / "webhook_metrics.jsonl")
+    monkeypatch.setattr(webhook_metrics, "_STATS", {})
+    monkeypatch.setattr(webhook_snapshots, "SNAPSHOT_DIR", tmp_path / "webhook_snapshots")
+    monkeypatch.setattr(webhook_snapshots, "_INVALIDATED", {})
+    webhook_snapshots.mark_ok()
+    settings.reload_settings()
+    yield tmp_path
+    llm_gateway.flush()
+    webhook_metrics.flush()
+    mailer.close_smtp_pools()
+
+
+@pytest.fixture
+def apps_script_standin(monkeypatch: pytest.MonkeyPatch) -> Iterator[StandinServer]:
+    """
+    Apps Script stand-in, wired as both webhooks (users sheet and generic).
+    """
+    srv = start_standin(secret="test-secret")
+    monkeypatch.setenv("GSHEET_USERS_WEBAPP_URL", srv.url)
+    monkeypatch.setenv("GSHEET_USERS_SHARED_SECRET", srv.secret)
+    monkeypatch.setenv("GSHEET_WEBAPP_URL", srv.url)
+    monkeypatch.setenv("GSHEET_SHARED_SECRET", srv.secret)
+    settings.reload_settings()
+    try:
+        yield srv
+    finally:
+        srv.stop()
+
+
+@pytest.fixture
+def openai_mock(monkeypatch: pytest.MonkeyPatch) -> Iterator[MockServer]:
+    """
+    OpenAI mock as the LLM endpoint; gateway stats start empty.
+    """
+    srv = start_mock()
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    monkeypatch.setenv("OPENAI_BASE_URL", srv.base_url)
+    monkeypatch.setattr(llm_gateway, "_STATS", {})
+    settings.reload_settings()
+    try:
+        yield srv
+    finally:
+        srv.stop()
+
+
+@pytest.fixture
+def smtp_sink(monkeypatch: pytest.MonkeyPatch) -> Iterator[SMTPSink]:
+    """
+    SMTP sink (STARTTLS + AUTH) configured as the mail server.
+    """
+    sink = start_sink()
+    monkeypatch.setenv("SMTP_HOST", sink.host)
+    monkeypatch.setenv("SMTP_PORT", str(sink.port))
+    monkeypatch.setenv("SMTP_USER", sink.user)
+    monkeypatch.setenv("SMTP_PASSWORD", sink.password)
+    monkeypatch.setenv("EMAIL_FROM", "noreply@example.com")
+    monkeypatch.setenv("SMTP_STARTTLS", "true")
+    monkeypatch.setenv("SMTP_CA_FILE", sink.ca_file)
+    settings.reload_settings()
+    try:
+        yield sink
+    finally:
+        mailer.close_smtp_pools()
+        sink.stop()
@@ -0,0 +1,62 @@
+# tests/test_audio_segments.py
+from __future__ import annotations
+
+from everskills.devtools.openai_mock import hear, synth_speech
+from everskills.services.audio_segments import decode_pcm, encode_wav, plan_segments, stitch
+
+
+def test_short_recording_is_one_segment():
+    pcm = decode_pcm(synth_speech(40))
+    assert pcm is not None
+
+    (seg,) = plan_segments(pcm, target_s=60.0)
+
+    assert (seg.index, seg.start, seg.end) == (0, 0, len(pcm.samples))
+
+
+def test_segments_overlap_and_cut_in_pauses():
+    pcm = decode_pcm(synth_speech(400))
+    assert pcm is not None
+    overlap = int(1.5 * pcm.rate)
+
+    segs = plan_segments(pcm, target_s=30.0, search_s=4.0, overlap_s=1.5)
+
+    assert len(segs) >= 4
+    assert [s.index for s in segs] == list(range(len(segs)))
+    assert segs[0].start == 0 and segs[-1].end == len(pcm.samples)
+    cuts = [0]
+    for prev, nxt in zip(segs, segs[1:]):
+        cut = prev.end - overlap
+        assert nxt.start == cut - overlap
+        assert max(abs(x) for x in pcm.samples[cut - 40 : cut + 40]) == 0  # silence, not a word
+        cuts.append(cut)
+    for a, b in zip(cuts, cuts[1:]):
+        assert 15.0 <= (b - a) / pcm.rate <= 30.0 + 4.0
+
+
+def test_segmented_transcript_matches_whole_recording():
+    audio = synth_speech(300)
+    pcm = decode_pcm(audio)
+    assert pcm is not None
+
+    texts = [hear(encode_wav(pcm, s.start, s.end))[0] for s in plan_segments(pcm, target_s=20.0)]
+
+    assert len(texts) > 3
+    assert stitch(texts) == hear(audio)[0]
+
+
+def test_stitch_drops_repeated_words():
+    assert stitch(["a b c d e", "d e f g"]) == "a b c d e f g"
+    assert stitch(["Bonjour à tous,", "tous, on commence"]) == "Bonjour à tous, on commence"
+
+
+def test_stitch_keeps_complete_copy_of_cut_edge_words():
+    # prev ends mid-word ("commen"), nxt starts mid-word ("ment"): both edges tolerated
+    prev = "nous allons voir comment la réunion commen"
+    nxt = "ment la réunion commence demain matin"
+    assert stitch([prev, nxt]) == "nous allons voir comment la réunion commence demain matin"
+
+
+def test_stitch_without_overlap_concatenates():
+    assert stitch(["un deux", "", "trois quatre"]) == "un deux trois quatre"
+    assert stitch([]) == ""
@@ -0,0 +1,105 @@
+# tests/test_journal_outbox.py
+from __future__ import annotations
+
+import time
+from dataclasses import replace
+from typing import Any, Dict
+
+import pytest
+
+from everskills.services import journal_gsheet, journal_outbox, journal_store
+
+COACH = "coach@example.com"
+LEARNER = "learner@example.com"
+
+
+@pytest.fixture(autouse=True)
+def outbox(isolated, monkeypatch):
+    monkeypatch.setattr(journal_outbox, "DATA_DIR", isolated)
+    monkeypatch.setattr(journal_outbox, "OUTBOX_PATH", isolated / "journal_outbox.json")
+    monkeypatch.setattr(journal_outbox, "ensure_worker", lambda: None)  # the tests drive process_due
+
+
+def _entry(created_at: int) -> journal_gsheet.JournalEntry:
+    entry = journal_gsheet.build_entry(
+        author_user_id="u1", author_email=LEARNER, body="hors ligne", share_with_coach=True, coach_email=COACH
+    )
+    return replace(entry, created_at=created_at)
+
+
+def _server_rows(srv) -> list:
+    return srv.backend._rows("SELECT data FROM journal")
+
+
+def _job(job_id: str) -> Dict[str, Any]:
+    (job,) = [j for j in journal_outbox._read_jobs() if j["id"] == job_id]
+    return job
+
+
+def test_failed_delivery_is_retried_with_the_same_payload(apps_script_standin):
+    key = journal_store.thread_store_key(COACH, LEARNER, LEARNER)
+    written_at = int(time.time()) - 3 * 3600  # written offline, delivered hours later
+    entry = _entry(written_at)
+    journal_outbox.enqueue_journal_create(entry, store_key=key)
+
+    apps_script_standin.configure(error_rate=1.0)
+    assert journal_outbox.process_due() == 1
+    job = _job(entry.id)
+    assert (job["status"], job["attempts"]) == (journal_outbox.PENDING, 1)
+    assert job["last_error"]
+    (local,) = journal_store.thread_items(key)
+    assert local["_delivery"] == journal_outbox.PENDING and local["_delivery_error"]
+    assert _server_rows(apps_script_standin) == []
+
+    apps_script_standin.configure(error_rate=0.0)
+    assert journal_outbox.process_due(now=job["next_try_at"]) == 1
+    assert _job(entry.id)["status"] == journal_outbox.SENT
+    (row,) = _server_rows(apps_script_standin)
+    assert row["id"] == entry.id and row["created_at"] == written_at  # author's time kept
+    (local,) = journal_store.thread_items(key)
+    assert local["_delivery"] == journal_outbox.SENT and local["created_at"] == written_at
+
+
+def test_lost_response_does_not_duplicate_the_entry(apps_script_standin):
+    entry = _entry(int(time.time()))
+    journal_outbox.enqueue_journal_create(entry)
+
+    create = apps_script_standin.backend.actions["journal_create"]
+    sent = []
+
+    def lost_ack(p: Dict[str, Any]) -> Dict[str, Any]:
+        sent.append(p)
+        out = create(p)
+        return out if len(sent) > 1 else {"ok": False, "error": "timeout"}  # stored, answer lost
+
+    apps_script_standin.backend.actions["journal_create"] = lost_ack
+    journal_outbox.process_due()
+    journal_outbox.process_due(now=_job(entry.id)["next_try_at"])
+
+    assert _job(entry.id)["status"] == journal_outbox.SENT
+    assert len(_server_rows(apps_script_standin)) == 1
+    assert len(sent) == 2
+    assert sent[0]["idempotency_key"] == sent[1]["idempotency_key"] == entry.id
+    assert sent[0]["data"] == sent[1]["data"]
+
+
+def test_enqueue_is_idempotent_on_the_entry_id(apps_script_standin):
+    entry = _entry(int(time.time()))
+    first = journal_outbox.enqueue_journal_create(entry)
+    again = journal_outbox.enqueue_journal_create(replace(entry, body="autre"))
+
+    assert again == first
+    assert len(journal_outbox._read_jobs()) == 1
+
+
+def test_gives_up_after_max_attempts(apps_script_standin, monkeypatch):
+    monkeypatch.setattr(journal_outbox, "MAX_ATTEMPTS", 2)
+    entry = _entry(int(time.time()))
+    journal_outbox.enqueue_journal_create(entry)
+    apps_script_standin.configure(error_rate=1.0)
+
+    journal_outbox.process_due()
+    journal_outbox.process_due(now=_job(entry.id)["next_try_at"])
+
+    assert _job(entry.id)["status"] == journal_outbox.FAILED
+    assert journal_outbox.process_due(now=time.time() + 3600) == 0
@@ -0,0 +1,108 @@
+# tests/test_journal_sync.py
+from __future__ import annotations
+
+import time
+from dataclasses import asdict, replace
+from typing import Any, Dict, List
+
+from everskills.services import journal_gsheet, journal_store
+from everskills.services.journal_store import CURSOR_OVERLAP_S
+
+COACH = "coach@example.com"
+LEARNER = "learner@example.com"
+FEED = "journal_list_coach"
+
+
+def _post(body: str, created_at: int) -> journal_gsheet.JournalEntry:
+    entry = journal_gsheet.build_entry(
+        author_user_id="u1",
+        author_email=LEARNER,
+        body=body,
+        share_with_coach=True,
+        coach_email=COACH,
+    )
+    return journal_gsheet.journal_create(replace(entry, created_at=created_at))
+
+
+def _sync(key: str, *, limit: int = 100, legacy: bool = False) -> int:
+    pages: List[Dict[str, int]] = []
+
+    def fetch(params: Dict[str, int]) -> Dict[str, Any]:
+        if legacy:  # WebApp deployed before after_seq: only knows `since`
+            params = {k: v for k, v in params.items() if k != "after_seq"}
+        pages.append(params)
+        return journal_gsheet._post({"action": FEED, "coach_email": COACH, "limit": limit, **params})
+
+    return journal_store.sync_feed(key, FEED, fetch)
+
+
+def _bodies(key: str) -> List[str]:
+    return [str(it.get("body")) for it in journal_store.thread_items(key)]
+
+
+def test_feed_is_paged_oldest_first_on_the_server_sequence(apps_script_standin):
+    key = journal_store.thread_store_key(COACH, LEARNER, COACH)
+    now = int(time.time())
+    for i in range(5):
+        _post(f"m{i}", now - 100 + i)
+
+    assert journal_store.feed_params(key, FEED) == {"after_seq": 0}
+    assert _sync(key, limit=2) == 5
+    assert _bodies(key) == [f"m{i}" for i in range(5)]
+    assert journal_store.feed_seq(key, FEED) == 5
+
+    # nothing after the cursor: nothing new, nothing duplicated
+    assert _sync(key, limit=2) == 0
+    assert len(_bodies(key)) == 5
+
+
+def test_message_from_a_late_clock_is_not_lost(apps_script_standin):
+    key = journal_store.thread_store_key(COACH, LEARNER, COACH)
+    now = int(time.time())
+    _post("un", now - 60)
+    assert _sync(key) == 1
+
+    # written on a device 2 h behind, or delivered late by the outbox: author's time kept
+    _post("zéro", now - 2 * 3600)
+    assert _sync(key) == 1
+    assert _bodies(key) == ["zéro", "un"]
+
+
+def test_legacy_webapp_uses_the_created_at_overlap(apps_script_standin):
+    key = journal_store.thread_store_key(COACH, LEARNER, COACH)
+    now = int(time.time())
+    _post("un", now - 300)
+    _post("trois", now - 60)
+    assert _sync(key, legacy=True) == 2
+    assert journal_store.feed_cursor(key, FEED) == now - 60 - CURSOR_OVERLAP_S
+
+    _post("deux", now - 200)
+    assert _sync(key, legacy=True) == 1
+    assert _bodies(key) == ["un", "deux", "trois"]
+
+
+def test_cursor_never_moves_back(apps_script_standin):
+    key = journal_store.thread_store_key(COACH, LEARNER, COACH)
+    now = int(time.time())
+    _post("récent", now)
+    assert _sync(key) == 1
+
+    older = [{"id": "old-1", "created_at": now - 3600, "body": "ancien"}]
+    assert journal_store.merge_feed(key, FEED, older) == 1
+    assert journal_store.feed_cursor(key, FEED) == now - CURSOR_OVERLAP_S
+    assert journal_store.feed_seq(key, FEED) == 1
+    assert _bodies(key) == ["ancien", "récent"]
+
+
+def test_server_copy_keeps_local_delivery_state(apps_script_standin):
+    key = journal_store.thread_store_key(COACH, LEARNER, COACH)
+    entry = journal_gsheet.build_entry(
+        author_user_id="u1", author_email=LEARNER, body="brouillon", share_with_coach=True, coach_email=COACH
+    )
+    journal_store.add_local_item(key, {**asdict(entry), "_delivery": "pending"})
+    journal_gsheet.journal_create(entry)
+
+    assert _sync(key) == 0  # same id as the local copy
+    (item,) = journal_store.thread_items(key)
+    assert item["_delivery"] == "pending"
+    assert item["coach_email"] == COACH
@@ -0,0 +1,75 @@
+# tests/test_llm_gateway.py
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import pytest
+
+from everskills.services import llm_gateway
+from everskills.services.llm_gateway import LLMError
+
+MESSAGES = [{"role": "user", "content": "Résume : la réunion commence demain matin"}]
+
+
+def _chat_stats() -> Dict[str, Any]:
+    (row,) = [r for r in llm_gateway.live_summary() if r["kind"] == "chat"]
+    return row
+
+
+def _concurrent_chats(n: int) -> List[Any]:
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        futures = [pool.submit(llm_gateway.chat, MESSAGES) for _ in range(n)]
+        out: List[Any] = []
+        for f in futures:
+            try:
+                out.append(f.result())
+            except LLMError as e:
+                out.append(e)
+        return out
+
+
+def test_429_is_retried_until_a_slot_frees(openai_mock):
+    openai_mock.configure(max_concurrent=1, latency_ms=300, retry_after_s=0.05)
+
+    results = _concurrent_chats(2)
+
+    assert all(not isinstance(r, Exception) and r.text for r in results)
+    assert openai_mock.peak_concurrency == 1
+    stats = _chat_stats()
+    assert stats["calls"] == 2 and stats["errors"] == 0
+    assert stats["retries"] >= 1
+
+
+def test_retry_after_is_honoured(openai_mock):
+    openai_mock.configure(max_concurrent=1, latency_ms=200, retry_after_s=1.0)
+
+    t0 = time.monotonic()
+    results = _concurrent_chats(2)
+
+    assert all(not isinstance(r, Exception) for r in results)
+    assert time.monotonic() - t0 >= 1.0  # the rejected call waited Retry-After, not the 0.5 s backoff
+
+
+def test_429_surfaces_once_retries_are_exhausted(openai_mock, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "MAX_RETRIES", 0)
+    openai_mock.configure(max_concurrent=1, latency_ms=500)
+
+    results = _concurrent_chats(2)
+
+    errors = [r for r in results if isinstance(r, LLMError)]
+    assert len(errors) == 1
+    assert errors[0].status == 429 and "Rate limit reached" in str(errors[0])
+    assert _chat_stats()["errors"] == 1
+
+
+def test_400_is_not_retried(openai_mock):
+    openai_mock.configure(reject_response_format=True)
+
+    with pytest.raises(LLMError) as exc:
+        llm_gateway.chat(MESSAGES, response_format={"type": "json_object"})
+
+    assert exc.value.status == 400
+    stats = _chat_stats()
+    assert stats["errors"] == 1 and stats["retries"] == 0
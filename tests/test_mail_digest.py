@@ -0,0 +1,60 @@
+# tests/test_mail_digest.py
+from __future__ import annotations
+
+import time
+
+from everskills.services import mail_events, mail_queue, settings
+from everskills.services.mail_digest import DEFAULT_DIGEST_WINDOWS_S
+
+WINDOW_S = DEFAULT_DIGEST_WINDOWS_S["COACH_UPDATE"]
+
+
+def _update(n: int, to_email: str = "learner@example.com") -> str:
+    return mail_queue.enqueue_send_once(
+        event_key=f"COACH_UPDATE:req-{n}",
+        event_type="COACH_UPDATE",
+        request_id=f"req-{n}",
+        to_email=to_email,
+        subject=f"Retour {n}",
+        text_body=f"Ton coach a répondu ({n}).",
+        digest=True,
+    )
+
+
+def test_notifications_of_one_window_go_out_as_one_email(smtp_sink):
+    jobs = [_update(n) for n in range(3)]
+    other = _update(9, to_email="other@example.com")
+
+    assert mail_queue.process_due() == 0  # held until the window closes
+    assert mail_queue.process_due(now=time.time() + WINDOW_S + 1) == 4
+
+    by_to = {m.rcpt_to[0]: m for m in smtp_sink.messages}
+    assert sorted(by_to) == ["learner@example.com", "other@example.com"]
+    digest = by_to["learner@example.com"]
+    assert digest.subject.endswith("(3)")
+    body = digest.data.decode("utf-8", "replace")
+    assert body.index("Retour 0") < body.index("Retour 1") < body.index("Retour 2")
+    assert by_to["other@example.com"].subject == "Retour 9"  # alone in its window: sent as is
+
+    for job_id in jobs + [other]:
+        assert mail_queue.job_status(job_id)["state"] == mail_queue.SENT
+    assert all(mail_events.was_sent(f"COACH_UPDATE:req-{n}") for n in (0, 1, 2, 9))
+
+
+def test_window_opens_with_the_first_notification(smtp_sink):
+    first = _update(0)
+    opened_at = mail_queue.job_status(first)["next_try_at"]
+    later = _update(1)
+
+    assert mail_queue.job_status(later)["next_try_at"] == opened_at
+
+
+def test_zero_window_disables_the_digest(smtp_sink, isolated):
+    (isolated / "secrets.toml").write_text("[MAIL_DIGEST_WINDOWS]\nCOACH_UPDATE = 0\n", encoding="utf-8")
+    settings.reload_settings()
+
+    _update(0)
+    _update(1)
+
+    assert mail_queue.process_due() == 2
+    assert sorted(m.subject for m in smtp_sink.messages) == ["Retour 0", "Retour 1"]
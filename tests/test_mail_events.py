@@ -0,0 +1,75 @@
+# tests/test_mail_events.py
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import List
+
+from everskills.services import mail_events
+
+KEY = "COACH_UPDATE:req-1:3"
+
+
+def _log(status: str, key: str = KEY) -> None:
+    mail_events.log_event(
+        event_key=key,
+        event_type="COACH_UPDATE",
+        request_id="req-1",
+        to_email="learner@example.com",
+        subject="Retour",
+        status=status,
+    )
+
+
+def test_only_one_concurrent_caller_gets_the_claim():
+    barrier = threading.Barrier(8)
+    won: List[bool] = []
+
+    def race() -> None:
+        barrier.wait()
+        won.append(mail_events.claim(KEY))
+
+    threads = [threading.Thread(target=race) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(won) == [False] * 7 + [True]
+
+
+def test_sent_key_is_never_claimed_again():
+    assert mail_events.claim(KEY)
+    _log(mail_events.SENT)
+
+    assert mail_events.was_sent(KEY)
+    assert not mail_events.claim(KEY)
+    assert not mail_events.claim(KEY, lease_s=0)
+
+
+def test_failed_send_can_be_retried():
+    assert mail_events.claim(KEY)
+    _log(mail_events.FAILED)
+
+    assert not mail_events.was_sent(KEY)
+    assert mail_events.claim(KEY)
+
+
+def test_claim_of_a_dead_sender_is_reclaimed_after_its_lease():
+    assert mail_events.claim(KEY)
+    assert not mail_events.claim(KEY)  # lease still running
+
+    time.sleep(0.05)
+    assert mail_events.claim(KEY, lease_s=0.01)
+
+
+def test_legacy_sent_events_are_imported():
+    mail_events.MAIL_EVENTS_PATH.write_text(
+        json.dumps([{"event_key": KEY, "status": "SENT"}, {"event_key": "other", "status": "FAILED"}]),
+        encoding="utf-8",
+    )
+
+    assert mail_events.was_sent(KEY)
+    assert not mail_events.was_sent("other")
+    assert [e["event_key"] for e in mail_events.iter_events()] == [KEY, "other"]
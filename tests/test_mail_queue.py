@@ -0,0 +1,69 @@
+# tests/test_mail_queue.py
+from __future__ import annotations
+
+import time
+
+from everskills.services import mail_events, mail_queue
+
+
+def _send_once(key: str, to_email: str = "learner@example.com", **kw) -> str:
+    return mail_queue.enqueue_send_once(
+        event_key=key,
+        event_type=kw.pop("event_type", "APPROVED"),
+        request_id="req-1",
+        to_email=to_email,
+        subject=kw.pop("subject", f"Sujet {key}"),
+        text_body=kw.pop("text_body", "Bonjour"),
+        **kw,
+    )
+
+
+def test_queued_mail_is_sent_by_the_worker(smtp_sink):
+    job_id = mail_queue.enqueue_email(to_email="learner@example.com", subject="Bienvenue", text_body="Bonjour")
+    assert mail_queue.job_status(job_id)["state"] == mail_queue.PENDING
+    assert smtp_sink.messages == []
+
+    assert mail_queue.process_due() == 1
+    assert mail_queue.job_status(job_id)["state"] == mail_queue.SENT
+    assert [m.subject for m in smtp_sink.messages] == ["Bienvenue"]
+
+
+def test_failed_send_is_retried_with_backoff(smtp_sink):
+    smtp_sink.configure(fail_rate=1.0)
+    job_id = _send_once("APPROVED:req-1")
+
+    mail_queue.process_due()
+    status = mail_queue.job_status(job_id)
+    assert (status["state"], status["attempts"]) == (mail_queue.PENDING, 1)
+    assert status["next_try_at"] > time.time() and status["last_error"]
+    assert mail_queue.process_due() == 0  # not due yet
+
+    smtp_sink.configure(fail_rate=0.0)
+    assert mail_queue.process_due(now=status["next_try_at"]) == 1
+    assert mail_queue.job_status(job_id)["state"] == mail_queue.SENT
+    assert mail_events.was_sent("APPROVED:req-1")
+
+
+def test_send_once_is_not_sent_twice(smtp_sink):
+    first = _send_once("APPROVED:req-1")
+    assert _send_once("APPROVED:req-1") == first  # still queued: same job
+
+    mail_queue.process_due()
+    again = _send_once("APPROVED:req-1")
+    assert again != first
+    mail_queue.process_due()
+
+    assert mail_queue.job_status(again)["state"] == mail_queue.SKIPPED
+    assert len(smtp_sink.messages) == 1
+
+
+def test_job_of_a_dead_worker_is_requeued_after_its_lease(smtp_sink):
+    job_id = mail_queue.enqueue_email(to_email="learner@example.com", subject="Bienvenue", text_body="Bonjour")
+    now = time.time()
+    (job,) = mail_queue._claim_due(now, 10)  # worker dies while sending
+    assert mail_queue.job_status(job_id)["state"] == mail_queue.SENDING
+
+    assert mail_queue.process_due(now=now) == 0  # still leased
+    assert mail_queue.process_due(now=now + mail_queue.SENDING_LEASE_S + 1) == 1
+    assert mail_queue.job_status(job_id)["state"] == mail_queue.SENT
+    assert len(smtp_sink.messages) == 1
@@ -0,0 +1,68 @@
+# tests/test_mailer.py
+from __future__ import annotations
+
+import socket
+from typing import Any, Dict, List
+
+from everskills.services import mailer, settings
+
+
+def _messages(n: int) -> List[Dict[str, Any]]:
+    return [
+        {"to_email": f"learner{i}@example.com", "subject": f"Rappel {i}", "text_body": "Bonjour", "meta": {"i": i}}
+        for i in range(n)
+    ]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _count_connects(monkeypatch) -> List[int]:
+    calls: List[int] = []
+    connect = mailer.SMTPPool._connect
+
+    def counted(self):
+        calls.append(1)
+        return connect(self)
+
+    monkeypatch.setattr(mailer.SMTPPool, "_connect", counted)
+    return calls
+
+
+def test_batch_shares_one_session(smtp_sink, monkeypatch):
+    connects = _count_connects(monkeypatch)
+
+    results = mailer.send_many(_messages(4))
+
+    assert [r["ok"] for r in results] == [True] * 4
+    assert [m.subject for m in smtp_sink.messages] == [f"Rappel {i}" for i in range(4)]
+    assert len(connects) == 1
+
+
+def test_unreachable_server_fails_the_batch_after_one_connect(monkeypatch):
+    monkeypatch.setenv("SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(_free_port()))  # nothing listens: connection refused
+    monkeypatch.setenv("SMTP_USER", "dev")
+    monkeypatch.setenv("SMTP_PASSWORD", "dev")
+    settings.reload_settings()
+    connects = _count_connects(monkeypatch)
+
+    results = mailer.send_many(_messages(3))
+
+    assert len(connects) == 1
+    assert [r["ok"] for r in results] == [False] * 3
+    assert all(r["details"].startswith("SMTP unavailable") for r in results)
+    logged = list(mailer.iter_outbox())
+    assert [it["to"] for it in logged] == [f"learner{i}@example.com" for i in range(3)]
+    assert not any(it["sent"] for it in logged) and all(it["error"] for it in logged)
+
+
+def test_without_smtp_config_mail_goes_to_the_outbox():
+    (res,) = mailer.send_many(_messages(1))
+
+    assert (res["ok"], res["mode"]) == (True, "outbox")
+    (logged,) = mailer.iter_outbox()
+    assert logged["mode"] == "outbox" and logged["meta"] == {"i": 0}
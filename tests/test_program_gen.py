@@ -0,0 +1,80 @@
+# tests/test_program_gen.py
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from everskills.services import program_gen
+
+
+@pytest.fixture(autouse=True)
+def _text_only(monkeypatch):
+    monkeypatch.setattr(program_gen, "_TEXT_ONLY", set())
+
+
+def test_structured_program(openai_mock):
+    text, program = program_gen.generate_program("Mieux déléguer", "manager", 3)
+
+    assert program is not None and [w["week"] for w in program["weeks"]] == [1, 2, 3]
+    assert text == program_gen.render_program_text(program)
+
+
+def test_rejected_response_format_falls_back_to_text(openai_mock):
+    openai_mock.configure(reject_response_format=True)
+    structured_key = program_gen.program_key("Mieux déléguer", "manager", 3)
+
+    text, program = program_gen.generate_program("Mieux déléguer", "manager", 3)
+
+    assert text and program is None
+    assert not program_gen.structured_mode()
+    assert program_gen.prompt_version() == program_gen.PROMPT_VERSION
+    assert program_gen.program_key("Mieux déléguer", "manager", 3) != structured_key
+
+
+def test_stream_falls_back_before_the_first_delta(openai_mock):
+    openai_mock.configure(reject_response_format=True)
+
+    items = list(program_gen.stream_program("Mieux déléguer", "manager", 3))
+
+    assert items[-1].done and items[-1].program is None
+    assert len(program_gen.parse_program_weeks(items[-1].text)) == 3
+    assert not program_gen.structured_mode()
+
+
+def test_invalid_structured_answer_keeps_the_text(openai_mock, monkeypatch):
+    answer = json.dumps(
+        {
+            "smart_objective": "Déléguer deux dossiers par mois",
+            "axes": ["Priorités"],
+            "weeks": [{"week": 1, "objective": "Lister les tâches", "actions": ["Faire la liste"], "reminder": "", "indicator": "1 liste"}],
+            "learner_message": "Courage",
+        },
+        ensure_ascii=False,
+    )
+
+    def chat_stream(messages, **kwargs):
+        for i in range(0, len(answer), 16):
+            yield answer[i : i + 16]
+
+    monkeypatch.setattr(program_gen.llm_gateway, "chat_stream", chat_stream)
+
+    items = list(program_gen.stream_program("Mieux déléguer", "manager", 3))
+
+    text, program = items[-1].text, items[-1].program
+    assert items[-1].done and program is None
+    assert "Semaine 1 : Lister les tâches" in text and "Message à l’apprenant" in text
+    assert list(program_gen.extract_week_sections(text)) == [1]
+
+
+def test_stream_renders_partial_text_lazily(openai_mock, monkeypatch):
+    calls = []
+    render = program_gen.render_partial_program
+    monkeypatch.setattr(program_gen, "render_partial_program", lambda raw: calls.append(raw) or render(raw))
+
+    items = list(program_gen.stream_program("Mieux déléguer", "manager", 3))
+
+    assert len(items) > 10 and calls == []
+    assert items[len(items) // 2].text  # rendered on access
+    assert len(calls) == 1
+    assert items[-1].done and [w["week"] for w in items[-1].program["weeks"]] == [1, 2, 3]
@@ -0,0 +1,101 @@
+# tests/test_reminders.py
+from __future__ import annotations
+
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import pytest
+
+from everskills.services import mail_queue, reminders
+
+WEEK_S = 7 * 24 * 3600.0
+
+
+def _campaign(cid: str, weeks_ago: float, parts: int = 4, **extra: Any) -> Dict[str, Any]:
+    activated = datetime.fromtimestamp(time.time() - weeks_ago * WEEK_S, timezone.utc).isoformat()
+    return {
+        "id": cid,
+        "status": "active",
+        "activated_at": activated,
+        "learner_email": f"{cid}@example.com",
+        "coach_email": "coach@example.com",
+        "objective": "Prendre la parole en réunion",
+        "weekly_plan": [{"week": i + 1} for i in range(parts)],
+        **extra,
+    }
+
+
+def _states() -> Dict[str, str]:
+    with reminders._db() as conn:
+        return {r["item_key"]: r["state"] for r in conn.execute("SELECT item_key, state FROM reminder_items")}
+
+
+def _queued() -> List[Dict[str, Any]]:
+    return mail_queue.recent_jobs(100)
+
+
+def test_only_changed_campaigns_are_reindexed():
+    a, b = _campaign("a", 1.5), _campaign("b", 0.5)
+    assert reminders.reindex_campaigns([a, b]) == 2
+    assert reminders.reindex_campaigns([a, b]) == 0
+
+    a["weekly_plan"][1]["learner_updated_at"] = "2026-01-01T10:00:00+00:00"  # part 2 done
+    assert reminders.reindex_campaigns([a, b]) == 1
+    assert sorted(k.split(":")[2] for k in _states() if k.startswith("a:")) == ["1", "3", "4"]
+
+    assert reminders.reindex_campaigns([b]) == 0  # campaign a gone: its open items too
+    assert all(k.startswith("b:") for k in _states())
+
+
+def test_due_items_are_enqueued_once_in_due_order(monkeypatch):
+    # part 1 of a and b is due; a week past due, a reminder is no use any more
+    reminders.reindex_campaigns([_campaign("b", 1.2), _campaign("a", 1.5), _campaign("old", 10)])
+    sent: List[str] = []
+    real = mail_queue.enqueue_send_once
+    monkeypatch.setattr(mail_queue, "enqueue_send_once", lambda **kw: sent.append(kw["to_email"]) or real(**kw))
+
+    assert reminders.process_due() == 2
+    assert sent == ["a@example.com", "b@example.com"]  # earliest due first
+    states = _states()
+    assert sorted(k.split(":")[0] for k, s in states.items() if s == reminders.ENQUEUED) == ["a", "b"]
+    assert {s for k, s in states.items() if k.startswith("old:")} == {reminders.EXPIRED}
+    assert reminders.upcoming()[0]["item_key"].startswith("a:touchpoint:2:")
+
+    assert reminders.process_due() == 0
+    assert len(_queued()) == 2
+
+
+def test_failed_enqueue_keeps_the_reminder(monkeypatch):
+    reminders.reindex_campaigns([_campaign("a", 1.5), _campaign("b", 1.2)])
+    real = mail_queue.enqueue_send_once
+    calls: List[str] = []
+
+    def flaky(**kw: Any) -> str:
+        calls.append(kw["event_key"])
+        if len(calls) == 2:
+            raise OSError("disk full")
+        return real(**kw)
+
+    monkeypatch.setattr(mail_queue, "enqueue_send_once", flaky)
+    with pytest.raises(OSError):
+        reminders.process_due()
+    states = _states()
+    assert sorted(s for k, s in states.items() if ":touchpoint:1:" in k) == [reminders.ENQUEUED, reminders.PENDING]
+    assert reminders.CLAIMED not in states.values()
+
+    assert reminders.process_due() == 1  # the part whose enqueue failed
+    assert len(_queued()) == 2
+
+
+def test_claim_of_a_dead_scheduler_is_taken_over():
+    reminders.reindex_campaigns([_campaign("a", 1.5)])
+    now = time.time()
+    (popped,) = reminders._pop_due(now, 10)  # scheduler dies before the enqueue
+    assert _states()[popped["item_key"]] == reminders.CLAIMED
+
+    assert reminders.process_due(now=now) == 0  # still leased
+    assert reminders.process_due(now=now + reminders.CLAIM_LEASE_S + 1) == 1
+    assert _states()[popped["item_key"]] == reminders.ENQUEUED
+    (job,) = _queued()
+    assert job["to_email"] == "a@example.com"
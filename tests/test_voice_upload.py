@@ -0,0 +1,93 @@
+# tests/test_voice_upload.py
+from __future__ import annotations
+
+import io
+import os
+from typing import Any, Dict, List
+
+import requests
+
+from everskills.services import voice_notes
+
+CHUNK = 4096
+
+
+def _audio(size: int = 5 * CHUNK + 123) -> bytes:
+    return os.urandom(size)
+
+
+def _record_appends(srv, fail_after: int = -1) -> List[int]:
+    """
+    Offsets of the appends the stand-in receives; from the fail_after-th one on,
+    appends fail as if the connection dropped mid-upload.
+    """
+    offsets: List[int] = []
+    append = srv.backend.actions["voice_upload_append"]
+
+    def wrapped(p: Dict[str, Any]) -> Dict[str, Any]:
+        if 0 <= fail_after <= len(offsets):
+            return {"ok": False, "error": "Connection reset"}
+        offsets.append(int(p.get("offset") or 0))
+        return append(p)
+
+    srv.backend.actions["voice_upload_append"] = wrapped
+    return offsets
+
+
+def _upload(srv, audio: bytes) -> voice_notes.DriveUploadResult:
+    return voice_notes.upload_voice_note_chunked(
+        io.BytesIO(audio),
+        file_name="note.webm",
+        mime_type="audio/webm",
+        url=srv.url,
+        secret=srv.secret,
+        chunk_bytes=CHUNK,
+    )
+
+
+def _download(srv, file_id: str) -> bytes:
+    content = srv.backend.get_file(file_id)
+    assert content is not None
+    return content[0]
+
+
+def test_chunked_upload_round_trip(apps_script_standin):
+    audio = _audio()
+    offsets = _record_appends(apps_script_standin)
+
+    res = _upload(apps_script_standin, audio)
+
+    assert res.ok, res.error
+    assert offsets == list(range(0, len(audio), CHUNK))
+    assert _download(apps_script_standin, res.file_id) == audio
+    assert requests.get(res.audio_url, timeout=5).content == audio
+
+
+def test_interrupted_upload_resumes_at_server_offset(apps_script_standin, monkeypatch):
+    monkeypatch.setattr(voice_notes, "UPLOAD_CHUNK_RETRIES", 0)
+    audio = _audio()
+
+    first = _record_appends(apps_script_standin, fail_after=2)
+    res = _upload(apps_script_standin, audio)
+    assert not res.ok
+    assert first == [0, CHUNK]
+
+    apps_script_standin.backend.actions["voice_upload_append"] = apps_script_standin.backend.voice_upload_append
+    second = _record_appends(apps_script_standin)
+    res = _upload(apps_script_standin, audio)
+
+    assert res.ok, res.error
+    assert second == list(range(2 * CHUNK, len(audio), CHUNK))  # nothing sent twice
+    assert _download(apps_script_standin, res.file_id) == audio
+
+
+def test_same_recording_is_not_uploaded_twice(apps_script_standin):
+    audio = _audio()
+    first = _upload(apps_script_standin, audio)
+    assert first.ok, first.error
+
+    offsets = _record_appends(apps_script_standin)
+    again = _upload(apps_script_standin, audio)
+
+    assert again.ok and again.file_id == first.file_id
+    assert offsets == []
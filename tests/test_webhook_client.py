@@ -0,0 +1,46 @@
+# tests/test_webhook_client.py
+from __future__ import annotations
+
+import threading
+
+from everskills.services import webhook_metrics
+from everskills.services.webhook_client import post_json
+
+
+def _post(srv):
+    return post_json(srv.url, {"action": "count_users", "secret": srv.secret})
+
+
+def test_connect_time_is_measured_then_reused(apps_script_standin):
+    def run() -> None:  # fresh thread: fresh keep-alive session
+        first.append(_post(apps_script_standin))
+        first.append(_post(apps_script_standin))
+
+    first: list = []
+    t = threading.Thread(target=run)
+    t.start()
+    t.join()
+
+    new, reused = first
+    assert new.status == reused.status == 200
+    assert new.connect_ms > 0
+    assert reused.connect_ms == 0
+    assert new.connect_ms <= new.first_byte_ms <= new.total_ms
+
+    (row,) = [r for r in webhook_metrics.live_summary() if r["action"] == "count_users"]
+    assert (row["calls"], row["new_conn_pct"]) == (2, 50.0)
+
+
+def test_unreachable_webhook_is_recorded_as_an_error(apps_script_standin):
+    url = apps_script_standin.url
+    apps_script_standin.stop()
+
+    try:
+        post_json(url, {"action": "count_users"}, timeout_s=2)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("expected a connection error")
+
+    (row,) = [r for r in webhook_metrics.live_summary() if r["action"] == "count_users"]
+    assert row["errors"] == 1
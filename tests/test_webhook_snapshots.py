@@ -0,0 +1,118 @@
+# tests/test_webhook_snapshots.py
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict
+
+from everskills.services import gsheet_access, webhook_snapshots
+from everskills.services.webhook_snapshots import load_snapshot, swr_read
+
+
+def _wait_for(cond, timeout_s: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _boom() -> Any:
+    raise RuntimeError("WebApp down")
+
+
+def test_fresh_read_refreshes_the_snapshot():
+    res = swr_read("users", lambda: {"rows": [1]})
+
+    assert (res.data, res.stale) == ({"rows": [1]}, False)
+    assert _wait_for(lambda: load_snapshot("users") is not None)
+    assert load_snapshot("users")["data"] == {"rows": [1]}
+
+
+def test_failure_serves_the_snapshot_and_marks_degraded():
+    webhook_snapshots.save_snapshot("users", {"rows": [1]})
+
+    res = swr_read("users", _boom)
+
+    assert res.stale and res.data == {"rows": [1]} and "WebApp down" in res.error
+    assert res.stale_since
+    assert webhook_snapshots.degraded_since() is not None
+    assert webhook_snapshots.last_error() == "WebApp down"
+
+
+def test_degraded_backend_does_not_make_pages_wait():
+    webhook_snapshots.save_snapshot("users", {"rows": [1]})
+    webhook_snapshots.mark_degraded("WebApp down")
+    release = threading.Event()
+
+    def slow() -> Dict[str, Any]:
+        release.wait(5)
+        return {"rows": [2]}
+
+    t0 = time.monotonic()
+    res = swr_read("users", slow, budget_s=4.0)
+    elapsed = time.monotonic() - t0
+    release.set()
+
+    assert res.stale and res.data == {"rows": [1]}
+    assert elapsed < 1.0
+    # the background probe succeeded: healthy again, snapshot refreshed
+    assert _wait_for(lambda: webhook_snapshots.degraded_since() is None)
+    assert _wait_for(lambda: (load_snapshot("users") or {}).get("data") == {"rows": [2]})
+
+
+def test_timeout_serves_the_snapshot_and_keeps_refreshing():
+    webhook_snapshots.save_snapshot("users", {"rows": [1]})
+    release = threading.Event()
+
+    res = swr_read("users", lambda: release.wait(5) and {"rows": [2]}, budget_s=0.1)
+    release.set()
+
+    assert res.stale and res.data == {"rows": [1]} and "Délai" in res.error
+    assert _wait_for(lambda: (load_snapshot("users") or {}).get("data") == {"rows": [2]})
+
+
+def test_no_snapshot_waits_for_the_real_answer():
+    res = swr_read("users", _boom)
+
+    assert res.data is None and not res.available and "WebApp down" in res.error
+
+
+def test_in_flight_refresh_does_not_resurrect_an_invalidated_snapshot():
+    release = threading.Event()
+    fut_started = threading.Event()
+
+    def old_rows() -> Dict[str, Any]:
+        fut_started.set()
+        release.wait(5)
+        return {"rows": ["avant"]}
+
+    webhook_snapshots.save_snapshot("list_users", {"rows": ["avant"]})
+    swr_read("list_users", old_rows, budget_s=0.0)
+    assert fut_started.wait(2)
+    webhook_snapshots.invalidate_snapshots("list_users")
+    release.set()
+
+    time.sleep(0.2)
+    assert load_snapshot("list_users") is None
+
+
+def test_write_invalidates_a_refresh_racing_it(apps_script_standin, monkeypatch):
+    api = gsheet_access.get_gsheet_api()
+    api.create_user("a@example.com", "Ann", "A", status="pending", request_id="r1")
+    real_post = api._post
+
+    def post(payload: Dict[str, Any]):
+        if payload.get("action") == "update_user":
+            # a page refreshes the list while the write is on its way
+            api.list_users_swr()
+            assert _wait_for(lambda: load_snapshot("list_users") is not None)
+        return real_post(payload)
+
+    monkeypatch.setattr(api, "_post", post)
+    assert api.update_user(request_id="r1", updates={"status": "approved"}).ok
+
+    assert load_snapshot("list_users") is None  # the pre-write rows are not last-known-good
+    (row,) = api.list_users_swr().data["rows"]
+    assert row["status"] == "approved"